@@ -80,6 +80,8 @@ class Simple_HUD(Aux_Base.Aux_Seats):
         #    for future use do this here so that subclasses don't have to bother
         
         self.stats  = [ [None]*self.ncols for i in range(self.nrows) ]
+        self.values = {}         # stat -> {player id: do_stat() result}, see update_gui()
+        self.values_dict = None  # the stat_dict of self.values
         self.popups = [ [None]*self.ncols for i in range(self.nrows) ]
         self.tips   = [ [None]*self.ncols for i in range(self.nrows) ]
 
@@ -95,6 +97,25 @@ class Simple_HUD(Aux_Base.Aux_Seats):
         # this is a call to whatever is in self.aw_class_window but it isn't obvious
         container.create_contents(i)
 
+    def update_gui(self, new_hand_id):
+        # each stat of the layout is calculated once for all the players,
+        # the stat windows take their numbers from self.values
+        stat_dict = self.hud.stat_dict
+        self.values = {}
+        for row in self.stats:
+            for stat in row:
+                if stat is not None and stat not in self.values:
+                    self.values[stat] = Stats.do_stat_all(stat_dict, stat, self.hud.hand_instance)
+        self.values_dict = stat_dict
+        super(Simple_HUD, self).update_gui(new_hand_id)
+
+    def get_stat(self, stat, player_id, stat_dict):
+        """Returns do_stat() of stat for player_id, from self.values if they
+           were calculated for stat_dict"""
+        if stat_dict is self.values_dict and stat in self.values:
+            return self.values[stat][player_id]
+        return Stats.do_stat(stat_dict, player_id, stat, self.hud.hand_instance)
+
     def update_contents(self, container, i):
         # this is a call to whatever is in self.aw_class_window but it isn't obvious
         container.update_contents(i)
@@ -185,11 +206,12 @@ class Simple_stat(object):
         self.widget = self.eb
         self.stat_dict = None
         self.hud = aw.hud
+        self.aw = aw
 
     def update(self, player_id, stat_dict):
         self.stat_dict = stat_dict     # So the Simple_stat obj always has a fresh stat_dict
         self.eb.stat_dict = stat_dict
-        self.number = Stats.do_stat(stat_dict, player_id, self.stat, self.hud.hand_instance)
+        self.number = self.aw.get_stat(self.stat, player_id, stat_dict)
         self.lab.set_text( str(self.number[1]))
 
     def set_color(self, fg=None, bg=None):
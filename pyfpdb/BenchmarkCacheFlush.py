@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+"""Compares the row by row and the set based (Database.mergeCacheBulk) flush of
+   the HudCache, CardsCache and PositionsCache bulk dicts.
+   Uses the database in HUD_config.test.xml, which is recreated."""
+
+import sys
+from time import time
+from optparse import OptionParser
+
+import Database
+import TestFixtures
+
+def statCount(db, insert, nkeys):
+    return len(db.sql.query[insert].split('(')[1].split(',')) - nkeys
+
+def hudKeys(db, n):
+    stats = statCount(db, 'insert_hudcache', 6)
+    keys = {}
+    for i in xrange(n):
+        # every 4th key is a tourney key, the rest have a NULL tourneyTypeId
+        k = (1 + i % 10, 1 + i / 10, 6, 'B', (1 if i % 4 == 0 else None), 'A000000')
+        keys[k] = [1] * stats
+    return keys
+
+def cardsKeys(db, n):
+    stats = statCount(db, 'insert_cardscache', 6)
+    return dict(((1, 1 + i / 1690, 6, str(i / 169 % 10), i % 169, 'd120101'), [1] * stats) for i in xrange(n))
+
+def positionsKeys(db, n):
+    stats = statCount(db, 'insert_positionscache', 5)
+    return dict(((1 + i % 10, 1 + i / 100, 6, str(i / 10 % 10), 'd120101'), [1] * stats) for i in xrange(n))
+
+def flush(db, table, bulk, update, insert, nullable):
+    update = db.query(update)
+    insert = db.query(insert)
+    start = time()
+    db.storeCacheBulk(table, bulk, update, insert, nullable)
+    db.commit()
+    return time() - start
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = OptionParser()
+    parser.add_option("-n", "--keys", dest="keys", type="int", default=20000,
+                      help="number of cache keys per flush")
+    (options, argv) = parser.parse_args(args = argv)
+
+    config = TestFixtures.get_config()
+    db = Database.Database(config)
+    merge = db.merge_caches
+    tables = (('HudCache', hudKeys, 'update_hudcache', 'insert_hudcache', ('tourneyTypeId',)),
+              ('CardsCache', cardsKeys, 'update_cardscache', 'insert_cardscache', ()),
+              ('PositionsCache', positionsKeys, 'update_positionscache', 'insert_positionscache', ()))
+    print "%-16s %-10s %12s %12s" % ("table", "flush", "insert (s)", "update (s)")
+    for (table, keys, update, insert, nullable) in tables:
+        for (name, mode) in (("row by row", False), ("merge", True)):
+            if mode and not merge:
+                print "%-16s %-10s %s" % (table, name, "not supported by this database")
+                continue
+            db.recreate_tables()
+            db.merge_caches = mode
+            bulk = keys(db, options.keys)
+            tinsert = flush(db, table, bulk, update, insert, nullable)
+            tupdate = flush(db, table, bulk, update, insert, nullable)
+            c = db.get_cursor()
+            c.execute("SELECT count(*), sum(HDs) FROM " + table)
+            (rows, hds) = c.fetchone()
+            assert rows == len(bulk) and hds == 2 * len(bulk), (rows, hds)
+            print "%-16s %-10s %12.3f %12.3f" % (table, name, tinsert, tupdate)
+    db.merge_caches = merge
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+"""Compares the eval() based stat dispatch with the Stats.STATS lookup
+   (Stats.do_stat and Stats.do_stat_all) for a HUD refresh of all the stats of
+   all the players of a hand.
+   Uses the database in HUD_config.test.xml, which is recreated."""
+
+import sys
+from time import time
+from optparse import OptionParser
+
+import Hand
+import Stats
+import TestFixtures
+
+HUD_STATS = ['playername', 'n', 'vpip', 'pfr', 'three_B', 'four_B', 'cbet', 'steal', 'f_BB_steal',
+             'f_SB_steal', 'f_3bet', 'f_4bet', 'wtsd', 'wmsd', 'saw_f', 'ffreq1', 'agg_freq',
+             'BBper100', 'vpip_0', 'pfr_0']
+
+def eval_stat(stat_dict, player, stat):
+    """do_stat as it was: builds the call and evals it for every stat"""
+    statname = stat
+    match = Stats.re_Places.search(stat)
+    if match:
+        statname = stat[0:-2]
+    result = eval("%(stat)s(stat_dict, %(player)d)" % {'stat': statname, 'player': player},
+                  vars(Stats), {'stat_dict': stat_dict})
+    if match:
+        result = Stats.__dict__['__stat_override'](int(stat[-1:]), result)
+    return result
+
+def refresh_eval(stat_dict, hand_instance):
+    for player in stat_dict:
+        for stat in HUD_STATS:
+            eval_stat(stat_dict, player, stat)
+
+def refresh_do_stat(stat_dict, hand_instance):
+    for player in stat_dict:
+        for stat in HUD_STATS:
+            Stats.do_stat(stat_dict, player, stat, hand_instance)
+
+def refresh_do_stat_all(stat_dict, hand_instance):
+    for stat in HUD_STATS:
+        Stats.do_stat_all(stat_dict, stat, hand_instance)
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = OptionParser()
+    parser.add_option("-r", "--refreshes", dest="refreshes", type="int", default=1000,
+                      help="number of HUD refreshes timed")
+    parser.add_option("-f", "--file", dest="file", default=TestFixtures.STARS_FILE,
+                      help="hand history file imported")
+    (options, argv) = parser.parse_args(args = argv)
+
+    config = TestFixtures.get_config()
+    db = TestFixtures.import_files(config, [options.file])
+
+    hand = db.get_last_hand()
+    stat_dict = db.get_stats_from_hand(hand, "ring")
+    hand_instance = Hand.hand_factory(hand, config, db)
+
+    for player in stat_dict:
+        for stat in HUD_STATS:
+            assert eval_stat(stat_dict, player, stat) == Stats.do_stat(stat_dict, player, stat, hand_instance)
+    for stat in HUD_STATS:
+        assert Stats.do_stat_all(stat_dict, stat, hand_instance) == \
+               dict((player, Stats.do_stat(stat_dict, player, stat, hand_instance)) for player in stat_dict)
+
+    print "%d players x %d stats, %d refreshes" % (len(stat_dict), len(HUD_STATS), options.refreshes)
+    print "%-12s %10s %14s" % ("dispatch", "total (s)", "per stat (us)")
+    for (name, refresh) in (("eval", refresh_eval), ("do_stat", refresh_do_stat),
+                            ("do_stat_all", refresh_do_stat_all)):
+        start = time()
+        for i in xrange(options.refreshes):
+            refresh(stat_dict, hand_instance)
+        elapsed = time() - start
+        print "%-12s %10.3f %14.2f" % (name, elapsed,
+                                       elapsed * 1e6 / (options.refreshes * len(stat_dict) * len(HUD_STATS)))
+    db.disconnect()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+"""Compares the hands/sec of the PokerStars converter reading a hand with a
+   finditer() per read method and with HandHistoryConverter.tokenizeHand(),
+   over the PokerStars regression test files. Also checks that both read the
+   same hands. Uses the site ids of the database in HUD_config.test.xml."""
+
+import os
+import sys
+from time import time
+from optparse import OptionParser
+
+import Configuration
+import Database
+import PokerStarsToFpdb
+
+STARS_DIRS = ("regression-test-files/cash/Stars/", "regression-test-files/tour/Stars/")
+
+def handTexts(config, dirs):
+    """Returns [(converter, handtext), ...] of the hands in the .txt files under dirs"""
+    texts = []
+    for dir in dirs:
+        for (root, dirnames, files) in os.walk(dir):
+            for file in sorted(files):
+                if not file.endswith('.txt'):
+                    continue
+                hhc = PokerStarsToFpdb.PokerStars(config, in_path = os.path.join(root, file), autostart = False)
+                for handText in hhc.allHandsAsGenerator():
+                    if not hhc.isSummary(handText):
+                        texts.append((hhc, handText))
+    return texts
+
+def readHands(texts, tokenize):
+    """Returns the hands read from texts, None for the hands that failed"""
+    PokerStarsToFpdb.PokerStars.tokenizeLines = tokenize
+    hands = []
+    for (hhc, handText) in texts:
+        try:
+            hands.append(hhc.processHand(handText))
+        except Exception:
+            hands.append(None)
+    return hands
+
+def handState(hand):
+    if hand is None:
+        return None
+    state = dict((k, v) for (k, v) in hand.__dict__.items() if k not in ('config', 'pot', 'stats'))
+    state['pot'] = hand.pot.__dict__
+    return state
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = OptionParser()
+    parser.add_option("-r", "--repeats", dest="repeats", type="int", default=5,
+                      help="number of times the hands are read each way")
+    (options, argv) = parser.parse_args(args = argv)
+    dirs = argv or STARS_DIRS
+
+    config = Configuration.Config(file = "HUD_config.test.xml")
+    db = Database.Database(config)  # sets the site ids
+    texts = handTexts(config, dirs)
+    tokenize = PokerStarsToFpdb.PokerStars.tokenizeLines
+
+    before = [handState(hand) for hand in readHands(texts, False)]
+    after = [handState(hand) for hand in readHands(texts, True)]
+    differ = [i for i in xrange(len(texts)) if before[i] != after[i]]
+    for i in differ:
+        print "differs:", texts[i][0].in_path, texts[i][1][:60]
+
+    print "%d hands, %d read differently" % (len(texts), len(differ))
+    # the two are timed in turn and the best time of each is kept, a busy machine hurts both
+    modes = (("finditer", False), ("tokenizer", True))
+    best = {}
+    for i in xrange(options.repeats):
+        for (name, mode) in modes:
+            start = time()
+            readHands(texts, mode)
+            elapsed = time() - start
+            best[name] = min(best.get(name, elapsed), elapsed)
+    print "%-12s %10s %12s" % ("read", "best (s)", "hands/sec")
+    for (name, mode) in modes:
+        print "%-12s %10.3f %12.1f" % (name, best[name], len(texts) / best[name])
+    PokerStarsToFpdb.PokerStars.tokenizeLines = tokenize
+    db.disconnect()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -711,14 +711,15 @@ class RawHands:
             if save in ("none", "error", "all"):
                 self.save=save
             else:
-                print (_("Invalid config value for %s, defaulting to %s") % (raw_hands.save, "\"error\""))
+                print (_("Invalid config value for %s, defaulting to %s") % ("raw_hands.save", "\"error\""))
                 self.save="error"
             
+            # zlib (gzip) and zstd blocks are compressed against a dictionary per site, see RawHandArchive
             compression=node.getAttribute("compression")
-            if save in ("none", "gzip", "bzip2"):
+            if compression in ("none", "gzip", "zlib", "bzip2", "zstd"):
                 self.compression=compression
             else:
-                print (_("Invalid config value for %s, defaulting to %s") % (raw_hands.compression, "\"none\""))
+                print (_("Invalid config value for %s, defaulting to %s") % ("raw_hands.compression", "\"none\""))
                 self.compression="none"
     #end def __init__
 
@@ -737,14 +738,14 @@ class RawTourneys:
             if save in ("none", "error", "all"):
                 self.save=save
             else:
-                print (_("Invalid config value for %s, defaulting to %s") % (raw_tourneys.save, "\"error\""))
+                print (_("Invalid config value for %s, defaulting to %s") % ("raw_tourneys.save", "\"error\""))
                 self.save="error"
             
             compression=node.getAttribute("compression")
-            if save in ("none", "gzip", "bzip2"):
+            if compression in ("none", "gzip", "bzip2"):
                 self.compression=compression
             else:
-                print (_("Invalid config value for %s, defaulting to %s") % (raw_tourneys.compression, "\"none\""))
+                print (_("Invalid config value for %s, defaulting to %s") % ("raw_tourneys.compression", "\"none\""))
                 self.compression="none"
     #end def __init__
 
@@ -774,6 +775,7 @@ class Config:
             self.dir_log = os.path.join(CONFIG_PATH, u'log')
         self.log_file = os.path.join(self.dir_log, u'fpdb-log.txt')
         self.dir_database = os.path.join(CONFIG_PATH, u'database')
+        self.dir_cards = os.path.join(CONFIG_PATH, u'cards')     # card atlases of Deck
         log = logging.getLogger("config")
 
 #    "file" is a path to an xml file with the fpdb/HUD configuration
@@ -50,6 +50,7 @@ import logging
 #    FreePokerTools modules
 import SQL
 import Card
+import HandRecords
 import Charset
 from Exceptions import *
 import Configuration
@@ -75,7 +76,7 @@ except ImportError:
     use_numpy = False
 
 
-DB_VERSION = 171
+DB_VERSION = 174
 
 
 # Variance created as sqlite has a bunch of undefined aggregate functions.
@@ -95,6 +96,25 @@ class sqlitemath:
         return a%b
 
 
+def siteHandNoKey(siteHandNo):
+    """siteHandNos are numeric in the db but strings in parsed hands, compare them as numbers"""
+    try:
+        return long(siteHandNo)
+    except (TypeError, ValueError):
+        return siteHandNo
+
+def clusterIntervals(intervals, threshold):
+    """Groups intervals, a list of (start, end, item), into clusters of intervals that
+       are no more than threshold apart. Returns [(start, end, [items])] by start"""
+    clusters = []
+    for (start, end, item) in sorted(intervals, key = lambda i: i[:2]):
+        if clusters and start <= clusters[-1][1] + threshold:
+            clusters[-1][1] = max(clusters[-1][1], end)
+            clusters[-1][2].append(item)
+        else:
+            clusters.append([start, end, [item]])
+    return clusters
+
 class Database:
 
     MYSQL_INNODB = 2
@@ -157,6 +177,7 @@ class Database:
                 , {'tab':'Backings',        'col':'tourneysPlayersId', 'drop':0}
                 , {'tab':'Backings',        'col':'playerId',          'drop':0}
                 , {'tab':'RawHands',        'col':'id',                'drop':0}
+                , {'tab':'RawHands',        'col':'handId',            'drop':0}
                 , {'tab':'RawTourneys',     'col':'id',                'drop':0}
                 ]
               , [ # indexes for sqlite (list index 4)
@@ -189,6 +210,7 @@ class Database:
                 , {'tab':'Backings',        'col':'tourneysPlayersId', 'drop':0}
                 , {'tab':'Backings',        'col':'playerId',          'drop':0}
                 , {'tab':'RawHands',        'col':'id',                'drop':0}
+                , {'tab':'RawHands',        'col':'handId',            'drop':0}
                 , {'tab':'RawTourneys',     'col':'id',                'drop':0}
                 ]
               ]
@@ -326,6 +348,7 @@ class Database:
             self.sql = SQL.Sql(db_server = self.db_server)
         else:
             self.sql = sql
+        self.queries = {}            # queries rendered for this backend, see query()
 
         if autoconnect:
             # connect to db
@@ -370,6 +393,17 @@ class Database:
                 self.connection.rollback()  # make sure any locks taken so far are released
     #end def __init__
 
+    def query(self, name):
+        """Returns sql.query[name] with the placeholder of the backend. Queries are
+           rendered the first time they are used and kept, so the import doesn't
+           redo the string work for every hand. The same text every time also lets
+           the driver reuse its prepared statement (sqlite3 caches them by text)."""
+        try:
+            return self.queries[name]
+        except KeyError:
+            q = self.queries[name] = self.sql.query[name].replace('%s', self.sql.query['placeholder'])
+            return q
+
     def dumpDatabase(self):
         result="fpdb database dump\nDB version=" + str(DB_VERSION)+"\n\n"
 
@@ -437,6 +471,7 @@ class Database:
         self.connection = None
         self.cursor     = None
         self.hand_inc   = 1
+        self.merge_caches = True     # see mergeCacheBulk()
 
         if backend == Database.MYSQL_INNODB:
             import MySQLdb
@@ -535,6 +570,9 @@ class Database:
                 self.cursor.execute('PRAGMA temp_store=2')  # use memory for temp tables/indexes
                 self.cursor.execute('PRAGMA journal_mode=WAL')  # use memory for temp tables/indexes
                 self.cursor.execute('PRAGMA synchronous=0') # don't wait for file writes to finish
+                self.cursor.execute('SELECT sqlite_version()')
+                version = tuple(int(v) for v in self.cursor.fetchone()[0].split('.')[:2])
+                self.merge_caches = version >= (3, 33)     # UPDATE ... FROM
             else:
                 raise FpdbError("sqlite database "+database+" does not exist")
         else:
@@ -683,14 +721,28 @@ class Database:
         # returns a gameinfo (gametype) dictionary suitable for passing
         #  to Hand.hand_factory
         c = self.connection.cursor()
-        q = self.sql.query['get_gameinfo_from_hid']
-        q = q.replace('%s', self.sql.query['placeholder'])
+        q = self.query('get_gameinfo_from_hid')
         c.execute (q, (hand_id, ))
         row = c.fetchone()
         gameinfo = {'sitename':row[0],'category':row[1],'base':row[2],'type':row[3],'limitType':row[4],
                 'hilo':row[5],'sb':row[6],'bb':row[7], 'sbet':row[8],'bbet':row[9], 'currency':row[10]}
         return gameinfo
-        
+
+    def get_gameinfo_from_hids(self, hand_ids):
+        # returns the get_gameinfo_from_hid() dictionaries of a list of hands,
+        #  by hand id. Hands not in the database are left out
+        if not hand_ids:
+            return {}
+        c = self.connection.cursor()
+        q = self.sql.query['get_gameinfo_from_hids']
+        q = q.replace('<hand_ids>', '(' + ','.join([str(int(hid)) for hid in hand_ids]) + ')')
+        c.execute(q)
+        gameinfos = {}
+        for row in c.fetchall():
+            gameinfos[row[0]] = {'sitename':row[1],'category':row[2],'base':row[3],'type':row[4],'limitType':row[5],
+                    'hilo':row[6],'sb':row[7],'bb':row[8], 'sbet':row[9],'bbet':row[10], 'currency':row[11]}
+        return gameinfos
+
 #   Query 'get_hand_info' does not exist, so it seems
 #    def get_hand_info(self, new_hand_id):
 #        c = self.connection.cursor()
@@ -717,12 +769,10 @@ class Database:
 
     def getSiteTourneyNos(self, site):
         c = self.connection.cursor()
-        q = self.sql.query['getSiteId']
-        q = q.replace('%s', self.sql.query['placeholder'])
+        q = self.query('getSiteId')
         c.execute(q, (site,))
         siteid = c.fetchone()[0]
-        q = self.sql.query['getSiteTourneyNos']
-        q = q.replace('%s', self.sql.query['placeholder'])
+        q = self.query('getSiteTourneyNos')
         c.execute(q, (siteid,))
         alist = []
         for row in c.fetchall():
@@ -803,7 +853,19 @@ class Database:
         now = datetime.utcnow() - d
         self.h_date_ndays_ago = "d%02d%02d%02d" % (now.year - 2000, now.month, now.day)
 
+    def get_seats_range(self, seats_style, seats_cust_nums, num_seats):
+        """Returns (min, max) of the activeSeats the HUD aggregates over for a table with num_seats"""
+        if seats_style == 'A':
+            return (0, 10)
+        elif seats_style == 'C':
+            return (seats_cust_nums[num_seats][0], seats_cust_nums[num_seats][1])
+        elif seats_style == 'E':
+            return (num_seats, num_seats)
+        print "bad seats_style value:", seats_style
+        return (0, 10)
+
     # is get_stats_from_hand slow?
+    # HUD_main uses HudStatCache, which only calls it to seed its cache
     def get_stats_from_hand( self, hand, type   # type is "ring" or "tour"
                            , hud_params = {'hud_style':'A', 'agg_bb_mult':1000
                                           ,'seats_style':'A', 'seats_cust_nums':['n/a', 'n/a', (2,2), (3,4), (3,5), (4,6), (5,7), (6,8), (7,9), (8,10), (8,10)]
@@ -824,25 +886,8 @@ class Database:
 
         stat_dict = {}
 
-        if seats_style == 'A':
-            seats_min, seats_max = 0, 10
-        elif seats_style == 'C':
-            seats_min, seats_max = seats_cust_nums[num_seats][0], seats_cust_nums[num_seats][1]
-        elif seats_style == 'E':
-            seats_min, seats_max = num_seats, num_seats
-        else:
-            seats_min, seats_max = 0, 10
-            print "bad seats_style value:", seats_style
-
-        if h_seats_style == 'A':
-            h_seats_min, h_seats_max = 0, 10
-        elif h_seats_style == 'C':
-            h_seats_min, h_seats_max = h_seats_cust_nums[num_seats][0], h_seats_cust_nums[num_seats][1]
-        elif h_seats_style == 'E':
-            h_seats_min, h_seats_max = num_seats, num_seats
-        else:
-            h_seats_min, h_seats_max = 0, 10
-            print "bad h_seats_style value:", h_seats_style
+        seats_min, seats_max = self.get_seats_range(seats_style, seats_cust_nums, num_seats)
+        h_seats_min, h_seats_max = self.get_seats_range(h_seats_style, h_seats_cust_nums, num_seats)
         log.info("opp seats style %s %d %d hero seats style %s %d %d"
                  % (seats_style, seats_min, seats_max
                    ,h_seats_style, h_seats_min, h_seats_max) )
@@ -891,8 +936,11 @@ class Database:
 
         # Now get the stats
         c.execute(self.sql.query[query], subs)
+        rows = c.fetchall()
+        if not rows:    # sqlite leaves description as None for an empty result
+            return stat_dict
         colnames = [desc[0] for desc in c.description]
-        for row in c.fetchall():
+        for row in rows:
             playerid = row[0]
             if (playerid == hero_id and h_hud_style != 'S') or (playerid != hero_id and hud_style != 'S'):
                 t_dict = {}
@@ -1250,6 +1298,7 @@ class Database:
         c.execute(self.sql.query['createSitesTable'])
         c.execute(self.sql.query['createGametypesTable'])
         c.execute(self.sql.query['createFilesTable'])
+        c.execute(self.sql.query['createIdentifyCacheTable'])
         c.execute(self.sql.query['createPlayersTable'])
         c.execute(self.sql.query['createAutoratesTable'])
         c.execute(self.sql.query['createSessionsCacheTable'])
@@ -1267,6 +1316,8 @@ class Database:
         c.execute(self.sql.query['createBoardsTable'])
         c.execute(self.sql.query['createBackingsTable'])
         c.execute(self.sql.query['createRawHands'])
+        c.execute(self.sql.query['createRawHandBlocks'])
+        c.execute(self.sql.query['createRawDictionaries'])
         c.execute(self.sql.query['createRawTourneys'])
 
         # Create unique indexes:
@@ -1549,14 +1600,12 @@ class Database:
                         when hp.position = '9' then 'E'
                         else 'E'
                    end                                            as hc_position""")
+            query = query.replace('<styleKey>', self.dayStyleKeySql())
             if self.backend == self.PGSQL:
-                query = query.replace('<styleKey>', "'d' || to_char(h.startTime, 'YYMMDD')")
                 query = query.replace('<styleKeyGroup>', ",to_char(h.startTime, 'YYMMDD')")
             elif self.backend == self.SQLITE:
-                query = query.replace('<styleKey>', "'d' || substr(strftime('%Y%m%d', h.startTime),3,7)")
                 query = query.replace('<styleKeyGroup>', ",substr(strftime('%Y%m%d', h.startTime),3,7)")
             elif self.backend == self.MYSQL_INNODB:
-                query = query.replace('<styleKey>', "date_format(h.startTime, 'd%y%m%d')")
                 query = query.replace('<styleKeyGroup>', ",date_format(h.startTime, 'd%y%m%d')")
         else:
             query = query.replace('<seat_num>', "'0' as seat_num")
@@ -1565,6 +1614,16 @@ class Database:
             query = query.replace('<styleKeyGroup>', ',styleKey')
         return query
 
+    def dayStyleKeySql(self):
+        """Returns the SQL expression of the styleKey of the day of h.startTime:
+           'd' and its yymmdd"""
+        if self.backend == self.PGSQL:
+            return "'d' || to_char(h.startTime, 'YYMMDD')"
+        elif self.backend == self.SQLITE:
+            return "'d' || substr(strftime('%Y%m%d', h.startTime),3,7)"
+        elif self.backend == self.MYSQL_INNODB:
+            return "date_format(h.startTime, 'd%y%m%d')"
+
     def rebuild_hudcache(self, h_start=None, v_start=None, ttid = None):
         """clears hudcache and rebuilds from the individual handsplayers records"""
 
@@ -1635,8 +1694,9 @@ class Database:
             print err
     #end def rebuild_hudcache
     
-    def rebuild_sessionscache(self, tz_name = None):
-        """clears sessionscache and rebuilds from the individual records"""
+    def get_heroes(self):
+        """Returns the player ids of the program owner: the players in GamesCache and
+           the tourney players with sessions, or else the screen names of the config"""
         heroes, hero, = [], {}
         c = self.get_cursor()
         c.execute("SELECT playerId FROM GamesCache GROUP BY playerId")
@@ -1657,7 +1717,54 @@ class Database:
                     p_id = self.get_player_id(self.config, site, hero[site_id])
                     if p_id:
                         heroes.append(int(p_id))
-                                
+        return heroes
+
+    def rebuild_cardscache(self, heroes = None):
+        """clears CardsCache and PositionsCache and rebuilds them from the handsplayers
+           records of heroes (default get_heroes()), import keeps them up to date"""
+        if heroes is None:
+            heroes = self.get_heroes()
+        c = self.get_cursor()
+        c.execute(self.sql.query['clearCardsCache'])
+        c.execute(self.sql.query['clearPositionsCache'])
+        if heroes:
+            where = "hp.playerId in (%s)" % ','.join([str(int(h)) for h in heroes])
+            c.execute(self.rebuildCacheQuery('CardsCache', 'insert_cardscache',
+                      ('h.gametypeId', 'hp.playerId', 'h.seats', 'hp.position', 'hp.startCards', self.dayStyleKeySql()), where))
+            c.execute(self.rebuildCacheQuery('PositionsCache', 'insert_positionscache',
+                      ('h.gametypeId', 'hp.playerId', 'h.seats', 'hp.position', self.dayStyleKeySql()), where))
+        self.commit()
+    #end def rebuild_cardscache
+
+    def rebuildCacheQuery(self, table, insert, keys, where):
+        """Returns the INSERT ... SELECT adding up the handsplayers records matching where
+           into table, grouped by the expressions keys (the key columns of insert, in order)"""
+        cols = [col.strip() for col in re.search(r'\(([^)]*)\)', self.sql.query[insert]).group(1).split(',')]
+        sums = []
+        for col in cols[len(keys):]:
+            if col == 'HDs':
+                sums.append("count(1)")
+            elif col == 'totalProfitSq':
+                if self.backend == self.MYSQL_INNODB:
+                    sums.append("sum(hp.totalProfit*hp.totalProfit)")
+                else:
+                    sums.append("sum(CAST(hp.totalProfit as bigint)*hp.totalProfit)")
+            elif col.startswith('won') or self.backend == self.MYSQL_INNODB:
+                sums.append("sum(hp.%s)" % col)
+            else:
+                sums.append("sum(CAST(hp.%s as integer))" % col)
+        return ("""INSERT INTO %s (%s)
+                   SELECT %s, %s
+                   FROM HandsPlayers hp
+                   INNER JOIN Hands h ON (h.id = hp.handId)
+                   INNER JOIN Gametypes gt ON (gt.id = h.gametypeId)
+                   WHERE %s
+                   GROUP BY %s"""
+                % (table, ', '.join(cols), ', '.join(keys), ', '.join(sums), where, ', '.join(keys)))
+
+    def rebuild_sessionscache(self, tz_name = None):
+        """clears sessionscache and rebuilds from the individual records"""
+        heroes = self.get_heroes()
         rebuildSessionsCache    = self.sql.query['rebuildSessionsCache']
         if len(heroes) == 0:
             where         = '0'
@@ -1721,6 +1828,7 @@ class Database:
                     self.storeGamesCache(id, pids, startTime, gtid, game, pdata, tz_name, heroes, tmp == None)
                     self.updateTourneysPlayersSessions(pids, tid, startTime, pdata, heroes, tmp == None)
                     if tmp == None:
+                        rows = []
                         for i, id in self.sc.iteritems():
                             if i!='bk':
                                 sid =  id['id']
@@ -1728,9 +1836,9 @@ class Database:
                                     self.tbulk[hid[i]] = sid
                                     gid = None
                                 else: gid = self.gc[i]['id']
-                                q = self.sql.query['update_RSC_H']
-                                q = q.replace('%s', self.sql.query['placeholder'])
-                                c.execute(q, (sid, gid, i))
+                                rows.append((sid, gid, i))
+                        q = self.query('update_RSC_H')
+                        c.executemany(q, rows)
                         self.updateTourneysSessions()
                         self.commit()
                         break
@@ -1847,12 +1955,16 @@ class Database:
             print _("Error during lock_for_insert:"), str(sys.exc_value)
     #end def lock_for_insert
     
+    # The store* functions below queue the rows of a batch of hands and write them
+    # when doinsert is True, none of them commits: the importer commits once per
+    # batch (fpdb_import.Importer.storeHands), so a batch is stored completely or not at all.
     def resetBulkCache(self, reset=True):
-        self.siteHandNos = []         # cache of siteHandNo
+        self.siteHandNos = set()      # cache of (gametypeId, siteHandNo) in the db or this import
+        self.siteHandNoRanges = {}    # siteHandNo ranges per gametypeId preloaded into siteHandNos
         self.hbulk       = []         # Hands bulk inserts
         self.bbulk       = []         # Boards bulk inserts
-        self.hpbulk      = []         # HandsPlayers bulk inserts
-        self.habulk      = []         # HandsActions bulk inserts
+        self.hpbulk      = HandRecords.Batch() # HandsPlayers bulk inserts
+        self.habulk      = HandRecords.Batch() # HandsActions bulk inserts
         self.hcbulk      = {}         # HudCache bulk inserts
         if reset:
             self.dcbulk  = {}
@@ -1915,29 +2027,25 @@ class Database:
             self.appendSessionIds()
             self.updateTourneysSessions()
             self.hbulk = [tuple([x for x in h[:-1]]) for h in self.hbulk]
-            q = self.sql.query['store_hand']
-            q = q.replace('%s', self.sql.query['placeholder'])
+            q = self.query('store_hand')
             c = self.get_cursor()
             c.executemany(q, self.hbulk)
-            self.commit()
     
     def storeBoards(self, id, boards, doinsert):
         if boards: 
             for b in boards:
                 self.bbulk += [[id] + b]
         if doinsert and self.bbulk:
-            q = self.sql.query['store_boards']
-            q = q.replace('%s', self.sql.query['placeholder'])
+            q = self.query('store_boards')
             c = self.get_cursor()
             c.executemany(q, self.bbulk)
     
     def updateTourneysSessions(self):
         if self.tbulk:
-            q_update_sessions  = self.sql.query['updateTourneysSessions'].replace('%s', self.sql.query['placeholder'])
+            q_update_sessions  = self.query('updateTourneysSessions')
             c = self.get_cursor()
             for t, sid in self.tbulk.iteritems():
                 c.execute(q_update_sessions,  (sid, t))
-                self.commit()
     
     def updateTourneysPlayersSessions(self, pids, tid, startTime, pdata, heroes, doinsert):
         for p, id in pids.iteritems():
@@ -1958,20 +2066,16 @@ class Database:
                     self.tc[tid]['endTime']    = startTime
                 
         if doinsert:
-            q_select           = self.sql.query['selectTourneysPlayersStartEnd'].replace('%s', self.sql.query['placeholder'])
-            q_update_start_end = self.sql.query['updateTourneysPlayersStartEnd'].replace('%s', self.sql.query['placeholder'])
-            q_update_start     = self.sql.query['updateTourneysPlayersStart'].replace('%s', self.sql.query['placeholder'])
-            q_update_end       = self.sql.query['updateTourneysPlayersEnd'].replace('%s', self.sql.query['placeholder'])
-            q_update           = self.sql.query['updateTourneysPlayers'].replace('%s', self.sql.query['placeholder'])
+            q_select           = self.query('selectTourneysPlayersStartEnd')
+            q_update_start_end = self.query('updateTourneysPlayersStartEnd')
+            q_update_start     = self.query('updateTourneysPlayersStart')
+            q_update_end       = self.query('updateTourneysPlayersEnd')
+            q_update           = self.query('updateTourneysPlayers')
             c = self.get_cursor()
             for t, d in self.tc.iteritems():
-                if self.backend == self.SQLITE:
-                    d['startTime'] = datetime.strptime(d['startTime'], '%Y-%m-%d %H:%M:%S')
-                    d['endTime']   = datetime.strptime(d['endTime'], '%Y-%m-%d %H:%M:%S')
-                else:
-                    d['startTime'] = d['startTime'].replace(tzinfo=None)
-                    d['endTime']   = d['endTime'].replace(tzinfo=None)
-                c.execute(q_select, d['tpid'])
+                d['startTime'] = self.naiveTime(d['startTime'])
+                d['endTime']   = self.naiveTime(d['endTime'])
+                c.execute(q_select, (d['tpid'],))
                 start, end = c.fetchone()
                 update = not start or not end
                 if (update or (d['startTime']<start and d['endTime']>end)):
@@ -1982,7 +2086,6 @@ class Database:
                     c.execute(q_update_end,(d['endTime'], d['played'], d['hands'], d['tpid']))
                 else:
                     c.execute(q_update,(d['played'], d['hands'], d['tpid']))
-                self.commit()
 
     def storeHandsPlayers(self, hid, pids, pdata, doinsert = False, printdata = False):
         #print "DEBUG: %s %s %s" %(hid, pids, pdata)
@@ -1992,134 +2095,12 @@ class Database:
             pp.pprint(pdata)
 
         for p in pdata:
-            self.hpbulk.append( ( hid,
-                                  pids[p],
-                                  pdata[p]['startCash'],
-                                  pdata[p]['seatNo'],
-                                  pdata[p]['sitout'],
-                                  pdata[p]['card1'],
-                                  pdata[p]['card2'],
-                                  pdata[p]['card3'],
-                                  pdata[p]['card4'],
-                                  pdata[p]['card5'],
-                                  pdata[p]['card6'],
-                                  pdata[p]['card7'],
-                                  pdata[p]['card8'],
-                                  pdata[p]['card9'],
-                                  pdata[p]['card10'],
-                                  pdata[p]['card11'],
-                                  pdata[p]['card12'],
-                                  pdata[p]['card13'],
-                                  pdata[p]['card14'],
-                                  pdata[p]['card15'],
-                                  pdata[p]['card16'],
-                                  pdata[p]['card17'],
-                                  pdata[p]['card18'],
-                                  pdata[p]['card19'],
-                                  pdata[p]['card20'],
-                                  pdata[p]['winnings'],
-                                  pdata[p]['rake'],
-                                  pdata[p]['totalProfit'],
-                                  pdata[p]['allInEV'],
-                                  pdata[p]['street0VPI'],
-                                  pdata[p]['street1Seen'],
-                                  pdata[p]['street2Seen'],
-                                  pdata[p]['street3Seen'],
-                                  pdata[p]['street4Seen'],
-                                  pdata[p]['sawShowdown'],
-                                  pdata[p]['showed'],
-                                  pdata[p]['wonAtSD'],
-                                  pdata[p]['street0Aggr'],
-                                  pdata[p]['street1Aggr'],
-                                  pdata[p]['street2Aggr'],
-                                  pdata[p]['street3Aggr'],
-                                  pdata[p]['street4Aggr'],
-                                  pdata[p]['street1CBChance'],
-                                  pdata[p]['street2CBChance'],
-                                  pdata[p]['street3CBChance'],
-                                  pdata[p]['street4CBChance'],
-                                  pdata[p]['street1CBDone'],
-                                  pdata[p]['street2CBDone'],
-                                  pdata[p]['street3CBDone'],
-                                  pdata[p]['street4CBDone'],
-                                  pdata[p]['wonWhenSeenStreet1'],
-                                  pdata[p]['wonWhenSeenStreet2'],
-                                  pdata[p]['wonWhenSeenStreet3'],
-                                  pdata[p]['wonWhenSeenStreet4'],
-                                  pdata[p]['street0Calls'],
-                                  pdata[p]['street1Calls'],
-                                  pdata[p]['street2Calls'],
-                                  pdata[p]['street3Calls'],
-                                  pdata[p]['street4Calls'],
-                                  pdata[p]['street0Bets'],
-                                  pdata[p]['street1Bets'],
-                                  pdata[p]['street2Bets'],
-                                  pdata[p]['street3Bets'],
-                                  pdata[p]['street4Bets'],
-                                  pdata[p]['position'],
-                                  pdata[p]['tourneysPlayersIds'],
-                                  pdata[p]['startCards'],
-                                  pdata[p]['street0CalledRaiseChance'],
-                                  pdata[p]['street0CalledRaiseDone'],
-                                  pdata[p]['street0_3BChance'],
-                                  pdata[p]['street0_3BDone'],
-                                  pdata[p]['street0_4BChance'],
-                                  pdata[p]['street0_4BDone'],
-                                  pdata[p]['street0_C4BChance'],
-                                  pdata[p]['street0_C4BDone'],
-                                  pdata[p]['street0_FoldTo3BChance'],
-                                  pdata[p]['street0_FoldTo3BDone'],
-                                  pdata[p]['street0_FoldTo4BChance'],
-                                  pdata[p]['street0_FoldTo4BDone'],
-                                  pdata[p]['street0_SqueezeChance'],
-                                  pdata[p]['street0_SqueezeDone'],
-                                  pdata[p]['raiseToStealChance'],
-                                  pdata[p]['raiseToStealDone'],
-                                  pdata[p]['success_Steal'],
-                                  pdata[p]['otherRaisedStreet0'],
-                                  pdata[p]['otherRaisedStreet1'],
-                                  pdata[p]['otherRaisedStreet2'],
-                                  pdata[p]['otherRaisedStreet3'],
-                                  pdata[p]['otherRaisedStreet4'],
-                                  pdata[p]['foldToOtherRaisedStreet0'],
-                                  pdata[p]['foldToOtherRaisedStreet1'],
-                                  pdata[p]['foldToOtherRaisedStreet2'],
-                                  pdata[p]['foldToOtherRaisedStreet3'],
-                                  pdata[p]['foldToOtherRaisedStreet4'],
-                                  pdata[p]['raiseFirstInChance'],
-                                  pdata[p]['raisedFirstIn'],
-                                  pdata[p]['foldBbToStealChance'],
-                                  pdata[p]['foldedBbToSteal'],
-                                  pdata[p]['foldSbToStealChance'],
-                                  pdata[p]['foldedSbToSteal'],
-                                  pdata[p]['foldToStreet1CBChance'],
-                                  pdata[p]['foldToStreet1CBDone'],
-                                  pdata[p]['foldToStreet2CBChance'],
-                                  pdata[p]['foldToStreet2CBDone'],
-                                  pdata[p]['foldToStreet3CBChance'],
-                                  pdata[p]['foldToStreet3CBDone'],
-                                  pdata[p]['foldToStreet4CBChance'],
-                                  pdata[p]['foldToStreet4CBDone'],
-                                  pdata[p]['street1CheckCallRaiseChance'],
-                                  pdata[p]['street1CheckCallRaiseDone'],
-                                  pdata[p]['street2CheckCallRaiseChance'],
-                                  pdata[p]['street2CheckCallRaiseDone'],
-                                  pdata[p]['street3CheckCallRaiseChance'],
-                                  pdata[p]['street3CheckCallRaiseDone'],
-                                  pdata[p]['street4CheckCallRaiseChance'],
-                                  pdata[p]['street4CheckCallRaiseDone'],
-                                  pdata[p]['street0Raises'],
-                                  pdata[p]['street1Raises'],
-                                  pdata[p]['street2Raises'],
-                                  pdata[p]['street3Raises'],
-                                  pdata[p]['street4Raises']
-                            ) )
+            self.hpbulk.append(hid, pids[p], pdata[p])
 
         if doinsert:
-            q = self.sql.query['store_hands_players']
-            q = q.replace('%s', self.sql.query['placeholder'])
+            q = self.query('store_hands_players')
             c = self.get_cursor()
-            c.executemany(q, self.hpbulk)
+            c.executemany(q, self.hpbulk.rows())
 
     def storeHandsActions(self, hid, pids, adata, doinsert = False, printdata = False):
         #print "DEBUG: %s %s %s" %(hid, pids, adata)
@@ -2131,141 +2112,48 @@ class Database:
         #    pp.pprint(adata)
         
         for a in adata:
-            self.habulk.append( (hid,
-                                 pids[adata[a]['player']],
-                                 adata[a]['street'],
-                                 adata[a]['actionNo'],
-                                 adata[a]['streetActionNo'],
-                                 adata[a]['actionId'],
-                                 adata[a]['amount'],
-                                 adata[a]['raiseTo'],
-                                 adata[a]['amountCalled'],
-                                 adata[a]['numDiscarded'],
-                                 adata[a]['cardsDiscarded'],
-                                 adata[a]['allIn']
-                               ) )
+            self.habulk.append(hid, pids[adata[a]['player']], adata[a])
             
         if doinsert:
-            q = self.sql.query['store_hands_actions']
-            q = q.replace('%s', self.sql.query['placeholder'])
+            q = self.query('store_hands_actions')
             c = self.get_cursor()
-            c.executemany(q, self.habulk)
+            c.executemany(q, self.habulk.rows())
     
     def storeHandsStove(self, sdata, doinsert):
         #print sdata
         self.hsbulk += sdata
         if doinsert and self.hsbulk:
-            q = self.sql.query['store_hands_stove']
-            q = q.replace('%s', self.sql.query['placeholder'])
+            q = self.query('store_hands_stove')
             c = self.get_cursor()
             c.executemany(q, self.hsbulk)
             
     def appendStats(self, pdata, p):
-        #NOTE: Insert new stats at right place because SQL needs strict order
-        line = []
-        line.append(1)  # HDs
-        line.append(pdata[p]['street0VPI'])
-        line.append(pdata[p]['street0Aggr'])  
-        line.append(pdata[p]['street0CalledRaiseChance'])
-        line.append(pdata[p]['street0CalledRaiseDone'])
-        line.append(pdata[p]['street0_3BChance'])            
-        line.append(pdata[p]['street0_3BDone'])              
-        line.append(pdata[p]['street0_4BChance'])            
-        line.append(pdata[p]['street0_4BDone'])              
-        line.append(pdata[p]['street0_C4BChance'])              
-        line.append(pdata[p]['street0_C4BDone'])              
-        line.append(pdata[p]['street0_FoldTo3BChance'])      
-        line.append(pdata[p]['street0_FoldTo3BDone'])        
-        line.append(pdata[p]['street0_FoldTo4BChance'])      
-        line.append(pdata[p]['street0_FoldTo4BDone'])        
-        line.append(pdata[p]['street0_SqueezeChance'])        
-        line.append(pdata[p]['street0_SqueezeDone'])        
-        line.append(pdata[p]['raiseToStealChance'])        
-        line.append(pdata[p]['raiseToStealDone'])        
-        line.append(pdata[p]['success_Steal'])        
-        line.append(pdata[p]['street1Seen'])                 
-        line.append(pdata[p]['street2Seen'])                 
-        line.append(pdata[p]['street3Seen'])                 
-        line.append(pdata[p]['street4Seen'])                 
-        line.append(pdata[p]['sawShowdown'])                 
-        line.append(pdata[p]['street1Aggr'])                 
-        line.append(pdata[p]['street2Aggr'])                 
-        line.append(pdata[p]['street3Aggr'])                 
-        line.append(pdata[p]['street4Aggr'])                 
-        line.append(pdata[p]['otherRaisedStreet0'])          
-        line.append(pdata[p]['otherRaisedStreet1'])          
-        line.append(pdata[p]['otherRaisedStreet2'])          
-        line.append(pdata[p]['otherRaisedStreet3'])          
-        line.append(pdata[p]['otherRaisedStreet4'])          
-        line.append(pdata[p]['foldToOtherRaisedStreet0'])    
-        line.append(pdata[p]['foldToOtherRaisedStreet1'])    
-        line.append(pdata[p]['foldToOtherRaisedStreet2'])    
-        line.append(pdata[p]['foldToOtherRaisedStreet3'])    
-        line.append(pdata[p]['foldToOtherRaisedStreet4'])    
-        line.append(pdata[p]['wonWhenSeenStreet1'])
-        line.append(pdata[p]['wonWhenSeenStreet2'])
-        line.append(pdata[p]['wonWhenSeenStreet3'])
-        line.append(pdata[p]['wonWhenSeenStreet4'])
-        line.append(pdata[p]['wonAtSD'])
-        line.append(pdata[p]['raiseFirstInChance'])          
-        line.append(pdata[p]['raisedFirstIn'])               
-        line.append(pdata[p]['foldBbToStealChance'])         
-        line.append(pdata[p]['foldedBbToSteal'])             
-        line.append(pdata[p]['foldSbToStealChance'])         
-        line.append(pdata[p]['foldedSbToSteal'])             
-        line.append(pdata[p]['street1CBChance'])             
-        line.append(pdata[p]['street1CBDone'])               
-        line.append(pdata[p]['street2CBChance'])             
-        line.append(pdata[p]['street2CBDone'])               
-        line.append(pdata[p]['street3CBChance'])             
-        line.append(pdata[p]['street3CBDone'])               
-        line.append(pdata[p]['street4CBChance'])             
-        line.append(pdata[p]['street4CBDone'])               
-        line.append(pdata[p]['foldToStreet1CBChance'])       
-        line.append(pdata[p]['foldToStreet1CBDone'])         
-        line.append(pdata[p]['foldToStreet2CBChance'])       
-        line.append(pdata[p]['foldToStreet2CBDone'])         
-        line.append(pdata[p]['foldToStreet3CBChance'])       
-        line.append(pdata[p]['foldToStreet3CBDone'])         
-        line.append(pdata[p]['foldToStreet4CBChance'])       
-        line.append(pdata[p]['foldToStreet4CBDone'])         
-        line.append(pdata[p]['totalProfit'])
-        line.append(pdata[p]['rake'])
-        line.append(pdata[p]['street1CheckCallRaiseChance']) 
-        line.append(pdata[p]['street1CheckCallRaiseDone'])   
-        line.append(pdata[p]['street2CheckCallRaiseChance']) 
-        line.append(pdata[p]['street2CheckCallRaiseDone'])   
-        line.append(pdata[p]['street3CheckCallRaiseChance']) 
-        line.append(pdata[p]['street3CheckCallRaiseDone'])   
-        line.append(pdata[p]['street4CheckCallRaiseChance']) 
-        line.append(pdata[p]['street4CheckCallRaiseDone'])   
-        line.append(pdata[p]['street0Calls'])                
-        line.append(pdata[p]['street1Calls'])                
-        line.append(pdata[p]['street2Calls'])                
-        line.append(pdata[p]['street3Calls'])                
-        line.append(pdata[p]['street4Calls'])                
-        line.append(pdata[p]['street0Bets'])                 
-        line.append(pdata[p]['street1Bets'])                 
-        line.append(pdata[p]['street2Bets'])                 
-        line.append(pdata[p]['street3Bets'])                 
-        line.append(pdata[p]['street4Bets'])                 
-        line.append(pdata[p]['street0Raises'])               
-        line.append(pdata[p]['street1Raises'])               
-        line.append(pdata[p]['street2Raises'])               
-        line.append(pdata[p]['street3Raises'])               
-        line.append(pdata[p]['street4Raises'])               
+        #NOTE: Insert new stats at right place in HandRecords.HUD_STATS because SQL needs strict order
+        stats = pdata[p]
+        if isinstance(stats, HandRecords.Record):
+            line = stats.pick(HandRecords.HUD_STATS)
+        else:
+            line = [stats[stat] for stat in HandRecords.HUD_STATS]
+        line.insert(0, 1)  # HDs
         
         for i in range(len(line)):
             if line[i]==True:  line[i] = 1
             if line[i]==False: line[i] = 0
             
         return line
+
+    def addStats(self, bulk, k, line):
+        """Adds line, a list of stats from appendStats(), to the stats of key k in bulk"""
+        total = bulk.get(k)
+        if total is None:
+            bulk[k] = line
+        else:
+            for i in xrange(len(line)):
+                total[i] += line[i]
             
     def storeHudCache(self, gid, pids, starttime, pdata, doinsert=False):
-        update_hudcache = self.sql.query['update_hudcache']
-        update_hudcache = update_hudcache.replace('%s', self.sql.query['placeholder'])
-        insert_hudcache = self.sql.query['insert_hudcache']
-        insert_hudcache = insert_hudcache.replace('%s', self.sql.query['placeholder'])
+        update_hudcache = self.query('update_hudcache')
+        insert_hudcache = self.query('insert_hudcache')
             
         if pdata:   
             # hard-code styleKey as 'A000000' (all-time cache, no key) for now
@@ -2296,415 +2184,287 @@ class Database:
                   ,styleKey
                   )
             
-            if k in self.hcbulk:
-                self.hcbulk[k] = [sum(l) for l in zip(self.hcbulk[k], line)]
-            else:
-                self.hcbulk[k] = line
+            self.addStats(self.hcbulk, k, line)
                 
         if doinsert:
+            self.storeCacheBulk('HudCache', self.hcbulk, update_hudcache, insert_hudcache, nullable = ('tourneyTypeId',))
+            
+    def storeCacheBulk(self, table, bulk, update, insert, nullable = ()):
+        """Writes bulk, a dict of {key: stats} for HudCache, CardsCache or PositionsCache,
+           to table: stats are added to existing rows, missing rows are inserted."""
+        if not bulk:
+            return
+        c = self.get_cursor()
+        if self.merge_caches:
+            self.mergeCacheBulk(c, table, bulk, insert, nullable)
+        else:
             inserts = []
-            c = self.get_cursor()
-            for k, line in self.hcbulk.iteritems():
-                row = line + [k[0], k[1], k[2], k[3], k[4], k[5]]
-                num = c.execute(update_hudcache, row)
+            for k, line in bulk.iteritems():
+                num = c.execute(update, line + list(k))
                 # Try to do the update first. Do insert it did not work
                 if ((self.backend == self.PGSQL and c.statusmessage != "UPDATE 1")
                         or (self.backend == self.MYSQL_INNODB and num == 0)
                         or (self.backend == self.SQLITE and num.rowcount == 0)):
-                    inserts.append([k[0], k[1], k[2], k[3], k[4], k[5]] + line)
-                    #print "DEBUG: Successfully(?: %s) updated HudCacho using INSERT" % num
-                else:
-                    #print "DEBUG: Successfully updated HudCacho using UPDATE"
-                    pass
+                    inserts.append(list(k) + line)
             if inserts:
-                c.executemany(insert_hudcache, inserts)
-            self.commit()
-            
-    def storeCardsCache(self, gametype, pids, heroes, pdata, doinsert):
-        """Update cached statistics. If update fails because no record exists, do an insert."""
-        update_cardscache = self.sql.query['update_cardscache']
-        update_cardscache = update_cardscache.replace('%s', self.sql.query['placeholder'])
-        insert_cardscache = self.sql.query['insert_cardscache']
-        insert_cardscache = insert_cardscache.replace('%s', self.sql.query['placeholder'])
+                c.executemany(insert, inserts)
+
+    def mergeCacheBulk(self, c, table, bulk, insert, nullable = ()):
+        """Set based version of storeCacheBulk(): the rows are loaded into a temporary
+           copy of table, then one UPDATE adds them to the existing rows and one
+           INSERT ... SELECT adds the missing ones, whatever the number of keys.
+           Key columns in nullable (HudCache.tourneyTypeId) are compared NULL safe,
+           which is why this doesn't use the backends' upsert statements: the unique
+           indexes don't treat NULLs as equal."""
+        keys = len(bulk.iterkeys().next())
+        statements = self.queries.get((table, insert, keys, nullable))
+        if statements is None:
+            statements = self.queries[(table, insert, keys, nullable)] = self.mergeCacheQueries(table, insert, keys, nullable)
+        (drop, create, stage, update, merge) = statements
+        c.execute(drop)
+        c.execute(create)
+        c.executemany(stage, [list(k) + line for k, line in bulk.iteritems()])
+        c.execute(update)
+        c.execute(merge)
+
+    def mergeCacheQueries(self, table, insert, keys, nullable):
+        """Returns the statements of mergeCacheBulk() for table, rendered once per
+           Database: (drop stage, create stage, insert into stage, update table,
+           insert missing rows). keys is the number of key columns."""
+        # insert lists the key columns first, then the stats in appendStats() order
+        cols = [col.strip() for col in re.search(r'\(([^)]*)\)', insert).group(1).split(',')]
+        keycols = cols[:keys]
+        statcols = cols[len(keycols):]
+        stage = table + 'Stage'
+        if self.backend == self.MYSQL_INNODB:
+            drop = "DROP TEMPORARY TABLE IF EXISTS " + stage
+        else:
+            drop = "DROP TABLE IF EXISTS " + stage
+        create = "CREATE TEMPORARY TABLE %s AS SELECT %s FROM %s WHERE 1=0" % (stage, ', '.join(cols), table)
+        fill = "INSERT INTO %s (%s) VALUES (%s)" % (stage, ', '.join(cols), ', '.join([self.sql.query['placeholder']] * len(cols)))
+
+        match = []
+        for col in keycols:
+            if col in nullable:
+                match.append("(%(t)s.%(c)s = s.%(c)s OR (%(t)s.%(c)s IS NULL AND s.%(c)s IS NULL))" % {'t': table, 'c': col})
+            else:
+                match.append("%(t)s.%(c)s = s.%(c)s" % {'t': table, 'c': col})
+        match = ' AND '.join(match)
+        if self.backend == self.MYSQL_INNODB:
+            sets = ', '.join(["%(t)s.%(c)s = %(t)s.%(c)s + s.%(c)s" % {'t': table, 'c': col} for col in statcols])
+            update = "UPDATE %s, %s s SET %s WHERE %s" % (table, stage, sets, match)
+        else:
+            sets = ', '.join(["%(c)s = %(t)s.%(c)s + s.%(c)s" % {'t': table, 'c': col} for col in statcols])
+            update = "UPDATE %s SET %s FROM %s s WHERE %s" % (table, sets, stage, match)
+        merge = ("INSERT INTO %s (%s) SELECT %s FROM %s s WHERE NOT EXISTS (SELECT 1 FROM %s WHERE %s)"
+                % (table, ', '.join(cols), ', '.join(['s.' + col for col in cols]), stage, table, match))
+        return (drop, create, fill, update, merge)
+
+    def storeCardsCache(self, gid, pids, starttime, heroes, pdata, doinsert):
+        """Adds the stats of heroes to CardsCache, by gametype, seats, position,
+           hole cards and day. With doinsert the queued rows are written."""
+        update_cardscache = self.query('update_cardscache')
+        insert_cardscache = self.query('insert_cardscache')
+        styleKey = datetime.strftime(starttime, 'd%y%m%d')     # the UTC day, like dayStyleKeySql()
             
         for p in pdata:
             if pids[p] in heroes:
                 line = self.appendStats(pdata, p)
-                k =   (gametype['type']
-                      ,gametype['category']
-                      ,gametype['currency']
+                line.append(pdata[p]['totalProfit'] ** 2)      # totalProfitSq
+                k =   (gid
                       ,pids[p]
+                      ,len(pids)
+                      ,str(pdata[p]['position'])[0]
                       ,pdata[p]['startCards']
+                      ,styleKey
                       )
-                if k in self.dcbulk:
-                    self.dcbulk[k] = [sum(l) for l in zip(self.dcbulk[k], line)]
-                else:
-                    self.dcbulk[k] = line
-                #id = self.dccache[(k,line)]
+                self.addStats(self.dcbulk, k, line)
                 
         if doinsert:
-            inserts = []
-            c = self.get_cursor()
-            for k, line in self.dcbulk.iteritems():
-                row = line + [k[0], k[1], k[2], k[3], k[4]]
-                num = c.execute(update_cardscache, row)
-                # Try to do the update first. Do insert it did not work
-                if ((self.backend == self.PGSQL and c.statusmessage != "UPDATE 1")
-                        or (self.backend == self.MYSQL_INNODB and num == 0)
-                        or (self.backend == self.SQLITE and num.rowcount == 0)):
-                    inserts.append([k[0], k[1], k[2], k[3], k[4]] + line)
-                    #print "DEBUG: Successfully(?: %s) updated HudCacho using INSERT" % num
-                else:
-                    #print "DEBUG: Successfully updated HudCacho using UPDATE"
-                    pass
-            if inserts:
-                c.executemany(insert_cardscache, inserts)
-            self.commit()
-
-    def storePositionsCache(self, gametype, pids, heroes, pdata, doinsert):
-        """Update cached statistics. If update fails because no record exists, do an insert."""
-        update_positionscache = self.sql.query['update_positionscache']
-        update_positionscache = update_positionscache.replace('%s', self.sql.query['placeholder'])
-        insert_positionscache = self.sql.query['insert_positionscache']
-        insert_positionscache = insert_positionscache.replace('%s', self.sql.query['placeholder'])
+            self.storeCacheBulk('CardsCache', self.dcbulk, update_cardscache, insert_cardscache)
+
+    def storePositionsCache(self, gid, pids, starttime, heroes, pdata, doinsert):
+        """Adds the stats of heroes to PositionsCache, by gametype, seats, position
+           and day. With doinsert the queued rows are written."""
+        update_positionscache = self.query('update_positionscache')
+        insert_positionscache = self.query('insert_positionscache')
+        styleKey = datetime.strftime(starttime, 'd%y%m%d')     # the UTC day, like dayStyleKeySql()
             
         for p in pdata:
             if pids[p] in heroes:
                 line = self.appendStats(pdata, p)
-                k =   (gametype['type']
-                      ,gametype['base']
-                      ,gametype['category']
-                      ,gametype['currency']
-                      ,gametype['maxSeats']
+                line.append(pdata[p]['totalProfit'] ** 2)      # totalProfitSq
+                k =   (gid
                       ,pids[p]
                       ,len(pids)
                       ,str(pdata[p]['position'])[0]
+                      ,styleKey
                       )
-                #id = self.pccache[(k,line)]
-                if k in self.pcbulk:
-                    self.pcbulk[k] = [sum(l) for l in zip(self.pcbulk[k], line)]
-                else:
-                    self.pcbulk[k] = line
-                #id = self.dccache[(k,line)]
+                self.addStats(self.pcbulk, k, line)
                 
         if doinsert:
-            inserts = []
-            c = self.get_cursor()
-            for k, line in self.pcbulk.iteritems():
-                row = line + [k[0], k[1], k[2], k[3], k[4], k[5], k[6], k[7]]
-                num = c.execute(update_positionscache, row)
-                # Try to do the update first. Do insert it did not work
-                if ((self.backend == self.PGSQL and c.statusmessage != "UPDATE 1")
-                        or (self.backend == self.MYSQL_INNODB and num == 0)
-                        or (self.backend == self.SQLITE and num.rowcount == 0)):
-                    inserts.append([k[0], k[1], k[2], k[3], k[4], k[5], k[6], k[7]] + line)
-                    #print "DEBUG: Successfully(?: %s) updated HudCacho using INSERT" % num
-                else:
-                    #print "DEBUG: Successfully updated HudCacho using UPDATE"
-                    pass
-            if inserts:
-                c.executemany(insert_positionscache, inserts)
-            self.commit()
+            self.storeCacheBulk('PositionsCache', self.pcbulk, update_positionscache, insert_positionscache)
             
     def storeSessionsCache(self, hid, pids, startTime, heroes, doinsert = False):
-        """Update cached sessions. If no record exists, do an insert"""
-        THRESHOLD = timedelta(seconds=int(self.sessionTimeout * 60))
-        
-        select_SC     = self.sql.query['select_SC'].replace('%s', self.sql.query['placeholder'])
-        update_SC     = self.sql.query['update_SC'].replace('%s', self.sql.query['placeholder'])
-        insert_SC     = self.sql.query['insert_SC'].replace('%s', self.sql.query['placeholder'])
-        update_SC_GC  = self.sql.query['update_SC_GC'].replace('%s', self.sql.query['placeholder'])
-        update_SC_T   = self.sql.query['update_SC_T'].replace('%s', self.sql.query['placeholder'])
-        update_SC_H   = self.sql.query['update_SC_H'].replace('%s', self.sql.query['placeholder'])
-        delete_SC     = self.sql.query['delete_SC'].replace('%s', self.sql.query['placeholder'])
-        
-        #print "DEBUG: %s %s %s" %(hid, pids, pdata)
-        hand = {}
+        """Queues hand hid for SessionsCache if one of heroes played it. With doinsert
+           the queued hands are written, see flushSessionsCache()"""
         for p, id in pids.iteritems():
             if id in heroes:
-                if self.backend == self.SQLITE:
-                    hand['startTime'] = datetime.strptime(startTime, '%Y-%m-%d %H:%M:%S')
-                else:
-                    hand['startTime'] = startTime.replace(tzinfo=None)
-                hand['ids'] = []
-        
-        if hand:
-            id = []
-            lower = hand['startTime']-THRESHOLD
-            upper = hand['startTime']+THRESHOLD
-            for i in range(len(self.sc['bk'])):
-                if ((lower  <= self.sc['bk'][i]['sessionEnd'])
-                and (upper  >= self.sc['bk'][i]['sessionStart'])):
-                    if ((hand['startTime'] <= self.sc['bk'][i]['sessionEnd']) 
-                    and (hand['startTime'] >= self.sc['bk'][i]['sessionStart'])):
-                         id.append(i)
-                    elif hand['startTime'] < self.sc['bk'][i]['sessionStart']:
-                         self.sc['bk'][i]['sessionStart'] = hand['startTime']
-                         id.append(i)
-                    elif hand['startTime'] > self.sc['bk'][i]['sessionEnd']:
-                         self.sc['bk'][i]['sessionEnd'] = hand['startTime']
-                         id.append(i)
-            if len(id) == 1:
-                id = id[0]
-                self.sc['bk'][id]['ids'].append(hid)
-            elif len(id) == 2:
-                if  self.sc['bk'][id[0]]['sessionStart'] < self.sc['bk'][id[1]]['sessionStart']:
-                    self.sc['bk'][id[0]]['sessionEnd']   = self.sc['bk'][id[1]]['sessionEnd']
-                else:
-                    self.sc['bk'][id[0]]['sessionStart'] = self.sc['bk'][id[1]]['sessionStart']
-                sh = self.sc['bk'].pop(id[1])
-                id = id[0]
-                self.sc['bk'][id]['ids'].append(hid)
-                self.sc['bk'][id]['ids'] += sh['ids']
-            elif len(id) == 0:
-                hand['id'] = None
-                hand['sessionStart'] = hand['startTime']
-                hand['sessionEnd']   = hand['startTime']
-                id = len(self.sc['bk'])
-                hand['ids'].append(hid)
-                self.sc['bk'].append(hand)
-        
+                self.sc['bk'].append((self.naiveTime(startTime), hid))
+                break
         if doinsert:
-            c = self.get_cursor()
-            for i in range(len(self.sc['bk'])):
-                lower = self.sc['bk'][i]['sessionStart'] - THRESHOLD
-                upper = self.sc['bk'][i]['sessionEnd']   + THRESHOLD
-                c.execute(select_SC, (lower, upper))
-                r = self.fetchallDict(c)
-                num = len(r)
-                if (num == 1):
-                    start, end, update = r[0]['sessionStart'], r[0]['sessionEnd'], False
-                    if self.sc['bk'][i]['sessionStart'] < start:
-                        start, update = self.sc['bk'][i]['sessionStart'], True
-                    if self.sc['bk'][i]['sessionEnd'] > end:
-                        end, update = self.sc['bk'][i]['sessionEnd'], True
-                    if update: 
-                        c.execute(update_SC, [start, end, r[0]['id']])
-                    for h in  self.sc['bk'][i]['ids']:
-                        self.sc[h] = {'id': r[0]['id'], 'data': [start, end]}
-                elif (num > 1):
-                    start, end, merge = None, None, []
-                    for n in r: merge.append(n['id'])
-                    merge.sort()
-                    r.append(self.sc['bk'][i])
-                    for n in r:                      
-                        if start: 
-                            if  start > n['sessionStart']: 
-                                start = n['sessionStart']
-                        else:   start = n['sessionStart']
-                        if end: 
-                            if  end < n['sessionEnd']: 
-                                end = n['sessionEnd']
-                        else:   end = n['sessionEnd']
-                    row = [start, end]
-                    c.execute(insert_SC, row)
-                    sid = self.get_last_insert_id(c)
-                    for h in self.sc['bk'][i]['ids']: self.sc[h] = {'id': sid}
-                    for m in merge:
-                        for h, n in self.sc.iteritems():
-                            if h!='bk':
-                                if n['id'] == m:
-                                    self.sc[h] = {'id': sid}
-                        c.execute(update_SC_GC,(sid, m))
-                        c.execute(update_SC_T, (sid, m))
-                        c.execute(update_SC_H, (sid, m))
-                        c.execute(delete_SC, m)
-                elif (num == 0):
-                    start =  self.sc['bk'][i]['sessionStart']
-                    end   =  self.sc['bk'][i]['sessionEnd']
-                    row = [start, end]
-                    c.execute(insert_SC, row)
-                    sid = self.get_last_insert_id(c)
-                    for h in self.sc['bk'][i]['ids']: self.sc[h] = {'id': sid}
-            self.commit()
-    
+            self.flushSessionsCache()
+
+    def flushSessionsCache(self):
+        """Cuts the queued hands into sessions where they are more than sessionTimeout
+           apart and merges those with the cached sessions they come that close to,
+           fetched with one range query. A merge keeps the lowest session id. Sets
+           self.sc[hand id] = {'id': session id} for appendSessionIds()"""
+        if not self.sc['bk']:
+            return
+        THRESHOLD = timedelta(seconds=int(self.sessionTimeout * 60))
+        sessions = clusterIntervals([(t, t, hid) for (t, hid) in self.sc['bk']], THRESHOLD)
+
+        c = self.get_cursor()
+        c.execute(self.query('select_SC'),
+                  (sessions[0][0] - THRESHOLD, sessions[-1][1] + THRESHOLD))
+        cached = [(self.naiveTime(start), self.naiveTime(end), (id, start, end)) for (id, start, end) in c.fetchall()]
+
+        (inserts, updates, merges) = ([], [], [])
+        nextId = None
+        for (start, end, members) in clusterIntervals([(s, e, ('new', hids)) for (s, e, hids) in sessions] + cached, THRESHOLD):
+            hids = [hid for m in members if m[0] == 'new' for hid in m[1]]
+            if not hids:
+                continue
+            rows = sorted(m for m in members if m[0] != 'new')
+            if rows:
+                sid = rows[0][0]
+                if len(rows) > 1 or (start, end) != (self.naiveTime(rows[0][1]), self.naiveTime(rows[0][2])):
+                    updates.append((start, end, sid))
+                merges += [(sid, row[0]) for row in rows[1:]]
+            else:
+                if nextId is None:
+                    nextId = self.nextCacheId('SessionsCache')
+                sid, nextId = nextId, nextId + self.hand_inc
+                inserts.append((sid, start, end))
+            for hid in hids:
+                self.sc[hid] = {'id': sid}
+
+        if inserts:
+            c.executemany(self.query('insert_SC'), inserts)
+        if updates:
+            c.executemany(self.query('update_SC'), updates)
+        if merges:
+            for table in ('update_SC_GC', 'update_SC_T', 'update_SC_H'):
+                c.executemany(self.query(table), merges)
+            c.executemany(self.query('delete_SC'),
+                          [(m,) for (sid, m) in merges])
+        self.sc['bk'] = []
+
     def storeGamesCache(self, hid, pids, startTime, gtid, game, pdata, tz_name, heroes, doinsert = False):
-        """Update cached sessions. If no record exists, do an insert"""
+        """Queues the results of heroes in ring hand hid for GamesCache. With doinsert
+           the queued hands are written, see flushGamesCache()"""
         utc = pytz.utc
+        naive = self.naiveTime(startTime)
         if tz_name in pytz.common_timezones:
-            if self.backend == self.SQLITE:
-                naive = datetime.strptime(startTime, '%Y-%m-%d %H:%M:%S')
-            else:
-                naive = startTime.replace(tzinfo=None)
             utc_start = utc.localize(naive)
             tz = pytz.timezone(tz_name)
             loc_tz = utc_start.astimezone(tz).strftime('%z')
             local = naive + timedelta(hours=int(loc_tz[:-2]), minutes=int(loc_tz[0]+loc_tz[-2:]))
         else:
             if strftime('%Z') == 'UTC':
-                local = startTime
+                local = naive
                 loc_tz = '0'
             else:
                 tz_dt = datetime.today() - datetime.utcnow()
                 loc_tz = tz_dt.seconds/3600 - 24
-                local = startTime + timedelta(hours=int(loc_tz))
+                local = naive + timedelta(hours=int(loc_tz))
                 loc_tz = str(loc_tz)
         date = "d%02d%02d%02d" % (local.year - 2000, local.month, local.day)
-        THRESHOLD = timedelta(seconds=int(self.sessionTimeout * 60))
-        
-        select_GC   = self.sql.query['select_GC'].replace('%s', self.sql.query['placeholder'])
-        update_GC   = self.sql.query['update_GC'].replace('%s', self.sql.query['placeholder'])
-        insert_GC   = self.sql.query['insert_GC'].replace('%s', self.sql.query['placeholder'])
-        update_GC_H = self.sql.query['update_GC_H'].replace('%s', self.sql.query['placeholder'])
-        delete_GC   = self.sql.query['delete_GC'].replace('%s', self.sql.query['placeholder'])
 
-        hand = {}
         for p, pid in pids.iteritems():
             if pid in heroes and game['type']=='ring':
-                hand['playerId']      = pid
-                hand['gametypeId']    = None
-                hand['date']          = date
-                if self.backend == self.SQLITE:
-                    hand['startTime'] = datetime.strptime(startTime, '%Y-%m-%d %H:%M:%S')
-                else:
-                    hand['startTime'] = startTime.replace(tzinfo=None)
-                hand['hid']           = hid
-                hand['hands']         = 1
-                
-                hand['ids']           = []
-                hand['gametypeId'] = gtid
-                if pdata[p]['street0VPI'] or pdata[p]['street1Seen']:
-                    hand['played'] = 1
-                else:
-                    hand['played'] = 0
-                hand['totalProfit'] = pdata[p]['totalProfit']
-                hand['rake']        = pdata[p]['rake']
+                played = 1 if (pdata[p]['street0VPI'] or pdata[p]['street1Seen']) else 0
                 if pdata[p]['sawShowdown']:
-                    hand['showdownWinnings']    = pdata[p]['totalProfit']
-                    hand['nonShowdownWinnings'] = 0
+                    winnings = (pdata[p]['totalProfit'], 0)
                 else:
-                    hand['showdownWinnings'] = 0
-                    hand['nonShowdownWinnings'] = pdata[p]['totalProfit']
-                hand['allInEV'] = pdata[p]['allInEV']
-                
-        if hand:
-            id = []
-            lower = hand['startTime']-THRESHOLD
-            upper = hand['startTime']+THRESHOLD
-            for i in range(len(self.gc['bk'])):
-                if ((hand['gametypeId'] == self.gc['bk'][i]['gametypeId'])
-                and (hand['playerId']   == self.gc['bk'][i]['playerId'])
-                and (lower <= self.gc['bk'][i]['gameEnd'])
-                and (upper >= self.gc['bk'][i]['gameStart'])):
-                    if len(id)==0:
-                        self.gc['bk'][i]['played']              += hand['played']
-                        self.gc['bk'][i]['hands']               += hand['hands']
-                        self.gc['bk'][i]['totalProfit']         += hand['totalProfit']
-                        self.gc['bk'][i]['rake']                += hand['rake']
-                        self.gc['bk'][i]['showdownWinnings']    += hand['showdownWinnings']
-                        self.gc['bk'][i]['nonShowdownWinnings'] += hand['nonShowdownWinnings']
-                        self.gc['bk'][i]['allInEV']             += hand['allInEV']
-                    if ((hand['startTime'] <= self.gc['bk'][i]['gameEnd']) 
-                    and (hand['startTime'] >= self.gc['bk'][i]['gameStart'])):
-                        id.append(i)
-                    elif hand['startTime']  <  self.gc['bk'][i]['gameStart']:
-                        self.gc['bk'][i]['gameStart']      = hand['startTime']
-                        id.append(i)
-                    elif hand['startTime']  >  self.gc['bk'][i]['gameEnd']:
-                        self.gc['bk'][i]['gameEnd']        = hand['startTime']
-                        id.append(i)
-            if len(id) == 1:
-                self.gc['bk'][id[0]]['ids'].append(hid)
-            elif len(id) == 2:
-                if    self.gc['bk'][id[0]]['gameStart'] < self.gc['bk'][id[1]]['gameStart']:
-                      self.gc['bk'][id[0]]['gameEnd']   = self.gc['bk'][id[1]]['gameEnd']
-                else: self.gc['bk'][id[0]]['gameStart'] = self.gc['bk'][id[1]]['gameStart']
-                self.gc['bk'][id[0]]['played']              += self.gc['bk'][id[1]]['played']
-                self.gc['bk'][id[0]]['hands']               += self.gc['bk'][id[1]]['hands']
-                self.gc['bk'][id[0]]['totalProfit']         += self.gc['bk'][id[1]]['totalProfit']
-                self.gc['bk'][id[0]]['rake']                += self.gc['bk'][id[1]]['rake']
-                self.gc['bk'][id[0]]['showdownWinnings']    += self.gc['bk'][id[1]]['showdownWinnings']
-                self.gc['bk'][id[0]]['nonShowdownWinnings'] += self.gc['bk'][id[1]]['nonShowdownWinnings']
-                self.gc['bk'][id[0]]['allInEV']             += self.gc['bk'][id[1]]['allInEV']
-                gh = self.gc['bk'].pop(id[1])
-                self.gc['bk'][id[0]]['ids'].append(hid)
-                self.gc['bk'][id[0]]['ids'] += gh['ids']
-            elif len(id) == 0:
-                hand['gameStart'] = hand['startTime']
-                hand['gameEnd']   = hand['startTime']
-                id = len(self.gc['bk'])
-                hand['ids'].append(hid)
-                self.gc['bk'].append(hand)
-        
+                    winnings = (0, pdata[p]['totalProfit'])
+                self.gc['bk'].append(((date, gtid, pid), naive, hid,
+                                      (played, 1, pdata[p]['totalProfit'], pdata[p]['rake']) + winnings + (pdata[p]['allInEV'],)))
         if doinsert:
-            c = self.get_cursor()
-            for i in range(len(self.gc['bk'])):
-                hid = self.gc['bk'][i]['hid']
-                sid = self.sc[hid]['id']
-                lower = self.gc['bk'][i]['gameStart'] - THRESHOLD
-                upper = self.gc['bk'][i]['gameEnd']   + THRESHOLD
-                game = [self.gc['bk'][i]['date']
-                       ,self.gc['bk'][i]['gametypeId']
-                       ,self.gc['bk'][i]['playerId']]
-                row = [lower, upper] + game
-                c.execute(select_GC, row)
-                r = self.fetchallDict(c)
-                num = len(r)
-                if (num == 1):
-                    start, end = r[0]['gameStart'], r[0]['gameEnd']
-                    if self.gc['bk'][i]['gameStart'] < start:
-                        start = self.gc['bk'][i]['gameStart']
-                    if self.gc['bk'][i]['gameEnd']   > end:
-                        end = self.gc['bk'][i]['gameEnd']
-                    row = [start, end
-                          ,self.gc['bk'][i]['played']
-                          ,self.gc['bk'][i]['hands']
-                          ,self.gc['bk'][i]['totalProfit']
-                          ,self.gc['bk'][i]['rake']
-                          ,self.gc['bk'][i]['showdownWinnings']
-                          ,self.gc['bk'][i]['nonShowdownWinnings']
-                          ,self.gc['bk'][i]['allInEV']
-                          ,r[0]['id']]
-                    c.execute(update_GC, row)
-                    for h in self.gc['bk'][i]['ids']: self.gc[h] = {'id': r[0]['id']} 
-                elif (num > 1):
-                    start, end, merge = None, None, []
-                    played, hands, totalProfit, rake, showdownWinnings, nonShowdownWinnings, allInEV = 0, 0, 0, 0, 0, 0, 0
-                    for n in r: merge.append(n['id'])
-                    merge.sort()
-                    r.append(self.gc['bk'][i])
-                    for n in r:
-                        if start:
-                            if  start > n['gameStart']: 
-                                start = n['gameStart']
-                        else:   start = n['gameStart']
-                        if end: 
-                            if  end < n['gameEnd']: 
-                                end = n['gameEnd']
-                        else:   end = n['gameEnd']
-                        played              += n['played']
-                        hands               += n['hands']
-                        totalProfit         += n['totalProfit']
-                        rake                += n['rake']
-                        showdownWinnings    += n['showdownWinnings']
-                        nonShowdownWinnings += n['nonShowdownWinnings']
-                        allInEV             += n['allInEV']
-                    row = [sid, start, end] + game + [played, hands, totalProfit, rake, showdownWinnings, nonShowdownWinnings, allInEV]
-                    c.execute(insert_GC, row)
-                    gid = self.get_last_insert_id(c)
-                    for h in self.gc['bk'][i]['ids']: self.gc[h] = {'id': gid}
-                    for m in merge:
-                        for h, n in self.gc.iteritems():
-                            if h!='bk':
-                                if n['id'] == m:
-                                    self.gc[h] = {'id': gid}
-                        c.execute(update_GC_H, (gid, m))
-                        c.execute(delete_GC, m)
-                elif (num == 0):
-                    start               = self.gc['bk'][i]['gameStart']
-                    end                 = self.gc['bk'][i]['gameEnd']
-                    played              = self.gc['bk'][i]['played']
-                    hands               = self.gc['bk'][i]['hands']
-                    totalProfit         = self.gc['bk'][i]['totalProfit']
-                    rake                = self.gc['bk'][i]['rake']
-                    showdownWinnings    = self.gc['bk'][i]['showdownWinnings']
-                    nonShowdownWinnings = self.gc['bk'][i]['nonShowdownWinnings']
-                    allInEV             = self.gc['bk'][i]['allInEV']
-                    row = [sid, start, end] + game + [played, hands, totalProfit, rake, showdownWinnings, nonShowdownWinnings, allInEV]
-                    c.execute(insert_GC, row)
-                    gid = self.get_last_insert_id(c)
-                    for h in self.gc['bk'][i]['ids']: self.gc[h] = {'id': gid}
-            self.commit()
+            self.flushGamesCache()
+
+    def flushGamesCache(self):
+        """Cuts the queued hands of each date, gametype and hero into games where they
+           are more than sessionTimeout apart and merges those with the cached games
+           they come that close to, fetched with one range query. A merge keeps the
+           lowest game id and adds up the totals. A new game gets the session of its
+           first hand, flushSessionsCache() has to run first. Sets self.gc[hand id]
+           = {'id': game id} for appendSessionIds()"""
+        if not self.gc['bk']:
+            return
+        THRESHOLD = timedelta(seconds=int(self.sessionTimeout * 60))
+        NEW = (None,)   # sorts before the ids of cached games
+        queued = {}
+        for (key, t, hid, totals) in self.gc['bk']:
+            queued.setdefault(key, []).append((t, t, (hid, totals)))
+        times = [t for (key, t, hid, totals) in self.gc['bk']]
+
+        c = self.get_cursor()
+        c.execute(self.query('select_GC_range'),
+                  (min(times) - THRESHOLD, max(times) + THRESHOLD))
+        cached = {}
+        for row in c.fetchall():
+            (id, start, end, date, gtid, pid) = row[:6]
+            if (date, gtid, pid) in queued:
+                cached.setdefault((date, gtid, pid), []).append((self.naiveTime(start), self.naiveTime(end), (id, start, end, row[6:])))
+
+        (inserts, updates, merges) = ([], [], [])
+        nextId = None
+        for key, hands in queued.iteritems():
+            games = [(s, e, NEW + (hands,)) for (s, e, hands) in clusterIntervals(hands, THRESHOLD)]
+            for (start, end, members) in clusterIntervals(games + cached.get(key, []), THRESHOLD):
+                members.sort()
+                hands = [hand for m in members if m[0] is None for hand in m[1]]
+                if not hands:
+                    continue
+                rows = [m for m in members if m[0] is not None]
+                totals = [sum(column) for column in zip(*([totals for (hid, totals) in hands] + [row[3] for row in rows[1:]]))]
+                if rows:
+                    gid = rows[0][0]
+                    updates.append([start, end] + totals + [gid])
+                    merges += [(gid, row[0]) for row in rows[1:]]
+                else:
+                    if nextId is None:
+                        nextId = self.nextCacheId('GamesCache')
+                    gid, nextId = nextId, nextId + self.hand_inc
+                    inserts.append([gid, self.sc[hands[0][0]]['id'], start, end] + list(key) + totals)
+                for hand in hands:
+                    self.gc[hand[0]] = {'id': gid}
+
+        if inserts:
+            c.executemany(self.query('insert_GC'), inserts)
+        if updates:
+            c.executemany(self.query('update_GC'), updates)
+        if merges:
+            c.executemany(self.query('update_GC_H'), merges)
+            c.executemany(self.query('delete_GC'),
+                          [(m,) for (gid, m) in merges])
+        self.gc['bk'] = []
+
+    def naiveTime(self, startTime):
+        """startTime as a naive datetime, sqlite returns timestamps as strings"""
+        if isinstance(startTime, basestring):
+            return datetime.strptime(startTime[:19], '%Y-%m-%d %H:%M:%S')
+        return startTime.replace(tzinfo=None)
+
+    def nextCacheId(self, table):
+        """Id for the next row of SessionsCache or GamesCache, their rows are inserted
+           in bulk with explicit ids like Hands"""
+        c = self.get_cursor()
+        c.execute("SELECT max(id) FROM %s" % table)
+        id = c.fetchone()[0]
+        return (id or 0) + self.hand_inc
     
     def appendSessionIds(self):
         for h in self.hbulk:
@@ -2717,19 +2477,123 @@ class Database:
                 h[5] = self.gc[id]['id']                
 
     def storeFile(self, fdata):
-        q = self.sql.query['store_file']
-        q = q.replace('%s', self.sql.query['placeholder'])
+        q = self.query('store_file')
         c = self.get_cursor()
         c.execute(q, fdata)
         id = self.get_last_insert_id(c)
         return id
         
     def updateFile(self, fdata):
-        q = self.sql.query['update_file']
-        q = q.replace('%s', self.sql.query['placeholder'])
+        q = self.query('update_file')
         c = self.get_cursor()
         c.execute(q, fdata)
 
+    def get_identify_cache(self):
+        """Returns {file: (size, mtime, site, type, kodec, archive, gametype)} from IdentifyCache"""
+        c = self.get_cursor()
+        c.execute(self.sql.query['get_identify_cache'])
+        return dict((row[0], row[1:]) for row in c.fetchall())
+
+    def store_identify_cache(self, rows, replace = ()):
+        """Inserts rows (file, size, mtime, site, type, kodec, archive, gametype) into
+           IdentifyCache, after deleting the old rows of the files in replace"""
+        c = self.get_cursor()
+        if replace:
+            q = self.query('delete_identify_cache')
+            c.executemany(q, [(file,) for file in replace])
+        q = self.query('insert_identify_cache')
+        c.executemany(q, rows)
+        self.commit()
+
+    def delete_identify_cache(self, files):
+        """Deletes the IdentifyCache rows of files"""
+        c = self.get_cursor()
+        c.executemany(self.query('delete_identify_cache'), [(file,) for file in files])
+        self.commit()
+
+    def binary(self, data):
+        """Wraps the str data for a BLOB/BYTEA column"""
+        if self.backend == self.SQLITE:
+            import sqlite3
+            return sqlite3.Binary(data)
+        elif self.backend == self.PGSQL:
+            import psycopg2
+            return psycopg2.Binary(data)
+        return data
+
+    def get_raw_dictionaries(self):
+        """Returns [(id, siteId, dictionary)] from RawDictionaries"""
+        c = self.get_cursor()
+        c.execute(self.sql.query['get_raw_dictionaries'])
+        return [(id, siteId, str(dictionary)) for (id, siteId, dictionary) in c.fetchall()]
+
+    def storeRawDictionary(self, siteId, dictionary):
+        q = self.query('insert_raw_dictionary')
+        c = self.get_cursor()
+        c.execute(q, (siteId, self.binary(dictionary)))
+        return self.get_last_insert_id(c)
+
+    def storeRawHandBlock(self, siteId, dictionaryId, compression, file, data, handIds):
+        """Inserts a RawHandBlocks row holding the hands handIds imported from file,
+           and their RawHands rows"""
+        q = self.query('insert_raw_block')
+        c = self.get_cursor()
+        c.execute(q, (siteId, dictionaryId, compression, file, len(handIds), self.binary(data)))
+        blockId = self.get_last_insert_id(c)
+        q = self.query('insert_raw_hands')
+        c.executemany(q, [(handId, blockId, i) for i, handId in enumerate(handIds)])
+        return blockId
+
+    def getRawHandBlocks(self, after = 0, count = 100):
+        """Returns the next count [(id, siteId, dictionaryId, compression, file, data, handIds)]
+           from RawHandBlocks with an id > after"""
+        c = self.get_cursor()
+        c.execute(self.query('get_raw_blocks'), (after, count))
+        blocks = c.fetchall()
+        q = self.query('get_raw_block_hands')
+        result = []
+        for (id, siteId, dictionaryId, compression, file, data) in blocks:
+            c.execute(q, (id,))
+            result.append((id, siteId, dictionaryId, compression, file, str(data), [row[1] for row in c.fetchall()]))
+        return result
+
+    def getHandEquities(self, first, last):
+        """Returns {hand id: {(player name, street, boardId): ev}} from the
+           HandsStove rows of the hands with ids from first to last"""
+        c = self.get_cursor()
+        c.execute(self.query('get_stove_equities'), (first, last))
+        equities = {}
+        for (handId, name, streetId, boardId, ev) in c.fetchall():
+            equities.setdefault(handId, {})[(name, streetId, boardId)] = ev
+        return equities
+
+    def getRawHand(self, handId):
+        """Returns (siteId, dictionaryId, compression, data, blockIndex) of the block
+           holding handId, or None if the hand isn't archived"""
+        c = self.get_cursor()
+        c.execute(self.query('get_raw_hand'), (handId,))
+        row = c.fetchone()
+        if row is None:
+            return None
+        return row[:3] + (str(row[3]),) + row[4:]
+
+    def deleteHandRows(self, handIds):
+        """Deletes the HandsPlayers, HandsActions and HandsStove rows of handIds"""
+        c = self.get_cursor()
+        q = self.query('delete_hand_rows')
+        for table in ('HandsPlayers', 'HandsActions', 'HandsStove'):
+            c.executemany(q.replace('<table>', table), [(id,) for id in handIds])
+
+    def updateHandStats(self, hands):
+        """Updates the derived columns of Hands from the hands dicts of DerivedStats"""
+        q = self.query('update_hand_stats')
+        c = self.get_cursor()
+        c.executemany(q, [(h['playersVpi'], h['playersAtStreet1'], h['playersAtStreet2'], h['playersAtStreet3'],
+                           h['playersAtStreet4'], h['playersAtShowdown'], h['street0Raises'], h['street1Raises'],
+                           h['street2Raises'], h['street3Raises'], h['street4Raises'], h['street1Pot'],
+                           h['street2Pot'], h['street3Pot'], h['street4Pot'], h['showdownPot'], h['id'])
+                          for h in hands])
+
     def getHeroIds(self, pids, sitename):
         #Grab playerIds using hero names in HUD_Config.xml
         try:
@@ -2771,15 +2635,40 @@ class Database:
         return id
 
     def isDuplicate(self, gametypeID, siteHandNo):
+        siteHandNo = siteHandNoKey(siteHandNo)
         if (gametypeID, siteHandNo) in self.siteHandNos:
             return True
-        c = self.get_cursor()
-        c.execute(self.sql.query['isAlreadyInDB'], (gametypeID, siteHandNo))
-        result = c.fetchall()
-        if len(result) > 0:
-            return True
-        self.siteHandNos.append((gametypeID, siteHandNo))
+        preloaded = False
+        for (lo, hi) in self.siteHandNoRanges.get(gametypeID, []):
+            if isinstance(siteHandNo, (int, long)) and lo <= siteHandNo <= hi:
+                preloaded = True
+                break
+        if not preloaded:
+            c = self.get_cursor()
+            c.execute(self.sql.query['isAlreadyInDB'], (gametypeID, siteHandNo))
+            result = c.fetchall()
+            if len(result) > 0:
+                return True
+        self.siteHandNos.add((gametypeID, siteHandNo))
         return False
+
+    def preloadSiteHandNos(self, hands):
+        """Loads the siteHandNos already in Hands into the duplicate cache with one
+           query per gametype, covering the range of the (gametypeId, siteHandNo)
+           pairs in hands. isDuplicate() needs no query for hands in that range."""
+        ranges = {}
+        for (gametypeID, siteHandNo) in hands:
+            siteHandNo = siteHandNoKey(siteHandNo)
+            if not isinstance(siteHandNo, (int, long)):
+                continue
+            (lo, hi) = ranges.get(gametypeID, (siteHandNo, siteHandNo))
+            ranges[gametypeID] = (min(lo, siteHandNo), max(hi, siteHandNo))
+        c = self.get_cursor()
+        for gametypeID, (lo, hi) in ranges.iteritems():
+            c.execute(self.sql.query['getSiteHandNosInRange'], (gametypeID, lo, hi))
+            for row in c.fetchall():
+                self.siteHandNos.add((gametypeID, siteHandNoKey(row[0])))
+            self.siteHandNoRanges.setdefault(gametypeID, []).append((lo, hi))
     
     def getSqlPlayerIDs(self, pnames, siteid):
         result = {}
@@ -2799,8 +2688,7 @@ class Database:
         return result
     
     def insertPlayer(self, name, site_id):
-        insert_player = "INSERT INTO Players (name, siteId) VALUES (%s, %s)"
-        insert_player = insert_player.replace('%s', self.sql.query['placeholder'])
+        insert_player = self.query('insertPlayer')
         _name = Charset.to_db_utf8(name)
         key = (_name, site_id)
         
@@ -2814,8 +2702,7 @@ class Database:
         #print "DEBUG: name: %s site: %s" %(name, site_id)
         result = None
         c = self.get_cursor()
-        q = "SELECT id, name FROM Players WHERE name=%s and siteid=%s"
-        q = q.replace('%s', self.sql.query['placeholder'])
+        q = self.query('getPlayerIdBySite')
         result = self.insertOrUpdate(c, key, q, insert_player)
         return result
     
@@ -2862,8 +2749,7 @@ class Database:
     def insertGameTypes(self, gtinfo, gtinsert):
         result = None
         c = self.get_cursor()
-        q = self.sql.query['getGametypeNL']
-        q = q.replace('%s', self.sql.query['placeholder'])
+        q = self.query('getGametypeNL')
         c.execute(q, gtinfo)
         tmp = c.fetchone()
         if (tmp == None):
@@ -2916,7 +2802,7 @@ class Database:
     def createOrUpdateTourneyType(self, obj):
         ttid, _ttid, updateDb = None, None, False
         cursor = self.get_cursor()
-        q = self.sql.query['getTourneyTypeIdByTourneyNo'].replace('%s', self.sql.query['placeholder'])
+        q = self.query('getTourneyTypeIdByTourneyNo')
         cursor.execute(q, (obj.tourNo, obj.siteId))
         result=cursor.fetchone()
         
@@ -2941,7 +2827,7 @@ class Database:
             row = (obj.siteId, obj.buyinCurrency, obj.buyin, obj.fee, category,
                    obj.gametype['limitType'], obj.maxseats, obj.isSng, obj.isKO, obj.koBounty,
                    obj.isRebuy, obj.rebuyCost, obj.isAddOn, obj.addOnCost, obj.speed, obj.isShootout, obj.isMatrix)
-            cursor.execute (self.sql.query['getTourneyTypeId'].replace('%s', self.sql.query['placeholder']), row)
+            cursor.execute (self.query('getTourneyTypeId'), row)
             tmp=cursor.fetchone()
             try:
                 ttid = tmp[0]
@@ -2952,20 +2838,20 @@ class Database:
                     pp = pprint.PrettyPrinter(indent=4)
                     pp.pprint(row)
                     print ("###### End Tourneys ########")
-                cursor.execute (self.sql.query['insertTourneyType'].replace('%s', self.sql.query['placeholder']), row)
+                cursor.execute (self.query('insertTourneyType'), row)
                 ttid = self.get_last_insert_id(cursor)
             if updateDb:
                 #print 'DEBUG createOrUpdateTourneyType:', 'old', _ttid, 'new', ttid, row
-                q = self.sql.query['updateTourneyTypeId'].replace('%s', self.sql.query['placeholder'])
+                q = self.query('updateTourneyTypeId')
                 cursor.execute(q, (ttid, obj.tourNo))
                 self.ttclean.add(_ttid)
         return ttid
     
     def cleanUpTourneyTypes(self):
-        clear  = self.sql.query['clearHudCacheTourneyType'].replace('%s', self.sql.query['placeholder'])
-        select = self.sql.query['selectTourneyWithTypeId'].replace('%s', self.sql.query['placeholder'])
-        delete = self.sql.query['deleteTourneyTypeId'].replace('%s', self.sql.query['placeholder'])
-        fetch  = self.sql.query['fetchNewTourneyTypeIds'].replace('%s', self.sql.query['placeholder'])
+        clear  = self.query('clearHudCacheTourneyType')
+        select = self.query('selectTourneyWithTypeId')
+        delete = self.query('deleteTourneyTypeId')
+        fetch  = self.query('fetchNewTourneyTypeIds')
         cursor = self.get_cursor()
         for ttid in self.ttclean:
             cursor.execute(clear, (ttid,))
@@ -2994,14 +2880,13 @@ class Database:
     def insertTourney(self, siteId, tourNo, tourneyTypeId):
         result = None
         c = self.get_cursor()
-        q = self.sql.query['getTourneyByTourneyNo']
-        q = q.replace('%s', self.sql.query['placeholder'])
+        q = self.query('getTourneyByTourneyNo')
 
         c.execute (q, (siteId, tourNo))
 
         tmp = c.fetchone()
         if (tmp == None): 
-            c.execute (self.sql.query['insertTourney'].replace('%s', self.sql.query['placeholder']),
+            c.execute (self.query('insertTourney'),
                         (tourneyTypeId, None, tourNo, None, None,
                          None, None, None, None, None, None))
             result = self.get_last_insert_id(c)
@@ -3011,7 +2896,7 @@ class Database:
     
     def createOrUpdateTourney(self, summary):
         cursor = self.get_cursor()
-        q = self.sql.query['getTourneyByTourneyNo'].replace('%s', self.sql.query['placeholder'])
+        q = self.query('getTourneyByTourneyNo')
         cursor.execute(q, (summary.siteId, summary.tourNo))
 
         columnNames=[desc[0] for desc in cursor.description]
@@ -3033,7 +2918,7 @@ class Database:
                 #    if (resultDict[ev] < summary.startTime):
                 #        summary.startTime=resultDict[ev]
             if updateDb:
-                q = self.sql.query['updateTourney'].replace('%s', self.sql.query['placeholder'])
+                q = self.query('updateTourney')
                 row = (summary.entries, summary.prizepool, summary.startTime, summary.endTime, summary.tourneyName,
                        summary.matrixIdProcessed, summary.totalRebuyCount, summary.totalAddOnCount, summary.comment,
                        summary.commentTs, tourneyId
@@ -3049,7 +2934,7 @@ class Database:
                 pp = pprint.PrettyPrinter(indent=4)
                 pp.pprint(row)
                 print ("###### End Tourneys ########")
-            cursor.execute (self.sql.query['insertTourney'].replace('%s', self.sql.query['placeholder']), row)
+            cursor.execute (self.query('insertTourney'), row)
             tourneyId = self.get_last_insert_id(cursor)
         return tourneyId
     #end def createOrUpdateTourney
@@ -3081,14 +2966,13 @@ class Database:
     def insertTourneysPlayers(self, playerId, tourneyId):
         result = None
         c = self.get_cursor()
-        q = self.sql.query['getTourneysPlayersByIds']
-        q = q.replace('%s', self.sql.query['placeholder'])
+        q = self.query('getTourneysPlayersByIds')
 
         c.execute (q, (tourneyId, playerId))
 
         tmp = c.fetchone()
         if (tmp == None): #new player
-            c.execute (self.sql.query['insertTourneysPlayer'].replace('%s',self.sql.query['placeholder'])
+            c.execute (self.query('insertTourneysPlayer')
                       ,(tourneyId, playerId, None, None, None, None, None, None, None, None, 0, 0))
             #Get last id might be faster here.
             #c.execute ("SELECT id FROM Players WHERE name=%s", (name,))
@@ -3101,14 +2985,14 @@ class Database:
         tplayers = []
         tourneysPlayersIds={}
         cursor = self.get_cursor()
-        cursor.execute (self.sql.query['getTourneysPlayersByTourney'].replace('%s', self.sql.query['placeholder']),
+        cursor.execute (self.query('getTourneysPlayersByTourney'),
                             (summary.tourneyId,))
         result=cursor.fetchall()
         if result: tplayers += [i[0] for i in result]
         for player in summary.players:
             playerId = summary.dbid_pids[player]
             if playerId in tplayers:
-                cursor.execute (self.sql.query['getTourneysPlayersByIds'].replace('%s', self.sql.query['placeholder']),
+                cursor.execute (self.query('getTourneysPlayersByIds'),
                                 (summary.tourneyId, playerId))
                 columnNames=[desc[0] for desc in cursor.description]
                 result=cursor.fetchone()
@@ -3126,7 +3010,7 @@ class Database:
                     elif getattr(summary, summaryAttribute)[player]!=None and resultDict[ev]==None:#object has this value but DB doesnt, so update DB
                         updateDb=True
                 if updateDb:
-                    q = self.sql.query['updateTourneysPlayer'].replace('%s', self.sql.query['placeholder'])
+                    q = self.query('updateTourneysPlayer')
                     inputs = (summary.ranks[player],
                               summary.winnings[player],
                               summary.winningsCurrency[player],
@@ -3147,7 +3031,7 @@ class Database:
                 else:
                     self.tpbulk.append((summary.tourneyId, playerId, None, None, None, None, None,
                                          summary.rebuyCounts[player], summary.addOnCounts[player], summary.koCounts[player], 0, 0))
-        cursor.executemany(self.sql.query['insertTourneysPlayer'].replace('%s', self.sql.query['placeholder']),self.tpbulk)
+        cursor.executemany(self.query('insertTourneysPlayer'),self.tpbulk)
     
 #end class Database
 
@@ -11,10 +11,29 @@
 
 Helper class for mucked card display. Loads specified deck from SVG
 images and returns it as a dict of pixbufs.
+
+Rasterising the 53 SVGs takes a while, so each deck is rendered once to a
+PNG sprite sheet (the atlas) in config.dir_cards and loaded from there
+afterwards. The atlas remembers the SVGs it was made from and is rendered
+again when they change. Decks of the same type, back and size share their
+pixbufs within a process.
 """
 
 import os
+import logging
+import hashlib
 import gtk
+import gobject
+
+log = logging.getLogger("fpdb")
+
+SUITS = ('s', 'h', 'd', 'c')        # the rows of the atlas
+RANKS = range(2, 15)                # the columns, the back is after the spades' ace
+RANK_FILES = {10: '10', 11: 'j', 12: 'q', 13: 'k', 14: 'a'}
+SOURCES_KEY = "tEXt::fpdb-sources"
+
+# (cards path, back file, width, height) -> (cards, back) of the decks loaded
+_decks = {}
 
 class Deck(object):
     def __init__(self, config, deck_type=u'colour', card_back=u'back04', width=30, height=42):
@@ -22,14 +41,13 @@ class Deck(object):
         self.__height = height
         self.__cardspath = os.path.join(config.graphics_path, u"cards", deck_type)
         self.__backfile = os.path.join(config.graphics_path, u"cards", u"backs", (card_back + u".svg"))
-        self.__cards = dict({ 's': None, 'h': None, 'd': None, 'c': None })
-        self.__card_back = None
+        self.__atlasfile = os.path.join(config.dir_cards, u"%s-%s-%dx%d.png" % (deck_type, card_back, width, height))
         self.__rank_vals = dict()
         #
-        for sk in self.__cards:
-            self.__load_suit(sk)
-        #
-        self.__card_back = self.__load_svg(self.__backfile)
+        key = (self.__cardspath, self.__backfile, width, height)
+        if key not in _decks:
+            _decks[key] = self.__load_deck()
+        (self.__cards, self.__card_back) = _decks[key]
         #
         self.__create_rank_lookups()
 
@@ -48,24 +66,67 @@ class Deck(object):
         pb = temp_buf.scale_simple(self.__width, self.__height, gtk.gdk.INTERP_HYPER)
         return pb
 
-    def __load_suit(self, suit_key):
-        sd = dict()
-        _p = self.__cardspath
-        sd[2]   = self.__load_svg(os.path.join(_p, (suit_key + '_' + '2' + '.svg')))
-        sd[3]   = self.__load_svg(os.path.join(_p, (suit_key + '_' + '3' + '.svg')))
-        sd[4]   = self.__load_svg(os.path.join(_p, (suit_key + '_' + '4' + '.svg')))
-        sd[5]   = self.__load_svg(os.path.join(_p, (suit_key + '_' + '5' + '.svg')))
-        sd[6]   = self.__load_svg(os.path.join(_p, (suit_key + '_' + '6' + '.svg')))
-        sd[7]   = self.__load_svg(os.path.join(_p, (suit_key + '_' + '7' + '.svg')))
-        sd[8]   = self.__load_svg(os.path.join(_p, (suit_key + '_' + '8' + '.svg')))
-        sd[9]   = self.__load_svg(os.path.join(_p, (suit_key + '_' + '9' + '.svg')))
-        sd[10]   = self.__load_svg(os.path.join(_p, (suit_key + '_' + '10' + '.svg')))
-        sd[11]   = self.__load_svg(os.path.join(_p, (suit_key + '_' + 'j' + '.svg')))
-        sd[12]   = self.__load_svg(os.path.join(_p, (suit_key + '_' + 'q' + '.svg')))
-        sd[13]   = self.__load_svg(os.path.join(_p, (suit_key + '_' + 'k' + '.svg')))
-        sd[14]   = self.__load_svg(os.path.join(_p, (suit_key + '_' + 'a' + '.svg')))
-        self.__cards[suit_key] = sd
-        
+    def __card_file(self, suit_key, rank):
+        return os.path.join(self.__cardspath, suit_key + '_' + RANK_FILES.get(rank, str(rank)) + '.svg')
+
+    def __sources(self):
+        """Returns a digest of the names, sizes and times of the SVGs of the deck"""
+        digest = hashlib.md5()
+        for path in [self.__card_file(s, r) for s in SUITS for r in RANKS] + [self.__backfile]:
+            st = os.stat(path)
+            digest.update((u"%s %d %d\n" % (path, st.st_size, st.st_mtime)).encode('utf-8'))
+        return digest.hexdigest()
+
+    def __load_deck(self):
+        """Returns the cards and the back, from the atlas if it is up to date"""
+        sources = self.__sources()
+        atlas = None
+        if os.path.exists(self.__atlasfile):
+            try:
+                atlas = gtk.gdk.pixbuf_new_from_file(self.__atlasfile)
+                if atlas.get_option(SOURCES_KEY) != sources \
+                        or atlas.get_width() != len(RANKS) * self.__width + self.__width \
+                        or atlas.get_height() != len(SUITS) * self.__height:
+                    atlas = None
+            except gobject.GError, e:
+                log.warning("Deck: can't read %s: %s" % (self.__atlasfile, e))
+                atlas = None
+        if atlas is None:
+            atlas = self.__render_atlas(sources)
+
+        w, h = self.__width, self.__height
+        cards = dict()
+        for (row, suit_key) in enumerate(SUITS):
+            cards[suit_key] = dict()
+            for (col, rank) in enumerate(RANKS):
+                cards[suit_key][rank] = atlas.subpixbuf(col * w, row * h, w, h)
+        card_back = atlas.subpixbuf(len(RANKS) * w, 0, w, h)
+        return (cards, card_back)
+
+    def __render_atlas(self, sources):
+        """Rasterises the SVGs into a new atlas and saves it, a row per suit
+           with the back at the end of the first row"""
+        w, h = self.__width, self.__height
+        atlas = gtk.gdk.Pixbuf(gtk.gdk.COLORSPACE_RGB, True, 8, len(RANKS) * w + w, len(SUITS) * h)
+        atlas.fill(0)
+        for (row, suit_key) in enumerate(SUITS):
+            for (col, rank) in enumerate(RANKS):
+                self.__load_svg(self.__card_file(suit_key, rank)).copy_area(0, 0, w, h, atlas, col * w, row * h)
+        self.__load_svg(self.__backfile).copy_area(0, 0, w, h, atlas, len(RANKS) * w, 0)
+
+        # written to a temporary file first, so another process never
+        # reads a partial atlas
+        temp = self.__atlasfile + u".%d" % os.getpid()
+        try:
+            if not os.path.isdir(os.path.dirname(self.__atlasfile)):
+                os.makedirs(os.path.dirname(self.__atlasfile))
+            atlas.save(temp, "png", {SOURCES_KEY: sources})
+            if os.path.exists(self.__atlasfile):
+                os.remove(self.__atlasfile)     # rename doesn't replace on windows
+            os.rename(temp, self.__atlasfile)
+        except (OSError, IOError, gobject.GError), e:
+            log.warning("Deck: can't save %s: %s" % (self.__atlasfile, e))
+        return atlas
 
     def card(self, suit=None, rank=0):
         return self.__cards[suit][rank]
@@ -19,6 +19,7 @@
 import L10n
 _ = L10n.get_translation()
 import Card
+import HandRecords
 from decimal_wrapper import Decimal
 
 import sys
@@ -26,13 +27,12 @@ import logging
 # logging has been set up in fpdb.py or HUD_main.py, use their settings:
 log = logging.getLogger("parser")
 
-try:
-    from pokereval import PokerEval
-    pokereval = PokerEval()
-except:
-    pokereval = None
+import HandEval
+pokereval = HandEval.PokerEval()
 
 class DerivedStats():
+    _initStats = None   # HandsPlayersRow copied for every player by getStats()
+
     def __init__(self, hand):
         self.hand = hand
 
@@ -40,7 +40,8 @@ class DerivedStats():
         self.handsplayers = {}
         self.handsactions = {}
         self.handsstove   = []
-        self._initStats = DerivedStats._buildStatsInitializer()
+        if DerivedStats._initStats is None:
+            DerivedStats._initStats = DerivedStats._buildStatsInitializer()
 
     @staticmethod
     def _buildStatsInitializer():
@@ -111,7 +112,7 @@ class DerivedStats():
         init['wonWhenSeenStreet2'] = 0.0
         init['wonWhenSeenStreet3'] = 0.0
         init['wonWhenSeenStreet4'] = 0.0
-        return init
+        return HandRecords.HandsPlayersRow(init)
 
     def getStats(self, hand):
         for player in hand.players:
@@ -123,9 +124,8 @@ class DerivedStats():
         if self.hand.saveActions:
             self.assembleHandsActions(self.hand)
         
-        if pokereval:
-            if self.hand.gametype['category'] in Card.games:
-                self.assembleHandsStove(self.hand)
+        if self.hand.gametype['category'] in Card.games:
+            self.assembleHandsStove(self.hand)
 
     def getHands(self):
         return self.hands
@@ -199,15 +199,11 @@ class DerivedStats():
         # sawShowdown is calculated in playersAtStreetX, as that calculation gives us a convenient list of names
 
         #hand.players = [[seat, name, chips],[seat, name, chips]]
+        self.assembleTourneyIds(hand)
         for player in hand.players:
             self.handsplayers[player[1]]['seatNo'] = player[0]
             self.handsplayers[player[1]]['startCash'] = int(100 * Decimal(player[2]))
             self.handsplayers[player[1]]['sitout'] = False #TODO: implement actual sitout detection
-            if hand.gametype["type"]=="tour":
-                self.handsplayers[player[1]]['tourneyTypeId']=hand.tourneyTypeId
-                self.handsplayers[player[1]]['tourneysPlayersIds'] = hand.tourneysPlayersIds[player[1]]
-            else:
-                self.handsplayers[player[1]]['tourneysPlayersIds'] = None
             if player[1] in hand.shown:
                 self.handsplayers[player[1]]['showed'] = True
 
@@ -246,7 +242,7 @@ class DerivedStats():
 
         for player in hand.pot.committed:
             self.handsplayers[player]['totalProfit'] = int(self.handsplayers[player]['winnings'] - (100*hand.pot.committed[player])- (100*hand.pot.common[player]))
-            if hand.gametype['type'] == 'ring' and pokereval:
+            if hand.gametype['type'] == 'ring':
                 self.handsplayers[player]['allInEV'] = self.handsplayers[player]['totalProfit']
 
         self.calcCBets(hand)
@@ -269,12 +265,24 @@ class DerivedStats():
         # 3betSB, 3betBB
         # Squeeze, Ratchet?
 
+    def assembleTourneyIds(self, hand):
+        """Copies the tourney ids from hand. Stats assembled in a parse process
+           are computed before Hand.prepInsert() has looked the ids up, so
+           prepInsert() calls this again once they are known"""
+        self.hands['tourneyId'] = hand.tourneyId
+        for player in hand.players:
+            if hand.gametype["type"]=="tour":
+                self.handsplayers[player[1]]['tourneyTypeId']=hand.tourneyTypeId
+                self.handsplayers[player[1]]['tourneysPlayersIds'] = hand.tourneysPlayersIds.get(player[1])
+            else:
+                self.handsplayers[player[1]]['tourneysPlayersIds'] = None
+
     def assembleHandsActions(self, hand):
         k = 0
         for i, street in enumerate(hand.actionStreets):
             for j, act in enumerate(hand.actions[street]):
                 k += 1
-                self.handsactions[k] = {}
+                self.handsactions[k] = HandRecords.HandsActionsRow()
                 #default values
                 self.handsactions[k]['amount'] = 0
                 self.handsactions[k]['raiseTo'] = 0
@@ -426,7 +434,7 @@ class DerivedStats():
                                              for j in range(len(inserts_temp)):
                                                  if ((boardId == inserts_temp[j][3]) and (lostring == inserts_temp[j][7]) and 
                                                     (lostringvalue != inserts_temp[j][9]) and (lostring is not None) and (winnings>0) and
-                                                     (streetId == inserts_temp[j][2]) and (hand.dbid_pids[player[1]] != inserts_temp[j][1])):
+                                                     (streetId == inserts_temp[j][2]) and (player[1] != inserts_temp[j][1])):
                                                      loappend = ' - lower kicker'
                                                      if lostringvalue < inserts_temp[j][9]:
                                                          lostring += loappend
@@ -442,7 +450,7 @@ class DerivedStats():
                                              for k in range(len(inserts_temp)):
                                                  if ((boardId == inserts_temp[k][3]) and (histring == inserts_temp[k][6]) and
                                                     (histringvalue != inserts_temp[k][8]) and (histring is not None) and (winnings>0) and
-                                                    (streetId == inserts_temp[k][2]) and (hand.dbid_pids[player[1]] != inserts_temp[k][1])
+                                                    (streetId == inserts_temp[k][2]) and (player[1] != inserts_temp[k][1])
                                                     and ('flush' not in histring) and ('straight' not in histring) and ('full house' not in histring)):
                                                      hiappend = ' - higher kicker'
                                                      if histringvalue > inserts_temp[k][8]:
@@ -451,7 +459,7 @@ class DerivedStats():
                                                          if hiappend not in inserts_temp[k][4] and inserts_temp[k][10]>0: 
                                                              inserts_temp[k][4] += hiappend
                                 inserts_temp.append( [hand.dbid_hands,
-                                                      hand.dbid_pids[player[1]],
+                                                      player[1],
                                                       streetId,
                                                       boardId,
                                                       histring,
@@ -471,7 +479,7 @@ class DerivedStats():
                         lostring = ''
                     self.handsstove.append( [  
                                        hand.dbid_hands,
-                                       hand.dbid_pids[player[1]],
+                                       player[1],
                                        streetId,
                                        0,
                                        histring,
@@ -505,19 +513,20 @@ class DerivedStats():
                                         and u'0x' not in holecards[p]['cards'][n]
                                         and 'Nu' not in holecards[p]['cards'][n]]
                             if len(holeshow)> 1:
-                                evs = pokereval.poker_eval(game = game[1]
-                                                          ,iterations = Card.iter[tid]
-                                                          ,pockets = holeshow
-                                                          ,dead = []
-                                                          ,board = b)
-                                equities = [e['ev'] for e in evs['eval']]
+                                equities = self.storedEquities(hand, players, len(holeshow), tid, bid)
+                                if equities is None:
+                                    evs = pokereval.poker_eval(game = game[1]
+                                                              ,iterations = Card.iter[tid]
+                                                              ,pockets = holeshow
+                                                              ,dead = []
+                                                              ,board = b)
+                                    equities = [e['ev'] for e in evs['eval']]
                             else:
                                 equities = [1000]
                             for i in range(len(equities)):
                                 for j in self.handsstove:
                                     p = players[i]
-                                    pid = hand.dbid_pids[p]
-                                    if ((j[1] == pid) and (j[2] == tid) and (j[3] == bid)):
+                                    if ((j[1] == p) and (j[2] == tid) and (j[3] == bid)):
                                         if len(players) == len(hand.pot.contenders): j[6] = equities[i]
                                         if street == startstreet and hand.gametype['type'] == 'ring':
                                             rake = (hand.rake * (pot/hand.totalpot))
@@ -528,6 +537,18 @@ class DerivedStats():
             if holecards[p]['committed'] != 0: 
                 self.handsplayers[p]['allInEV'] = holecards[p]['eq'] - holecards[p]['committed']
               
+    def storedEquities(self, hand, players, n, streetId, boardId):
+        """Returns the equities of the first n players of a pot from the HandsStove
+           rows of a re-derived hand (hand.equities), or None if they must be
+           calculated. The rows only hold the equities of pots contested by all
+           the players at showdown."""
+        if not hand.equities or len(players) != len(hand.pot.contenders):
+            return None
+        try:
+            return [hand.equities[(players[i], streetId, boardId)] for i in range(n)]
+        except KeyError:
+            return None
+
     def getHandString(self, type, string, cards, best):
         if best[0] == 'Nothing':
             string, cards = None, None
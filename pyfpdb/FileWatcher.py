@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""FileWatcher.py
+
+Event driven watching of the auto import directories.
+"""
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#    In the "official" distribution you can find the license in agpl-3.0.txt.
+
+#    Standard Library modules
+import os
+import sys
+import errno
+import struct
+import logging
+
+# logging has been set up in fpdb.py or HUD_main.py, use their settings:
+log = logging.getLogger("importer")
+
+# inotify constants, from <sys/inotify.h>
+IN_MODIFY      = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW  = 0x00004000
+IN_IGNORED     = 0x00008000
+IN_ISDIR       = 0x40000000
+IN_NONBLOCK    = 0x00000800
+IN_CLOEXEC     = 0x00080000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct('iIII')     # wd, mask, cookie, len
+
+
+class InotifyWatcher:
+    """Watches directories with inotify (Linux).
+
+       read_events() doesn't block, it returns what happened in the watched
+       directories since the last call. fileno() becomes readable when there
+       are events, so it can be added to the gtk main loop."""
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self.get_errno = ctypes.get_errno
+        self.dirs = {}          # watch descriptor -> (directory, data)
+
+    def fileno(self):
+        return self.fd
+
+    def add_directory(self, dir, data = None):
+        """Watches dir, data is returned with the events of its files"""
+        path = dir.encode(sys.getfilesystemencoding() or 'utf8') if isinstance(dir, unicode) else dir
+        wd = self.libc.inotify_add_watch(self.fd, path, WATCH_MASK)
+        if wd < 0:
+            log.warning("inotify_add_watch failed for %s: %s" % (dir, os.strerror(self.get_errno())))
+            return False
+        self.dirs[wd] = (dir, data)
+        return True
+
+    def read_events(self):
+        """Returns (changed, removed, overflow). changed and removed map the paths
+           written to, created or deleted since the last call to the data of their
+           directory. overflow is True if the kernel dropped events, the caller
+           has to look at all the files again."""
+        changed, removed, overflow = {}, {}, False
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except OSError, e:
+                if e.errno == errno.EAGAIN:
+                    break
+                raise
+            pos = 0
+            while pos < len(buf):
+                (wd, mask, cookie, length) = EVENT_HEADER.unpack_from(buf, pos)
+                name = buf[pos + EVENT_HEADER.size:pos + EVENT_HEADER.size + length].rstrip('\0')
+                pos += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                if wd not in self.dirs:
+                    continue
+                (dir, data) = self.dirs[wd]
+                if mask & (IN_DELETE_SELF | IN_IGNORED):
+                    del self.dirs[wd]
+                    continue
+                if isinstance(dir, unicode):
+                    name = name.decode(sys.getfilesystemencoding() or 'utf8', 'replace')
+                path = os.path.join(dir, name)
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    removed[path] = data
+                    changed.pop(path, None)
+                else:
+                    changed[path] = data
+                    removed.pop(path, None)
+        return (changed, removed, overflow)
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+        self.dirs = {}
+
+
+def get_watcher():
+    """Returns a watcher for this platform, or None if the import directories
+       have to be polled"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        return InotifyWatcher()
+    except (OSError, AttributeError), e:
+        log.info("inotify not available, polling the import directories: %s" % e)
+        return None
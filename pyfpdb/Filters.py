@@ -1506,6 +1506,7 @@ class Filters(threading.Thread):
             <game_test>       GameType gt               whole clause       Game
             <limit_test>      GameType gt               whole clause       Limits, LimitSep, LimitType
             <position_test>   HandsPlayers hp           whole clause       Positions
+            <cards_test>      HandsPlayers hp, gt       whole clause       Cards (only holdem hands have startCards)
         """
         
         #copyed from GuiRingPlayerStats withouth thinking if this could be done any better
@@ -1562,6 +1563,18 @@ class Filters(threading.Thread):
             positiontest = "AND hp.position in ('" + "','".join(pos_list) + "')"   #values must be set in '' because they can be strings as well as numbers
             query = query.replace('<position_test>', positiontest)
 
+        if '<cards_test>' in query:
+            cards = self.getCards()
+            if False in cards.values():
+                startcards = [str(i) for i in range(1, 170) if cards.get(Card.twoStartCardString(i))]
+                cardstest = "AND (gt.category != 'holdem' OR hp.startCards = 0"
+                if startcards:
+                    cardstest += " OR hp.startCards in (" + ",".join(startcards) + ")"
+                cardstest += ")"
+            else:
+                cardstest = ""
+            query = query.replace('<cards_test>', cardstest)
+
         return query
 
     def __refresh(self, widget, entry):
@@ -34,6 +34,7 @@ import logging
 
 
 import fpdb_import
+import HudProtocol
 from optparse import OptionParser
 import Configuration
 import string
@@ -50,6 +51,7 @@ if os.name == "nt":
 class GuiAutoImport (threading.Thread):
     def __init__(self, settings, config, sql = None, parent = None, cli = False):
         self.importtimer = 0
+        self.watchsource = 0
         self.settings = settings
         self.config = config
         self.sql = sql
@@ -58,7 +60,8 @@ class GuiAutoImport (threading.Thread):
         imp = self.config.get_import_parameters()
 
         self.input_settings = {}
-        self.pipe_to_hud = None
+        self.pipe_to_hud = None     # the HUD process
+        self.hud_client = None      # the connection to it, see HudProtocol
 
         self.importer = fpdb_import.Importer(self, self.settings, self.config, self.sql)
         self.importer.setCallHud(True)
@@ -187,6 +190,7 @@ class GuiAutoImport (threading.Thread):
         if self.doAutoImportBool:
             self.startButton.set_label(_(u'_Auto Import Running'))
             self.importer.runUpdated()
+            self.poll_hud()
             self.addText(".")
             #sys.stdout.write(".")
             #sys.stdout.flush()
@@ -194,6 +198,24 @@ class GuiAutoImport (threading.Thread):
             return True
         return False
 
+    def poll_hud(self):
+        """Sends the hands queued until the HUD connected"""
+        if self.hud_client is not None:
+            try:
+                self.hud_client.poll()
+            except (socket.error, IOError), e:
+                log.error(_("Failed to send hand to HUD: %s") % e)
+
+    def do_watched_import(self, fd, condition):
+        """Callback for the import directory watcher, runs when a file changed."""
+        if self.doAutoImportBool:
+            self.importer.runUpdated()
+            if self.importer.getWatchFd() is not None:
+                return True
+            # the importer gave up watching, do_import polls the directories
+        self.watchsource = 0
+        return False
+
     def reset_startbutton(self):
         if self.pipe_to_hud is not None:
             self.startButton.set_label(_(u'Stop _Auto Import'))
@@ -255,34 +277,44 @@ class GuiAutoImport (threading.Thread):
                 while gtk.events_pending(): # change the label NOW don't wait for the pipe to open
                     gtk.main_iteration(False)
                 if self.pipe_to_hud is None:
+                    # the HUD connects back to this port
+                    self.hud_client = HudProtocol.HudClient(HudProtocol.listen())
+                    port = str(self.hud_client.port())
                     if self.config.install_method == "exe":    # if py2exe, run hud_main.exe
                         path = self.config.pyfpdb_path
-                        command = "HUD_main.exe"
+                        command = "HUD_main.exe --hudport " + port
                         bs = 0
                     elif os.name == 'nt':
                         path = sys.path[0].replace('\\','\\\\')
                         if win32console.GetConsoleWindow() == 0:
-                            command = 'pythonw "'+path+'\\HUD_main.pyw" ' + self.settings['cl_options']
+                            command = 'pythonw "'+path+'\\HUD_main.pyw" ' + self.settings['cl_options'] + ' --hudport ' + port
                         else:
-                            command = 'python "'+path+'\\HUD_main.pyw" ' + self.settings['cl_options']
+                            command = 'python "'+path+'\\HUD_main.pyw" ' + self.settings['cl_options'] + ' --hudport ' + port
                         bs = 0
                     else:
                         command = os.path.join(sys.path[0], 'HUD_main.pyw')
-                        command = [command, ] + string.split(self.settings['cl_options'])
+                        command = [command, ] + string.split(self.settings['cl_options']) + ['--hudport', port]
                         bs = 1
 
                         print _("opening pipe to HUD")
+                    # the HUD proves it is the one started here with the token,
+                    # the environment isn't visible to other users like the command line
+                    env = dict(os.environ)
+                    env[HudProtocol.TOKEN_VARIABLE] = self.hud_client.token
                     try:
                         if self.config.install_method == "exe" or (os.name == "nt" and win32console.GetConsoleWindow() == 0):
                             self.pipe_to_hud = subprocess.Popen(command, bufsize=bs,
                                                                 stdin=subprocess.PIPE,
                                                                 stdout=subprocess.PIPE,  # needed for pythonw / py2exe
                                                                 stderr=subprocess.PIPE,  # needed for pythonw / py2exe
-                                                                universal_newlines=True
+                                                                universal_newlines=True,
+                                                                env=env
                                                                )
                         else:
-                            self.pipe_to_hud = subprocess.Popen(command, bufsize=bs, stdin=subprocess.PIPE, universal_newlines=True)
+                            self.pipe_to_hud = subprocess.Popen(command, bufsize=bs, universal_newlines=True, env=env)
                     except:
+                        self.hud_client.close()
+                        self.hud_client = None
                         err = traceback.extract_tb(sys.exc_info()[2])[-1]
                         #self.addText( _("\n*** GuiAutoImport Error opening pipe: " + err[2] + "(" + str(err[1]) + "): " + str(sys.exc_info()[1])))
                         self.addText("\n" + _("*** GuiAutoImport Error opening pipe:") + " " + traceback.format_exc() )
@@ -295,14 +327,25 @@ class GuiAutoImport (threading.Thread):
                     if self.importtimer != 0:
                         gobject.source_remove(self.importtimer)
                     self.importtimer = gobject.timeout_add(interval * 1000, self.do_import)
+                    # with a directory watcher the files are imported as soon as they change
+                    fd = self.importer.getWatchFd()
+                    if fd is not None and self.watchsource == 0:
+                        self.watchsource = gobject.io_add_watch(fd, gobject.IO_IN, self.do_watched_import)
 
             else:
                 self.addText("\n" + _("Auto Import aborted.") + _("Global lock not available."))
         else: # toggled off
             gobject.source_remove(self.importtimer)
+            if self.watchsource != 0:
+                gobject.source_remove(self.watchsource)
+                self.watchsource = 0
+            self.importer.closeWatcher()
             self.settings['global_lock'].release()
             self.doAutoImportBool = False # do_import will return this and stop the gobject callback timer
             self.addText("\n" + _("Stopping Auto Import.") + _("Global lock released."))
+            if self.hud_client is not None:
+                self.hud_client.close()     # tells the HUD to quit
+                self.hud_client = None
             if self.pipe_to_hud.poll() is not None:
                 self.addText("\n * " + _("Stop Auto Import") + ": " + _("HUD already terminated."))
             else:
@@ -45,7 +45,7 @@ log = logging.getLogger("importer")
 class GuiBulkImport():
 
     # CONFIGURATION  -  update these as preferred:
-    allowThreads = False  # set to True to try out the threads field
+    allowThreads = True   # threads field sets the number of parse processes
 
     def dopulse(self):
         self.progressbar.pulse()
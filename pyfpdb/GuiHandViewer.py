@@ -30,6 +30,7 @@ import SQL
 import fpdb_import
 import Filters
 import Deck
+from LazyListModel import LazyListModel
 
 import pygtk
 pygtk.require('2.0')
@@ -52,6 +53,10 @@ pp = pprint.PrettyPrinter(indent=4)
 global card_images
 card_images = 53 * [0]
 
+# hands loaded by each gtk idle call after the first page, small enough that
+# the list stays responsive while they are read
+IDLE_PAGE_SIZE = 50
+
 def card_renderer_cell_func(tree_column, cell, model, tree_iter, data):
     card_width  = 30
     card_height = 42
@@ -108,6 +113,7 @@ class GuiHandViewer:
         self.replayer = None
         self.date_from = None
         self.date_to = None
+        self.hand_range = None      # the dates of the hands loaded, for the card filter
 
         # These are temporary variables until it becomes possible
         # to select() a Hand object from the database
@@ -208,8 +214,17 @@ class GuiHandViewer:
         if self.date_to != None and end == self.filters.MAX_DATE:
             end = self.date_to
 
+        self.hand_range = (start, end)
+        return self.get_hand_ids_in_range(start, end)
+
+    def get_hand_ids_in_range(self, start, end, cards = False):
+        """Returns the handids in the date range and in the filters, and in the card
+            filter too if cards is True. All the hands are loaded, the card filter
+            only changes which of them are shown."""
         q = self.db.sql.query['handsInRange']
         q = q.replace('<datetest>', "between '" + start + "' and '" + end + "'")
+        if not cards:
+            q = q.replace('<cards_test>', '')
         q = self.filters.replace_placeholders_with_filter_values(q)
 
         c = self.db.get_cursor()
@@ -217,6 +232,13 @@ class GuiHandViewer:
         c.execute(q)
         return [r[0] for r in c.fetchall()]
 
+    def get_card_filter_ids(self):
+        """Returns the set of handids loaded that are in the card filter, None if
+            all the cards are selected"""
+        if self.hand_range is None or False not in self.filters.getCards().values():
+            return None
+        return set(self.get_hand_ids_in_range(self.hand_range[0], self.hand_range[1], cards = True))
+
     def rankedhand(self, hand, game):
         ranks = {'0':0, '2':2, '3':3, '4':4, '5':5, '6':6, '7':7, '8':8, '9':9, 'T':10, 'J':11, 'Q':12, 'K':13, 'A':14}
         suits = {'x':0, 's':1, 'c':2, 'd':3, 'h':4}
@@ -235,54 +257,40 @@ class GuiHandViewer:
         else:
             return 0
 
-    def sorthand(self, model, iter1, iter2):
-        hand1 = self.hands[int(model.get_value(iter1, self.colnum['HandId']))]         
-        hand2 = self.hands[int(model.get_value(iter2, self.colnum['HandId']))]
-        base1 = hand1.gametype['base']
-        base2 = hand2.gametype['base']
-        if base1 < base2:
-            return -1
-        elif base1 > base2:
-            return 1
-
-        cat1 = hand1.gametype['category']
-        cat2 = hand2.gametype['category']
-        if cat1 < cat2:
-            return -1
-        elif cat1 > cat2:
-            return 1
-
-        a = self.rankedhand(model.get_value(iter1, 0), hand1.gametype['category'])
-        b = self.rankedhand(model.get_value(iter2, 0), hand2.gametype['category'])
-        
-        if a < b:
-            return -1
-        elif a > b:
-            return 1
-
-        return 0
+    def sorthand(self, hand, hero):
+        cards = ''
+        if hand.gametype['category'] == 'holdem':
+            cards = hand.join_holecards(hero)
+        return (hand.gametype['base'], hand.gametype['category'],
+                self.rankedhand(cards, hand.gametype['category']))
 
-    def sort_float(self, model, iter1, iter2, col):
-        a = float(model.get_value(iter1, col))
-        b = float(model.get_value(iter2, col))
+    def sort_net(self, hand, hero):
+        (won, bet) = self.won_and_bet(hand, hero)
+        return won - bet
 
-        if a < b:
-            return -1
-        elif a > b:
-            return 1
-        
-        return 0
+    def sort_bet(self, hand, hero):
+        return self.won_and_bet(hand, hero)[1]
     
-    def sort_pos(self, model, iter1, iter2, col):
-        a = self.__get_sortable_int_from_pos__(model.get_value(iter1, col))
-        b = self.__get_sortable_int_from_pos__(model.get_value(iter2, col))
-        
-        if a < b:
-            return -1
-        elif a > b:
-            return 1
-        
-        return 0
+    def sort_pos(self, hand, hero):
+        return self.__get_sortable_int_from_pos__(hand.get_player_position(hero))
+
+    def sortcol(self, column, key):
+        """Sorts the list on a column, key(hand, hero) is the sort key of a hand.
+           The keys come from the hands, the rows aren't formatted to sort them."""
+        if column.get_sort_indicator() and column.get_sort_order() == gtk.SORT_ASCENDING:
+            column.set_sort_order(gtk.SORT_DESCENDING)
+        else:
+            column.set_sort_order(gtk.SORT_ASCENDING)
+        for c in self.view.get_columns():
+            c.set_sort_indicator(False)
+        column.set_sort_indicator(True)
+        model = self.liststore
+        heroes = self.filters.getHeroes()
+        def handkey(i):
+            hand = self.hands[model.rows[i]]
+            return key(hand, heroes[hand.sitename])
+        self.liststore = model.sorted(handkey, column.get_sort_order() == gtk.SORT_DESCENDING)
+        self.view.set_model(self.liststore)
         
     def __get_sortable_int_from_pos__(self, pos):
         if pos == 'B':
@@ -293,10 +301,28 @@ class GuiHandViewer:
             return int(pos)
     
     def reload_hands(self, handids):
+        # The first page of hands is shown right away, the others are added
+        # to the list while gtk is idle, IDLE_PAGE_SIZE hands at a time
         self.hands = {}
-        for handid in handids:
-            self.hands[handid] = self.importhand(handid)
+        handids = list(handids)
+        heroes = self.filters.getHeroes()
+        for hand in load_hands(handids[:HAND_PAGE_SIZE], self.config, self.db, heroes):
+            self.hands[hand.handid_selected] = hand
+        self.hand_pages = hand_pages(handids[HAND_PAGE_SIZE:], self.config, self.db, heroes, IDLE_PAGE_SIZE)
+        self.card_ids = self.get_card_filter_ids()
         self.refreshHands()
+        gobject.idle_add(self.load_next_page, self.hand_pages)
+
+    def load_next_page(self, pages):
+        if pages is not self.hand_pages:    # hands reloaded since
+            return False
+        page = next(pages, None)
+        if page is None:
+            return False
+        for hand in page:
+            self.hands[hand.handid_selected] = hand
+        self.addHandRows([(hand.handid_selected, hand) for hand in page])
+        return True
     
     def refreshHands(self):
         try:
@@ -321,7 +347,8 @@ class GuiHandViewer:
                   'Game'         : 9,
                   'HandId'       : 10,
                  }
-        self.liststore = gtk.ListStore(*([str] * len(self.colnum)))
+        # only the rows shown are formatted, all the hands are kept for the card filter
+        self.liststore = LazyListModel(len(self.colnum), [], self.handRow, None)
         self.view = gtk.TreeView()
         self.view.set_grid_lines(gtk.TREE_VIEW_GRID_LINES_BOTH)
         self.handsWindow.add(self.view)
@@ -346,94 +373,90 @@ class GuiHandViewer:
         self.view.insert_column_with_data_func(-1, 'Net', numcell, cash_renderer_cell_func, self.colnum['Net'])
         self.view.insert_column_with_data_func(-1, 'Game', textcell, reset_style_render_func ,self.colnum['Game'])
         
-        self.liststore.set_sort_func(self.colnum['Street0'], self.sorthand)
-        self.liststore.set_sort_func(self.colnum['Pos'], self.sort_pos, self.colnum['Pos'])
-        self.liststore.set_sort_func(self.colnum['Net'], self.sort_float, self.colnum['Net'])
-        self.liststore.set_sort_func(self.colnum['Bet'], self.sort_float, self.colnum['Bet'])
-        self.view.get_column(self.colnum['Street0']).set_sort_column_id(self.colnum['Street0'])
-        self.view.get_column(self.colnum['Net']).set_sort_column_id(self.colnum['Net'])
-        self.view.get_column(self.colnum['Bet']).set_sort_column_id(self.colnum['Bet'])
-        self.view.get_column(self.colnum['Pos']).set_sort_column_id(self.colnum['Pos'])
+        for (name, key) in (('Street0', self.sorthand), ('Pos', self.sort_pos),
+                            ('Net', self.sort_net), ('Bet', self.sort_bet)):
+            column = self.view.get_column(self.colnum[name])
+            column.set_clickable(True)
+            column.connect('clicked', self.sortcol, key)
 
         #selection = self.view.get_selection()
         #selection.set_select_function(self.select_hand, None, True)     #listen on selection (single click)
         self.view.connect('row-activated', self.row_activated)           #listen to double klick
 
-        for handid, hand in self.hands.items():
-            hero = self.filters.getHeroes()[hand.sitename]
-            won = 0
-            if hero in hand.collectees.keys():
-                won = hand.collectees[hero]
-            bet = 0
-            if hero in hand.pot.committed.keys():
-                bet = hand.pot.committed[hero]
-            net = won - bet
-            pos = hand.get_player_position(hero)
-            gt =  hand.gametype['category']
-            row = []
-            if hand.gametype['base'] == 'hold':
-                board =  []
-                board.extend(hand.board['FLOP'])
-                board.extend(hand.board['TURN'])
-                board.extend(hand.board['RIVER'])
-                
-                pre_actions = hand.get_actions_short(hero, 'PREFLOP')
-                post_actions = ''
-                if 'F' not in pre_actions:      #if player hasen't folded preflop
-                    post_actions = hand.get_actions_short_streets(hero, 'FLOP', 'TURN', 'RIVER')
-                
-                row = [hand.getStakesAsString(), pos, hand.join_holecards(hero), pre_actions, ' '.join(board), post_actions, str(won), str(bet), 
-                       str(net), gt, handid]
-                
-            elif hand.gametype['base'] == 'stud':
-                third = " ".join(hand.holecards['THIRD'][hero][0]) + " " + " ".join(hand.holecards['THIRD'][hero][1]) 
-                #ugh - fix the stud join_holecards function so we can retrieve sanely
-                later_streets= []
-                later_streets.extend(hand.holecards['FOURTH'] [hero][0])
-                later_streets.extend(hand.holecards['FIFTH']  [hero][0])
-                later_streets.extend(hand.holecards['SIXTH']  [hero][0])
-                later_streets.extend(hand.holecards['SEVENTH'][hero][0])
-                
-                pre_actions = hand.get_actions_short(hero, 'THIRD')
-                post_actions = ''
-                if 'F' not in pre_actions:
-                    post_actions = hand.get_actions_short_streets(hero, 'FOURTH', 'FIFTH', 'SIXTH', 'SEVENTH')
-                    
-                row = [hand.getStakesAsString(), pos, third, pre_actions, ' '.join(later_streets), post_actions, str(won), str(bet), str(net), 
-                       gt, handid]
-                
-            elif hand.gametype['base'] == 'draw':
-                row = [hand.getStakesAsString(), pos, hand.join_holecards(hero,street='DEAL'), hand.get_actions_short(hero, 'DEAL'), None, None, 
-                       str(won), str(bet), str(net), gt, handid]
-            
-            if self.is_row_in_card_filter(row):
-                self.liststore.append(row)
+        self.addHandRows(self.hands.items())
         #self.viewfilter.set_visible_func(self.viewfilter_visible_cb)
         self.handsWindow.show_all()
 
-    def filter_cards_cb(self, card):
-        if hasattr(self, 'hands'):     #Do not call refresh if only filters are refreshed and no hands have been loaded yet
-            self.refreshHands()
-        #self.viewfilter.refilter()    #As the sorting doesnt work if this is used, a refresh is needed.
-
-    def is_row_in_card_filter(self, row):
-        """ Returns true if the cards of the given row are in the card filter """
-        #Does work but all cards that should NOT be displayed have to be clicked.
-        card_filter = self.filters.getCards() 
-        hcs = row[self.colnum['Street0']].split(' ')
-        
-        if '0x' in hcs:      #if cards are unknown return True
-            return True
+    def addHandRows(self, hands):
+        """Appends the (handid, hand) pairs in hands to the list"""
+        for handid, hand in hands:
+            self.liststore.append(handid, self.card_ids is None or handid in self.card_ids)
+
+    def won_and_bet(self, hand, hero):
+        """Returns what hero won and bet in a hand"""
+        won = 0
+        if hero in hand.collectees.keys():
+            won = hand.collectees[hero]
+        bet = 0
+        if hero in hand.pot.committed.keys():
+            bet = hand.pot.committed[hero]
+        return (won, bet)
+
+    def handRow(self, handid):
+        """Returns the columns of the list for a hand"""
+        hand = self.hands[handid]
+        hero = self.filters.getHeroes()[hand.sitename]
+        (won, bet) = self.won_and_bet(hand, hero)
+        net = won - bet
+        pos = hand.get_player_position(hero)
+        gt =  hand.gametype['category']
+        row = []
+        if hand.gametype['base'] == 'hold':
+            board =  []
+            board.extend(hand.board['FLOP'])
+            board.extend(hand.board['TURN'])
+            board.extend(hand.board['RIVER'])
+            
+            pre_actions = hand.get_actions_short(hero, 'PREFLOP')
+            post_actions = ''
+            if 'F' not in pre_actions:      #if player hasen't folded preflop
+                post_actions = hand.get_actions_short_streets(hero, 'FLOP', 'TURN', 'RIVER')
+            
+            row = [hand.getStakesAsString(), pos, hand.join_holecards(hero), pre_actions, ' '.join(board), post_actions, str(won), str(bet), 
+                   str(net), gt, str(handid)]
+            
+        elif hand.gametype['base'] == 'stud':
+            third = " ".join(hand.holecards['THIRD'][hero][0]) + " " + " ".join(hand.holecards['THIRD'][hero][1]) 
+            #ugh - fix the stud join_holecards function so we can retrieve sanely
+            later_streets= []
+            later_streets.extend(hand.holecards['FOURTH'] [hero][0])
+            later_streets.extend(hand.holecards['FIFTH']  [hero][0])
+            later_streets.extend(hand.holecards['SIXTH']  [hero][0])
+            later_streets.extend(hand.holecards['SEVENTH'][hero][0])
+            
+            pre_actions = hand.get_actions_short(hero, 'THIRD')
+            post_actions = ''
+            if 'F' not in pre_actions:
+                post_actions = hand.get_actions_short_streets(hero, 'FOURTH', 'FIFTH', 'SIXTH', 'SEVENTH')
+                
+            row = [hand.getStakesAsString(), pos, third, pre_actions, ' '.join(later_streets), post_actions, str(won), str(bet), str(net), 
+                   gt, str(handid)]
+            
+        elif hand.gametype['base'] == 'draw':
+            row = [hand.getStakesAsString(), pos, hand.join_holecards(hero,street='DEAL'), hand.get_actions_short(hero, 'DEAL'), None, None, 
+                   str(won), str(bet), str(net), gt, str(handid)]
         
-        gt = row[self.colnum['Game']]
+        return row
 
-        if gt not in ('holdem', 'omahahi', 'omahahilo'): return True
-        # Holdem: Compare the real start cards to the selected filter (ie. AhKh = AKs)
-        value1 = Card.card_map[hcs[0][0]]
-        value2 = Card.card_map[hcs[1][0]]
-        idx = Card.twoStartCards(value1, hcs[0][1], value2, hcs[1][1])
-        abbr = Card.twoStartCardString(idx)
-        return False if card_filter[abbr] == False else True
+    def filter_cards_cb(self, card):
+        if hasattr(self, 'hands'):     #Do not filter if only filters are refreshed and no hands have been loaded yet
+            # the database tells which hands are in the card filter, the rows of all
+            # the hands are kept in the model, only which are shown changes
+            self.card_ids = self.get_card_filter_ids()
+            ids = self.card_ids
+            model = self.liststore
+            self.liststore = model.filtered(lambda i: ids is None or model.rows[i] in ids)
+            self.view.set_model(self.liststore)
 
     #def select_hand(self, selection, model, path, is_selected, userdata):    #function head for single click event
     def row_activated(self, view, path, column):
@@ -461,33 +484,8 @@ class GuiHandViewer:
 
 
     def importhand(self, handid=1):
-        # Fetch hand info
-        # We need at least sitename, gametype, handid
-        # for the Hand.__init__
-
-        ####### Shift this section in Database.py for all to use ######
-        q = self.sql.query['get_gameinfo_from_hid']
-        q = q.replace('%s', self.sql.query['placeholder'])
-
-        c = self.db.get_cursor()
-
-        c.execute(q, (handid,))
-        res = c.fetchone()
-        gametype = {'category':res[1],'base':res[2],'type':res[3],'limitType':res[4],'hilo':res[5],'sb':res[6],'bb':res[7], 'currency':res[10]}
-        #FIXME: smallbet and bigbet are res[8] and res[9] respectively
-        ###### End section ########
-        if gametype['base'] == 'hold':
-            h = HoldemOmahaHand(config = self.config, hhc = None, sitename=res[0], gametype = gametype, handText=None, builtFrom = "DB", handid=handid)
-        elif gametype['base'] == 'stud':
-            h = StudHand(config = self.config, hhc = None, sitename=res[0], gametype = gametype, handText=None, builtFrom = "DB", handid=handid)
-        elif gametype['base'] == 'draw':
-            h = DrawHand(config = self.config, hhc = None, sitename=res[0], gametype = gametype, handText=None, builtFrom = "DB", handid=handid)
-
-        # Set the hero for this hand using the filter for the sitename of this hand
-        h.hero = self.filters.getHeroes()[res[0]]
-
-        h.select(self.db, handid)
-        return h
+        # The hero for this hand is set using the filter for the sitename of this hand
+        return load_hands([handid], self.config, self.db, self.filters.getHeroes())[0]
 
     '''
     #This code would use pango markup instead of pix for the cards and renderers
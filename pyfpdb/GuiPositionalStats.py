@@ -390,7 +390,6 @@ class GuiPositionalStats (threading.Thread):
             query = query.replace("<selectgt.bigBlind>", bigblindselect)
             query = query.replace("<groupbygt.bigBlind>", "")
             query = query.replace("<hcgametypeId>", "-1")
-            query = query.replace("<hgametypeId>", "-1")
         else:
             if self.db.backend == self.MYSQL_INNODB:
                 bigblindselect = """concat('$', trim(leading ' ' from
@@ -411,7 +410,6 @@ class GuiPositionalStats (threading.Thread):
             query = query.replace("<selectgt.bigBlind>", bigblindselect)
             query = query.replace("<groupbygt.bigBlind>", ",gt.bigBlind")
             query = query.replace("<hcgametypeId>", "hc.gametypeId")
-            query = query.replace("<hgametypeId>", "h.gametypeId")
 
         # Filter on dates
         query = query.replace("<datestest>", " between '" + dates[0] + "' and '" + dates[1] + "'")
@@ -27,6 +27,7 @@ import Database
 import SQL
 import fpdb_import
 import Deck
+import ICM
 
 import pygtk
 pygtk.require('2.0')
@@ -304,8 +305,7 @@ class GuiReplayer:
         # for the Hand.__init__
 
         ####### Shift this section in Database.py for all to use ######
-        q = self.sql.query['get_gameinfo_from_hid']
-        q = q.replace('%s', self.sql.query['placeholder'])
+        q = self.db.query('get_gameinfo_from_hid')
 
         c = self.db.get_cursor()
 
@@ -352,32 +352,6 @@ class GuiReplayer:
                 self.state.set_value(i)
                 break
 
-# ICM code originally grabbed from http://svn.gna.org/svn/pokersource/trunk/icm-calculator/icm-webservice.py
-# Copyright (c) 2008 Thomas Johnson <tomfmason@gmail.com>
-
-class ICM:
-    def __init__(self, stacks, payouts):
-        self.stacks = stacks
-        self.payouts = payouts
-        self.equities = []
-        self.prepare()
-    def prepare(self):
-        total = sum(self.stacks)
-        for k,v in enumerate(stacks):
-            self.equities.append(round(Decimal(str(self.getEquities(total, k,0))),4))
-    def getEquities(self, total, player, depth):
-        D = Decimal
-        eq = D(self.stacks[player]) / total * D(str(self.payouts[depth]))
-        if(depth + 1 < len(self.payouts)):
-            i=0
-            for stack in self.stacks:
-                if i != player and stack > 0.0:
-                    self.stacks[i] = 0.0
-                    eq += self.getEquities((total - stack), player, (depth + 1)) * (stack / D(total))
-                    self.stacks[i] = stack
-                i += 1
-        return eq
-
 class TableState:
     def __init__(self, hand):
         self.pot = Decimal(0)
@@ -391,8 +365,7 @@ class TableState:
         self.called = Decimal(0)
         self.gametype = hand.gametype['category']
         # NOTE: Need a useful way to grab payouts
-        #self.icm = ICM(stacks,payouts)
-        #print icm.equities
+        #self.equities = ICM.equities(stacks, payouts)
 
         self.players = {}
 
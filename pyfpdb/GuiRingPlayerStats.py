@@ -33,6 +33,7 @@ import Database
 import Filters
 import Charset
 import GuiPlayerStats
+from LazyListModel import LazyListModel
 
 from TreeViewTooltips import TreeViewTooltips
 
@@ -106,8 +107,10 @@ class GuiRingPlayerStats (GuiPlayerStats.GuiPlayerStats):
         self.main_window = mainwin
         self.sql = querylist
         
-        self.liststore = []   # gtk.ListStore[]         stores the contents of the grids
+        self.liststore = []   # LazyListModel[]         stores the contents of the grids
         self.listcols = []    # gtk.TreeViewColumn[][]  stores the columns in the grids
+        self.listviews = []   # gtk.TreeView[]          shows the grids
+        self.gridqueries = [] # [(query, colnames)]     the query of each grid, re-run to sort it
 
         self.MYSQL_INNODB   = 2
         self.PGSQL          = 3
@@ -237,6 +240,8 @@ class GuiRingPlayerStats (GuiPlayerStats.GuiPlayerStats):
         except AttributeError: pass
         self.liststore = []
         self.listcols = []
+        self.listviews = []
+        self.gridqueries = []
         self.stats_vbox = gtk.VPaned()
         self.stats_vbox.show()
         self.stats_frame.add(self.stats_vbox)
@@ -336,7 +341,7 @@ class GuiRingPlayerStats (GuiPlayerStats.GuiPlayerStats):
             # Detailed table
             flags[0] = True
             flags[2] = 1
-            self.addGrid(swin2, 'playerDetailedStats', flags, playerids
+            self.addGrid(swin2, self.holecardsQuery(playerids), flags, playerids
                         ,sitenos, limits, type, seats, groups, dates, games, currencies)
 
         if self.height_inc is None:
@@ -372,33 +377,14 @@ class GuiRingPlayerStats (GuiPlayerStats.GuiPlayerStats):
 
         return
 
-    def sortnums(self, model, iter1, iter2, nums):
-        ret = 0
+    def sortkey(self, value, nums):
         (n, grid) = nums
-        a = self.liststore[grid].get_value(iter1, n)
-        b = self.liststore[grid].get_value(iter2, n)
-        if 'f' in self.cols_to_show[n][4]:
-            try:     a = float(a)
-            except:  a = 0.0
-            try:     b = float(b)
-            except:  b = 0.0
         if n == 0 and grid == 1: #make sure it only works on the starting hands
-            a1,a2,a3 = ranks[a[0]], ranks[a[1]], (a+'o')[2]
-            b1,b2,b3 = ranks[b[0]], ranks[b[1]], (b+'o')[2]
-            if a1 > b1 or ( a1 == b1 and (a2 > b2 or (a2 == b2 and a3 > b3) ) ):
-                ret = 1
-            else:
-                ret = -1
-        else:
-            if a < b:
-                ret = -1
-            elif a == b:
-                ret = 0
-            else:
-                ret = 1
-        #print "n =", n, "iter1[n] =", self.liststore[grid].get_value(iter1,n), "iter2[n] =", self.liststore[grid].get_value(iter2,n), "ret =", ret
-
-        return(ret)
+            return (ranks[value[0]], ranks[value[1]], (value+'o')[2])
+        if 'f' in self.cols_to_show[n][4]:
+            try:     return float(value)
+            except:  return 0.0
+        return value
 
     def sortcols(self, col, nums):
         try:
@@ -408,8 +394,21 @@ class GuiRingPlayerStats (GuiPlayerStats.GuiPlayerStats):
                 col.set_sort_order(gtk.SORT_DESCENDING)
             else:
                 col.set_sort_order(gtk.SORT_ASCENDING)
-            self.liststore[grid].set_sort_column_id(n, col.get_sort_order())
-            self.liststore[grid].set_sort_func(n, self.sortnums, (n,grid))
+            desc = col.get_sort_order() == gtk.SORT_DESCENDING
+            model = self.liststore[grid]
+            (query, colnames) = self.gridqueries[grid]
+            alias = self.cols_to_show[n][colalias]
+            if alias in colnames and 'order by' in query:
+                # let the database sort the raw values, the old order breaks ties
+                (select, order) = query.rsplit('order by', 1)
+                self.cursor.execute(select + 'order by ' + alias + (' desc' if desc else '') + '\n,' + order)
+                model = LazyListModel(model.n_columns, self.cursor.fetchall(), model.format_row, model.cache_size)
+                self.db.rollback()
+            else:
+                # columns made up from several values are sorted on their text
+                model = model.sorted(lambda i: self.sortkey(model.get_row(i)[n], nums), desc)
+            self.liststore[grid] = model
+            self.listviews[grid].set_model(model)
             for i in xrange(len(self.listcols[grid])):
                 self.listcols[grid][i].set_sort_indicator(False)
             self.listcols[grid][n].set_sort_indicator(True)
@@ -422,15 +421,21 @@ class GuiRingPlayerStats (GuiPlayerStats.GuiPlayerStats):
     #end def sortcols
     
 
+    def holecardsQuery(self, playerids):
+        """Returns the query of the hole cards grid: CardsCache holds the hands of the
+           heroes, it can't apply the hand filters of the detail dialog"""
+        if self.detailFilters or not set(playerids) <= set(self.db.get_heroes()):
+            return 'playerDetailedStats'
+        return 'playerDetailedStatsCards'
+    #end def holecardsQuery
+
     def addGrid(self, vbox, query, flags, playerids, sitenos, limits, type, seats, groups, dates, games, currencies):
-        counter = 0
-        row = 0
-        sqlrow = 0
         if not flags:  holecards,grid = False,0
         else:          holecards,grid = flags[0],flags[2]
 
         tmp = self.sql.query[query]
-        tmp = self.refineQuery(tmp, flags, playerids, sitenos, limits, type, seats, groups, dates, games, currencies)
+        tmp = self.refineQuery(tmp, flags, playerids, sitenos, limits, type, seats, groups, dates, games, currencies
+                              ,cached = query == 'playerDetailedStatsCards')
         #print "DEBUG: query: %s" % tmp
         self.cursor.execute(tmp)
         result = self.cursor.fetchall()
@@ -440,11 +445,15 @@ class GuiRingPlayerStats (GuiPlayerStats.GuiPlayerStats):
         colshow = colshowsumm
         if groups['posn']:  colshow = colshowposn 
         self.cols_to_show = [x for x in self.columns if x[colshow]]
-        hgametypeid_idx = colnames.index('hgametypeid')
+        cols_to_show = self.cols_to_show
 
+        # rows are only formatted when they are shown
         assert len(self.liststore) == grid, "len(self.liststore)="+str(len(self.liststore))+" grid-1="+str(grid)
-        self.liststore.append( gtk.ListStore(*([str] * len(self.cols_to_show))) )
+        self.liststore.append(LazyListModel(len(cols_to_show), result,
+                              lambda sqlrow: self.formatRow(sqlrow, colnames, cols_to_show, holecards)))
+        self.gridqueries.append((tmp, colnames))
         view = gtk.TreeView(model=self.liststore[grid])
+        self.listviews.append(view)
         view.set_grid_lines(gtk.TREE_VIEW_GRID_LINES_BOTH)
         #vbox.pack_start(view, expand=False, padding=3)
         vbox.add(view)
@@ -490,49 +499,6 @@ class GuiRingPlayerStats (GuiPlayerStats.GuiPlayerStats):
             else:
                 self.listcols[grid][col].set_cell_data_func(cellrend, self.reset_style_render_func)
 
-        rows = len(result) # +1 for title row
-
-        while sqlrow < rows:
-            treerow = []
-            for col,column in enumerate(self.cols_to_show):
-                if column[colalias] in colnames:
-                    value = result[sqlrow][colnames.index(column[colalias])]
-                    if column[colalias] == 'plposition':
-                        if value == 'B':
-                            value = 'BB'
-                        elif value == 'S':
-                            value = 'SB'
-                        elif value == '0':
-                            value = 'Btn'
-                else:
-                    if column[colalias] == 'game':
-                        if holecards:
-                            value = Card.decodeStartHandValue(result[sqlrow][colnames.index('category')], result[sqlrow][hgametypeid_idx] )
-                        else:
-                            minbb = result[sqlrow][colnames.index('minbigblind')]
-                            maxbb = result[sqlrow][colnames.index('maxbigblind')]
-                            value = result[sqlrow][colnames.index('limittype')] + ' ' \
-                                    + result[sqlrow][colnames.index('category')].title() + ' ' \
-                                    + result[sqlrow][colnames.index('name')] + ' $'
-                            if 100 * int(minbb/100.0) != minbb:
-                                value += '%.2f' % (minbb/100.0)
-                            else:
-                                value += '%.0f' % (minbb/100.0)
-                            if minbb != maxbb:
-                                if 100 * int(maxbb/100.0) != maxbb:
-                                    value += ' - $' + '%.2f' % (maxbb/100.0)
-                                else:
-                                    value += ' - $' + '%.0f' % (maxbb/100.0)
-                    else:
-                        continue
-                if value != None and value != -999:
-                    treerow.append(column[colformat] % value)
-                else:
-                    treerow.append(' ')
-            iter = self.liststore[grid].append(treerow)
-            #print treerow
-            sqlrow += 1
-            row += 1
         tips = DemoTips(column[colformat])
         tips.add_view(view)     
 
@@ -544,8 +510,54 @@ class GuiRingPlayerStats (GuiPlayerStats.GuiPlayerStats):
             #print "saved ", self.top_pane_height
     #end def addGrid
 
-    def refineQuery(self, query, flags, playerids, sitenos, limits, type, seats, groups, dates, games, currencies):
+    def formatRow(self, sqlrow, colnames, cols_to_show, holecards):
+        """Returns the strings shown in the grid for a row of the query"""
+        treerow = []
+        for col,column in enumerate(cols_to_show):
+            if column[colalias] in colnames:
+                value = sqlrow[colnames.index(column[colalias])]
+                if column[colalias] == 'plposition':
+                    if value == 'B':
+                        value = 'BB'
+                    elif value == 'S':
+                        value = 'SB'
+                    elif value == '0':
+                        value = 'Btn'
+            else:
+                if column[colalias] == 'game':
+                    if holecards:
+                        value = Card.decodeStartHandValue(sqlrow[colnames.index('category')], sqlrow[colnames.index('hgametypeid')] )
+                    else:
+                        minbb = sqlrow[colnames.index('minbigblind')]
+                        maxbb = sqlrow[colnames.index('maxbigblind')]
+                        value = sqlrow[colnames.index('limittype')] + ' ' \
+                                + sqlrow[colnames.index('category')].title() + ' ' \
+                                + sqlrow[colnames.index('name')] + ' $'
+                        if 100 * int(minbb/100.0) != minbb:
+                            value += '%.2f' % (minbb/100.0)
+                        else:
+                            value += '%.0f' % (minbb/100.0)
+                        if minbb != maxbb:
+                            if 100 * int(maxbb/100.0) != maxbb:
+                                value += ' - $' + '%.2f' % (maxbb/100.0)
+                            else:
+                                value += ' - $' + '%.0f' % (maxbb/100.0)
+                else:
+                    continue
+            if value != None and value != -999:
+                treerow.append(column[colformat] % value)
+            else:
+                treerow.append(' ')
+        return treerow
+    #end def formatRow
+
+    def refineQuery(self, query, flags, playerids, sitenos, limits, type, seats, groups, dates, games, currencies, cached = False):
         having = ''
+        # the hole cards query of CardsCache hc (cached) has no HandsPlayers hp or Hands h
+        if cached:
+            (hpalias, seatscol) = ('hc.', 'hc.activeSeats')
+        else:
+            (hpalias, seatscol) = ('hp.', 'h.seats')
         if not flags:
             holecards = False
             numhands = 0
@@ -631,8 +643,8 @@ class GuiRingPlayerStats (GuiPlayerStats.GuiPlayerStats):
         if seats:
             query = query.replace('<seats_test>', 'between ' + str(seats['from']) + ' and ' + str(seats['to']))
             if 'show' in seats and seats['show']:
-                query = query.replace('<groupbyseats>', ',h.seats')
-                query = query.replace('<orderbyseats>', ',h.seats')
+                query = query.replace('<groupbyseats>', ',' + seatscol)
+                query = query.replace('<orderbyseats>', ',' + seatscol)
             else:
                 query = query.replace('<groupbyseats>', '')
                 query = query.replace('<orderbyseats>', '')
@@ -646,11 +658,11 @@ class GuiRingPlayerStats (GuiPlayerStats.GuiPlayerStats):
         query = query.replace("<gtbigBlind_test>", bbtest)
 
         if holecards:  # re-use level variables for hole card query
-            query = query.replace("<hgametypeId>", "hp.startcards")
+            query = query.replace("<hgametypeId>", hpalias + "startcards")
             query = query.replace("<orderbyhgametypeId>"
-                                 , ",case when floor((hp.startcards-1)/13) >= mod((hp.startcards-1),13) then hp.startcards + 0.1 "
+                                 , (",case when floor((hp.startcards-1)/13) >= mod((hp.startcards-1),13) then hp.startcards + 0.1 "
                                    +    " else 13*mod((hp.startcards-1),13) + floor((hp.startcards-1)/13) + 1 "
-                                   +    " end desc ")
+                                   +    " end desc ").replace('hp.', hpalias))
         else:
             query = query.replace("<orderbyhgametypeId>", "")
             groupLevels = "show" not in str(limits)
@@ -673,7 +685,7 @@ class GuiRingPlayerStats (GuiPlayerStats.GuiPlayerStats):
 
             for filter in self.cardsFilters:
                 cardstests.append(filter)
-            cardstests = ''.join(('and (', ' or '.join(cardstests), ')'))
+            cardstests = ''.join(('and (', ' or '.join(cardstests), ')')).replace('hp.', hpalias)
         else:
             cardstests = ''
         query = query.replace("<cardstest>", cardstests)
@@ -683,14 +695,17 @@ class GuiRingPlayerStats (GuiPlayerStats.GuiPlayerStats):
         else:
             query = query.replace("<signed>", '')
 
-        # Filter on dates
+        # Filter on dates, CardsCache has the days of the hands as 'dyymmdd' styleKeys
+        if cached:
+            dates = (max(dates[0], '2000'), min(dates[1], '2099-12-31'))
+            dates = ['d' + date[2:4] + date[5:7] + date[8:10] for date in dates]
         query = query.replace("<datestest>", " between '" + dates[0] + "' and '" + dates[1] + "'")
 
         # Group by position?
         plposition_column = (x for x in self.columns if x[0] == 'plposition').next()
         if groups['posn']:
             #query = query.replace("<position>", "case hp.position when '0' then 'Btn' else hp.position end")
-            query = query.replace("<position>", "hp.position")
+            query = query.replace("<position>", hpalias + "position")
             plposition_column[colshow] = True
         else:
             query = query.replace("<position>", "gt.base")
@@ -35,6 +35,7 @@ import os
 import thread
 import time
 import string
+import socket
 import logging
 
 #    pyGTK modules
@@ -43,7 +44,8 @@ import gobject
 
 #    FreePokerTools modules
 import Configuration
-import Database
+import HudEngine
+import HudProtocol
 import Hud
 import Options
 import Deck
@@ -65,7 +67,7 @@ elif c.os_family in ('XP', 'Win7'):
 
 
 class HUD_main(object):
-    """A main() object to own both the read_stdin thread and the gui."""
+    """A main() object to own both the reading thread and the gui."""
 #    This class mainly provides state for controlling the multiple HUDs.
 
     def __init__(self, db_name='fpdb'):
@@ -88,9 +90,12 @@ class HUD_main(object):
                 deck_type=self.hud_params["deck_type"], card_back=self.hud_params["card_back"],
                 width=self.hud_params['card_wd'], height=self.hud_params['card_ht'])
 
-            # a thread to read stdin
+            # a thread to read the hands from the importer
             gobject.threads_init()                        # this is required
-            thread.start_new_thread(self.read_stdin, ())  # starts the thread
+            if options.hudport is not None:
+                thread.start_new_thread(self.read_socket, (options.hudport,))
+            else:
+                thread.start_new_thread(self.read_stdin, ())  # starts the thread
 
             # a main window
             self.main_window = gtk.Window()
@@ -162,225 +167,118 @@ class HUD_main(object):
         gobject.idle_add(idle_check_tables, self)
         return True
 
-    def create_HUD(self, new_hand_id, table, temp_key, max, poker_game, type, stat_dict, cards):
-        """type is "ring" or "tour" used to set hud_params"""
-
-        self.hud_dict[temp_key] = Hud.Hud(self, table, max, poker_game, type, self.config)
+    def create_HUD(self, new_hand_id, table, state):
+        """state is the HudEngine.TableState of the table"""
+        temp_key = state.key
+        self.hud_dict[temp_key] = Hud.Hud(self, table, state.max, state.poker_game, state.type, self.config)
         self.hud_dict[temp_key].table_name = temp_key
-        self.hud_dict[temp_key].stat_dict = stat_dict
-        self.hud_dict[temp_key].cards = cards
-        self.hud_dict[temp_key].max = max
+        self.hud_dict[temp_key].stat_dict = state.stat_dict
+        self.hud_dict[temp_key].cards = state.cards
+        self.hud_dict[temp_key].max = state.max
+        # the engine reads the params the HUD menus change
+        self.hud_dict[temp_key].hud_params = state.hud_params
         
         table.hud = self.hud_dict[temp_key]
         
-        # set agg_bb_mult so that aggregate_tour and aggregate_ring can be ignored,
-        # agg_bb_mult == 1 means no aggregation after these if statements:
-        if type == "tour" and self.hud_params['aggregate_tour'] == False:
-            self.hud_dict[temp_key].hud_params['agg_bb_mult'] = 1
-        elif type == "ring" and self.hud_params['aggregate_ring'] == False:
-            self.hud_dict[temp_key].hud_params['agg_bb_mult'] = 1
-        if type == "tour" and self.hud_params['h_aggregate_tour'] == False:
-            self.hud_dict[temp_key].hud_params['h_agg_bb_mult'] = 1
-        elif type == "ring" and self.hud_params['h_aggregate_ring'] == False:
-            self.hud_dict[temp_key].hud_params['h_agg_bb_mult'] = 1
-        # sqlcoder: I forget why these are set to true (aren't they ignored from now on?)
-        # but I think it's needed:
-        self.hud_params['aggregate_ring'] = True
-        self.hud_params['h_aggregate_ring'] = True
-        # so maybe the tour ones should be set as well? does this fix the bug I see mentioned?
-        self.hud_params['aggregate_tour'] = True
-        self.hud_params['h_aggregate_tour'] = True
         #fixme - passing self.db_connection into another thread
         # is probably pointless. Note that the valid db_connection for
         # that thread is NOT realised until Hud.create() has been called
         [aw.update_data(new_hand_id, self.db_connection) for aw in self.hud_dict[temp_key].aux_windows]
-        gobject.idle_add(idle_create, self, new_hand_id, table, temp_key, max, poker_game, type, stat_dict, cards)
+        gobject.idle_add(idle_create, self, new_hand_id, table, temp_key, state.max, state.poker_game, state.type,
+                         state.stat_dict, state.cards)
 
     def update_HUD(self, new_hand_id, table_name, config):
         """Update a HUD gui from inside the non-gui read_stdin thread."""
         gobject.idle_add(idle_update, self, new_hand_id, table_name, config)
 
-    def read_stdin(self):            # This is the thread function
-        """Do all the non-gui heavy lifting for the HUD program."""
-
-#    This db connection is for the read_stdin thread only. It should not
+    def start_engine(self):
+        """Starts the HudEngine of the reading thread, returns False if there is nothing to do"""
+#    This db connection is for the reading thread only. It should not
 #    be passed to HUDs for use in the gui thread. HUD objects should not
 #    need their own access to the database, but should open their own
 #    if it is required.
-        self.db_connection = Database.Database(self.config)
-
-#       get hero's screen names and player ids
-        self.hero, self.hero_ids = {}, {}
-        found = False
-        
-        enabled_sites = self.config.get_supported_sites()
-        if not enabled_sites:
-            log.exception(_("No enabled sites found"))
-            self.db_connection.connection.rollback()
+        self.engine = HudEngine.HudEngine(self.config, self)
+        self.db_connection = self.engine.db_connection
+        if not self.engine.enabled_sites:
+            self.engine.close()
             self.destroy()
+            return False
+        return True
+
+    def read_stdin(self):            # This is the thread function
+        """Reads the new hand numbers from stdin, one per line, for the engine."""
+        if not self.start_engine():
             return
-        
-        aux_disabled_sites = []
-        for i in enabled_sites:
-            if not c.get_site_parameters(i)['aux_enabled']:
-                log.info(_("Aux disabled for site %s") % i)
-                aux_disabled_sites.append(i)
 
         while 1:    # wait for a new hand number on stdin
             new_hand_id = sys.stdin.readline()
             new_hand_id = string.rstrip(new_hand_id)
-            log.debug(_("Received hand no %s") % new_hand_id)
             if new_hand_id == "":           # blank line means quit
-                self.db_connection.connection.rollback()
+                self.engine.close()
                 self.destroy()
                 break # this thread is not always killed immediately with gtk.main_quit()
+            self.engine.process_hands([new_hand_id])
 
-#    The following block cannot be hoisted outside the while loop, because it would
-#    cause a problem when auto importing into an empty db.
-#    FIXME (corner-case): Because this block only executes once when the hud starts,
-#    if our hero plays at another site for the __first_time__ during that session,
-#     the hud won't display correctly, because the heroname isn't known yet.
-
-            if not found:
-                for site in enabled_sites:
-                    result = self.db_connection.get_site_id(site)
-                    if result:
-                        site_id = result[0][0]
-                        self.hero[site_id] = self.config.supported_sites[site].screen_name
-                        self.hero_ids[site_id] = self.db_connection.get_player_id(self.config, site, self.hero[site_id])
-                        if self.hero_ids[site_id] is not None:
-                            found = True
-                        else:
-                            self.hero_ids[site_id] = -1
-
-#        get basic info about the new hand from the db
-#        if there is a db error, complain, skip hand, and proceed
-            #log.info("HUD_main.read_stdin: " + _("Hand processing starting."))
-            try:
-                (table_name, max, poker_game, type, site_id, site_name, num_seats, tour_number, tab_number) = \
-                                self.db_connection.get_table_info(new_hand_id)
-            except Exception:
-                log.exception(_("database error: skipping %s") % new_hand_id)
-                continue
-            
-            # Do nothing if this site is on the ignore list
-            if site_name in aux_disabled_sites:
-                continue
+    def read_socket(self, port):      # This is the thread function with --hudport
+        """Reads the new hand numbers sent by the importer (HudProtocol.HudClient)
+           listening on port, for the engine."""
+        if not self.start_engine():
+            return
+        try:
+            sock = HudProtocol.connect(port, os.environ.get(HudProtocol.TOKEN_VARIABLE, ''))
+            HudProtocol.serve(sock, self.engine.process_hands)
+            sock.close()
+        except (socket.error, IOError):
+            log.exception(_("Error reading hands from port %s") % port)
+        self.engine.close()
+        self.destroy()
+
+#   HudEngine.HudListener, called in the reading thread
+
+    def create(self, new_hand_id, state):
+        """Creates the HUD of the table of state if its window is on the screen"""
+        table_kwargs = dict(table_name=state.table_name, tournament=state.tour_number, table_number=state.tab_number)
+        tablewindow = Tables.Table(self.config, state.site_name, **table_kwargs)
+        if tablewindow.number is None:
+#        If no client window is found on the screen, complain and continue
+            table_name = state.table_name
+            if state.type == "tour":
+                table_name = "%s %s" % (state.tour_number, state.tab_number)
+            log.error(_("HUD create: table name %s not found, skipping.") % table_name)
+            return False
+        tablewindow.key = state.key
+        tablewindow.max = state.max
+        tablewindow.site = state.site_name
+        self.create_HUD(new_hand_id, tablewindow, state)
+        self.check_table_no(state)
+        return True
 
+    def update(self, new_hand_id, state):
+        try:
+            hud = self.hud_dict[state.key]
+        except KeyError:    # HUD instance has been killed off, key is stale
+            log.error(_('%s was not found') % ("hud_dict[%s]" % state.key))
+            log.error(_('will not send hand'))
+            return
+        hud.stat_dict = state.stat_dict
+        hud.cards = state.cards
+        #fixme - passing self.db_connection into another thread
+        # is probably pointless
+        [aw.update_data(new_hand_id, self.db_connection) for aw in hud.aux_windows]
+        self.update_HUD(new_hand_id, state.key, self.config)
+        self.check_table_no(state)
+
+    def kill(self, state):
+        self.kill_hud("activate", state.key)   # kill everything
+        while state.key in self.hud_dict: time.sleep(0.5)   # wait for idle_kill to complete
+
+    def check_table_no(self, state):
+        if state.type == "tour":
+            try:
+                self.hud_dict[state.key].table.check_table_no(self.hud_dict[state.key])
+            except KeyError:
+                pass
 
-            # Have we moved tables in a tournament?
-            # Check if our table from last hand still exists;
-            #  if it does not, then a table-move has taken place
-            #  so we must kill-off the existing hud
-            # Note that kill+restart will reset the aggregation settings
-                                
-            if type == "tour":
-                try:
-                    if temp_key in self.hud_dict:
-                        if unicode(tablewindow.table) != tab_number:  # tab_number is unicode, tablewindow.table is not :(
-                            log.info(_("Table number changed: %s %s >>> %s") % (str(tour_number),str(tablewindow.table),str(tab_number)))
-                            try:
-                                self.kill_hud("activate", temp_key)   # kill everything
-                                while temp_key in self.hud_dict: time.sleep(0.5)   # wait for idle_kill to complete
-                            except: continue
-                except: pass
-                
-            # regenerate temp_key
-            if type == "tour":   # hand is from a tournament
-                temp_key = "%s Table %s" % (tour_number, tab_number)
-            else:
-                temp_key = table_name
-        
-#       detect maxseats changed in hud
-#       if so, kill and create new hud with specified "max"
-            if temp_key in self.hud_dict:
-                try:
-                    newmax = self.hud_dict[temp_key].hud_params['new_max_seats']  # trigger
-                    if newmax and self.hud_dict[temp_key].max != newmax:  # max has changed
-                        self.kill_hud("activate", temp_key)   # kill everything
-                        while temp_key in self.hud_dict: time.sleep(0.5)   # wait for idle_kill to complete
-                        max = newmax   # "max" localvar used in create_HUD call below
-                    self.hud_dict[temp_key].hud_params['new_max_seats'] = None   # reset trigger
-                except:
-                    pass
-                    
-#       detect poker_game changed in latest hand (i.e. mixed game)
-#       if so, kill and create new hud with specified poker_game
-#       Note that this will reset the aggretation params for that table
-            if temp_key in self.hud_dict:
-                if self.hud_dict[temp_key].poker_game != poker_game:
-                    print "game changed!:", poker_game
-                    try:
-                        self.kill_hud("activate", temp_key)   # kill everything
-                        while temp_key in self.hud_dict: time.sleep(0.5)   # wait for idle_kill to complete
-                    except:
-                        pass
-
-#        Update an existing HUD
-            if temp_key in self.hud_dict:
-                # get stats using hud's specific params and get cards
-                self.db_connection.init_hud_stat_vars( self.hud_dict[temp_key].hud_params['hud_days']
-                                                     , self.hud_dict[temp_key].hud_params['h_hud_days'])
-                #print "update an existing hud ", temp_key, self.hud_dict[temp_key].hud_params
-                stat_dict = self.db_connection.get_stats_from_hand(new_hand_id, type, self.hud_dict[temp_key].hud_params,
-                                                                   self.hero_ids[site_id], num_seats)
-
-                try:
-                    self.hud_dict[temp_key].stat_dict = stat_dict
-                except KeyError:    # HUD instance has been killed off, key is stale
-                    log.error(_('%s was not found') % ("hud_dict[%s]" % temp_key))
-                    log.error(_('will not send hand'))
-                    # Unlocks table, copied from end of function
-                    self.db_connection.connection.rollback()
-                    return
-
-                self.hud_dict[temp_key].cards = self.get_cards(new_hand_id, poker_game)
-                #fixme - passing self.db_connection into another thread
-                # is probably pointless
-                [aw.update_data(new_hand_id, self.db_connection) for aw in self.hud_dict[temp_key].aux_windows]
-                self.update_HUD(new_hand_id, temp_key, self.config)
-
-#        Or create a new HUD
-            else:
-                # get stats using default params--also get cards
-
-                self.db_connection.init_hud_stat_vars( self.hud_params['hud_days'], self.hud_params['h_hud_days'] )
-                stat_dict = self.db_connection.get_stats_from_hand(new_hand_id, type, self.hud_params,
-                                                                   self.hero_ids[site_id], num_seats)
-                cards = self.get_cards(new_hand_id, poker_game)
-                table_kwargs = dict(table_name=table_name, tournament=tour_number, table_number=tab_number)
-                tablewindow = Tables.Table(self.config, site_name, **table_kwargs)
-                if tablewindow.number is None:
-#        If no client window is found on the screen, complain and continue
-                    if type == "tour":
-                        table_name = "%s %s" % (tour_number, tab_number)
-                    log.error(_("HUD create: table name %s not found, skipping.") % table_name)
-                else:
-                    tablewindow.key = temp_key
-                    tablewindow.max = max
-                    tablewindow.site = site_name
-                    # Test that the table window still exists
-                    if hasattr(tablewindow, 'number'):
-                        self.create_HUD(new_hand_id, tablewindow, temp_key, max, poker_game, type, stat_dict, cards)
-                    else:
-                        log.error(_('Table "%s" no longer exists') % table_name)
-                        self.db_connection.connection.rollback()
-                        return
-
-            if type == "tour":
-                try:
-                    self.hud_dict[temp_key].table.check_table_no(self.hud_dict[temp_key])
-                except KeyError:
-                    pass
-        
-        self.db_connection.connection.rollback()
-
-    def get_cards(self, new_hand_id, poker_game):
-        cards = self.db_connection.get_cards(new_hand_id)
-        if poker_game in ['holdem','omahahi','omahahilo']:
-            comm_cards = self.db_connection.get_common_cards(new_hand_id)
-            cards['common'] = comm_cards['common']
-        return cards
 ######################################################################
 #   idle FUNCTIONS
 #
@@ -419,8 +317,10 @@ def idle_kill(hud_main, table):
         if table in hud_main.hud_dict:
             hud_main.vb.remove(hud_main.hud_dict[table].tablehudlabel)
 #            hud_main.hud_dict[table].main_window.destroy()
+            hud_main.hud_dict[table].table.unwatch()
             hud_main.hud_dict[table].kill()
             del(hud_main.hud_dict[table])
+            hud_main.engine.forget(table)
         hud_main.main_window.resize(1, 1)
     except:
         log.exception(_("Error killing HUD for table: %s.") % table.title)
@@ -441,6 +341,8 @@ def idle_create(hud_main, new_hand_id, table, temp_key, max, poker_game, type, s
         hud_main.hud_dict[temp_key].tablehudlabel = newlabel
         # call the hud.create method, apparently
         hud_main.hud_dict[temp_key].create(new_hand_id, hud_main.config, stat_dict)
+        # tables the window manager tells us about aren't polled in check_tables
+        hud_main.hud_dict[temp_key].table_watched = table.watch(hud_main.hud_dict[temp_key])
         for m in hud_main.hud_dict[temp_key].aux_windows:
             m.create() # create method of aux_window class (generally Mucked.aux_seats.create)
             m.update_gui(new_hand_id)
@@ -468,6 +370,8 @@ def idle_check_tables(hud_main):
     gtk.gdk.threads_enter()
     try:
         for hud in hud_main.hud_dict.keys():
+            if hud_main.hud_dict[hud].table_watched:
+                continue
             hud_main.hud_dict[hud].table.check_table(hud_main.hud_dict[hud])
     except:
         log.exception("Error checking tables.")
@@ -70,6 +70,7 @@ class Hand(object):
         self.cancelled = False
         self.dbid_hands = 0
         self.dbid_pids = None
+        self.equities = None        # (player, street, boardId) -> HandsStove ev the hand was stored with
         self.dbid_hpid = None
         self.dbid_gt = 0
         self.tablename = ""
@@ -149,6 +150,13 @@ class Hand(object):
         self.pot.setSym(self.sym)
         self.is_duplicate = False  # i.e. don't update hudcache if true
 
+    def __getstate__(self):
+        # Hands are pickled to send them from a parse process back to the
+        # importer; the Configuration stays behind and is set again by the receiver
+        state = self.__dict__.copy()
+        state['config'] = None
+        return state
+
     def __str__(self):
         vars = ( (_("BB"), self.bb),
                  (_("SB"), self.sb),
@@ -264,6 +272,9 @@ class Hand(object):
             self.tourneyTypeId = db.getSqlTourneyTypeIDs(self)
             self.tourneyId = db.getSqlTourneyIDs(self)
             self.tourneysPlayersIds = db.getSqlTourneysPlayersIDs(self)
+            if self.stats.handsplayers:
+                # assembleHand() already ran in a parse process, fill in the ids
+                self.stats.assembleTourneyIds(self)
         
     def assembleHand(self):
         self.stats.getStats(self)
@@ -305,7 +316,9 @@ class Hand(object):
     def insertHandsStove(self, db, doinsert = False):
         """ Function to inserts HandsActions into database"""
         if self.handsstove:
-            for hs in self.handsstove: hs[0] = self.dbid_hands
+            for hs in self.handsstove:
+                hs[0] = self.dbid_hands
+                hs[1] = self.dbid_pids[hs[1]]
         db.storeHandsStove(self.handsstove, doinsert)
 
     def updateHudCache(self, db, doinsert = False):
@@ -325,32 +338,57 @@ class Hand(object):
             db.updateTourneysPlayersSessions(self.dbid_pids, self.tourneyId, self.startTime, self.handsplayers, heroes, doinsert)
             
     def updateCardsCache(self, db, doinsert = False):
-        """ Function to update the HandsCache"""
+        """ Function to update the CardsCache"""
         heroes = []
         if self.hero in self.dbid_pids: 
             heroes = [self.dbid_pids[self.hero]]
-        db.storeCardsCache(self.gametype, self.dbid_pids, heroes, self.handsplayers, doinsert)
+        db.storeCardsCache(self.dbid_gt, self.dbid_pids, self.startTime, heroes, self.handsplayers, doinsert)
                 
     def updatePositionsCache(self, db, doinsert = False):
         """ Function to update the PositionsCache"""
         heroes = []
         if self.hero in self.dbid_pids: 
             heroes = [self.dbid_pids[self.hero]]
-        db.storePositionsCache(self.gametype, self.dbid_pids, heroes, self.handsplayers, doinsert)
+        db.storePositionsCache(self.dbid_gt, self.dbid_pids, self.startTime, heroes, self.handsplayers, doinsert)
 
     def select(self, db, handId):
         """ Function to create Hand object from database """
         c = db.get_cursor()
-        q = db.sql.query['playerHand']
-        q = q.replace('%s', db.sql.query['placeholder'])
+        q = db.query('playerHand')
 
         # PlayerStacks
         c.execute(q, (handId,))
         # See NOTE: below on what this does.
 
         # Discripter must be set to lowercase as postgres returns all descriptors lower case and SQLight returns them as they are
-        res = [dict(line) for line in [zip([ column[0].lower() for column in c.description], row) for row in c.fetchall()]]
-        for row in res:
+        players = [dict(line) for line in [zip([ column[0].lower() for column in c.description], row) for row in c.fetchall()]]
+
+        # HandInfo
+        q = db.query('singleHand')
+        c.execute(q, (handId,))
+
+        # NOTE: This relies on row_factory = sqlite3.Row (set in connect() params)
+        #       Need to find MySQL and Postgres equivalents
+        #       MySQL maybe: cursorclass=MySQLdb.cursors.DictCursor
+        #res = c.fetchone()
+
+        # Using row_factory is global, and affects the rest of fpdb. The following 2 line achieves
+        # a similar result
+
+        # Discripter must be set to lowercase as supported dbs differ on what is returned.
+        info = [dict(line) for line in [zip([ column[0].lower() for column in c.description], row) for row in c.fetchall()]][0]
+
+        # Actions
+        q = db.query('handActions')
+        c.execute(q, (handId,))
+        
+        # Discripter must be set to lowercase as supported dbs differ on what is returned.
+        actions = [dict(line) for line in [zip([ column[0].lower() for column in c.description], row) for row in c.fetchall()]]
+        self.assembleFromRows(players, info, actions)
+
+    def assembleFromRows(self, players, info, actions):
+        """ Fills in the Hand from its playerHand, singleHand and handActions rows, see select() """
+        for row in players:
             #print "DEBUG: addPlayer(%s, %s, %s, %s)" %(row['seatno'],row['name'],row['chips'],row['position'])
             self.addPlayer(row['seatno'],row['name'],str(row['chips']), str(row['position']))
             cardlist = []
@@ -409,21 +447,7 @@ class Hand(object):
 
 
         # HandInfo
-        q = db.sql.query['singleHand']
-        q = q.replace('%s', db.sql.query['placeholder'])
-        c.execute(q, (handId,))
-
-        # NOTE: This relies on row_factory = sqlite3.Row (set in connect() params)
-        #       Need to find MySQL and Postgres equivalents
-        #       MySQL maybe: cursorclass=MySQLdb.cursors.DictCursor
-        #res = c.fetchone()
-
-        # Using row_factory is global, and affects the rest of fpdb. The following 2 line achieves
-        # a similar result
-
-        # Discripter must be set to lowercase as supported dbs differ on what is returned.
-        res = [dict(line) for line in [zip([ column[0].lower() for column in c.description], row) for row in c.fetchall()]]
-        res = res[0]
+        res = info
 
         #res['tourneyId'] #res['seats'] #res['rush']
         self.tablename = res['tablename']
@@ -456,13 +480,7 @@ class Hand(object):
         # street3Pot | street4Pot | showdownPot | comment | commentTs | texture
 
         # Actions
-        q = db.sql.query['handActions']
-        q = q.replace('%s', db.sql.query['placeholder'])
-        c.execute(q, (handId,))
-        
-        # Discripter must be set to lowercase as supported dbs differ on what is returned.
-        res = [dict(line) for line in [zip([ column[0].lower() for column in c.description], row) for row in c.fetchall()]]
-        for row in res:
+        for row in actions:
             name = row['name']
             street = row['street']
             act = row['actionid']
@@ -1891,20 +1909,72 @@ def hand_factory(hand_id, config, db_connection):
     # and to return a populated class instance of the correct hand
     
     gameinfo = db_connection.get_gameinfo_from_hid(hand_id)
+    hand_instance = db_hand(config, gameinfo, hand_id)
 
+    hand_instance.select(db_connection, hand_id)
+    hand_instance.handid_selected = hand_id #hand_instance does not supply this, create it here
+    hand_instance.db_connection = db_connection #stats that need more than the stat_dict read through it
+    
+    return hand_instance
+
+def db_hand(config, gameinfo, hand_id):
+    # an empty hand of the right class for gameinfo, to be filled in from the database
     if gameinfo['base'] == 'hold':
-        hand_instance = HoldemOmahaHand(config=config, hhc=None, sitename=gameinfo['sitename'],
+        return HoldemOmahaHand(config=config, hhc=None, sitename=gameinfo['sitename'],
          gametype = gameinfo, handText=None, builtFrom = "DB", handid=hand_id)
     elif gameinfo['base'] == 'stud':
-        hand_instance = StudHand(config=config, hhc=None, sitename=gameinfo['sitename'],
+        return StudHand(config=config, hhc=None, sitename=gameinfo['sitename'],
          gametype = gameinfo, handText=None, builtFrom = "DB", handid=hand_id)
     elif gameinfo['base'] == 'draw':
-        hand_instance = DrawHand(config=config, hhc=None, sitename=gameinfo['sitename'],
+        return DrawHand(config=config, hhc=None, sitename=gameinfo['sitename'],
          gametype = gameinfo, handText=None, builtFrom = "DB", handid=hand_id)
 
-    hand_instance.select(db_connection, hand_id)
-    hand_instance.handid_selected = hand_id #hand_instance does not supply this, create it here
-    
-    return hand_instance
-
-
+HAND_PAGE_SIZE = 500
+
+def hand_pages(hand_ids, config, db_connection, heroes = None, page_size = HAND_PAGE_SIZE):
+    """Yields the hands of hand_ids in lists of up to page_size hands, so the first
+       page can be shown while the rest is still loading. See load_hands."""
+    hand_ids = list(hand_ids)
+    for start in xrange(0, len(hand_ids), page_size):
+        yield load_hands(hand_ids[start:start + page_size], config, db_connection, heroes)
+
+def load_hands(hand_ids, config, db_connection, heroes = None):
+    """Returns the hands of hand_ids, in that order, like hand_factory would.
+       Instead of four queries per hand, the rows of all the hands are read with
+       one query per table and grouped by hand id. heroes maps a site name to the
+       name of the hero, select() needs it to tell the dealt cards from mucked ones.
+       Hands not in the database are left out."""
+    hand_ids = list(hand_ids)
+    gameinfos = db_connection.get_gameinfo_from_hids(hand_ids)
+    if not gameinfos:
+        return []
+    in_list = '(' + ','.join([str(int(hid)) for hid in gameinfos]) + ')'
+    c = db_connection.get_cursor()
+
+    def rows_by_hand(query, key):
+        c.execute(db_connection.sql.query[query].replace('<hand_ids>', in_list))
+        # Discripter must be set to lowercase as supported dbs differ on what is returned.
+        columns = [column[0].lower() for column in c.description]
+        rows = {}
+        for row in c.fetchall():
+            row = dict(zip(columns, row))
+            rows.setdefault(row[key], []).append(row)
+        return rows
+
+    players = rows_by_hand('playerHands', 'handid')
+    infos = rows_by_hand('multipleHands', 'id')
+    actions = rows_by_hand('handsActions', 'handid')
+
+    hands = []
+    for hand_id in hand_ids:
+        if hand_id not in gameinfos:
+            continue
+        gameinfo = gameinfos[hand_id]
+        hand_instance = db_hand(config, gameinfo, hand_id)
+        if heroes is not None:
+            hand_instance.hero = heroes[gameinfo['sitename']]
+        hand_instance.assembleFromRows(players.get(hand_id, []), infos[hand_id][0], actions.get(hand_id, []))
+        hand_instance.handid_selected = hand_id
+        hand_instance.db_connection = db_connection
+        hands.append(hand_instance)
+    return hands
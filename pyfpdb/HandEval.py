@@ -0,0 +1,467 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+"""Poker hand evaluator and all-in equity calculator.
+
+Replaces the part of pypoker-eval used by DerivedStats and Stove, with the
+same calls (best_hand, best_hand_value, poker_eval, card2string).
+
+A hand value is an int, higher is better for high hands and lower is better
+for 8 or better lows.  Flushes and straights are looked up in tables indexed
+by the 13 bit mask of the ranks, everything else by a key which is the sum of
+8**rank over the cards, i.e. the rank counts of the hand.  The values of
+those keys are computed the first time they are seen and kept.
+
+Equities are enumerated over all the possible boards or, when iterations is
+given, over that many random boards.  With numpy the boards are evaluated as
+arrays, one row per board.
+"""
+
+import logging
+import random
+import zlib
+from itertools import combinations, chain
+
+import L10n
+_ = L10n.get_translation()
+
+# logging has been set up in fpdb.py or HUD_main.py, use their settings:
+log = logging.getLogger("parser")
+
+try:
+    import numpy
+    use_numpy = True
+except ImportError:
+    log.info(_("Not using numpy to enumerate equities."))
+    use_numpy = False
+
+RANKS = '23456789TJQKA'
+SUITS = 'hdcs'
+NOCARD = '__'
+
+HAND_TYPES = ('NoPair', 'OnePair', 'TwoPair', 'Trips', 'Straight', 'Flush', 'FlHouse', 'Quads', 'StFlush')
+NOPAIR, ONEPAIR, TWOPAIR, TRIPS, STRAIGHT, FLUSH, FLHOUSE, QUADS, STFLUSH = range(9)
+LOW_NOTHING = 1 << 20       # worse than any 8 or better low
+
+# game: (hole cards, uses exactly two hole cards, has a low half)
+GAMES = {'holdem': (2, False, False),
+         'omaha':  (4, True,  False),
+         'omaha8': (4, True,  True),
+        }
+
+# per card (rank * 4 + suit) values summed over a hand
+RANK_KEY = [1 << (3 * (c >> 2)) for c in xrange(52)]      # rank counts, 3 bits per rank
+SUIT_KEY = [1 << (4 * (c & 3)) for c in xrange(52)]       # suit counts, 4 bits per suit
+RANK_BIT = [1 << (c >> 2) for c in xrange(52)]
+LOW_BIT = [(1 << ((c >> 2) + 1) % 13) & 0xFF for c in xrange(52)]   # A..8 as bits 0..7
+# Suit counts start at 3, so the 4th bit of a suit is set by its 5th card
+SUIT_BASE = 0x3333
+FLUSH_BITS = 0x8888
+FLUSH_SUIT = {0x8: 0, 0x80: 1, 0x800: 2, 0x8000: 3}
+
+# rows of boards evaluated at once by numpy, divided by the combinations per row
+CHUNK = 500000
+
+
+def card2string(card):
+    return RANKS[card >> 2] + SUITS[card & 3]
+
+def string2card(card):
+    if isinstance(card, (int, long)):
+        return card
+    return RANKS.index(card[0].upper()) * 4 + SUITS.index(card[1].lower())
+
+def make_value(type, ranks):
+    value = type
+    for i in xrange(5):
+        value = (value << 4) | (ranks[i] if i < len(ranks) else 0)
+    return value
+
+def value_type(value):
+    return value >> 20
+
+def straight_top(mask):
+    for top in xrange(12, 3, -1):
+        run = 0x1F << (top - 4)
+        if mask & run == run:
+            return top
+    if mask & 0x100F == 0x100F:   # A2345
+        return 3
+    return -1
+
+def bits(mask):
+    return [r for r in xrange(13) if mask & (1 << r)]
+
+STRAIGHT_TOP = [straight_top(mask) for mask in xrange(1 << 13)]
+
+def flush_value(mask):
+    ranks = bits(mask)
+    if len(ranks) < 5:
+        return 0
+    if STRAIGHT_TOP[mask] >= 0:
+        return make_value(STFLUSH, [STRAIGHT_TOP[mask]])
+    return make_value(FLUSH, ranks[::-1])
+
+FLUSH_VALUE = [flush_value(mask) for mask in xrange(1 << 13)]
+
+def low8_value(mask):
+    ranks = bits(mask & 0xFF)
+    if len(ranks) < 5:
+        return LOW_NOTHING
+    return make_value(0, ranks[4::-1])
+
+LOW8_VALUE = [low8_value(mask) for mask in xrange(1 << 8)]
+
+_rank_values = {}
+
+def rank_value(key):
+    """Value of the best hand, flushes aside, with the rank counts in key"""
+    try:
+        return _rank_values[key]
+    except KeyError:
+        pass
+    groups = sorted([((key >> (3 * r)) & 7, r) for r in xrange(13) if (key >> (3 * r)) & 7], reverse=True)
+    ranks = sorted([r for (n, r) in groups], reverse=True)
+    top = STRAIGHT_TOP[sum([1 << r for r in ranks])]
+    (n1, r1) = groups[0]
+    (n2, r2) = groups[1] if len(groups) > 1 else (0, 0)
+    if n1 == 4:
+        value = make_value(QUADS, [r1] + [r for r in ranks if r != r1][:1])
+    elif n1 == 3 and n2 >= 2:
+        value = make_value(FLHOUSE, [r1, r2])
+    elif top >= 0:
+        value = make_value(STRAIGHT, [top])
+    elif n1 == 3:
+        value = make_value(TRIPS, [r1] + [r for r in ranks if r != r1][:2])
+    elif n1 == 2 and n2 == 2:
+        value = make_value(TWOPAIR, [r1, r2] + [r for r in ranks if r not in (r1, r2)][:1])
+    elif n1 == 2:
+        value = make_value(ONEPAIR, [r1] + [r for r in ranks if r != r1][:3])
+    else:
+        value = make_value(NOPAIR, ranks[:5])
+    _rank_values[key] = value
+    return value
+
+def hi_value(cards):
+    """Value of the best 5 card high hand out of up to 7 cards"""
+    key, suits = 0, SUIT_BASE
+    for c in cards:
+        key += RANK_KEY[c]
+        suits += SUIT_KEY[c]
+    if suits & FLUSH_BITS:
+        # 7 cards can't hold a flush and a full house
+        suit = FLUSH_SUIT[suits & FLUSH_BITS]
+        mask = 0
+        for c in cards:
+            if c & 3 == suit:
+                mask |= RANK_BIT[c]
+        return FLUSH_VALUE[mask]
+    return rank_value(key)
+
+def low8_hand_value(cards):
+    """Value of the best 8 or better low out of the cards"""
+    mask = 0
+    for c in cards:
+        mask |= LOW_BIT[c]
+    return LOW8_VALUE[mask]
+
+def _parts(cards, n):
+    """(rank key, suit count, rank mask, low mask) of each n cards out of cards"""
+    return [(sum([RANK_KEY[c] for c in sub]), sum([SUIT_KEY[c] for c in sub]),
+             reduce(lambda a, b: a | b, [RANK_BIT[c] for c in sub]),
+             reduce(lambda a, b: a | b, [LOW_BIT[c] for c in sub]))
+            for sub in combinations(cards, n)]
+
+def omaha_values(hole, board, low):
+    """(hi, low) values of the best hands made of two hole cards and three board cards"""
+    best_hi, best_lo = 0, LOW_NOTHING
+    holes = _parts(hole, 2)
+    for (bkey, bsuits, bmask, blow) in _parts(board, 3):
+        for (hkey, hsuits, hmask, hlow) in holes:
+            if (bsuits + hsuits + SUIT_BASE) & FLUSH_BITS:
+                value = FLUSH_VALUE[bmask | hmask]
+            else:
+                value = rank_value(bkey + hkey)
+            if value > best_hi:
+                best_hi = value
+            if low and LOW8_VALUE[blow | hlow] < best_lo:
+                best_lo = LOW8_VALUE[blow | hlow]
+    return best_hi, best_lo
+
+
+class PokerEval:
+    """Evaluator with the interface of pypoker-eval's PokerEval, for the games
+       fpdb computes equities of. Cards are given as strings ('Ah', '__' for an
+       unknown card) or as ints from string2card()."""
+
+    def card2string(self, card):
+        return card2string(card)
+
+    def string2card(self, card):
+        return string2card(card)
+
+    def best_hand(self, side, hand, board = []):
+        """Returns [hand type] + the 5 cards of the best hand, strongest card
+           first. With a board the hand is made of 2 hand and 3 board cards
+           (omaha), else of any 5 cards of hand. side is 'hi' or 'low' (8 or
+           better), a hand without a low returns ['Nothing']."""
+        hand = [string2card(c) for c in hand]
+        board = [string2card(c) for c in board]
+        if board:
+            fives = [h + b for h in combinations(hand, 2) for b in combinations(board, 3)]
+        else:
+            fives = list(combinations(hand, 5))
+        if side == 'hi':
+            value, cards = max([(hi_value(five), five) for five in fives])
+            return [HAND_TYPES[value_type(value)]] + self._order_hi(value, cards)
+        value, cards = min([(low8_hand_value(five), five) for five in fives])
+        if value == LOW_NOTHING:
+            return ['Nothing']
+        return ['NoPair'] + sorted(cards, key = lambda c: ((c >> 2) + 1) % 13, reverse = True)
+
+    def best_hand_value(self, side, hand, board = []):
+        """Value of the best hand, see best_hand(). Compare values of the same
+           side only: higher is better for 'hi', lower is better for 'lo'."""
+        hand = [string2card(c) for c in hand]
+        board = [string2card(c) for c in board]
+        low = side in ('lo', 'low')
+        if board:
+            (hi, lo) = omaha_values(hand, board, low)
+            return lo if low else hi
+        if low:
+            return low8_hand_value(hand)
+        return max([hi_value(five) for five in combinations(hand, 5)])
+
+    def _order_hi(self, value, cards):
+        ranks = [c >> 2 for c in cards]
+        if value_type(value) in (STRAIGHT, STFLUSH) and (value >> 16) & 0xF == 3:
+            # the ace of a wheel is its lowest card
+            return sorted(cards, key = lambda c: (c >> 2) if c >> 2 != 12 else -1, reverse = True)
+        return sorted(cards, key = lambda c: (ranks.count(c >> 2), c >> 2), reverse = True)
+
+    def poker_eval(self, game, pockets, board = [], dead = [], iterations = 0, seed = None):
+        """Enumerates the possible boards, or deals iterations random ones, and
+           returns the results of each pocket in the same format as pypoker-eval:
+           {'info': (boards, has low pot, has high pot),
+            'eval': [{'scoop', 'winhi', 'losehi', 'tiehi', 'winlo', 'loselo', 'tielo', 'ev'}, ...]}
+           where ev is the share of the pot won, in 1/1000s. The random boards
+           are drawn from a generator seeded from the cards unless seed is given,
+           so that the same hand always gets the same equities."""
+        if game not in GAMES:
+            raise ValueError(_("Can't compute equities for game '%s'") % game)
+        low = GAMES[game][2]
+        pockets = [[string2card(c) for c in pocket] for pocket in pockets]
+        known = [string2card(c) for c in board if c != NOCARD]
+        used = set(chain(known, [string2card(c) for c in dead], *pockets))
+        deck = [c for c in xrange(52) if c not in used]
+        missing = 5 - len(known)
+        if seed is None:
+            seed = zlib.crc32(repr((game, pockets, known, sorted(used))))
+        if missing and iterations > 0:
+            boards = self._deal(deck, missing, iterations, seed)
+        else:
+            boards = self._enumerate(deck, missing)
+
+        if use_numpy:
+            results = self._eval_numpy(game, pockets, known, boards)
+        else:
+            results = self._eval_python(game, pockets, known, boards)
+        (n, counts, shares) = results
+        evals = []
+        for i in xrange(len(pockets)):
+            eval = dict(zip(('scoop', 'winhi', 'losehi', 'tiehi', 'winlo', 'loselo', 'tielo'), counts[i]))
+            eval['ev'] = int(1000 * shares[i] / n)
+            evals.append(eval)
+        return {'info': (n, int(low), 1), 'eval': evals}
+
+    def _deal(self, deck, missing, iterations, seed):
+        if use_numpy:
+            rng = numpy.random.RandomState(seed & 0xFFFFFFFF)
+            deck = numpy.array(deck, dtype = numpy.int64)
+            rows = numpy.empty((0, missing), dtype = numpy.int64)
+            while len(rows) < iterations:
+                # draw with replacement and throw away the boards with a card twice
+                draw = numpy.sort(rng.randint(0, len(deck), (iterations + iterations / 2 + 16, missing)), axis = 1)
+                draw = draw[(numpy.diff(draw, axis = 1) != 0).all(axis = 1)]
+                rows = numpy.vstack((rows, deck[draw]))
+            return rows[:iterations]
+        rng = random.Random(seed)
+        return [rng.sample(deck, missing) for i in xrange(iterations)]
+
+    def _enumerate(self, deck, missing):
+        if use_numpy:
+            if not missing:
+                return numpy.zeros((1, 0), dtype = numpy.int64)
+            return numpy.fromiter(chain.from_iterable(combinations(deck, missing)),
+                                  dtype = numpy.int64).reshape(-1, missing)
+        return list(combinations(deck, missing))
+
+    def _eval_python(self, game, pockets, known, boards):
+        (holes, omaha, low) = GAMES[game]
+        n = len(boards)
+        counts = [[0] * 7 for pocket in pockets]
+        shares = [0.0] * len(pockets)
+        for extra in boards:
+            board = known + list(extra)
+            if omaha:
+                values = [omaha_values(pocket, board, low) for pocket in pockets]
+            else:
+                values = [(hi_value(pocket + board), LOW_NOTHING) for pocket in pockets]
+            best_hi = max([v[0] for v in values])
+            best_lo = min([v[1] for v in values])
+            his = [v[0] == best_hi for v in values]
+            los = [v[1] == best_lo and best_lo != LOW_NOTHING for v in values]
+            nhi, nlo = his.count(True), los.count(True)
+            for i in xrange(len(pockets)):
+                c = counts[i]
+                if nlo:
+                    shares[i] += (0.5 * his[i] / nhi) + (0.5 * los[i] / nlo)
+                    c[4 + (1 if not los[i] else 2 if nlo > 1 else 0)] += 1
+                else:
+                    shares[i] += float(his[i]) / nhi
+                c[1 + (1 if not his[i] else 2 if nhi > 1 else 0)] += 1
+                if his[i] and nhi == 1 and (not nlo or (los[i] and nlo == 1)):
+                    c[0] += 1
+        return (n, counts, shares)
+
+    def _eval_numpy(self, game, pockets, known, boards):
+        (holes, omaha, low) = GAMES[game]
+        n = len(boards)
+        counts = numpy.zeros((len(pockets), 7), dtype = numpy.int64)
+        shares = numpy.zeros(len(pockets))
+        rows = max(1, CHUNK / (60 if omaha else 1))
+        for start in xrange(0, max(n, 1), rows):
+            chunk = boards[start:start + rows]
+            board = numpy.hstack((numpy.tile(numpy.array(known, dtype = numpy.int64), (len(chunk), 1)), chunk))
+            if omaha:
+                values = [omaha_values_numpy(pocket, board, low) for pocket in pockets]
+                his = numpy.array([v[0] for v in values])
+                los = numpy.array([v[1] for v in values])
+            else:
+                parts = board_parts_numpy(board)
+                his = numpy.array([hold_values_numpy(parts, pocket) for pocket in pockets])
+                los = numpy.zeros(his.shape, dtype = numpy.int64) + LOW_NOTHING
+            win_hi = his == his.max(axis = 0)
+            best_lo = los.min(axis = 0)
+            win_lo = (los == best_lo) & (best_lo != LOW_NOTHING)
+            nhi, nlo = win_hi.sum(axis = 0), win_lo.sum(axis = 0)
+            haslo = nlo > 0
+            shares += numpy.where(haslo, 0.5 * win_hi / nhi + 0.5 * win_lo / numpy.maximum(nlo, 1),
+                                  1.0 * win_hi / nhi).sum(axis = 1)
+            counts[:, 0] += (win_hi & (nhi == 1) & (~haslo | (win_lo & (nlo == 1)))).sum(axis = 1)
+            counts[:, 1] += (win_hi & (nhi == 1)).sum(axis = 1)
+            counts[:, 2] += (~win_hi).sum(axis = 1)
+            counts[:, 3] += (win_hi & (nhi > 1)).sum(axis = 1)
+            counts[:, 4] += (win_lo & (nlo == 1)).sum(axis = 1)
+            counts[:, 5] += (~win_lo & haslo).sum(axis = 1)
+            counts[:, 6] += (win_lo & (nlo > 1)).sum(axis = 1)
+        return (n, counts.tolist(), shares.tolist())
+
+    def holdem_range_odds(self, hand, villains, board = [], iterations = 0, seed = None):
+        """(boards, wins, ties, losses) of hold'em hand against each hand in
+           villains. All the villain hands are played out on the same boards,
+           dealt without the cards of hand and board, leaving out the boards
+           holding a card of the villain hand."""
+        hand = [string2card(c) for c in hand]
+        villains = [[string2card(c) for c in v] for v in villains]
+        known = [string2card(c) for c in board if c != NOCARD]
+        deck = [c for c in xrange(52) if c not in hand + known]
+        missing = 5 - len(known)
+        if seed is None:
+            seed = zlib.crc32(repr((hand, known, villains)))
+        if missing and iterations > 0:
+            boards = self._deal(deck, missing, iterations, seed)
+        else:
+            boards = self._enumerate(deck, missing)
+
+        if not use_numpy:
+            odds = []
+            for villain in villains:
+                plays = [b for b in boards if villain[0] not in b and villain[1] not in b]
+                win = tie = lose = 0
+                for extra in plays:
+                    full = known + list(extra)
+                    (h, v) = (hi_value(hand + full), hi_value(villain + full))
+                    if h > v:    win += 1
+                    elif h == v: tie += 1
+                    else:        lose += 1
+                odds.append((len(plays), win, tie, lose))
+            return odds
+
+        full = numpy.hstack((numpy.tile(numpy.array(known, dtype = numpy.int64), (len(boards), 1)), boards))
+        parts = board_parts_numpy(full)
+        hero = hold_values_numpy(parts, hand)
+        odds = []
+        for villain in villains:
+            plays = ~(boards == villain[0]).any(axis = 1) & ~(boards == villain[1]).any(axis = 1)
+            value = hold_values_numpy(parts, villain, plays)
+            h = hero[plays]
+            odds.append((int(plays.sum()), int((h > value).sum()), int((h == value).sum()), int((h < value).sum())))
+        return odds
+
+
+if use_numpy:
+    RANK_KEY_A = numpy.array(RANK_KEY, dtype = numpy.int64)
+    SUIT_KEY_A = numpy.array(SUIT_KEY, dtype = numpy.int64)
+    RANK_BIT_A = numpy.array(RANK_BIT, dtype = numpy.int64)
+    LOW_BIT_A = numpy.array(LOW_BIT, dtype = numpy.int64)
+    FLUSH_VALUE_A = numpy.array(FLUSH_VALUE, dtype = numpy.int64)
+    LOW8_VALUE_A = numpy.array(LOW8_VALUE, dtype = numpy.int64)
+    FLUSH_SUIT_A = numpy.zeros(FLUSH_BITS + 1, dtype = numpy.int64)
+    for bit, suit in FLUSH_SUIT.iteritems():
+        FLUSH_SUIT_A[bit] = suit
+    TRIPLES = numpy.array(list(combinations(range(5), 3)))
+
+def rank_values_numpy(keys):
+    uniq, inverse = numpy.unique(keys, return_inverse = True)
+    values = numpy.array([rank_value(k) for k in uniq.tolist()], dtype = numpy.int64)
+    return values[inverse].reshape(keys.shape)
+
+def board_parts_numpy(board):
+    """Rank keys, suit counts and rank masks by suit of the rows of board"""
+    suitmasks = numpy.column_stack([(RANK_BIT_A[board] * ((board & 3) == s)).sum(axis = 1) for s in xrange(4)])
+    return (RANK_KEY_A[board].sum(axis = 1), SUIT_BASE + SUIT_KEY_A[board].sum(axis = 1), suitmasks)
+
+def hold_values_numpy(parts, hole, rows = None):
+    """Hi values of the hole cards on the boards of parts (on rows of them only if given)"""
+    (keys, suits, suitmasks) = parts
+    if rows is not None:
+        (keys, suits, suitmasks) = (keys[rows], suits[rows], suitmasks[rows])
+    keys = keys + sum([RANK_KEY[c] for c in hole])
+    suits = suits + sum([SUIT_KEY[c] for c in hole])
+    values = rank_values_numpy(keys)
+    flush = numpy.nonzero(suits & FLUSH_BITS)[0]
+    if len(flush):
+        suit = FLUSH_SUIT_A[suits[flush] & FLUSH_BITS]
+        masks = suitmasks[flush, suit]
+        for c in hole:
+            masks |= numpy.where(suit == c & 3, RANK_BIT[c], 0)
+        values[flush] = FLUSH_VALUE_A[masks]
+    return values
+
+def omaha_values_numpy(hole, board, low):
+    """(hi, low) values of hole on the rows of board, made of 2 hole and 3 board cards"""
+    triples = board[:, TRIPLES]                                  # boards x 10 x 3
+    pairs = numpy.array(list(combinations(hole, 2)))            # 6 x 2
+    keys = RANK_KEY_A[triples].sum(axis = 2)[:, :, None] + RANK_KEY_A[pairs].sum(axis = 1)
+    suits = SUIT_KEY_A[triples].sum(axis = 2)[:, :, None] + SUIT_KEY_A[pairs].sum(axis = 1) + SUIT_BASE
+    masks = numpy.bitwise_or.reduce(RANK_BIT_A[triples], axis = 2)[:, :, None] | numpy.bitwise_or.reduce(RANK_BIT_A[pairs], axis = 1)
+    values = numpy.where(suits & FLUSH_BITS, FLUSH_VALUE_A[masks], rank_values_numpy(keys))
+    hi = values.reshape(len(board), -1).max(axis = 1)
+    if not low:
+        return hi, numpy.zeros(len(board), dtype = numpy.int64) + LOW_NOTHING
+    lows = numpy.bitwise_or.reduce(LOW_BIT_A[triples], axis = 2)[:, :, None] | numpy.bitwise_or.reduce(LOW_BIT_A[pairs], axis = 1)
+    return hi, LOW8_VALUE_A[lows].reshape(len(board), -1).min(axis = 1)
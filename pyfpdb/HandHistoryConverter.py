@@ -28,6 +28,7 @@ import xml.dom.minidom
 import codecs
 from decimal_wrapper import Decimal
 import operator
+import itertools
 from xml.dom.minidom import Node
 
 import time
@@ -60,9 +61,20 @@ class HandHistoryConverter():
     codepage = "cp1252"
 
     re_tzOffset = re.compile('^\w+[+-]\d{4}$')
+    # The gametype is only in the header of the file, see fileGameType()
     copyGameHeader = False
     summaryInFile  = False
 
+    # Converters can read a hand in a single pass over its lines, see tokenizeHand():
+    #   re_LineKind   regex matched at the start of every line, with a named group per kind of line
+    #   lineTokens    kind of line -> names of the regexes (re_<name>) searched for in these lines
+    #   streetMarkers game base -> ((street, regex of the line starting it), ...) in street order,
+    #                 a street with no regex starts with the hand
+    tokenizeLines = False
+    re_LineKind   = None
+    lineTokens    = {}
+    streetMarkers = {}
+
     # maybe archive params should be one archive param, then call method in specific converter.   if archive:  convert_archive()
     def __init__( self, config, in_path = '-', out_path = '-', index=0
                 , autostart=True, starsArchive=False, ftpArchive=False, sitename="PokerStars"):
@@ -97,7 +109,10 @@ out_path  (default '-' = sys.stdout)
         self.out_fh = get_out_fh(out_path, self.import_parameters)
 
         self.compiledPlayers   = set()
+        self.headerGameType = None  # gametype in the header of whole_file, see fileGameType()
         self.maxseats  = 0
+        self.tokenized = None   # (hand, matches, matches by street) of the last tokenizeHand()
+        self.lineTokenRegexes = None
 
         self.status = True
 
@@ -117,6 +132,14 @@ HandHistoryConverter: '%(sitename)s'
 
     def start(self):
         """Process a hand at a time from the input specified by in_path."""
+        for handlist in self.handBatches():
+            self.processedHands.extend(handlist)
+
+    def handBatches(self, batchSize = None):
+        """Generator: converts the hands in in_path and yields them in lists of at
+        most batchSize hands (all of them in one list if batchSize is None), so the
+        caller can store a batch before the next one is read.
+        A summary file is read into self.tourney and yields nothing."""
         starttime = time.time()
         if not self.sanityCheck():
             log.warning(_("Failed sanity check"))
@@ -124,35 +147,103 @@ HandHistoryConverter: '%(sitename)s'
 
         self.numHands = 0
         self.numErrors = 0
-        handsList = self.allHandsAsList()
-        log.debug( _("Hands list is:") + str(handsList))
-        log.info(_("Parsing %d hands") % len(handsList))
+        handsList = self.allHandsAsGenerator()
         # Determine if we're dealing with a HH file or a Summary file
         # quick fix : empty files make the handsList[0] fail ==> If empty file, go on with HH parsing
-        if len(handsList) == 0 or self.isSummary(handsList[0]) == False:
+        firstHand = next(handsList, None)
+        if firstHand is None or self.isSummary(firstHand) == False:
             self.parsedObjectType = "HH"
-            for handText in handsList:
-                try:
-                    self.processedHands.append(self.processHand(handText))
-                except FpdbHandPartial, e:
-                    self.numPartial += 1
-                    log.debug("%s" % e)
-                except FpdbParseError:
-                    self.numErrors += 1
-                    log.error(_("FpdbParseError for file '%s'") % self.in_path)
-            self.numHands = len(handsList)
+            if firstHand is not None:
+                handsList = itertools.chain([firstHand], handsList)
+            batch = []
+            for hand in self.convertHands(handsList):
+                batch.append(hand)
+                if batchSize is not None and len(batch) >= batchSize:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
             endtime = time.time()
             log.info(_("Read %d hands (%d failed) in %.3f seconds") % (self.numHands, (self.numErrors + self.numPartial), endtime - starttime))
         else:
             self.parsedObjectType = "Summary"
-            summaryParsingStatus = self.readSummaryInfo(handsList)
+            summaryParsingStatus = self.readSummaryInfo([firstHand] + list(handsList))
             endtime = time.time()
             if summaryParsingStatus :
                 log.info(_("Summary file '%s' correctly parsed (took %.3f seconds)") % (self.in_path, endtime - starttime))
             else :
                 log.warning(_("Error converting summary file '%s' (took %.3f seconds)") % (self.in_path, endtime - starttime))
 
-                
+    def processHandTexts(self, handsList):
+        """Converts the handtexts in handsList, adding them to processedHands"""
+        self.processedHands.extend(self.convertHands(handsList))
+
+    def convertHands(self, handsList):
+        """Generator: converts the handtexts in handsList one at a time, counting
+        them and the ones that fail in numHands, numPartial and numErrors"""
+        for handText in handsList:
+            self.numHands += 1
+            try:
+                hand = self.processHand(handText)
+            except FpdbHandPartial, e:
+                self.numPartial += 1
+                log.debug("%s" % e)
+                continue
+            except FpdbParseError:
+                self.numErrors += 1
+                log.error(_("FpdbParseError for file '%s'") % self.in_path)
+                continue
+            yield hand
+
+    def followFile(self):
+        """Opens in_path to read the hands appended to it with readAppendedHands().
+        Reading starts at character self.index. Returns False if the file can't be read."""
+        kodec = self.detectCodepage()
+        if kodec is None:
+            return False
+        try:
+            self.follow_fh = open(self.in_path, 'rb')
+        except IOError:
+            return False
+        self.follow_decoder = codecs.getincrementaldecoder(kodec)()
+        self.follow_skip = self.index
+        self.follow_pending = u''
+        return True
+
+    def readAppendedHands(self):
+        """Returns the handtexts appended to the file since the last call, reading
+        only the new bytes from the open file. As in allHandsAsGenerator() the
+        text up to the end of the last complete line is taken as the last hand.
+        self.index is kept at the first character not handed out yet."""
+        text = u''
+        data = self.follow_fh.read(self.READ_CHUNK_SIZE)
+        while data:
+            try:
+                text += self.follow_decoder.decode(data)
+            except UnicodeError:
+                log.error(_("unable to read file with any codec in list!") + " " + self.in_path)
+                break
+            data = self.follow_fh.read(self.READ_CHUNK_SIZE)
+        if self.follow_skip:
+            text, self.follow_skip = text[self.follow_skip:], max(0, self.follow_skip - len(text))
+        text = self.follow_pending + text
+        cut = text.rfind(u'\n') + 1
+        text, self.follow_pending = text[:cut], text[cut:]
+        self.index += len(text)
+        text = self.cleanHandsText(text).strip()
+        if not text:
+            return []
+        handlist = re.split(self.re_SplitHands, text)
+        if len(handlist[-1]) <= 50:
+            handlist.pop()
+            log.info(_("Removing text < 50 characters"))
+        return handlist
+
+    def unfollowFile(self):
+        if getattr(self, 'follow_fh', None):
+            self.follow_fh.close()
+            self.follow_fh = None
+
     def progressNotify(self):
         "A callback to the interface while events are pending"
         import gtk, pygtk
@@ -161,7 +252,7 @@ HandHistoryConverter: '%(sitename)s'
 
     def allHandsAsList(self):
         """Return a list of handtexts in the file at self.in_path"""
-        #TODO : any need for this to be generator? e.g. stars support can email one huge file of all hands in a year. Better to read bit by bit than all at once.
+        # Reads the whole file at once, see allHandsAsGenerator() for the streaming version
         self.readFile()
         self.obs = self.obs.strip()
         self.obs = self.obs.replace('\r\n', '\n')
@@ -189,9 +280,111 @@ HandHistoryConverter: '%(sitename)s'
             log.info(_("Removing text < 50 characters"))
         return handlist
 
+    def allHandsAsGenerator(self):
+        """Yield the handtexts in the file at self.in_path one at a time.
+
+        The file is read READ_CHUNK_SIZE bytes at a time and split on re_SplitHands
+        as it arrives, so only the hands not yet handed out are held in memory.
+        Splitting gives the same handtexts as allHandsAsList()."""
+        if self.copyGameHeader:
+            # these converters need self.whole_file to find the game header
+            for handText in self.allHandsAsList():
+                yield handText
+            return
+
+        kodec = self.detectCodepage()
+        if kodec is None:
+            print _("unable to read file with any codec in list!"), self.in_path
+            return
+
+        decoder = codecs.getincrementaldecoder(kodec)()
+        skip = self.index
+        read, pending, buffer = 0, u'', u''
+        found = False
+        try:
+            in_fh = open(self.in_path, 'rb')
+        except IOError:
+            print _("unable to read file with any codec in list!"), self.in_path
+            return
+        try:
+            while True:
+                data = in_fh.read(self.READ_CHUNK_SIZE)
+                try:
+                    text = decoder.decode(data, not data)
+                except UnicodeError:
+                    log.error(_("unable to read file with any codec in list!") + " " + self.in_path)
+                    return
+                read += len(text)
+                if skip:
+                    text, skip = text[skip:], max(0, skip - len(text))
+                pending += text
+                if data:
+                    # only release complete lines, so '\r\n' pairs and the line
+                    # based archive markers are never cut in two
+                    cut = pending.rfind(u'\n') + 1
+                    if not cut:
+                        continue
+                    text, pending = pending[:cut], pending[cut:]
+                else:
+                    text, pending = pending, u''
+                buffer += self.cleanHandsText(text)
+                if not found:
+                    buffer = buffer.lstrip()
+                    found = buffer != u''
+                if not data:
+                    break
+                (handlist, buffer) = self.splitCompleteHands(buffer)
+                for handText in handlist:
+                    yield handText
+        finally:
+            in_fh.close()
+        self.index = read
+
+        buffer = buffer.rstrip()
+        if not found:
+            log.error(_("Read no hands from file: '%s'") % self.in_path)
+            return
+        handlist = re.split(self.re_SplitHands, buffer)
+        # Some HH formats leave dangling text after the split
+        # ie. </game> (split) </session>EOL
+        # Remove this dangler if less than 50 characters and warn in the log
+        if len(handlist[-1]) <= 50:
+            handlist.pop()
+            log.info(_("Removing text < 50 characters"))
+        for handText in handlist:
+            yield handText
+
+    def cleanHandsText(self, text):
+        """Normalise line endings and strip archive markers from a run of complete lines"""
+        text = text.replace('\r\n', '\n')
+        if self.starsArchive == True:
+            m = re.compile('^Hand #\d+', re.MULTILINE)
+            text = m.sub('', text)
+
+        if self.ftpArchive == True:
+            # Remove  ******************** # 1 *************************
+            m = re.compile('\*{20}\s#\s\d+\s\*{20,25}\s+', re.MULTILINE)
+            text = m.sub('', text)
+        return text
+
+    def splitCompleteHands(self, text):
+        """Split text on re_SplitHands, returning (hands, remainder).
+        A separator that runs to the end of text might still grow when more of
+        the file arrives, so everything after the last separator that is
+        followed by more text is returned as the remainder."""
+        handlist, start = [], 0
+        for m in self.re_SplitHands.finditer(text):
+            if m.end() >= len(text):
+                break
+            if m.end() == m.start():
+                continue
+            handlist.append(text[start:m.start()])
+            start = m.end()
+        return (handlist, text[start:])
+
     def processHand(self, handText):
         if self.copyGameHeader:
-            gametype = self.determineGameType(self.whole_file)
+            gametype = self.fileGameType()
             if 'mix' in gametype:
                 gametype = self.determineGameType(handText)
         else:
@@ -229,6 +422,73 @@ HandHistoryConverter: '%(sitename)s'
             log.error(_("%s Unsupported game type: %s") % (self.sitename, gametype))
             # TODO: pity we don't know the HID at this stage. Log the entire hand?
 
+    def fileGameType(self):
+        """Returns the gametype in the header of whole_file for the copyGameHeader
+        converters. The header is parsed from the whole file once, each hand then
+        gets a copy: these converters keep the gametype of the hand being read in
+        self.info and the hand adds its own keys to it."""
+        if self.headerGameType is None:
+            self.headerGameType = dict(self.determineGameType(self.whole_file))
+        self.info = dict(self.headerGameType)
+        return self.info
+
+    def tokenizeHand(self, hand):
+        """Marks the streets of hand and finds the lines read by the converter
+        in one pass, instead of a finditer() over the hand text per read method.
+
+        Every line is matched against re_LineKind, the regexes listed in lineTokens
+        for its kind are then searched for in that line only. The streets end where
+        the line starting the next street does, as in a markStreets() regex.
+        The read methods get the matches from lineMatches()."""
+        if self.lineTokenRegexes is None:
+            self.lineTokenRegexes = dict((kind, [(token, getattr(self, 're_' + token)) for token in names])
+                                         for (kind, names) in self.lineTokens.iteritems())
+        markers = self.streetMarkers[hand.gametype['base']]
+        streets = dict((street, None) for (street, marker) in markers)
+        text = hand.handText
+        tokens, streetTokens = {}, {}
+        street, start, next = None, 0, 0
+        if markers[0][1] is None:
+            street, next = markers[0][0], 1
+        marker = next < len(markers) and markers[next][1]
+        lineKind = self.re_LineKind.match
+        pos = 0
+        for line in text.split('\n'):
+            if marker:
+                m = marker.match(line)
+                if m:
+                    if street is not None:
+                        streets[street] = text[start:pos]
+                    street, start = markers[next][0], pos + m.end()
+                    next += 1
+                    marker = next < len(markers) and markers[next][1]
+                    pos += len(line) + 1
+                    continue
+            kind = lineKind(line)
+            if kind:
+                for (token, regex) in self.lineTokenRegexes[kind.lastgroup]:
+                    for m in regex.finditer(line):
+                        tokens.setdefault(token, []).append(m)
+                        streetTokens.setdefault((token, street), []).append(m)
+            pos += len(line) + 1
+        if street is None:
+            hand.addStreets(None) # raises FpdbHandPartial
+        streets[street] = text[start:]
+        hand.streets.update(streets)
+        log.debug("markStreets:\n"+ str(hand.streets))
+        self.tokenized = (hand, tokens, streetTokens)
+
+    def lineMatches(self, hand, token, street = None):
+        """Returns the matches of the regex re_<token> in the text of hand, or
+        of one of its streets. They come from tokenizeHand() if it has read hand."""
+        if self.tokenized is not None and self.tokenized[0] is hand:
+            if street is None:
+                return self.tokenized[1].get(token, [])
+            return self.tokenized[2].get((token, street), [])
+        if street is None:
+            return getattr(self, 're_' + token).finditer(hand.handText)
+        return getattr(self, 're_' + token).finditer(hand.streets[street])
+
 
     # These functions are parse actions that may be overridden by the inheriting class
     # This function should return a list of lists looking like:
@@ -426,6 +686,29 @@ or None if we fail to get the info """
             doc = xml.dom.minidom.parse(filename)
             self.doc = doc
 
+    def detectCodepage(self):
+        """Return the first codec in self.codepage that decodes in_path, or None.
+        The file is checked in chunks so it is never held in memory whole."""
+        kodecs = self.__listof(self.codepage)
+        for kodec in kodecs:
+            if len(kodecs) == 1:
+                return kodec
+            try:
+                decoder = codecs.getincrementaldecoder(kodec)()
+                in_fh = open(self.in_path, 'rb')
+                try:
+                    data = in_fh.read(self.READ_CHUNK_SIZE)
+                    while data:
+                        decoder.decode(data)
+                        data = in_fh.read(self.READ_CHUNK_SIZE)
+                    decoder.decode('', True)
+                finally:
+                    in_fh.close()
+                return kodec
+            except (IOError, UnicodeError, LookupError):
+                pass
+        return None
+
     def guessMaxSeats(self, hand):
         """Return a guess at maxseats when not specified in HH."""
         # if some other code prior to this has already set it, return it
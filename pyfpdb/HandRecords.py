@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""HandRecords.py
+
+Fixed column records for the HandsPlayers and HandsActions rows of a hand, and
+the batches they wait in for an executemany() during an import.
+"""
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#    In the "official" distribution you can find the license in agpl-3.0.txt.
+
+#    Standard Library modules
+from itertools import izip
+from operator import itemgetter
+
+# The columns of store_hands_players after handId and playerId, in insert order
+HANDS_PLAYERS = ('startCash', 'seatNo', 'sitout', 'card1', 'card2', 'card3', 'card4', 'card5', 'card6', 'card7',
+                 'card8', 'card9', 'card10', 'card11', 'card12', 'card13', 'card14', 'card15', 'card16',
+                 'card17', 'card18', 'card19', 'card20', 'winnings', 'rake', 'totalProfit', 'allInEV',
+                 'street0VPI', 'street1Seen', 'street2Seen', 'street3Seen', 'street4Seen', 'sawShowdown',
+                 'showed', 'wonAtSD', 'street0Aggr', 'street1Aggr', 'street2Aggr', 'street3Aggr', 'street4Aggr',
+                 'street1CBChance', 'street2CBChance', 'street3CBChance', 'street4CBChance', 'street1CBDone',
+                 'street2CBDone', 'street3CBDone', 'street4CBDone', 'wonWhenSeenStreet1', 'wonWhenSeenStreet2',
+                 'wonWhenSeenStreet3', 'wonWhenSeenStreet4', 'street0Calls', 'street1Calls', 'street2Calls',
+                 'street3Calls', 'street4Calls', 'street0Bets', 'street1Bets', 'street2Bets', 'street3Bets',
+                 'street4Bets', 'position', 'tourneysPlayersIds', 'startCards', 'street0CalledRaiseChance',
+                 'street0CalledRaiseDone', 'street0_3BChance', 'street0_3BDone', 'street0_4BChance',
+                 'street0_4BDone', 'street0_C4BChance', 'street0_C4BDone', 'street0_FoldTo3BChance',
+                 'street0_FoldTo3BDone', 'street0_FoldTo4BChance', 'street0_FoldTo4BDone',
+                 'street0_SqueezeChance', 'street0_SqueezeDone', 'raiseToStealChance', 'raiseToStealDone',
+                 'success_Steal', 'otherRaisedStreet0', 'otherRaisedStreet1', 'otherRaisedStreet2',
+                 'otherRaisedStreet3', 'otherRaisedStreet4', 'foldToOtherRaisedStreet0',
+                 'foldToOtherRaisedStreet1', 'foldToOtherRaisedStreet2', 'foldToOtherRaisedStreet3',
+                 'foldToOtherRaisedStreet4', 'raiseFirstInChance', 'raisedFirstIn', 'foldBbToStealChance',
+                 'foldedBbToSteal', 'foldSbToStealChance', 'foldedSbToSteal', 'foldToStreet1CBChance',
+                 'foldToStreet1CBDone', 'foldToStreet2CBChance', 'foldToStreet2CBDone', 'foldToStreet3CBChance',
+                 'foldToStreet3CBDone', 'foldToStreet4CBChance', 'foldToStreet4CBDone',
+                 'street1CheckCallRaiseChance', 'street1CheckCallRaiseDone', 'street2CheckCallRaiseChance',
+                 'street2CheckCallRaiseDone', 'street3CheckCallRaiseChance', 'street3CheckCallRaiseDone',
+                 'street4CheckCallRaiseChance', 'street4CheckCallRaiseDone', 'street0Raises', 'street1Raises',
+                 'street2Raises', 'street3Raises', 'street4Raises')
+
+# The stats added up in HudCache, CardsCache and PositionsCache after HDs, in insert order
+HUD_STATS = ('street0VPI', 'street0Aggr', 'street0CalledRaiseChance', 'street0CalledRaiseDone',
+             'street0_3BChance', 'street0_3BDone', 'street0_4BChance', 'street0_4BDone', 'street0_C4BChance',
+             'street0_C4BDone', 'street0_FoldTo3BChance', 'street0_FoldTo3BDone', 'street0_FoldTo4BChance',
+             'street0_FoldTo4BDone', 'street0_SqueezeChance', 'street0_SqueezeDone', 'raiseToStealChance',
+             'raiseToStealDone', 'success_Steal', 'street1Seen', 'street2Seen', 'street3Seen', 'street4Seen',
+             'sawShowdown', 'street1Aggr', 'street2Aggr', 'street3Aggr', 'street4Aggr', 'otherRaisedStreet0',
+             'otherRaisedStreet1', 'otherRaisedStreet2', 'otherRaisedStreet3', 'otherRaisedStreet4',
+             'foldToOtherRaisedStreet0', 'foldToOtherRaisedStreet1', 'foldToOtherRaisedStreet2',
+             'foldToOtherRaisedStreet3', 'foldToOtherRaisedStreet4', 'wonWhenSeenStreet1',
+             'wonWhenSeenStreet2', 'wonWhenSeenStreet3', 'wonWhenSeenStreet4', 'wonAtSD',
+             'raiseFirstInChance', 'raisedFirstIn', 'foldBbToStealChance', 'foldedBbToSteal',
+             'foldSbToStealChance', 'foldedSbToSteal', 'street1CBChance', 'street1CBDone', 'street2CBChance',
+             'street2CBDone', 'street3CBChance', 'street3CBDone', 'street4CBChance', 'street4CBDone',
+             'foldToStreet1CBChance', 'foldToStreet1CBDone', 'foldToStreet2CBChance', 'foldToStreet2CBDone',
+             'foldToStreet3CBChance', 'foldToStreet3CBDone', 'foldToStreet4CBChance', 'foldToStreet4CBDone',
+             'totalProfit', 'rake', 'street1CheckCallRaiseChance', 'street1CheckCallRaiseDone',
+             'street2CheckCallRaiseChance', 'street2CheckCallRaiseDone', 'street3CheckCallRaiseChance',
+             'street3CheckCallRaiseDone', 'street4CheckCallRaiseChance', 'street4CheckCallRaiseDone',
+             'street0Calls', 'street1Calls', 'street2Calls', 'street3Calls', 'street4Calls', 'street0Bets',
+             'street1Bets', 'street2Bets', 'street3Bets', 'street4Bets', 'street0Raises', 'street1Raises',
+             'street2Raises', 'street3Raises', 'street4Raises')
+
+# The columns of store_hands_actions after handId and playerId, in insert order
+HANDS_ACTIONS = ('street', 'actionNo', 'streetActionNo', 'actionId', 'amount', 'raiseTo', 'amountCalled',
+                 'numDiscarded', 'cardsDiscarded', 'allIn')
+
+_missing = object()     # value of the columns that haven't been set
+
+
+class Record(object):
+    """A row with a fixed set of columns, that reads and writes like the dict
+       it replaces: record['street0VPI'] = True. The values are kept in a list in
+       column order, a HandsPlayers row takes about a tenth of the memory of the
+       dict and copying one is a list copy. Setting a column that isn't in the
+       schema raises a KeyError, as does reading one that hasn't been set."""
+    __slots__ = ('cells',)
+    columns  = ()       # the inserted columns in insert order, then the others
+    inserted = 0        # number of columns written to the database
+    position = {}       # column -> index in cells
+    getters  = {}       # columns -> itemgetter of their cells, see pick()
+
+    def __init__(self, items = None):
+        self.cells = [_missing] * len(self.columns)
+        if items is not None:
+            self.update(items)
+
+    def __getitem__(self, column):
+        value = self.cells[self.position[column]]
+        if value is _missing:
+            raise KeyError(column)
+        return value
+
+    def __setitem__(self, column, value):
+        self.cells[self.position[column]] = value
+
+    def __delitem__(self, column):
+        self[column]
+        self.cells[self.position[column]] = _missing
+
+    def __contains__(self, column):
+        return column in self.position and self.cells[self.position[column]] is not _missing
+
+    has_key = __contains__
+
+    def get(self, column, default = None):
+        if column in self:
+            return self.cells[self.position[column]]
+        return default
+
+    def iteritems(self):
+        for (column, value) in izip(self.columns, self.cells):
+            if value is not _missing:
+                yield (column, value)
+
+    def iterkeys(self):
+        for (column, value) in self.iteritems():
+            yield column
+
+    __iter__ = iterkeys
+
+    def items(self):
+        return list(self.iteritems())
+
+    def keys(self):
+        return list(self.iterkeys())
+
+    def values(self):
+        return [value for value in self.cells if value is not _missing]
+
+    def __len__(self):
+        return len(self.cells) - self.cells.count(_missing)
+
+    def update(self, items):
+        if hasattr(items, 'iteritems'):
+            items = items.iteritems()
+        for (column, value) in items:
+            self[column] = value
+
+    def copy(self):
+        record = self.__class__.__new__(self.__class__)
+        record.cells = self.cells[:]
+        return record
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = dict(other.iteritems())
+        return dict(self.iteritems()) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(dict(self.iteritems()))
+
+    def __getstate__(self):
+        return dict(self.iteritems())
+
+    def __setstate__(self, state):
+        self.cells = [_missing] * len(self.columns)
+        self.update(state)
+
+    def pick(self, columns):
+        """Returns the values of columns, a tuple of column names, as a list"""
+        getter = self.getters.get(columns)
+        if getter is None:
+            getter = self.getters[columns] = itemgetter(*[self.position[column] for column in columns])
+        values = list(getter(self.cells))
+        if _missing in values:
+            raise KeyError(columns[values.index(_missing)])
+        return values
+
+    def row(self):
+        """Returns the values of the inserted columns, in insert order"""
+        values = tuple(self.cells[:self.inserted])
+        if _missing in values:
+            raise KeyError(self.columns[values.index(_missing)])
+        return values
+
+
+class HandsPlayersRow(Record):
+    """The stats of a player in a hand, DerivedStats.handsplayers[player]"""
+    __slots__ = ()
+    columns  = HANDS_PLAYERS + ('tourneyTypeId', 'other3BStreet0', 'other4BStreet0')
+    inserted = len(HANDS_PLAYERS)
+    position = dict((column, i) for (i, column) in enumerate(columns))
+    getters  = {}
+
+
+class HandsActionsRow(Record):
+    """An action of a hand, DerivedStats.handsactions[actionNo]"""
+    __slots__ = ()
+    columns  = HANDS_ACTIONS + ('player',)
+    inserted = len(HANDS_ACTIONS)
+    position = dict((column, i) for (i, column) in enumerate(columns))
+    getters  = {}
+
+
+class Batch(object):
+    """HandsPlayers or HandsActions rows waiting for an executemany(), kept by
+       column: the hand and player ids and the records themselves, so the values
+       aren't copied until rows() hands them to the database. The ids are kept
+       in lists: array('l') is 32 bit on Windows, and python 2 has no 'q'."""
+    __slots__ = ('handIds', 'playerIds', 'records')
+
+    def __init__(self):
+        self.handIds   = []
+        self.playerIds = []
+        self.records   = []
+
+    def append(self, handId, playerId, record):
+        self.handIds.append(handId)
+        self.playerIds.append(playerId)
+        self.records.append(record)
+
+    def __len__(self):
+        return len(self.records)
+
+    def rows(self):
+        """Yields the rows for executemany(), each one made as it is read"""
+        for (handId, playerId, record) in izip(self.handIds, self.playerIds, self.records):
+            yield (handId, playerId) + record.row()
@@ -63,6 +63,7 @@ class Hud:
         #print "parent", parent
         self.parent        = parent
         self.table         = table
+        self.table_watched = False  # the table tells us when it moves, see Table_Window.watch()
         self.config        = config
         self.poker_game    = poker_game
         self.game_type     = game_type # (ring|tour)
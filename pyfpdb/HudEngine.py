@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""HudEngine.py
+
+The part of the HUD that doesn't need a display: follows the tables the new
+hands are played at and fetches their stats and cards.
+"""
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#    In the "official" distribution you can find the license in agpl-3.0.txt.
+
+import L10n
+_ = L10n.get_translation()
+
+#    Standard Library modules
+import logging
+import threading
+
+#    FreePokerTools modules
+import Database
+import HudStatCache
+
+# logging has been set up in fpdb.py or HUD_main.py, use their settings:
+log = logging.getLogger("hud")
+
+
+class TableState:
+    """What the engine knows about a table with a HUD"""
+
+    def __init__(self, key, table_name, max, poker_game, type, site_name, tour_number, tab_number, hud_params):
+        self.key = key                  # temp_key of HUD_main, the hud_dict key
+        self.table_name = table_name
+        self.max = max
+        self.poker_game = poker_game
+        self.type = type
+        self.site_name = site_name
+        self.tour_number = tour_number
+        self.tab_number = tab_number
+        self.hud_params = hud_params    # the HUD's own params, the HUD menus change them
+        self.stat_dict = None
+        self.cards = None
+        self.hands = 0
+
+
+class HudListener:
+    """What the engine tells the HUD, this one has no windows.
+       create() returns whether a HUD was created for the table, the engine
+       tries again with the next hand of the table if it wasn't."""
+
+    def create(self, hand_id, table):
+        return True
+
+    def update(self, hand_id, table):
+        pass
+
+    def kill(self, table):
+        pass
+
+
+class HudEngine:
+    """Does the non-gui work of HUD_main.read_stdin() for each new hand: finds
+       the table, works out if its HUD must be created, killed or updated, and
+       fetches the stats (HudStatCache) and cards for it. The gui is driven
+       through listener (a HudListener).
+
+       The engine opens its own db connection, it must be created in the thread
+       that calls process_hands(). forget() is called by the gui thread, lock
+       guards self.tables; the listener is never called with it held, as the
+       gui may be waiting for it."""
+
+    def __init__(self, config, listener = None):
+        self.config = config
+        self.listener = listener if listener is not None else HudListener()
+        self.db_connection = Database.Database(config)
+        self.stat_cache = HudStatCache.HudStatCache(self.db_connection)
+        self.hud_params = config.get_hud_ui_parameters()
+        self.tables = {}                # key -> TableState
+        self.lock = threading.Lock()
+        self.hero, self.hero_ids = {}, {}
+        self.found = False
+
+        self.enabled_sites = config.get_supported_sites()
+        if not self.enabled_sites:
+            log.error(_("No enabled sites found"))
+        self.aux_disabled_sites = []
+        for i in self.enabled_sites:
+            if not config.get_site_parameters(i)['aux_enabled']:
+                log.info(_("Aux disabled for site %s") % i)
+                self.aux_disabled_sites.append(i)
+
+    def process_hands(self, hand_ids):
+        """Processes a batch of new hands, in order"""
+        for hand_id in hand_ids:
+            self.process_hand(hand_id)
+        self.db_connection.connection.rollback()
+
+    def find_heroes(self):
+#    This cannot be done once at startup, because it would cause a problem
+#    when auto importing into an empty db.
+#    FIXME (corner-case): Because this only runs until hero is found,
+#    if our hero plays at another site for the __first_time__ during that session,
+#     the hud won't display correctly, because the heroname isn't known yet.
+        for site in self.enabled_sites:
+            result = self.db_connection.get_site_id(site)
+            if result:
+                site_id = result[0][0]
+                self.hero[site_id] = self.config.supported_sites[site].screen_name
+                self.hero_ids[site_id] = self.db_connection.get_player_id(self.config, site, self.hero[site_id])
+                if self.hero_ids[site_id] is not None:
+                    self.found = True
+                else:
+                    self.hero_ids[site_id] = -1
+
+    def process_hand(self, new_hand_id):
+        """Creates or updates the HUD of the table of new_hand_id, returns its
+           TableState or None if the hand was skipped"""
+        log.debug(_("Received hand no %s") % new_hand_id)
+        if not self.found:
+            self.find_heroes()
+
+#        get basic info about the new hand from the db
+#        if there is a db error, complain, skip hand, and proceed
+        try:
+            (table_name, max, poker_game, type, site_id, site_name, num_seats, tour_number, tab_number) = \
+                            self.db_connection.get_table_info(new_hand_id)
+        except Exception:
+            log.exception(_("database error: skipping %s") % new_hand_id)
+            return None
+
+        # Do nothing if this site is on the ignore list
+        if site_name in self.aux_disabled_sites:
+            return None
+
+        if type == "tour":   # hand is from a tournament
+            key = "%s Table %s" % (tour_number, tab_number)
+            # Have we moved tables in a tournament?
+            # Note that kill+restart will reset the aggregation settings
+            with self.lock:
+                tables = self.tables.values()
+            for table in tables:
+                if table.type == "tour" and table.tour_number == tour_number and table.tab_number != tab_number:
+                    log.info(_("Table number changed: %s %s >>> %s") % (str(tour_number), str(table.tab_number), str(tab_number)))
+                    self.kill(table.key)
+        else:
+            key = table_name
+
+        table = self.get_table(key)
+#       detect maxseats changed in hud
+#       if so, kill and create new hud with specified "max"
+        if table is not None:
+            newmax = table.hud_params.get('new_max_seats')  # trigger
+            if newmax and table.max != newmax:  # max has changed
+                self.kill(key)
+                max = newmax
+            table.hud_params['new_max_seats'] = None   # reset trigger
+
+#       detect poker_game changed in latest hand (i.e. mixed game)
+#       if so, kill and create new hud with specified poker_game
+#       Note that this will reset the aggretation params for that table
+        table = self.get_table(key)
+        if table is not None and table.poker_game != poker_game:
+            log.info("game changed!: %s" % poker_game)
+            self.kill(key)
+
+#        Update an existing HUD
+        table = self.get_table(key)
+        hero_id = self.hero_ids.get(site_id, -1)
+        if table is not None:
+            # get stats using hud's specific params and get cards
+            table.stat_dict = self.stat_cache.get_stats(new_hand_id, type, table.hud_params, hero_id, num_seats)
+            table.cards = self.get_cards(new_hand_id, poker_game)
+            table.hands += 1
+            self.listener.update(new_hand_id, table)
+
+#        Or create a new HUD
+        else:
+            # get stats using default params--also get cards
+            stat_dict = self.stat_cache.get_stats(new_hand_id, type, self.hud_params, hero_id, num_seats)
+            table = TableState(key, table_name, max, poker_game, type, site_name, tour_number, tab_number,
+                               self.table_params(type))
+            table.stat_dict = stat_dict
+            table.cards = self.get_cards(new_hand_id, poker_game)
+            table.hands = 1
+            if self.listener.create(new_hand_id, table):
+                with self.lock:
+                    self.tables[key] = table
+                # sqlcoder: I forget why these are set to true (aren't they ignored from now on?)
+                # but I think it's needed:
+                self.hud_params['aggregate_ring'] = True
+                self.hud_params['h_aggregate_ring'] = True
+                # so maybe the tour ones should be set as well? does this fix the bug I see mentioned?
+                self.hud_params['aggregate_tour'] = True
+                self.hud_params['h_aggregate_tour'] = True
+        return table
+
+    def table_params(self, type):
+        """Returns the hud_params of a new HUD for a table of type"""
+        hud_params = dict.copy(self.hud_params)
+        # set agg_bb_mult so that aggregate_tour and aggregate_ring can be ignored,
+        # agg_bb_mult == 1 means no aggregation after these if statements:
+        if type == "tour" and self.hud_params['aggregate_tour'] == False:
+            hud_params['agg_bb_mult'] = 1
+        elif type == "ring" and self.hud_params['aggregate_ring'] == False:
+            hud_params['agg_bb_mult'] = 1
+        if type == "tour" and self.hud_params['h_aggregate_tour'] == False:
+            hud_params['h_agg_bb_mult'] = 1
+        elif type == "ring" and self.hud_params['h_aggregate_ring'] == False:
+            hud_params['h_agg_bb_mult'] = 1
+        return hud_params
+
+    def get_table(self, key):
+        with self.lock:
+            return self.tables.get(key)
+
+    def kill(self, key):
+        with self.lock:
+            table = self.tables.pop(key, None)
+        if table is not None:
+            self.listener.kill(table)
+
+    def forget(self, key):
+        """The HUD of key has been closed by the gui"""
+        with self.lock:
+            self.tables.pop(key, None)
+
+    def get_cards(self, new_hand_id, poker_game):
+        cards = self.db_connection.get_cards(new_hand_id)
+        if poker_game in ['holdem','omahahi','omahahilo']:
+            comm_cards = self.db_connection.get_common_cards(new_hand_id)
+            cards['common'] = comm_cards['common']
+        return cards
+
+    def close(self):
+        self.db_connection.connection.rollback()
+        self.db_connection.disconnect()
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""HudProtocol.py
+
+The messages between the importer and the HUD, over a local socket.
+"""
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#    In the "official" distribution you can find the license in agpl-3.0.txt.
+
+#    A message is the length of its payload as 4 bytes (network order), then
+#    the payload. The HUD's first message is the token the importer gave it in
+#    its environment (TOKEN_VARIABLE), a connection that doesn't start with it
+#    is closed: any local process can connect to the port. Then the importer
+#    sends the ids of the new hands separated by spaces, an empty message tells
+#    the HUD to quit. The HUD answers each message once its hands are processed
+#    with the number of hands, the importer doesn't send more than `window`
+#    messages ahead of the answers.
+
+#    Standard Library modules
+import socket
+import select
+import struct
+import logging
+import binascii
+import os
+from collections import deque
+from time import time
+
+# logging has been set up in fpdb.py or HUD_main.py, use their settings:
+log = logging.getLogger("hud")
+
+HEADER = struct.Struct('!I')    # length of the payload
+MAX_PAYLOAD = 1 << 20           # a message longer than this is an error
+HOST = '127.0.0.1'
+TOKEN_VARIABLE = 'FPDB_HUD_TOKEN'   # environment variable the HUD gets the token from
+HANDSHAKE_TIMEOUT = 5.0         # seconds a new connection has to send the token
+MAX_QUEUED = 10000              # hands kept for a HUD that isn't connected, the oldest are dropped
+
+
+def send_message(sock, payload):
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+def recv_bytes(sock, size):
+    """Returns the next size bytes of sock, None if it is closed before the first one"""
+    chunks, left = [], size
+    while left > 0:
+        chunk = sock.recv(left)
+        if not chunk:
+            if left == size:
+                return None
+            raise IOError("connection closed in a message")
+        chunks.append(chunk)
+        left -= len(chunk)
+    return ''.join(chunks)
+
+def recv_message(sock):
+    """Returns the payload of the next message, None if sock is closed"""
+    header = recv_bytes(sock, HEADER.size)
+    if header is None:
+        return None
+    (size,) = HEADER.unpack(header)
+    if size > MAX_PAYLOAD:
+        raise IOError("message of %d bytes" % size)
+    if size == 0:
+        return ''
+    payload = recv_bytes(sock, size)
+    if payload is None:
+        raise IOError("connection closed in a message")
+    return payload
+
+def listen(host = HOST):
+    """Returns a socket listening on a free port of host, for HudClient"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind((host, 0))
+    listener.listen(1)
+    return listener
+
+def new_token():
+    return binascii.hexlify(os.urandom(16))
+
+def connect(port, token, host = HOST):
+    """Connects the HUD to the HudClient listening on port, token is its token"""
+    sock = socket.create_connection((host, port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    send_message(sock, token)
+    return sock
+
+def serve(sock, process):
+    """Calls process(hand ids) for the hands of each message read from sock and
+       answers it, until the importer quits or closes the connection"""
+    while True:
+        payload = recv_message(sock)
+        if not payload:
+            break
+        hand_ids = payload.split()
+        process(hand_ids)
+        send_message(sock, str(len(hand_ids)))
+
+
+class HudClient:
+    """The importer's end of the connection to the HUD.
+
+       The HUD connects to listener (see listen()) with token when it is
+       ready, until then the hand ids are queued. send_hands() sends them in
+       messages of up to batch hands. When `window` messages haven't been
+       answered it waits up to timeout seconds (None: until the HUD answers) and
+       leaves the rest queued for the next poll(), so a slow HUD neither gets
+       further and further behind nor blocks the caller longer than timeout.
+       A connection error drops the connection, the HUD may connect again.
+       latencies has (seconds until the answer, hands) for each message answered."""
+
+    def __init__(self, listener = None, sock = None, batch = 100, window = 4, timeout = 0.0, token = None):
+        self.listener = listener
+        self.sock = sock
+        self.batch = batch
+        self.window = window
+        self.timeout = timeout
+        self.token = token if token is not None else new_token()
+        self.queue = deque(maxlen = MAX_QUEUED)   # hand ids not sent yet
+        self.sent = deque()         # (time sent, hands) of the messages not answered yet
+        self.latencies = []
+        if sock is not None:
+            self.setup(sock)
+
+    def port(self):
+        return self.listener.getsockname()[1]
+
+    def setup(self, sock):
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+
+    def connected(self, timeout = 0.0):
+        """Accepts the HUD's connection if it is waiting, returns whether there is one"""
+        if self.sock is None and self.listener is not None:
+            self.listener.settimeout(timeout)
+            try:
+                (sock, address) = self.listener.accept()
+            except (socket.error, socket.timeout):
+                return False
+            try:
+                sock.settimeout(HANDSHAKE_TIMEOUT)
+                token = recv_message(sock)
+            except (socket.error, socket.timeout, IOError):
+                token = None
+            if token != self.token:
+                log.warning("HudClient: rejected a connection from %s:%s without the token" % address)
+                sock.close()
+                return False
+            self.setup(sock)
+        return self.sock is not None
+
+    def disconnect(self):
+        """Drops the connection after an error, the hands not answered are lost"""
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        self.sent.clear()
+
+    def send_hands(self, hand_ids):
+        self.queue.extend(hand_ids)
+        self.poll()
+
+    def poll(self):
+        """Sends the queued hands if the HUD has connected"""
+        if self.connected():
+            self.flush()
+
+    def flush(self):
+        try:
+            self.read_answers()
+            while self.queue:
+                if len(self.sent) >= self.window and not self.wait_answer(self.timeout):
+                    break       # the HUD is behind, the rest waits for the next poll()
+                hand_ids = [str(self.queue.popleft()) for i in xrange(min(self.batch, len(self.queue)))]
+                send_message(self.sock, ' '.join(hand_ids))
+                self.sent.append((time(), len(hand_ids)))
+        except (socket.error, IOError):
+            self.disconnect()
+            raise
+
+    def wait_answer(self, timeout = None):
+        """Reads the answer to the oldest message sent, waiting up to timeout
+           seconds (None: as long as it takes). Returns False if it didn't arrive"""
+        if timeout is not None and not select.select([self.sock], [], [], timeout)[0]:
+            return False
+        payload = recv_message(self.sock)
+        if payload is None:
+            raise IOError("the HUD closed the connection")
+        (sent, hands) = self.sent.popleft()
+        self.latencies.append((time() - sent, hands))
+        return True
+
+    def read_answers(self):
+        """Reads the answers that have arrived, without waiting"""
+        while self.sent and self.wait_answer(0):
+            pass
+
+    def drain(self):
+        """Waits until the HUD has processed all the hands sent and queued"""
+        try:
+            while self.sent or (self.queue and self.sock is not None):
+                if self.sent:
+                    self.wait_answer()
+                self.flush()
+        except (socket.error, IOError):
+            self.disconnect()
+            raise
+
+    def close(self):
+        """Tells the HUD to quit"""
+        if self.sock is not None:
+            try:
+                send_message(self.sock, '')
+            except socket.error, e:
+                log.error("HudClient.close: %s" % e)
+            self.sock.close()
+            self.sock = None
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
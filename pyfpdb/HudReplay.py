@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+"""Replays a stream of hand ids to a headless HUD (HudEngine) over the socket
+   protocol of the importer (HudProtocol), and measures the time from a hand
+   being sent to its stats being ready, and the hands per second.
+
+   The hands of N simulated tables are imported first: N copies of a
+   PokerStars file, each with its own table name and hand numbers, dealt in
+   turns. --stream replays a recorded stream instead, a line of hand ids per
+   import of the importer, from the database as it is.
+   Uses the database in HUD_config.test.xml, which is recreated unless --stream."""
+
+import sys
+import os
+import re
+import codecs
+import shutil
+import tempfile
+import threading
+from time import time, sleep
+from optparse import OptionParser
+
+import HudEngine
+import HudProtocol
+import TestFixtures
+
+
+class ReplayListener(HudEngine.HudListener):
+    """Notes the time each hand's stats are ready"""
+
+    def __init__(self):
+        self.done = {}          # hand id -> time
+        self.tables = set()
+        self.created = 0
+        self.killed = 0
+
+    def create(self, hand_id, table):
+        self.done[int(hand_id)] = time()
+        self.tables.add(table.key)
+        self.created += 1
+        return True
+
+    def update(self, hand_id, table):
+        self.done[int(hand_id)] = time()
+
+    def kill(self, table):
+        self.killed += 1
+
+
+def import_tables(config, file, tables):
+    """Imports tables copies of the PokerStars file, at tables 'Replay 1'... and
+       returns the stream of hand ids, the hands of the tables in turns"""
+    text = codecs.open(file, encoding = 'utf-8-sig').read()
+    dir = tempfile.mkdtemp()
+    try:
+        paths = []
+        for k in xrange(1, tables + 1):
+            copy = re.sub(u"(PokerStars (Game|Hand) #)(\d+)", lambda m: u"%s%d%s" % (m.group(1), k, m.group(3)), text)
+            copy = re.sub(u"Table '[^']*'", u"Table 'Replay %d'" % k, copy)
+            path = os.path.join(dir, "table-%d.txt" % k)
+            codecs.open(path, 'w', encoding = 'utf-8').write(copy)
+            paths.append(path)
+        db = TestFixtures.import_files(config, paths)
+    finally:
+        shutil.rmtree(dir)
+
+    c = db.get_cursor()
+    c.execute("SELECT id, tableName FROM Hands ORDER BY id")
+    hands = {}
+    for (id, table) in c.fetchall():
+        hands.setdefault(table, []).append(id)
+    db.disconnect()
+    stream = []
+    for i in xrange(max(len(ids) for ids in hands.values())):
+        for table in sorted(hands):
+            if i < len(hands[table]):
+                stream.append([hands[table][i]])
+    return stream
+
+def run_engine(config, port, token, listener, started):
+    engine = HudEngine.HudEngine(config, listener)
+    started.set()
+    sock = HudProtocol.connect(port, token)
+    HudProtocol.serve(sock, engine.process_hands)
+    sock.close()
+    engine.close()
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = OptionParser()
+    parser.add_option("-t", "--tables", dest="tables", type="int", default=4,
+                      help="number of simulated tables")
+    parser.add_option("-n", "--hands", dest="hands", type="int", default=None,
+                      help="hands replayed per table (default all)")
+    parser.add_option("-f", "--file", dest="file", default=TestFixtures.STARS_FILE,
+                      help="PokerStars hand history file dealt at each table")
+    parser.add_option("-r", "--rate", dest="rate", type="float", default=0,
+                      help="hands per second per table, 0 sends them as fast as the HUD takes them")
+    parser.add_option("-w", "--window", dest="window", type="int", default=4,
+                      help="messages sent ahead of the HUD's answers")
+    parser.add_option("-b", "--batch", dest="batch", type="int", default=100,
+                      help="most hands sent in one message")
+    parser.add_option("-s", "--stream", dest="stream", default=None,
+                      help="replay this recorded stream instead of importing the tables")
+    parser.add_option("-o", "--record", dest="record", default=None,
+                      help="write the stream replayed to this file")
+    (options, argv) = parser.parse_args(args = argv)
+
+    config = TestFixtures.get_config()
+    if options.stream:
+        stream = [[int(id) for id in line.split()] for line in open(options.stream) if line.strip()]
+    else:
+        stream = import_tables(config, options.file, options.tables)
+        if options.hands is not None:
+            stream = stream[:options.hands * options.tables]
+    if options.record:
+        open(options.record, 'w').write(''.join(' '.join(map(str, ids)) + '\n' for ids in stream))
+
+    # the replay waits for the engine, to measure it at full speed
+    client = HudProtocol.HudClient(HudProtocol.listen(), batch = options.batch, window = options.window, timeout = None)
+    listener = ReplayListener()
+    started = threading.Event()
+    engine = threading.Thread(target = run_engine, args = (config, client.port(), client.token, listener, started))
+    engine.start()
+    started.wait()
+    if not client.connected(timeout = 30):
+        print "the engine did not connect"
+        return 1
+
+    sent = {}                       # hand id -> time
+    start = time()
+    for (i, ids) in enumerate(stream):
+        if options.rate:
+            wait = start + i / (options.rate * options.tables) - time()
+            if wait > 0:
+                sleep(wait)
+        now = time()
+        for id in ids:
+            sent[id] = now
+        client.send_hands(ids)
+    client.drain()
+    elapsed = time() - start
+    client.close()
+    engine.join()
+
+    latencies = sorted(listener.done[id] - sent[id] for id in sent if id in listener.done)
+    hands = len(sent)
+    print "%d hands at %d tables, %d messages, %d HUDs created, %d killed" % (hands, len(listener.tables),
+          len(client.latencies), listener.created, listener.killed)
+    if len(latencies) != hands:
+        print "%d hands got no stats" % (hands - len(latencies))
+    if latencies:
+        print "%.2fs, %.1f hands/s" % (elapsed, hands / elapsed)
+        print "hand to stats (ms): mean %.2f  median %.2f  95%% %.2f  max %.2f" % (
+              1000 * sum(latencies) / len(latencies), 1000 * percentile(latencies, 0.5),
+              1000 * percentile(latencies, 0.95), 1000 * latencies[-1])
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
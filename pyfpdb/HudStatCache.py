@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""HudStatCache.py
+
+In-process cache of the HUD stats of the players seen at the tables.
+"""
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#    In the "official" distribution you can find the license in agpl-3.0.txt.
+
+#    Standard Library modules
+import logging
+from datetime import date
+from time import time
+
+# logging has been set up in fpdb.py or HUD_main.py, use their settings:
+log = logging.getLogger("hud")
+
+# columns of get_stats_from_hand_players that describe the hand, not a stat
+HAND_COLUMNS = ('gametype_id', 'table_name')
+# columns that are replaced by the latest hand instead of added up
+PLAYER_COLUMNS = ('player_id', 'seat', 'screen_name', 'hand_id', 'seats')
+# seconds between two reads of the start of the session stats (hand_1day_ago)
+SESSION_CHECK = 60
+
+
+class HudStatCache:
+    """Replacement for Database.get_stats_from_hand() in the HUD.
+
+       The stats of a player are fetched with get_stats_from_hand() (HudCache,
+       or HandsPlayers for session stats) the first time the player is seen with
+       a set of HUD params. After that only the HandsPlayers rows of each new
+       hand are read and added to the cached stats, so a hand costs one small
+       query whatever the number of tables. The cache is dropped every day, as
+       that moves the start of the 'T' aggregation period. Session
+       stats ('S') cover the last 24 hours: they remember the first hand they
+       were read from (Database.hand_1day_ago) and are read again when that
+       moves forward."""
+
+    def __init__(self, db):
+        self.db = db
+        self.players = {}        # player id -> {key: {'stats': stat dict, 'upto': last hand id in stats,
+                                 #                     'cutoff': hand_1day_ago when it was read}}
+        self.gametypes = {}      # gametype id -> (siteId, type, category, limitType, bigBlind)
+        self.day = date.today()
+        self.cutoff = 0          # hand_1day_ago the session stats were last checked against
+        self.checked = 0         # time of that check
+
+        query = self.db.sql.query['get_stats_from_hand_players']
+        if self.db.db_server == 'mysql':
+            self.query = query.replace("<signed>", 'signed ')
+        else:
+            self.query = query.replace("<signed>", '')
+
+    def get_stats(self, hand, type, hud_params, hero_id = -1, num_seats = 6):
+        """Returns the stat_dict for hand, see Database.get_stats_from_hand()"""
+        hand = int(hand)
+        if date.today() != self.day:
+            self.players = {}
+            self.day = date.today()
+        self.expire_sessions()
+
+        rows = self.get_hand_rows(hand)
+        keys, missing = {}, False
+        for row in rows:
+            pid = row['player_id']
+            keys[pid] = self.key(row, hud_params, hero_id, num_seats)
+            if keys[pid] not in self.players.get(pid, {}):
+                missing = True
+        if missing:
+            self.seed(hand, type, hud_params, hero_id, num_seats, rows, keys)
+
+        stat_dict = {}
+        for row in rows:
+            pid = row['player_id']
+            for key, entry in self.players[pid].iteritems():
+                if hand > entry['upto'] and self.counts(key, row):
+                    self.add(entry['stats'], row)
+                    entry['upto'] = hand
+            stats = self.players[pid][keys[pid]]['stats']
+            if stats:
+                stat_dict[pid] = dict(stats)
+                for name in ('seat', 'screen_name'):
+                    stat_dict[pid][name] = row[name]
+        return stat_dict
+
+    def get_hand_rows(self, hand):
+        c = self.db.get_cursor()
+        c.execute(self.query, (hand,))
+        colnames = [desc[0].lower() for desc in c.description]
+        rows = [dict(zip(colnames, row)) for row in c.fetchall()]
+        for row in rows:
+            if row['gametype_id'] not in self.gametypes:
+                c.execute(self.db.sql.query['get_hud_gametype'], (row['gametype_id'],))
+                self.gametypes[row['gametype_id']] = c.fetchone()
+        return rows
+
+    def expire_sessions(self):
+        """Drops the session stats that include hands played more than a day ago"""
+        if time() - self.checked < SESSION_CHECK:
+            return
+        self.checked = time()
+        c = self.db.get_cursor()
+        c.execute(self.db.sql.query['get_hand_1day_ago'])
+        row = c.fetchone()
+        cutoff = int(row[0]) if row and row[0] else 1
+        if cutoff <= self.cutoff:
+            return
+        self.cutoff = cutoff
+        for entries in self.players.itervalues():
+            for key in [k for k in entries if k[0] == 'S' and entries[k]['cutoff'] < cutoff]:
+                del entries[key]
+
+    def key(self, row, hud_params, hero_id, num_seats):
+        """The cache key of the stats shown for the player in row with these HUD params"""
+        p = 'h_' if row['player_id'] == hero_id else ''
+        style = hud_params[p + 'hud_style']
+        seats = self.db.get_seats_range(hud_params[p + 'seats_style'], hud_params[p + 'seats_cust_nums'], num_seats)
+        if style == 'S':
+            # session stats are read from the hands at this table
+            return (style, row['table_name']) + seats
+        days = 0
+        if style == 'T':
+            days = hud_params[p + 'hud_days']
+        return (style, row['gametype_id'], hud_params[p + 'agg_bb_mult'], days) + seats
+
+    def seed(self, hand, type, hud_params, hero_id, num_seats, rows, keys):
+        """Reads the stats of the players in rows that are not cached yet"""
+        c = self.db.get_cursor()
+        c.execute(self.db.sql.query['get_last_hand'])
+        upto = c.fetchone()[0] or hand    # hands up to here are already in HudCache
+        self.db.init_hud_stat_vars(hud_params['hud_days'], hud_params['h_hud_days'])
+        stat_dict = self.db.get_stats_from_hand(hand, type, hud_params, hero_id, num_seats)
+        for row in rows:
+            pid = row['player_id']
+            entries = self.players.setdefault(pid, {})
+            if keys[pid] not in entries:
+                entries[keys[pid]] = {'stats': stat_dict.get(pid, {}), 'upto': upto,
+                                      'cutoff': self.db.hand_1day_ago}
+
+    def counts(self, key, row):
+        """True if get_stats_from_hand() would include the hand in row in the stats for key,
+           mirroring the WHERE clauses of get_stats_from_hand_aggregated/_session"""
+        if key[0] == 'S':
+            (style, table_name, seats_min, seats_max) = key
+            return row['table_name'] == table_name and seats_min <= row['seats'] <= seats_max
+        (style, gametype_id, agg_bb_mult, days, seats_min, seats_max) = key
+        if style == 'T' and not self.db.build_full_hudcache:
+            return False    # HudCache rows all have styleKey A000000
+        active_seats = row['seats'] if self.db.build_full_hudcache else 0
+        if not seats_min <= active_seats <= seats_max:
+            return False
+        gt1, gt2 = self.gametypes[row['gametype_id']], self.gametypes[gametype_id]
+        return (gt1[:4] == gt2[:4]
+                and gt1[4] <= gt2[4] * agg_bb_mult
+                and gt1[4] >= gt2[4] / agg_bb_mult)
+
+    def add(self, stats, row):
+        for name, val in row.iteritems():
+            if name in HAND_COLUMNS:
+                continue
+            elif name in PLAYER_COLUMNS:
+                if name in stats or name in ('player_id', 'seat', 'screen_name'):
+                    stats[name] = val
+            elif stats.get(name) is None:
+                stats[name] = val
+            elif val is not None:
+                try:
+                    stats[name] += val
+                except TypeError:   # Decimal from the db + float
+                    stats[name] = float(stats[name]) + float(val)
+
+
+# HandsPlayers.position -> position group shown by Stats.starthands()
+# (b=SB/BB, l=Button/cutoff, m=previous 3 seats to that, e=remainder)
+STARTHANDS_POSITIONS = {'B': 'b', 'S': 'b', '0': 'l', '1': 'l', '2': 'm', '3': 'm', '4': 'm',
+                        '5': 'e', '6': 'e', '7': 'e', '8': 'e', '9': 'e'}
+STARTHANDS_FILES = 50    # files kept in StartHandsCache
+
+
+class StartHandsCache:
+    """Starting hands played in each hand history file, for Stats.starthands().
+
+       The voluntarily played holdem starting hands of a file (and game type and
+       limit type) are read once with the hands up to the one shown. Later calls
+       only read the hands stored since, with a query on the Hands id range, so
+       rendering a popup costs at most one small query on the connection the
+       hand was loaded with."""
+
+    def __init__(self):
+        self.files = {}          # hand id -> file id
+        self.ranges = {}         # (file id, type, limitType) -> {'upto': last hand id read, 'players': {player id: set of rows}}
+
+    def get_starthands(self, db, hand, type, limitType, player):
+        """Returns the distinct (startCards, street0Aggr, street0CalledRaiseDone, position
+           group) of player in the file of hand, by startCards descending"""
+        hand = int(hand)
+        c = db.get_cursor()
+        if hand not in self.files:
+            c.execute(db.query('get_hand_fileId'), (hand,))
+            row = c.fetchone()
+            self.files[hand] = row[0] if row else None
+        key = (self.files[hand], type, limitType)
+        if key not in self.ranges:
+            if len(self.ranges) >= STARTHANDS_FILES:
+                # the file read longest ago is the least likely to be shown again
+                del self.ranges[min(self.ranges, key = lambda k: self.ranges[k]['upto'])]
+                self.files = {}
+            self.ranges[key] = {'upto': 0, 'players': {}}
+        cached = self.ranges[key]
+        if hand > cached['upto']:
+            c.execute(db.query('get_starthands'),
+                      (key[0], cached['upto'], hand, type, limitType))
+            for (pid, startCards, street0Aggr, street0CalledRaiseDone, position) in c.fetchall():
+                row = (startCards, street0Aggr, street0CalledRaiseDone, STARTHANDS_POSITIONS.get(str(position), 'X'))
+                cached['players'].setdefault(pid, set()).add(row)
+            cached['upto'] = hand
+        return sorted(cached['players'].get(player, ()), key = lambda row: (-row[0], row[1:]))
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+"""Independent Chip Model: the prize equity of tournament stacks.
+
+equities(stacks, payouts) gives the share of the prize pool of each stack
+under the Malmuth-Harville model: a player finishes first with the probability
+stack / total chips, then the others play for the next place the same way.
+
+The probability that a set of players took the first places, in any order,
+only depends on the set.  So instead of going through the n! finishing orders
+the sets are enumerated as bitmasks, each one from the sets one player
+smaller: sum(C(n, k) for k < places) sets, 1023 for 10 players and 10 places.
+Fields with too many sets for that are approximated by sampling finishing
+orders, with numpy when it is available.
+"""
+
+import logging
+import random
+
+import L10n
+_ = L10n.get_translation()
+
+# logging has been set up in fpdb.py or HUD_main.py, use their settings:
+log = logging.getLogger("parser")
+
+try:
+    import numpy
+    use_numpy = True
+except ImportError:
+    log.info(_("Not using numpy to sample ICM equities."))
+    use_numpy = False
+
+EXACT_SETS = 100000         # more sets of players than this are sampled
+ITERATIONS = 20000          # finishing orders sampled
+CACHE_SIZE = 1000           # equities kept, see equities()
+
+cache = {}
+
+def equities(stacks, payouts, iterations = ITERATIONS):
+    """Returns the prize equity of each of stacks, as floats.
+       payouts[0] is the prize for 1st place etc.  Empty stacks get nothing and
+       payouts for more places than there are stacks left are not paid.
+       The results are kept, the replayer asks for the same stacks again as
+       it steps through a hand."""
+    key = (tuple(stacks), tuple(payouts), iterations)
+    try:
+        return list(cache[key])
+    except KeyError:
+        pass
+    live = [i for i, stack in enumerate(stacks) if stack > 0]
+    live_stacks = [float(stacks[i]) for i in live]
+    live_payouts = [float(payout) for payout in payouts[:len(live)]]
+    if set_count(len(live), len(live_payouts)) <= EXACT_SETS:
+        live_equities = harville(live_stacks, live_payouts)
+    else:
+        live_equities = sampled(live_stacks, live_payouts, iterations, hash(key))
+    result = [0.0] * len(stacks)
+    for i, equity in zip(live, live_equities):
+        result[i] = equity
+    if len(cache) >= CACHE_SIZE:
+        cache.clear()
+    cache[key] = result
+    return list(result)
+
+def set_count(players, places):
+    """Number of sets of players enumerated by harville()"""
+    count, sets = 0, 1
+    for k in xrange(places):
+        count += sets
+        sets = sets * (players - k) / (k + 1)
+    return count
+
+def harville(stacks, payouts):
+    """Exact equities, stacks must all be > 0 and there are at most as many payouts"""
+    n = len(stacks)
+    total = sum(stacks)
+    result = [0.0] * n
+    # players who took the first k places as a bitmask -> [probability, their chips]
+    level = {0: [1.0, 0.0]}
+    for k, payout in enumerate(payouts):
+        last = k + 1 == len(payouts)
+        next_level = {}
+        for mask, (prob, taken) in level.iteritems():
+            left = total - taken
+            for i in xrange(n):
+                bit = 1 << i
+                if mask & bit:
+                    continue
+                p = prob * stacks[i] / left
+                result[i] += p * payout
+                if last:
+                    continue
+                entry = next_level.get(mask | bit)
+                if entry is None:
+                    next_level[mask | bit] = [p, taken + stacks[i]]
+                else:
+                    entry[0] += p
+        level = next_level
+    return result
+
+def sampled(stacks, payouts, iterations, seed):
+    """Equities over iterations random finishing orders.  Ordering the players
+       by exponential times divided by their stacks gives a finishing order with
+       the Malmuth-Harville probability."""
+    n = len(stacks)
+    prizes = list(payouts) + [0.0] * (n - len(payouts))
+    if use_numpy:
+        rng = numpy.random.RandomState(seed & 0xFFFFFFFF)
+        times = rng.exponential(size = (iterations, n)) / numpy.array(stacks)
+        places = numpy.argsort(numpy.argsort(times, axis = 1), axis = 1)
+        return list(numpy.array(prizes)[places].mean(axis = 0))
+    rng = random.Random(seed)
+    result = [0.0] * n
+    for j in xrange(iterations):
+        order = sorted(xrange(n), key = lambda i: rng.expovariate(1.0) / stacks[i])
+        for place, i in enumerate(order):
+            result[i] += prizes[place]
+    return [equity / iterations for equity in result]
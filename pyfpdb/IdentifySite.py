@@ -24,8 +24,10 @@ import os
 from time import time
 from optparse import OptionParser
 import codecs
+import json
 import Database
 import Configuration
+from decimal_wrapper import Decimal
 import logging
 # logging has been set up in fpdb.py or HUD_main.py, use their settings:
 log = logging.getLogger("parser")
@@ -36,6 +38,33 @@ __ARCHIVE_PRE_HEADER_REGEX['Fulltilt'] ='\*{20}\s#\s\d+\s\*{20,25}\s?'
 re_SplitArchive['PokerStars'] = re.compile(__ARCHIVE_PRE_HEADER_REGEX['PokerStars'], re.MULTILINE)
 re_SplitArchive['Fulltilt'] = re.compile(__ARCHIVE_PRE_HEADER_REGEX['Fulltilt'], re.MULTILINE)
 
+# Files are identified from their first HEADER_CHARS characters, read from
+# HEADER_BYTES bytes (enough for 2 byte encodings)
+HEADER_CHARS = 5000
+HEADER_BYTES = 2 * HEADER_CHARS
+
+def dumpGameType(gametype):
+    """The gametype dict of a file as JSON for IdentifyCache, Decimals as {"Decimal": "0.02"}"""
+    def decimal(value):
+        if isinstance(value, Decimal):
+            return {'Decimal': str(value)}
+        raise TypeError("%r is not JSON serializable" % (value,))
+    return json.dumps(gametype, default = decimal)
+
+def loadGameType(text):
+    """The gametype dict stored by dumpGameType(), None if text isn't one"""
+    def decimal(obj):
+        if obj.keys() == ['Decimal']:
+            return Decimal(obj['Decimal'])
+        return obj
+    try:
+        gametype = json.loads(text, object_hook = decimal)
+    except ValueError:
+        return None
+    if not isinstance(gametype, dict):
+        return None
+    return gametype
+
 class FPDBFile:
     path = ""
     ftype = None # Valid: hh, summary, both
@@ -80,13 +109,41 @@ class IdentifySite:
         self.filelist = {}
         self.re_identify = self.getSiteRegex()
         self.generateSiteList(hhcs)
+        self.re_combined, self.signatures = self.getCombinedRegex()
+        # IdentifyCache rows by path, and the rows to write back
+        self.cache = self.db.get_identify_cache()
+        self.cache_updates = {}
+        self.pruneCache()
 
     def scan(self, path):
         if os.path.isdir(path):
             self.walkDirectory(path, self.sitelist)
         else:
             self.processFile(path)
+        self.storeCache()
+
+    def storeCache(self):
+        """Writes the files identified since the last call to IdentifyCache"""
+        if self.cache_updates:
+            replace = [path for path in self.cache_updates if path in self.cache]
+            self.db.store_identify_cache([(path,) + row for path, row in self.cache_updates.iteritems()], replace)
+            self.cache.update(self.cache_updates)
+            self.cache_updates = {}
             
+    def pruneCache(self):
+        """Deletes the IdentifyCache rows of the files that don't exist anymore"""
+        stale = []
+        for path in self.cache:
+            try:
+                if not os.path.exists(path):
+                    stale.append(path)
+            except UnicodeError:    # a name the filesystem encoding can't represent, keep it
+                pass
+        if stale:
+            self.db.delete_identify_cache(stale)
+            for path in stale:
+                del self.cache[path]
+
     def get_fobj(self, file):
         try:
             fobj = self.filelist[file]
@@ -128,6 +185,22 @@ class IdentifySite:
         re_identify['WinamaxSummary']       = re.compile(u"Winamax\sPoker\s\-\sTournament\ssummary")
         return re_identify
 
+    def getCombinedRegex(self):
+        """Returns one regex matching the signature of every site in sitelist, with
+           a named group per signature, and the (site name, file type) of each group.
+           The groups are in the order idSite tries them: hand histories, summaries,
+           then PokerTracker"""
+        signatures, patterns = [], []
+        for id, site in self.sitelist.iteritems():
+            signatures.append((site.name, "hh", self.re_identify[site.filter_name]))
+        for id, site in self.sitelist.iteritems():
+            if site.summary in self.re_identify:
+                signatures.append((site.name, "summary", self.re_identify[site.summary]))
+        signatures.append(('PokerTracker', "hh", self.re_identify['PokerTracker']))
+        for i, (name, ftype, regex) in enumerate(signatures):
+            patterns.append(u'(?P<g%d>%s)' % (i, regex.pattern))
+        return re.compile(u'|'.join(patterns)), [(name, ftype) for (name, ftype, regex) in signatures]
+
     def generateSiteList(self, hhcs):
         """Generates a ordered dictionary of site, filter and filter name for each site in hhcs"""
         if not hhcs:
@@ -165,60 +238,117 @@ class IdentifySite:
     def processFile(self, path):
         if path.endswith('.txt') or path.endswith('.xml') or path.endswith('.log'):
             if path not in self.filelist:
-                whole_file, kodec = self.read_file(path)
-                if whole_file:
-                    fobj = self.idSite(path, whole_file[:5000], kodec)
-                    if fobj == False: # Site id failed
-                        log.debug(_("DEBUG:") + " " + _("siteId Failed for: %s") % path)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    return
+                (size, mtime) = (stat.st_size, int(stat.st_mtime))
+                key = self.cacheKey(path)
+                cached = self.cache.get(key)
+                if cached and cached[:2] == (size, mtime):
+                    fobj = self.cachedFile(path, cached)
+                else:
+                    fobj = None
+                if fobj is None:
+                    header, kodec = self.read_header(path)
+                    if not header:
+                        return
+                    fobj = self.idSite(path, header, kodec)
+                    if fobj == False:
+                        self.cache_updates[key] = (size, mtime, None, None, kodec, False, None)
                     else:
-                        self.filelist[path] = fobj
+                        self.cache_updates[key] = (size, mtime, fobj.site.name, fobj.ftype, kodec, fobj.archive, None)
+                if fobj == False: # Site id failed
+                    log.debug(_("DEBUG:") + " " + _("siteId Failed for: %s") % path)
+                else:
+                    self.filelist[path] = fobj
+
+    def cacheKey(self, path):
+        """IdentifyCache stores the paths as unicode"""
+        if isinstance(path, unicode):
+            return path
+        return unicode(path, sys.getfilesystemencoding() or "utf8", "replace")
+
+    def cachedFile(self, path, cached):
+        """FPDBFile for a file found in IdentifyCache, False if it wasn't identified,
+           or None if its site is not in sitelist anymore"""
+        (size, mtime, sitename, ftype, kodec, archive, gametype) = cached
+        if sitename is None:
+            return False
+        if sitename == 'PokerTracker':
+            site = self.getPokerTrackerSite()
+        else:
+            site = [s for s in self.sitelist.itervalues() if s.name == sitename]
+            if not site:
+                return None
+            site = site[0]
+        f = FPDBFile(path)
+        f.site, f.ftype, f.kodec, f.archive = site, ftype, kodec, bool(archive)
+        if gametype:
+            # rows written before the JSON format are read again by fetchGameTypes()
+            f.gametype = loadGameType(gametype) or False
+        return f
+
+    def read_header(self, in_path):
+        """Returns the first HEADER_CHARS characters of in_path and the codec they
+           were decoded with, reading HEADER_BYTES bytes at most"""
+        try:
+            infile = open(in_path, 'rb')
+            head = infile.read(HEADER_BYTES)
+            infile.close()
+        except IOError:
+            return None, None
+        kodec = self.detect_codec(head)
+        try:
+            # the last character may be cut, let the incremental decoder keep it back
+            header = codecs.getincrementaldecoder(kodec)().decode(head)
+        except UnicodeDecodeError:
+            return None, None
+        return header[:HEADER_CHARS], kodec
+
+    def detect_codec(self, head):
+        """Guesses the codec of a file from its first bytes: a BOM, NUL bytes for
+           utf-16 without BOM, then utf8 if they decode as such, else cp1252"""
+        if head.startswith(codecs.BOM_UTF8):
+            return "utf8"
+        if head.startswith(codecs.BOM_UTF16_LE) or head.startswith(codecs.BOM_UTF16_BE):
+            return "utf-16"
+        # mostly ascii text in utf-16 has a NUL every other byte
+        if head[1::2].count('\x00') > len(head) / 4:
+            return "utf-16-le"
+        if head[0::2].count('\x00') > len(head) / 4:
+            return "utf-16-be"
+        try:
+            codecs.getincrementaldecoder("utf8")().decode(head)
+            return "utf8"
+        except UnicodeDecodeError:
+            return "cp1252"
 
-    def read_file(self, in_path):
-        for kodec in self.codepage:
-            try:
-                infile = codecs.open(in_path, 'r', kodec)
-                whole_file = infile.read()
-                infile.close()
-                return whole_file, kodec
-            except:
-                continue
-        return None, None
-    
     def idSite(self, path, whole_file, kodec):
         """Identifies the site the hh file originated from"""
         f = FPDBFile(path)
         f.kodec = kodec
-        for id, site in self.sitelist.iteritems():
-            filter_name = site.filter_name
-            m = self.re_identify[filter_name].search(whole_file)
-            if m and filter_name in ('Fulltilt', 'PokerStars'):
-                if re_SplitArchive[filter_name].search(whole_file):
-                    f.archive = True
-            if m:
-                f.site = site
-                f.ftype = "hh"
-                return f
+        # all the signatures found in the header, the first one in the list wins
+        found = set([m.lastgroup for m in self.re_combined.finditer(whole_file)])
+        if not found:
+            return False
+        (name, ftype) = self.signatures[min([int(g[1:]) for g in found])]
+        if name == 'PokerTracker':
+            f.site = self.getPokerTrackerSite()
+        else:
+            f.site = [s for s in self.sitelist.itervalues() if s.name == name][0]
+        f.ftype = ftype
+        if ftype == "hh" and f.site.filter_name in ('Fulltilt', 'PokerStars'):
+            if re_SplitArchive[f.site.filter_name].search(whole_file):
+                f.archive = True
+        return f
 
-        for id, site in self.sitelist.iteritems():
-            filter_name = site.filter_name
-            if site.summary in self.re_identify:
-                m = self.re_identify[site.summary].search(whole_file)
-                if m:
-                    f.site = site
-                    f.ftype = "summary"
-                    return f
-                
-        m = self.re_identify['PokerTracker'].search(whole_file)
-        if m:
-            filter = 'PokerTrackerToFpdb'
-            filter_name = 'PokerTracker'
-            mod = __import__(filter)
-            obj = getattr(mod, filter_name, None)
-            f.site = Site('PokerTracker', filter, filter_name, None, obj)
-            f.ftype = "hh"
-            return f
-        
-        return False
+    def getPokerTrackerSite(self):
+        filter = 'PokerTrackerToFpdb'
+        filter_name = 'PokerTracker'
+        mod = __import__(filter)
+        obj = getattr(mod, filter_name, None)
+        return Site('PokerTracker', filter, filter_name, None, obj)
 
     def getFilesForSite(self, sitename, ftype):
         l = []
@@ -228,8 +358,9 @@ class IdentifySite:
         return l
 
     def fetchGameTypes(self):
-        for name, f in self.filelist.iteritems():
-            if f.ftype != None and f.ftype == "hh":
+        for path, f in self.filelist.iteritems():
+            if f.ftype != None and f.ftype == "hh" and not f.gametype:
+                name = path
                 try: #TODO: this is a dirty hack. Borrowed from fpdb_import
                     name = unicode(name, "utf8", "replace")
                 except TypeError:
@@ -237,8 +368,19 @@ class IdentifySite:
                 mod = __import__(f.site.hhc_fname)
                 obj = getattr(mod, f.site.filter_name, None)
                 hhc = obj(self.config, in_path = name, sitename = f.site.hhc_fname, autostart = False)
-                if hhc.readFile():
+                # the first hand is usually in the header, else read the whole file
+                header, kodec = self.read_header(path)
+                try:
+                    f.gametype = hhc.determineGameType(header)
+                except Exception:
+                    f.gametype = None
+                if not f.gametype and hhc.readFile():
                     f.gametype = hhc.determineGameType(hhc.whole_file)
+                key = self.cacheKey(path)
+                row = self.cache_updates.get(key) or self.cache.get(key)
+                if row and f.gametype:
+                    self.cache_updates[key] = row[:6] + (dumpGameType(f.gametype),)
+        self.storeCache()
 
 def main(argv=None):
     if argv is None:
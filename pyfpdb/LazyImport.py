@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""LazyImport.py
+
+Deferred imports for the fpdb main window, and timing of the imports at startup.
+"""
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#    In the "official" distribution you can find the license in agpl-3.0.txt.
+
+#    Standard Library modules
+import os
+import sys
+import imp
+import __builtin__
+import logging
+from time import time
+
+# logging has been set up in fpdb.py or HUD_main.py, use their settings:
+log = logging.getLogger("fpdb")
+
+
+class LazyModule(object):
+    """Stands in for a module until one of its attributes is used, then
+       imports it. The tabs and dialogs of fpdb each pull in a lot (matplotlib
+       for the graphs for example), most of it isn't needed to show the window."""
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def loaded(self):
+        return self._module is not None
+
+    def load(self):
+        if self._module is None:
+            start = time()
+            self.__dict__['_module'] = __import__(self._name)
+            log.debug("imported %s in %.3fs" % (self._name, time() - start))
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+
+def installed_version(name):
+    """Returns the version of the package name, without importing it if it
+       isn't imported yet, or None if it isn't installed."""
+    if name in sys.modules:
+        return getattr(sys.modules[name], '__version__', None)
+    try:
+        (file, path, description) = imp.find_module(name)
+    except ImportError:
+        return None
+    if file is not None:
+        file.close()
+    # the name of the package metadata has the version:
+    #   numpy-1.16.6.dist-info, matplotlib-1.0.1-py2.7.egg-info, ...
+    dir = os.path.dirname(path)
+    prefix = name.lower() + '-'
+    try:
+        entries = os.listdir(dir)
+    except OSError:
+        entries = []
+    for entry in entries:
+        if entry.lower().startswith(prefix) and (entry.endswith('.dist-info') or entry.endswith('.egg-info')):
+            return entry[len(prefix):].rsplit('.', 1)[0].split('-')[0]
+    try:
+        return getattr(__import__(name), '__version__', None)
+    except ImportError:
+        return None
+
+
+class ImportTimer:
+    """Times the first import of every module while it is installed.
+       A module's own time leaves out the modules it imports."""
+
+    def __init__(self):
+        self.start = time()
+        self.times = {}         # module -> [cumulative, own] seconds
+        self.stack = []         # time spent in the imports made by the imports in progress
+        self.import_ = None
+
+    def install(self):
+        self.import_ = __builtin__.__import__
+        __builtin__.__import__ = self.timed_import
+
+    def uninstall(self):
+        if self.import_ is not None:
+            __builtin__.__import__ = self.import_
+            self.import_ = None
+
+    def timed_import(self, name, *args, **kwargs):
+        if name in sys.modules or name in self.times:
+            return self.import_(name, *args, **kwargs)
+        self.stack.append(0.0)
+        start = time()
+        try:
+            return self.import_(name, *args, **kwargs)
+        finally:
+            elapsed = time() - start
+            children = self.stack.pop()
+            if self.stack:
+                self.stack[-1] += elapsed
+            self.times[name] = [elapsed, elapsed - children]
+
+    def report(self, limit = 25):
+        """Returns the modules that took longest as lines of text"""
+        lines = ["%-32s %10s %10s" % ("module", "total (s)", "self (s)")]
+        for (name, (total, own)) in sorted(self.times.items(), key = lambda x: -x[1][0])[:limit]:
+            lines.append("%-32s %10.3f %10.3f" % (name, total, own))
+        lines.append("%d modules imported, %.3fs since startup" % (len(self.times), time() - self.start))
+        return '\n'.join(lines)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""LazyListModel.py
+
+A list model for gtk.TreeView that formats its rows only when they are shown.
+"""
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#    In the "official" distribution you can find the license in agpl-3.0.txt.
+
+#    pyGTK modules
+import pygtk
+pygtk.require('2.0')
+import gtk
+
+
+class LazyListModel(gtk.GenericTreeModel):
+    """A list of string columns over a list of raw rows, e.g. the result of a query.
+
+       Appending every row to a gtk.ListStore formats all of them and makes a gtk
+       call per row before the view can be drawn. This model keeps the raw rows
+       and calls format_row(raw row) for a row only when the view asks for one of
+       its values. The formatted rows are kept in a cache of up to cache_size rows
+       (None for no limit).
+
+       The model doesn't change once it is created: sorted() and filtered() return
+       a new model over the same rows and cache, set it on the view to show it.
+       A filtered model keeps the order of the last sorted()."""
+
+    def __init__(self, n_columns, rows, format_row, cache_size = 5000, shown = None, cache = None, sort = None):
+        gtk.GenericTreeModel.__init__(self)
+        # gtk doesn't hold a reference to the rowrefs it is given, so they are
+        # kept alive in self.refs
+        self.set_property('leak-references', False)
+        self.n_columns = n_columns
+        self.rows = rows
+        self.format_row = format_row
+        self.cache_size = cache_size
+        self.cache = {} if cache is None else cache
+        # indexes in rows of the rows shown, in the order they are shown
+        self.shown = range(len(rows)) if shown is None else shown
+        # the rowrefs: refs[n] is the rowref of the nth row shown
+        self.refs = range(len(self.shown))
+        self.sort = sort            # (key, reverse) of sorted()
+
+    def get_row(self, index):
+        """Returns the formatted row of rows[index]"""
+        try:
+            return self.cache[index]
+        except KeyError:
+            pass
+        if self.cache_size is not None and len(self.cache) >= self.cache_size:
+            self.cache.clear()
+        row = self.cache[index] = self.format_row(self.rows[index])
+        return row
+
+    def append(self, raw, show = True, row = None):
+        """Adds a raw row at the end, shown or not. row is its formatted row if
+           the caller already has it"""
+        index = len(self.rows)
+        self.rows.append(raw)
+        if row is not None:
+            self.cache[index] = row
+        if show:
+            self.shown.append(index)
+            self.refs.append(len(self.refs))
+            path = (len(self.shown) - 1,)
+            self.row_inserted(path, self.get_iter(path))
+
+    def sorted(self, key, reverse = False):
+        """Returns a model with the shown rows sorted by key(index in rows)"""
+        shown = sorted(self.shown, key = key, reverse = reverse)
+        return LazyListModel(self.n_columns, self.rows, self.format_row, self.cache_size, shown, self.cache,
+                             (key, reverse))
+
+    def filtered(self, keep):
+        """Returns a model showing the rows for which keep(index in rows) is True,
+           out of all the rows of this model"""
+        shown = [i for i in xrange(len(self.rows)) if keep(i)]
+        if self.sort is not None:
+            (key, reverse) = self.sort
+            shown.sort(key = key, reverse = reverse)
+        return LazyListModel(self.n_columns, self.rows, self.format_row, self.cache_size, shown, self.cache,
+                             self.sort)
+
+    # gtk.GenericTreeModel interface, a rowref is a position in self.shown,
+    # always the int object of self.refs
+    def on_get_flags(self):
+        return gtk.TREE_MODEL_LIST_ONLY | gtk.TREE_MODEL_ITERS_PERSIST
+
+    def on_get_n_columns(self):
+        return self.n_columns
+
+    def on_get_column_type(self, index):
+        return str
+
+    def on_get_iter(self, path):
+        if path[0] < len(self.shown):
+            return self.refs[path[0]]
+        return None
+
+    def on_get_path(self, rowref):
+        return (rowref,)
+
+    def on_get_value(self, rowref, column):
+        return self.get_row(self.shown[rowref])[column]
+
+    def on_iter_next(self, rowref):
+        if rowref + 1 < len(self.shown):
+            return self.refs[rowref + 1]
+        return None
+
+    def on_iter_children(self, parent):
+        if parent is None and self.shown:
+            return self.refs[0]
+        return None
+
+    def on_iter_has_child(self, rowref):
+        return False
+
+    def on_iter_n_children(self, rowref):
+        if rowref is None:
+            return len(self.shown)
+        return 0
+
+    def on_iter_nth_child(self, parent, n):
+        if parent is None and n < len(self.shown):
+            return self.refs[n]
+        return None
+
+    def on_iter_parent(self, child):
+        return None
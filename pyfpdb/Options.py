@@ -78,6 +78,10 @@ def fpdb_options():
                       help=_("Start Minimized"))
     parser.add_option("--hidden", action="store_true", dest="hidden",
                       help=_("Start Hidden"))
+    parser.add_option("--profile-startup", action="store_true", dest="profileStartup", default=False,
+                      help=_("Print the time taken by the imports at startup"))
+    parser.add_option("--hudport", dest="hudport", default=None, type="int",
+                      help=_("Port the importer sends the new hands to the HUD on, instead of stdin"))
 
 
     (options, argv) = parser.parse_args()
@@ -156,6 +156,11 @@ class PartyPoker(HandHistoryConverter):
             return []
         return filter(lambda text: len(text.strip()), list)
 
+    def allHandsAsGenerator(self):
+        for handText in HandHistoryConverter.allHandsAsGenerator(self):
+            if len(handText.strip()):
+                yield handText
+
     def compilePlayerRegexs(self,  hand):
         players = set([player[1] for player in hand.players])
         if not players <= self.compiledPlayers: # x <= y means 'x is subset of y'
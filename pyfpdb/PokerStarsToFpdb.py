@@ -171,6 +171,32 @@ class PokerStars(HandHistoryConverter):
     re_RankOther        = re.compile(u"^%(PLYR)s finished the tournament in (?P<RANK>[0-9]+)(st|nd|rd|th) place$" %  substitutions, re.MULTILINE)
     re_Cancelled        = re.compile('Hand\scancelled', re.MULTILINE)
 
+    # Hold'em and stud hands are read in one pass over their lines, see HandHistoryConverter.tokenizeHand()
+    tokenizeLines = True
+    re_LineKind   = re.compile(r"""^(?:(?P<SEAT>Seat\s\d+:\s)|(?P<DEALT>Dealt\sto\s)|
+                                  .+?(?::\s(?:(?P<POSTS>posts\s)|(?P<BRINGS>brings)|(?P<SHOWS>shows\s\[)|
+                                              (?P<ACTION>bets|checks|raises|calls|folds|discards|stands\spat))|
+                                       (?P<COLLECTED>\scollected\s)))""", re.VERBOSE)
+    lineTokens    = {  'SEAT': ('ShownCards', 'CollectPot'),
+                      'DEALT': ('HeroCards',),
+                      'POSTS': ('PostSB', 'PostBB', 'PostBoth', 'Antes'),
+                     'BRINGS': ('BringIn',),
+                      'SHOWS': ('ShowdownAction',),
+                     'ACTION': ('Action',),
+                  'COLLECTED': ('CollectPot2',)
+                    }
+    streetMarkers = { 'hold': (('PREFLOP', re.compile(r"\*\*\* HOLE CARDS \*\*\*")),
+                               ('FLOP',    re.compile(r"\*\*\* FLOP \*\*\*")),
+                               ('TURN',    re.compile(r"\*\*\* TURN \*\*\* \[\S\S \S\S \S\S] ")),
+                               ('RIVER',   re.compile(r"\*\*\* RIVER \*\*\* \[\S\S \S\S \S\S \S\S] "))),
+                      'stud': (('ANTES',   None),
+                               ('THIRD',   re.compile(r"\*\*\* 3rd STREET \*\*\*")),
+                               ('FOURTH',  re.compile(r"\*\*\* 4th STREET \*\*\*")),
+                               ('FIFTH',   re.compile(r"\*\*\* 5th STREET \*\*\*")),
+                               ('SIXTH',   re.compile(r"\*\*\* 6th STREET \*\*\*")),
+                               ('SEVENTH', re.compile(r"\*\*\* RIVER \*\*\*")))
+                    }
+
     def compilePlayerRegexs(self,  hand):
         pass
 
@@ -344,6 +370,9 @@ class PokerStars(HandHistoryConverter):
             hand.addPlayer(int(a.group('SEAT')), a.group('PNAME'), a.group('CASH'))
 
     def markStreets(self, hand):
+        if self.tokenizeLines and hand.gametype['base'] in self.streetMarkers:
+            self.tokenizeHand(hand)
+            return
 
         # There is no marker between deal and draw in Stars single draw games
         #  this upsets the accounting, incorrectly sets handsPlayers.cardxx and 
@@ -398,29 +427,29 @@ class PokerStars(HandHistoryConverter):
 
     def readAntes(self, hand):
         log.debug(_("reading antes"))
-        m = self.re_Antes.finditer(hand.handText)
+        m = self.lineMatches(hand, 'Antes')
         for player in m:
             #~ logging.debug("hand.addAnte(%s,%s)" %(player.group('PNAME'), player.group('ANTE')))
             hand.addAnte(player.group('PNAME'), player.group('ANTE'))
     
     def readBringIn(self, hand):
-        m = self.re_BringIn.search(hand.handText,re.DOTALL)
-        if m:
+        for m in self.lineMatches(hand, 'BringIn'):
             #~ logging.debug("readBringIn: %s for %s" %(m.group('PNAME'),  m.group('BRINGIN')))
             hand.addBringIn(m.group('PNAME'),  m.group('BRINGIN'))
+            break
         
     def readBlinds(self, hand):
         liveBlind = True
-        for a in self.re_PostSB.finditer(hand.handText):
+        for a in self.lineMatches(hand, 'PostSB'):
             if liveBlind:
                 hand.addBlind(a.group('PNAME'), 'small blind', a.group('SB'))
                 liveBlind = False
             else:
                 # Post dead blinds as ante
                 hand.addBlind(a.group('PNAME'), 'secondsb', a.group('SB'))
-        for a in self.re_PostBB.finditer(hand.handText):
+        for a in self.lineMatches(hand, 'PostBB'):
             hand.addBlind(a.group('PNAME'), 'big blind', a.group('BB'))
-        for a in self.re_PostBoth.finditer(hand.handText):
+        for a in self.lineMatches(hand, 'PostBoth'):
             hand.addBlind(a.group('PNAME'), 'both', a.group('SBBB'))
 
     def readHeroCards(self, hand):
@@ -428,7 +457,7 @@ class PokerStars(HandHistoryConverter):
 #    we need to grab hero's cards
         for street in ('PREFLOP', 'DEAL'):
             if street in hand.streets.keys():
-                m = self.re_HeroCards.finditer(hand.streets[street])
+                m = self.lineMatches(hand, 'HeroCards', street)
                 for found in m:
 #                    if m == None:
 #                        hand.involved = False
@@ -439,7 +468,7 @@ class PokerStars(HandHistoryConverter):
 
         for street, text in hand.streets.iteritems():
             if not text or street in ('PREFLOP', 'DEAL'): continue  # already done these
-            m = self.re_HeroCards.finditer(hand.streets[street])
+            m = self.lineMatches(hand, 'HeroCards', street)
             for found in m:
                 player = found.group('PNAME')
                 if found.group('NEWCARDS') is None:
@@ -460,7 +489,7 @@ class PokerStars(HandHistoryConverter):
 
 
     def readAction(self, hand, street):
-        m = self.re_Action.finditer(hand.streets[street])
+        m = self.lineMatches(hand, 'Action', street)
         for action in m:
             acts = action.groupdict()
             #print "DEBUG: acts: %s" %acts
@@ -484,7 +513,7 @@ class PokerStars(HandHistoryConverter):
 
     def readShowdownActions(self, hand):
 # TODO: pick up mucks also??
-        for shows in self.re_ShowdownAction.finditer(hand.handText):            
+        for shows in self.lineMatches(hand, 'ShowdownAction'):            
             cards = shows.group('CARDS').split(' ')
             hand.addShownCards(cards, shows.group('PNAME'))
 
@@ -504,15 +533,15 @@ class PokerStars(HandHistoryConverter):
 
     def readCollectPot(self,hand):
         i=0
-        for m in self.re_CollectPot.finditer(hand.handText):
+        for m in self.lineMatches(hand, 'CollectPot'):
             hand.addCollectPot(player=m.group('PNAME'),pot=m.group('POT'))
             i+=1
         if i==0:
-            for m in self.re_CollectPot2.finditer(hand.handText):
+            for m in self.lineMatches(hand, 'CollectPot2'):
                 hand.addCollectPot(player=m.group('PNAME'),pot=m.group('POT'))
 
     def readShownCards(self,hand):
-        for m in self.re_ShownCards.finditer(hand.handText):
+        for m in self.lineMatches(hand, 'ShownCards'):
             if m.group('CARDS') is not None:
                 cards = m.group('CARDS')
                 cards = cards.split(' ') # needs to be a list, not a set--stud needs the order
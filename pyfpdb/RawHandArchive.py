@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""RawHandArchive.py
+
+Compressed archive of the imported hand histories (RawHands, RawHandBlocks
+and RawDictionaries tables), and re-derivation of the stats of the archived
+hands without the original files.
+"""
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#    In the "official" distribution you can find the license in agpl-3.0.txt.
+
+import L10n
+_ = L10n.get_translation()
+
+#    Standard Library modules
+import sys
+import zlib
+import bz2
+import logging
+import multiprocessing
+from collections import deque
+from time import time
+from optparse import OptionParser
+
+try:
+    import zstandard
+    use_zstd = True
+except ImportError:
+    use_zstd = False
+
+#    fpdb/FreePokerTools modules
+from Exceptions import FpdbParseError, FpdbHandPartial
+
+# logging has been set up in fpdb.py or HUD_main.py, use their settings:
+log = logging.getLogger("importer")
+
+BLOCK_HANDS = 100           # most hands in a RawHandBlocks row
+DICTIONARY_SIZE = 32768     # bytes of hand text in a site dictionary, the deflate window
+REDERIVE_BLOCKS = 20        # blocks re-derived per transaction
+SEPARATOR = '\0'            # between the utf8 hand texts of a block
+
+# Configuration and converters of a re-derive process, see initDerivePool()
+deriveConfig = None
+deriveConverters = {}
+
+def initDerivePool(config):
+    """Initializer for the processes of the rederive() pool"""
+    global deriveConfig
+    deriveConfig = config
+
+def parseHands(site, filter, file, sitehands, equities = None, assemble = True):
+    """Parses the archived hands sitehands, a list of (hand id, hand text) of site
+       imported from file (some converters read the table from the file name).
+       equities are the stored all-in equities by hand id, used instead of
+       calculating them again. In a rederive() pool process the stats are
+       assembled too, they need no ids from the database. Returns (hands, ids of
+       the hands that failed)"""
+    if site not in deriveConverters:
+        mod = __import__(filter)
+        obj = getattr(mod, filter.replace("ToFpdb", ""), None)
+        deriveConverters[site] = obj(deriveConfig, in_path = "RawHands", sitename = site, autostart = False)
+    hhc = deriveConverters[site]
+    hhc.in_path = file or "RawHands"
+    (hands, failed) = ([], [])
+    for (handId, text) in sitehands:
+        try:
+            hand = hhc.processHand(text)
+        except (FpdbParseError, FpdbHandPartial), e:
+            hand = None
+        if hand is None:
+            failed.append(handId)
+            continue
+        hand.dbid_hands = handId
+        if equities:
+            hand.equities = equities.get(handId)
+        if assemble:
+            hand.assembleHand()
+        hands.append(hand)
+    return (hands, failed)
+
+
+class RawHandArchive:
+    """Writes the text of imported hands to the database in compressed blocks.
+
+       A block holds up to BLOCK_HANDS consecutive hands of one site, RawHands
+       maps each hand id to its block. With zlib (gzip) or zstd the blocks are
+       compressed against a dictionary of the site: the hand texts of the first
+       block archived for it, so blocks of a single hand (auto import) compress
+       about as well as big ones. bzip2 blocks don't use it."""
+
+    def __init__(self, db, config, compression = None):
+        self.db = db
+        self.config = config
+        if compression is None:
+            compression = config.raw_hands.compression
+        if compression == 'gzip':
+            compression = 'zlib'
+        if compression == 'zstd' and not use_zstd:
+            log.warning(_("zstandard module not found, archiving hands with zlib"))
+            compression = 'zlib'
+        self.compression = compression
+        self.dictionaries = None     # dictionary id -> (siteId, dictionary), read when first needed
+        self.siteDictionary = {}     # siteId -> id of the dictionary new blocks use
+        self.compressors = {}        # (compression, dictionary id) -> primed compressor
+        self.decompressors = {}      # (compression, dictionary id) -> primed decompressor
+
+        # sites whose hands can't be parsed without the rest of their file
+        self.sites = dict((id, site) for (site, id) in config.site_ids.iteritems())
+        self.wholeFileSites = set()
+        for site, hhc in config.hhcs.iteritems():
+            if site in config.site_ids:
+                mod = __import__(hhc.converter)
+                obj = getattr(mod, hhc.converter.replace("ToFpdb", ""), None)
+                if obj is None or obj.copyGameHeader:
+                    self.wholeFileSites.add(config.site_ids[site])
+
+    def storeHands(self, hands):
+        """Archives hands, a list of (hand id, site id, imported file, hand text).
+           Doesn't commit."""
+        bysite = {}
+        for (handId, siteId, file, text) in hands:
+            if isinstance(file, str):
+                file = file.decode(sys.getfilesystemencoding() or 'utf8', 'replace')
+            if siteId not in self.wholeFileSites:
+                bysite.setdefault((siteId, file), []).append((handId, text))
+        for (siteId, file), sitehands in bysite.iteritems():
+            for i in xrange(0, len(sitehands), BLOCK_HANDS):
+                block = sitehands[i:i + BLOCK_HANDS]
+                data = SEPARATOR.join([text.encode('utf8') for (handId, text) in block])
+                dictionaryId = None
+                if self.compression in ('zlib', 'zstd'):
+                    dictionaryId = self.getSiteDictionary(siteId, data)
+                self.db.storeRawHandBlock(siteId, dictionaryId, self.compression, file,
+                                          self.compress(self.compression, dictionaryId, data),
+                                          [handId for (handId, text) in block])
+
+    def getHand(self, handId):
+        """Returns the text of the archived hand handId, or None"""
+        row = self.db.getRawHand(handId)
+        if row is None:
+            return None
+        (siteId, dictionaryId, compression, data, blockIndex) = row
+        return self.decompress(compression, dictionaryId, data)[blockIndex]
+
+    def blocks(self, equities = False):
+        """Generator: yields the archived blocks REDERIVE_BLOCKS at a time, as lists
+           of (siteId, file, [(hand id, hand text)], stored equities by hand id).
+           With equities True the equities are left out (None)."""
+        after = 0
+        while True:
+            blocks = self.db.getRawHandBlocks(after, REDERIVE_BLOCKS)
+            if not blocks:
+                break
+            stored = None
+            if not equities:
+                handIds = [handId for block in blocks for handId in block[6]]
+                stored = self.db.getHandEquities(min(handIds), max(handIds))
+            result = []
+            for (id, siteId, dictionaryId, compression, file, data, handIds) in blocks:
+                result.append((siteId, file, zip(handIds, self.decompress(compression, dictionaryId, data)),
+                               None if stored is None else dict((h, stored[h]) for h in handIds if h in stored)))
+                after = id
+            yield result
+
+    def loadDictionaries(self):
+        if self.dictionaries is None:
+            self.dictionaries = {}
+            for (id, siteId, dictionary) in self.db.get_raw_dictionaries():
+                self.dictionaries[id] = (siteId, dictionary)
+                self.siteDictionary[siteId] = max(id, self.siteDictionary.get(siteId, id))
+
+    def getSiteDictionary(self, siteId, data):
+        """Returns the id of the dictionary of siteId, made from data if it has none"""
+        self.loadDictionaries()
+        if siteId not in self.siteDictionary:
+            # the end of the text is the nearest to what is compressed against it
+            dictionary = data[-DICTIONARY_SIZE:]
+            id = self.db.storeRawDictionary(siteId, dictionary)
+            self.dictionaries[id] = (siteId, dictionary)
+            self.siteDictionary[siteId] = id
+        return self.siteDictionary[siteId]
+
+    def compress(self, compression, dictionaryId, data):
+        if compression == 'zlib':
+            c = self.compressor(compression, dictionaryId).copy()
+            return c.compress(data) + c.flush()
+        elif compression == 'zstd':
+            return self.compressor(compression, dictionaryId).compress(data)
+        elif compression == 'bzip2':
+            return bz2.compress(data)
+        return data
+
+    def decompress(self, compression, dictionaryId, data):
+        """Returns the list of unicode hand texts in the block data"""
+        if compression == 'zlib':
+            data = self.decompressor(compression, dictionaryId).copy().decompress(data)
+        elif compression == 'zstd':
+            data = self.decompressor(compression, dictionaryId).decompress(data)
+        elif compression == 'bzip2':
+            data = bz2.decompress(data)
+        return [text.decode('utf8') for text in data.split(SEPARATOR)]
+
+    def compressor(self, compression, dictionaryId):
+        """Compressor with the dictionary dictionaryId loaded. For zlib that is a raw
+           deflate stream that already compressed the dictionary, each block is the
+           output of a copy of it after a sync flush."""
+        key = (compression, dictionaryId)
+        if key not in self.compressors:
+            dictionary = self.getDictionary(dictionaryId)
+            if compression == 'zlib':
+                c = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+                c.compress(dictionary)
+                c.flush(zlib.Z_SYNC_FLUSH)
+            else:
+                c = zstandard.ZstdCompressor(level = 9, dict_data = self.zstdDictionary(dictionary))
+            self.compressors[key] = c
+        return self.compressors[key]
+
+    def decompressor(self, compression, dictionaryId):
+        """Decompressor with the dictionary dictionaryId loaded, see compressor()"""
+        key = (compression, dictionaryId)
+        if key not in self.decompressors:
+            dictionary = self.getDictionary(dictionaryId)
+            if compression == 'zlib':
+                # any deflate stream of the dictionary ending on a sync flush
+                # leaves the decompressor in the state the blocks continue from
+                c = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+                d = zlib.decompressobj(-zlib.MAX_WBITS)
+                d.decompress(c.compress(dictionary) + c.flush(zlib.Z_SYNC_FLUSH))
+            else:
+                d = zstandard.ZstdDecompressor(dict_data = self.zstdDictionary(dictionary))
+            self.decompressors[key] = d
+        return self.decompressors[key]
+
+    def getDictionary(self, dictionaryId):
+        if dictionaryId is None:
+            return ''
+        self.loadDictionaries()
+        return self.dictionaries[dictionaryId][1]
+
+    def zstdDictionary(self, dictionary):
+        if not dictionary:
+            return None
+        return zstandard.ZstdCompressionDict(dictionary, dict_type = zstandard.DICT_TYPE_RAWCONTENT)
+
+    def rederive(self, threads = 0, equities = False):
+        """Parses the archived hands again and rewrites their HandsPlayers, HandsActions
+           and HandsStove rows and the derived columns of Hands, then rebuilds HudCache.
+           With threads > 0 the hands are parsed by that many processes, like the
+           bulk import does. The all-in equities, most of the time of an import, only
+           depend on the cards: the ones in HandsStove are used again unless equities
+           is True. Returns (hands, errors)."""
+        global deriveConfig
+        (count, errors) = (0, 0)
+        if threads > 0:
+            parsed = self.parseBlocks(threads, equities)
+        else:
+            deriveConfig = self.config
+            parsed = ([parseHands(self.sites[siteId], self.config.hhcs[self.sites[siteId]].converter, file, sitehands,
+                                  stored, assemble = False)
+                       for (siteId, file, sitehands, stored) in blocks] for blocks in self.blocks(equities))
+        for results in parsed:
+            hands = []
+            for (sitehands, failed) in results:
+                for handId in failed:
+                    log.error(_("Could not re-derive hand id %s") % handId)
+                errors += len(failed)
+                hands += sitehands
+
+            self.db.resetBulkCache()
+            for hand in hands:
+                hand.config = self.config
+                hand.prepInsert(self.db)
+                if not hand.stats.handsplayers:
+                    hand.assembleHand()
+                hand.hands['id'] = hand.dbid_hands
+            self.db.deleteHandRows([hand.dbid_hands for hand in hands])
+            self.db.updateHandStats([hand.hands for hand in hands])
+            for i, hand in enumerate(hands):
+                doinsert = i == len(hands) - 1
+                hand.insertHandsPlayers(self.db, doinsert)
+                hand.insertHandsActions(self.db, doinsert)
+                hand.insertHandsStove(self.db, doinsert)
+            self.db.commit()
+            count += len(hands)
+        self.db.rebuild_hudcache()
+        self.db.rebuild_cardscache()
+        return (count, errors)
+
+    def parseBlocks(self, threads, equities = False):
+        """Generator: parses the blocks of blocks() in a pool of threads processes and
+           yields the results of parseHands() for each group of them, in order. At
+           most two groups per process are parsed ahead of the one being stored."""
+        pool = multiprocessing.Pool(threads, initDerivePool, (self.config,))
+        try:
+            pending = deque()
+            for blocks in self.blocks(equities):
+                pending.append([pool.apply_async(parseHands, (self.sites[siteId], self.config.hhcs[self.sites[siteId]].converter, file, sitehands, stored))
+                                for (siteId, file, sitehands, stored) in blocks])
+                if len(pending) > 2 * threads:
+                    yield [result.get() for result in pending.popleft()]
+            while pending:
+                yield [result.get() for result in pending.popleft()]
+        except:
+            pool.terminate()
+            raise
+        pool.close()
+        pool.join()
+
+
+def main(argv=None):
+    """Re-derives the stats of the hands in the archive"""
+    import Configuration
+    import Database
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = OptionParser()
+    parser.add_option("-c", "--configFile", dest="config", default=None,
+                      help=_("Specifies a configuration file."))
+    parser.add_option("-t", "--threads", dest="threads", type="int", default=0,
+                      help=_("Number of processes parsing the hands."))
+    parser.add_option("-e", "--equities", action="store_true", dest="equities", default=False,
+                      help=_("Calculate the all-in equities again instead of using the stored ones."))
+    (options, argv) = parser.parse_args(args = argv)
+
+    config = Configuration.Config(file = options.config)
+    db = Database.Database(config)
+    start = time()
+    (hands, errors) = RawHandArchive(db, config).rederive(options.threads, options.equities)
+    print _("Re-derived %d hands (%d errors) in %.1f seconds") % (hands, errors, time() - start)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -120,27 +120,82 @@ class Sql:
                         ENGINE=INNODB"""
 
         ################################
-        # Create RawHands (this table is all but identical with RawTourneys)
+        # Create RawHands (the index of the hands archived in RawHandBlocks)
         ################################
         if db_server == 'mysql':
             self.query['createRawHands'] = """CREATE TABLE RawHands (
                         id BIGINT UNSIGNED AUTO_INCREMENT NOT NULL, PRIMARY KEY (id),
                         handId BIGINT NOT NULL,
-                        rawHand TEXT NOT NULL,
+                        blockId BIGINT NOT NULL,
+                        blockIndex SMALLINT NOT NULL,
                         complain BOOLEAN NOT NULL DEFAULT FALSE)
                         ENGINE=INNODB"""
         elif db_server == 'postgresql':
             self.query['createRawHands'] =  """CREATE TABLE RawHands (
                         id BIGSERIAL, PRIMARY KEY (id),
                         handId BIGINT NOT NULL,
-                        rawHand TEXT NOT NULL,
+                        blockId BIGINT NOT NULL,
+                        blockIndex SMALLINT NOT NULL,
                         complain BOOLEAN NOT NULL DEFAULT FALSE)"""
         elif db_server == 'sqlite':
             self.query['createRawHands'] = """CREATE TABLE RawHands (
                         id INTEGER PRIMARY KEY,
                         handId BIGINT NOT NULL,
-                        rawHand TEXT NOT NULL,
+                        blockId BIGINT NOT NULL,
+                        blockIndex SMALLINT NOT NULL,
                         complain BOOLEAN NOT NULL DEFAULT FALSE)"""
+
+        ################################
+        # Create RawHandBlocks (compressed texts of consecutive hands of a site)
+        ################################
+        if db_server == 'mysql':
+            self.query['createRawHandBlocks'] = """CREATE TABLE RawHandBlocks (
+                        id BIGINT UNSIGNED AUTO_INCREMENT NOT NULL, PRIMARY KEY (id),
+                        siteId SMALLINT UNSIGNED NOT NULL,
+                        dictionaryId INT,
+                        compression VARCHAR(8) NOT NULL,
+                        file VARCHAR(255),
+                        hands SMALLINT NOT NULL,
+                        rawHands MEDIUMBLOB NOT NULL)
+                        ENGINE=INNODB"""
+        elif db_server == 'postgresql':
+            self.query['createRawHandBlocks'] =  """CREATE TABLE RawHandBlocks (
+                        id BIGSERIAL, PRIMARY KEY (id),
+                        siteId SMALLINT NOT NULL,
+                        dictionaryId INT,
+                        compression VARCHAR(8) NOT NULL,
+                        file VARCHAR(255),
+                        hands SMALLINT NOT NULL,
+                        rawHands BYTEA NOT NULL)"""
+        elif db_server == 'sqlite':
+            self.query['createRawHandBlocks'] = """CREATE TABLE RawHandBlocks (
+                        id INTEGER PRIMARY KEY,
+                        siteId INT NOT NULL,
+                        dictionaryId INT,
+                        compression TEXT NOT NULL,
+                        file TEXT,
+                        hands INT NOT NULL,
+                        rawHands BLOB NOT NULL)"""
+
+        ################################
+        # Create RawDictionaries (per site texts the RawHandBlocks are compressed against)
+        ################################
+        if db_server == 'mysql':
+            self.query['createRawDictionaries'] = """CREATE TABLE RawDictionaries (
+                        id INT UNSIGNED AUTO_INCREMENT NOT NULL, PRIMARY KEY (id),
+                        siteId SMALLINT UNSIGNED NOT NULL,
+                        dictionary BLOB NOT NULL)
+                        ENGINE=INNODB"""
+        elif db_server == 'postgresql':
+            self.query['createRawDictionaries'] =  """CREATE TABLE RawDictionaries (
+                        id SERIAL, PRIMARY KEY (id),
+                        siteId SMALLINT NOT NULL,
+                        dictionary BYTEA NOT NULL)"""
+        elif db_server == 'sqlite':
+            self.query['createRawDictionaries'] = """CREATE TABLE RawDictionaries (
+                        id INTEGER PRIMARY KEY,
+                        siteId INT NOT NULL,
+                        dictionary BLOB NOT NULL)"""
         
         ################################
         # Create RawTourneys (this table is all but identical with RawHands)
@@ -1308,6 +1363,46 @@ class Sql:
                         finished BOOLEAN
                         )""" 
 
+        ################################
+        # Create IdentifyCache
+        ################################
+
+        if db_server == 'mysql':
+            self.query['createIdentifyCacheTable'] = """CREATE TABLE IdentifyCache (
+                        id INT(10) UNSIGNED AUTO_INCREMENT NOT NULL, PRIMARY KEY (id),
+                        file text NOT NULL,
+                        size BIGINT NOT NULL,
+                        mtime BIGINT NOT NULL,
+                        site VARCHAR(32),
+                        type VARCHAR(7),
+                        kodec VARCHAR(16),
+                        archive BOOLEAN,
+                        gametype text)
+                        ENGINE=INNODB"""
+        elif db_server == 'postgresql':
+            self.query['createIdentifyCacheTable'] = """CREATE TABLE IdentifyCache (
+                        id BIGSERIAL, PRIMARY KEY (id),
+                        file TEXT NOT NULL,
+                        size BIGINT NOT NULL,
+                        mtime BIGINT NOT NULL,
+                        site VARCHAR(32),
+                        type VARCHAR(7),
+                        kodec VARCHAR(16),
+                        archive BOOLEAN,
+                        gametype TEXT)"""
+        elif db_server == 'sqlite':
+            self.query['createIdentifyCacheTable'] = """CREATE TABLE IdentifyCache (
+                        id INTEGER PRIMARY KEY,
+                        file TEXT NOT NULL,
+                        size BIGINT NOT NULL,
+                        mtime BIGINT NOT NULL,
+                        site VARCHAR(32),
+                        type VARCHAR(7),
+                        kodec VARCHAR(16),
+                        archive BOOLEAN,
+                        gametype TEXT
+                        )"""
+
         ################################
         # Create HudCache
         ################################
@@ -1659,11 +1754,12 @@ class Sql:
         if db_server == 'mysql':
             self.query['createCardsCacheTable'] = """CREATE TABLE CardsCache (
                         id BIGINT UNSIGNED AUTO_INCREMENT NOT NULL, PRIMARY KEY (id),
-                        type char(4) NOT NULL,
-                        category varchar(9) NOT NULL,
-                        currency char(4) NOT NULL,
+                        gametypeId SMALLINT UNSIGNED NOT NULL, FOREIGN KEY (gametypeId) REFERENCES Gametypes(id),
                         playerId INT UNSIGNED NOT NULL, FOREIGN KEY (playerId) REFERENCES Players(id),
+                        activeSeats SMALLINT NOT NULL,
+                        position CHAR(1),
                         startCards SMALLINT NOT NULL,
+                        styleKey CHAR(7) NOT NULL,  /* 'd' and the yymmdd of the day, like HudCache */
                         HDs INT NOT NULL,
 
                         wonWhenSeenStreet1 FLOAT,
@@ -1767,17 +1863,19 @@ class Sql:
                         street1Raises INT,
                         street2Raises INT,
                         street3Raises INT,
-                        street4Raises INT)
+                        street4Raises INT,
+                        totalProfitSq BIGINT)  /* sum of the squares of totalProfit, for the variance */
 
                         ENGINE=INNODB"""
         elif db_server == 'postgresql':
             self.query['createCardsCacheTable'] = """CREATE TABLE CardsCache (
                         id BIGSERIAL, PRIMARY KEY (id),
-                        type char(4) NOT NULL,
-                        category varchar(9) NOT NULL,
-                        currency char(4) NOT NULL,
+                        gametypeId INT, FOREIGN KEY (gametypeId) REFERENCES Gametypes(id),
                         playerId INT, FOREIGN KEY (playerId) REFERENCES Players(id),
+                        activeSeats SMALLINT,
+                        position CHAR(1),
                         startCards SMALLINT,
+                        styleKey CHAR(7) NOT NULL,  /* 'd' and the yymmdd of the day, like HudCache */
                         HDs INT,
 
                         wonWhenSeenStreet1 FLOAT,
@@ -1879,16 +1977,18 @@ class Sql:
                         street1Raises INT,
                         street2Raises INT,
                         street3Raises INT,
-                        street4Raises INT)
+                        street4Raises INT,
+                        totalProfitSq BIGINT)  /* sum of the squares of totalProfit, for the variance */
                         """
         elif db_server == 'sqlite':
             self.query['createCardsCacheTable'] = """CREATE TABLE CardsCache (
                         id INTEGER PRIMARY KEY,
-                        type TEXT NOT NULL,
-                        category TEXT NOT NULL,
-                        currency TEXT NOT NULL,
+                        gametypeId INT,
                         playerId INT,
-                        startCards INT
+                        activeSeats INT,
+                        position TEXT,
+                        startCards INT,
+                        styleKey TEXT NOT NULL,  /* 'd' and the yymmdd of the day, like HudCache */
                         HDs INT,
 
                         wonWhenSeenStreet1 REAL,
@@ -1990,7 +2090,8 @@ class Sql:
                         street1Raises INT,
                         street2Raises INT,
                         street3Raises INT,
-                        street4Raises INT)
+                        street4Raises INT,
+                        totalProfitSq INT)  /* sum of the squares of totalProfit, for the variance */
                         """
                         
         ################################
@@ -2000,14 +2101,11 @@ class Sql:
         if db_server == 'mysql':
             self.query['createPositionsCacheTable'] = """CREATE TABLE PositionsCache (
                         id BIGINT UNSIGNED AUTO_INCREMENT NOT NULL, PRIMARY KEY (id),
-                        type char(4) NOT NULL,
-                        base char(4) NOT NULL,
-                        category varchar(9) NOT NULL,
-                        currency char(4) NOT NULL,
-                        maxSeats TINYINT NOT NULL,
+                        gametypeId SMALLINT UNSIGNED NOT NULL, FOREIGN KEY (gametypeId) REFERENCES Gametypes(id),
                         playerId INT UNSIGNED NOT NULL, FOREIGN KEY (playerId) REFERENCES Players(id),
                         activeSeats SMALLINT NOT NULL,
                         position CHAR(1),
+                        styleKey CHAR(7) NOT NULL,  /* 'd' and the yymmdd of the day, like HudCache */
                         HDs INT NOT NULL,
 
                         wonWhenSeenStreet1 FLOAT,
@@ -2111,20 +2209,18 @@ class Sql:
                         street1Raises INT,
                         street2Raises INT,
                         street3Raises INT,
-                        street4Raises INT)
+                        street4Raises INT,
+                        totalProfitSq BIGINT)  /* sum of the squares of totalProfit, for the variance */
 
                         ENGINE=INNODB"""
         elif db_server == 'postgresql':
             self.query['createPositionsCacheTable'] = """CREATE TABLE PositionsCache (
                         id BIGSERIAL, PRIMARY KEY (id),
-                        type char(4) NOT NULL,
-                        base char(4) NOT NULL,
-                        category varchar(9) NOT NULL,
-                        currency char(4) NOT NULL,
-                        maxSeats SMALLINT NOT NULL,
+                        gametypeId INT, FOREIGN KEY (gametypeId) REFERENCES Gametypes(id),
                         playerId INT, FOREIGN KEY (playerId) REFERENCES Players(id),
                         activeSeats SMALLINT,
                         position CHAR(1),
+                        styleKey CHAR(7) NOT NULL,  /* 'd' and the yymmdd of the day, like HudCache */
                         HDs INT,
 
                         wonWhenSeenStreet1 FLOAT,
@@ -2226,19 +2322,17 @@ class Sql:
                         street1Raises INT,
                         street2Raises INT,
                         street3Raises INT,
-                        street4Raises INT)
+                        street4Raises INT,
+                        totalProfitSq BIGINT)  /* sum of the squares of totalProfit, for the variance */
                         """
         elif db_server == 'sqlite':
             self.query['createPositionsCacheTable'] = """CREATE TABLE PositionsCache (
                         id INTEGER PRIMARY KEY,
-                        type TEXT NOT NULL,
-                        base TEXT NOT NULL,
-                        category TEXT NOT NULL,
-                        currency TEXT NOT NULL,
-                        maxSeats INT NOT NULL,
+                        gametypeId INT,
                         playerId INT,
                         activeSeats INT,
                         position TEXT,
+                        styleKey TEXT NOT NULL,  /* 'd' and the yymmdd of the day, like HudCache */
                         HDs INT,
 
                         wonWhenSeenStreet1 REAL,
@@ -2340,7 +2434,8 @@ class Sql:
                         street1Raises INT,
                         street2Raises INT,
                         street3Raises INT,
-                        street4Raises INT)
+                        street4Raises INT,
+                        totalProfitSq INT)  /* sum of the squares of totalProfit, for the variance */
                         """
 
                         
@@ -2459,8 +2554,8 @@ class Sql:
             self.query['addTPlayersIndex'] = """CREATE UNIQUE INDEX tourneyId ON TourneysPlayers (tourneyId, playerId)"""
 
         self.query['addHudCacheCompundIndex'] = """CREATE UNIQUE INDEX HudCache_Compound_idx ON HudCache(gametypeId, playerId, activeSeats, position, tourneyTypeId, styleKey)"""
-        self.query['addCardsCacheCompundIndex'] = """CREATE UNIQUE INDEX CardsCache_Compound_idx ON CardsCache(type, category, currency, playerId, startCards)"""
-        self.query['addPositionsCacheCompundIndex'] = """CREATE UNIQUE INDEX PositionsCache_Compound_idx ON PositionsCache(type, base, category, currency, maxSeats, playerId, activeSeats, position)"""
+        self.query['addCardsCacheCompundIndex'] = """CREATE UNIQUE INDEX CardsCache_Compound_idx ON CardsCache(gametypeId, playerId, activeSeats, position, startCards, styleKey)"""
+        self.query['addPositionsCacheCompundIndex'] = """CREATE UNIQUE INDEX PositionsCache_Compound_idx ON PositionsCache(gametypeId, playerId, activeSeats, position, styleKey)"""
 
         self.query['get_last_hand'] = "select max(id) from Hands"
         
@@ -2476,6 +2571,10 @@ class Sql:
                 and Players.siteId = Sites.id
             """
 
+        self.query['getPlayerIdBySite'] = "SELECT id, name FROM Players WHERE name=%s and siteid=%s"
+
+        self.query['insertPlayer'] = "INSERT INTO Players (name, siteId) VALUES (%s, %s)"
+
         self.query['get_player_names'] = """
                 select p.name
                 from Players p
@@ -2483,6 +2582,23 @@ class Sql:
                 and   (p.siteId = %s or %s = -1)
             """
 
+        self.query['get_hand_fileId'] = """SELECT fileId FROM Hands WHERE id = %s"""
+
+        # starting hands played voluntarily in the holdem hands of a file, see HudStatCache.StartHandsCache
+        self.query['get_starthands'] = """
+                SELECT hp.playerId, hp.startCards, hp.street0Aggr, hp.street0CalledRaiseDone, hp.position
+                FROM Hands h
+                INNER JOIN HandsPlayers hp ON (hp.handId = h.id)
+                INNER JOIN Gametypes g ON (g.id = h.gametypeId)
+                WHERE h.fileId = %s
+                AND h.id > %s
+                AND h.id <= %s
+                AND g.type = %s
+                AND g.limitType = %s
+                AND g.category = 'holdem'
+                AND hp.street0VPI
+                AND hp.startCards > 0"""
+
         self.query['get_gameinfo_from_hid'] = """
                 SELECT
                         s.name,
@@ -2511,6 +2627,31 @@ class Sql:
                     limit 1
             """
 
+        # the gametypes of a page of hands, for Hand.hand_pages
+        self.query['get_gameinfo_from_hids'] = """
+                SELECT
+                        h.id,
+                        s.name,
+                        g.category,
+                        g.base,
+                        g.type,
+                        g.limitType,
+                        g.hilo,
+                        round(g.smallBlind / 100.0,2),
+                        round(g.bigBlind / 100.0,2),
+                        round(g.smallBet / 100.0,2),
+                        round(g.bigBet / 100.0,2),
+                        g.currency
+                    FROM
+                        Hands as h,
+                        Sites as s,
+                        Gametypes as g
+                    WHERE
+                        h.id in <hand_ids>
+                    and g.id = h.gametypeid
+                    and s.id = g.siteid
+            """
+
         self.query['get_stats_from_hand'] = """
                 SELECT hc.playerId                      AS player_id,
                     hp.seatNo                           AS seat,
@@ -3137,6 +3278,115 @@ class Sql:
                        the session */
                 """
      
+        # stats of the players in one hand, same columns as get_stats_from_hand_aggregated:
+        # used by HudStatCache to add a new hand to the cached stats
+        self.query['get_stats_from_hand_players'] = """
+                    SELECT hp.playerId                                              AS player_id,
+                           hp.seatNo                                                AS seat,
+                           p.name                                                   AS screen_name,
+                           h.seats                                                  AS seats,
+                           h.gametypeId                                             AS gametype_id,
+                           h.tableName                                              AS table_name,
+                           1                                                        AS n,
+                           cast(hp.street0VPI as <signed>integer)                   AS vpip,
+                           cast(hp.street0Aggr as <signed>integer)                  AS pfr,
+                           cast(hp.street0CalledRaiseChance as <signed>integer)     AS CAR_opp_0,
+                           cast(hp.street0CalledRaiseDone as <signed>integer)       AS CAR_0,
+                           cast(hp.street0_3BChance as <signed>integer)             AS TB_opp_0,
+                           cast(hp.street0_3BDone as <signed>integer)               AS TB_0,
+                           cast(hp.street0_4BChance as <signed>integer)             AS FB_opp_0,
+                           cast(hp.street0_4BDone as <signed>integer)               AS FB_0,
+                           cast(hp.street0_C4BChance as <signed>integer)            AS CFB_opp_0,
+                           cast(hp.street0_C4BDone as <signed>integer)              AS CFB_0,
+                           cast(hp.street0_FoldTo3BChance as <signed>integer)       AS F3B_opp_0,
+                           cast(hp.street0_FoldTo3BDone as <signed>integer)         AS F3B_0,
+                           cast(hp.street0_FoldTo4BChance as <signed>integer)       AS F4B_opp_0,
+                           cast(hp.street0_FoldTo4BDone as <signed>integer)         AS F4B_0,
+                           cast(hp.street0_SqueezeChance as <signed>integer)        AS SQZ_opp_0,
+                           cast(hp.street0_SqueezeDone as <signed>integer)          AS SQZ_0,
+                           cast(hp.raiseToStealChance as <signed>integer)           AS RTS_opp,
+                           cast(hp.raiseToStealDone as <signed>integer)             AS RTS,
+                           cast(hp.success_Steal as <signed>integer)                AS SUC_ST,
+                           cast(hp.street1Seen as <signed>integer)                  AS saw_f,
+                           cast(hp.street1Seen as <signed>integer)                  AS saw_1,
+                           cast(hp.street2Seen as <signed>integer)                  AS saw_2,
+                           cast(hp.street3Seen as <signed>integer)                  AS saw_3,
+                           cast(hp.street4Seen as <signed>integer)                  AS saw_4,
+                           cast(hp.sawShowdown as <signed>integer)                  AS sd,
+                           cast(hp.street1Aggr as <signed>integer)                  AS aggr_1,
+                           cast(hp.street2Aggr as <signed>integer)                  AS aggr_2,
+                           cast(hp.street3Aggr as <signed>integer)                  AS aggr_3,
+                           cast(hp.street4Aggr as <signed>integer)                  AS aggr_4,
+                           cast(hp.otherRaisedStreet1 as <signed>integer)           AS was_raised_1,
+                           cast(hp.otherRaisedStreet2 as <signed>integer)           AS was_raised_2,
+                           cast(hp.otherRaisedStreet3 as <signed>integer)           AS was_raised_3,
+                           cast(hp.otherRaisedStreet4 as <signed>integer)           AS was_raised_4,
+                           cast(hp.foldToOtherRaisedStreet1 as <signed>integer)     AS f_freq_1,
+                           cast(hp.foldToOtherRaisedStreet2 as <signed>integer)     AS f_freq_2,
+                           cast(hp.foldToOtherRaisedStreet3 as <signed>integer)     AS f_freq_3,
+                           cast(hp.foldToOtherRaisedStreet4 as <signed>integer)     AS f_freq_4,
+                           hp.wonWhenSeenStreet1                                    AS w_w_s_1,
+                           hp.wonAtSD                                               AS wmsd,
+                           cast(hp.raiseFirstInChance as <signed>integer)           AS steal_opp,
+                           cast(hp.raisedFirstIn as <signed>integer)                AS steal,
+                           cast(hp.foldSbToStealChance as <signed>integer)          AS SBstolen,
+                           cast(hp.foldedSbToSteal as <signed>integer)              AS SBnotDef,
+                           cast(hp.foldBbToStealChance as <signed>integer)          AS BBstolen,
+                           cast(hp.foldedBbToSteal as <signed>integer)              AS BBnotDef,
+                           cast(hp.street1CBChance as <signed>integer)              AS CB_opp_1,
+                           cast(hp.street1CBDone as <signed>integer)                AS CB_1,
+                           cast(hp.street2CBChance as <signed>integer)              AS CB_opp_2,
+                           cast(hp.street2CBDone as <signed>integer)                AS CB_2,
+                           cast(hp.street3CBChance as <signed>integer)              AS CB_opp_3,
+                           cast(hp.street3CBDone as <signed>integer)                AS CB_3,
+                           cast(hp.street4CBChance as <signed>integer)              AS CB_opp_4,
+                           cast(hp.street4CBDone as <signed>integer)                AS CB_4,
+                           cast(hp.foldToStreet1CBChance as <signed>integer)        AS f_cb_opp_1,
+                           cast(hp.foldToStreet1CBDone as <signed>integer)          AS f_cb_1,
+                           cast(hp.foldToStreet2CBChance as <signed>integer)        AS f_cb_opp_2,
+                           cast(hp.foldToStreet2CBDone as <signed>integer)          AS f_cb_2,
+                           cast(hp.foldToStreet3CBChance as <signed>integer)        AS f_cb_opp_3,
+                           cast(hp.foldToStreet3CBDone as <signed>integer)          AS f_cb_3,
+                           cast(hp.foldToStreet4CBChance as <signed>integer)        AS f_cb_opp_4,
+                           cast(hp.foldToStreet4CBDone as <signed>integer)          AS f_cb_4,
+                           cast(hp.totalProfit as <signed>integer)                  AS net,
+                           cast(gt.bigblind as <signed>integer)                     AS bigblind,
+                           cast(hp.street1CheckCallRaiseChance as <signed>integer)  AS ccr_opp_1,
+                           cast(hp.street1CheckCallRaiseDone as <signed>integer)    AS ccr_1,
+                           cast(hp.street2CheckCallRaiseChance as <signed>integer)  AS ccr_opp_2,
+                           cast(hp.street2CheckCallRaiseDone as <signed>integer)    AS ccr_2,
+                           cast(hp.street3CheckCallRaiseChance as <signed>integer)  AS ccr_opp_3,
+                           cast(hp.street3CheckCallRaiseDone as <signed>integer)    AS ccr_3,
+                           cast(hp.street4CheckCallRaiseChance as <signed>integer)  AS ccr_opp_4,
+                           cast(hp.street4CheckCallRaiseDone as <signed>integer)    AS ccr_4,
+                           cast(hp.street0Calls as <signed>integer)                 AS call_0,
+                           cast(hp.street1Calls as <signed>integer)                 AS call_1,
+                           cast(hp.street2Calls as <signed>integer)                 AS call_2,
+                           cast(hp.street3Calls as <signed>integer)                 AS call_3,
+                           cast(hp.street4Calls as <signed>integer)                 AS call_4,
+                           cast(hp.street0Bets as <signed>integer)                  AS bet_0,
+                           cast(hp.street1Bets as <signed>integer)                  AS bet_1,
+                           cast(hp.street2Bets as <signed>integer)                  AS bet_2,
+                           cast(hp.street3Bets as <signed>integer)                  AS bet_3,
+                           cast(hp.street4Bets as <signed>integer)                  AS bet_4,
+                           cast(hp.street0Raises as <signed>integer)                AS raise_0,
+                           cast(hp.street1Raises as <signed>integer)                AS raise_1,
+                           cast(hp.street2Raises as <signed>integer)                AS raise_2,
+                           cast(hp.street3Raises as <signed>integer)                AS raise_3,
+                           cast(hp.street4Raises as <signed>integer)                AS raise_4
+                         FROM Hands h
+                         INNER JOIN HandsPlayers hp  ON (hp.handId = h.id)
+                         INNER JOIN Players p        ON (p.id = hp.playerId)
+                         INNER JOIN Gametypes gt     ON (gt.id = h.gametypeId)
+                    WHERE h.id = %s
+                """
+
+        self.query['get_hud_gametype'] = """
+                    SELECT siteId, type, category, limitType, bigBlind
+                    FROM Gametypes
+                    WHERE id = %s
+                """
+
         self.query['get_players_from_hand'] = """
                 SELECT HandsPlayers.playerId, seatNo, name
                 FROM  HandsPlayers INNER JOIN Players ON (HandsPlayers.playerId = Players.id)
@@ -3778,6 +4028,130 @@ class Sql:
                               ,s.name
                       """
 
+        # playerDetailedStats by hole cards from CardsCache, used when the players are
+        # heroes and no hand filter is set: sums replace the casts of the HandsPlayers rows
+        self.query['playerDetailedStatsCards'] = """
+                     select  <hgametypeId>                                                          AS hgametypeid
+                            ,<playerName>                                                           AS pname
+                            ,gt.base
+                            ,gt.category                                                            AS category
+                            ,upper(gt.limitType)                                                    AS limittype
+                            ,s.name                                                                 AS name
+                            ,min(gt.bigBlind)                                                       AS minbigblind
+                            ,max(gt.bigBlind)                                                       AS maxbigblind
+                            ,<position>                                                             AS plposition
+                            ,sum(hc.HDs)                                                            AS n
+                            ,100.0*sum(hc.street0VPI)/sum(hc.HDs)                                   AS vpip
+                            ,100.0*sum(hc.street0Aggr)/sum(hc.HDs)                                  AS pfr
+                            ,case when sum(hc.street0CalledRaiseChance) = 0 then -999
+                                  else 100.0*sum(hc.street0CalledRaiseDone)/sum(hc.street0CalledRaiseChance)
+                             end                                                                    AS car0
+                            ,case when sum(hc.street0_3Bchance) = 0 then -999
+                                  else 100.0*sum(hc.street0_3Bdone)/sum(hc.street0_3Bchance)
+                             end                                                                    AS pf3
+                            ,case when sum(hc.street0_4Bchance) = 0 then -999
+                                  else 100.0*sum(hc.street0_4Bdone)/sum(hc.street0_4Bchance)
+                             end                                                                    AS pf4
+                            ,case when sum(hc.street0_FoldTo3Bchance) = 0 then -999
+                                  else 100.0*sum(hc.street0_FoldTo3Bdone)/sum(hc.street0_FoldTo3Bchance)
+                             end                                                                    AS pff3
+                            ,case when sum(hc.street0_FoldTo4Bchance) = 0 then -999
+                                  else 100.0*sum(hc.street0_FoldTo4Bdone)/sum(hc.street0_FoldTo4Bchance)
+                             end                                                                    AS pff4
+                            ,case when sum(hc.raiseFirstInChance) = 0 then -999
+                                  else 100.0*sum(hc.raisedFirstIn)/sum(hc.raiseFirstInChance)
+                             end                                                                    AS rfi
+                            ,case when sum(case when hc.position in ('S','0','1') then hc.raiseFirstInChance else 0 end) = 0 then -999
+                                  else 100.0*sum(case when hc.position in ('S','0','1') then hc.raisedFirstIn else 0 end)
+                                       /sum(case when hc.position in ('S','0','1') then hc.raiseFirstInChance else 0 end)
+                             end                                                                    AS steals
+                            ,case when sum(hc.success_Steal) = 0 then -999
+                                  else 100.0*sum(hc.success_Steal)
+                                       /sum(case when hc.position in ('S','0','1') then hc.raisedFirstIn else 0 end)
+                             end                                                                    AS suc_steal
+                            ,100.0*sum(hc.street1Seen)/sum(hc.HDs)                                  AS saw_f
+                            ,100.0*sum(hc.sawShowdown)/sum(hc.HDs)                                  AS sawsd
+                            ,case when sum(hc.street1Seen) = 0 then -999
+                                  else 100.0*sum(hc.wonWhenSeenStreet1)/sum(hc.street1Seen)
+                             end                                                                    AS wmsf
+                            ,case when sum(hc.street1Seen) = 0 then -999
+                                  else 100.0*sum(hc.sawShowdown)/sum(hc.street1Seen)
+                             end                                                                    AS wtsdwsf
+                            ,case when sum(hc.sawShowdown) = 0 then -999
+                                  else 100.0*sum(hc.wonAtSD)/sum(hc.sawShowdown)
+                             end                                                                    AS wmsd
+                            ,case when sum(hc.street1Seen) = 0 then -999
+                                  else 100.0*sum(hc.street1Aggr)/sum(hc.street1Seen)
+                             end                                                                    AS flafq
+                            ,case when sum(hc.street2Seen) = 0 then -999
+                                  else 100.0*sum(hc.street2Aggr)/sum(hc.street2Seen)
+                             end                                                                    AS tuafq
+                            ,case when sum(hc.street3Seen) = 0 then -999
+                                  else 100.0*sum(hc.street3Aggr)/sum(hc.street3Seen)
+                             end                                                                    AS rvafq
+                            ,case when sum(hc.street1Seen)+sum(hc.street2Seen)+sum(hc.street3Seen) = 0 then -999
+                                  else 100.0*(sum(hc.street1Aggr)+sum(hc.street2Aggr)+sum(hc.street3Aggr))
+                                       /(sum(hc.street1Seen)+sum(hc.street2Seen)+sum(hc.street3Seen))
+                             end                                                                    AS pofafq
+                            ,case when sum(hc.street1Calls)+sum(hc.street2Calls)+sum(hc.street3Calls)+sum(hc.street4Calls) = 0 then -999
+                                  else (sum(hc.street1Aggr)+sum(hc.street2Aggr)+sum(hc.street3Aggr)+sum(hc.street4Aggr))
+                                       /(0.0+sum(hc.street1Calls)+sum(hc.street2Calls)+sum(hc.street3Calls)+sum(hc.street4Calls))
+                             end                                                                    AS aggfac
+                            ,100.0*(sum(hc.street1Aggr)+sum(hc.street2Aggr)+sum(hc.street3Aggr)+sum(hc.street4Aggr))
+                                  /((sum(hc.foldToOtherRaisedStreet1)+sum(hc.foldToOtherRaisedStreet2)+sum(hc.foldToOtherRaisedStreet3)+sum(hc.foldToOtherRaisedStreet4))
+                                   +(sum(hc.street1Calls)+sum(hc.street2Calls)+sum(hc.street3Calls)+sum(hc.street4Calls))
+                                   +(sum(hc.street1Aggr)+sum(hc.street2Aggr)+sum(hc.street3Aggr)+sum(hc.street4Aggr)))
+                                                                                                    AS aggfrq
+                            ,100.0*(sum(hc.street1CBDone)+sum(hc.street2CBDone)+sum(hc.street3CBDone)+sum(hc.street4CBDone))
+                                  /(sum(hc.street1CBChance)+sum(hc.street2CBChance)+sum(hc.street3CBChance)+sum(hc.street4CBChance))
+                                                                                                    AS conbet
+                            ,sum(hc.totalProfit)/100.0                                              AS net
+                            ,sum(hc.rake)/100.0                                                     AS rake
+                            ,100.0*sum(hc.totalProfit/(gt.bigBlind+0.0))/sum(hc.HDs)                AS bbper100
+                            ,sum(hc.totalProfit)/100.0/sum(hc.HDs)                                  AS profitperhand
+                            ,100.0*sum((hc.totalProfit+hc.rake)/(gt.bigBlind+0.0))/sum(hc.HDs)      AS bb100xr
+                            ,sum(hc.totalProfit+hc.rake)/100.0/sum(hc.HDs)                          AS profhndxr
+                            ,sum(hc.activeSeats*hc.HDs)/(sum(hc.HDs)+0.0)                           AS avgseats
+                            ,(sum(hc.totalProfitSq) - sum(hc.totalProfit)*sum(hc.totalProfit)/(sum(hc.HDs)+0.0))
+                                  /sum(hc.HDs)/10000.0                                              AS variance
+                            ,sqrt(abs(sum(hc.totalProfitSq) - sum(hc.totalProfit)*sum(hc.totalProfit)/(sum(hc.HDs)+0.0))
+                                  /sum(hc.HDs)/10000.0)                                             AS stddev
+                      from CardsCache hc
+                           inner join Gametypes gt  on  (gt.Id = hc.gametypeId)
+                           inner join Sites s       on  (s.Id = gt.siteId)
+                           inner join Players p     on  (p.Id = hc.playerId)
+                      where hc.playerId in <player_test>
+                      <game_test>
+                      <site_test>
+                      <currency_test>
+                      and   hc.activeSeats <seats_test>
+                      <cardstest>
+                      <gtbigBlind_test>
+                      and   hc.styleKey <datestest>
+                      group by hgametypeId
+                              ,pname
+                              ,gt.base
+                              ,gt.category
+                              <groupbyseats>
+                              ,plposition
+                              ,upper(gt.limitType)
+                              ,s.name
+                      having 1 = 1 <havingclause>
+                      order by pname
+                              ,gt.base
+                              ,gt.category
+                              <orderbyseats>
+                              ,case <position> when 'B' then -2
+                                               when 'S' then -1
+                                               else 0
+                               end
+                              ,<position>
+                              <orderbyhgametypeId>
+                              ,upper(gt.limitType) desc
+                              ,maxbigblind desc
+                              ,s.name
+                      """
+
         #FIXME: 3/4bet and foldTo don't added four tournaments yet
         if db_server == 'mysql':
             self.query['tourneyPlayerDetailedStats'] = """
@@ -4287,15 +4661,15 @@ class Sql:
                      ,stats.Net
                      ,stats.BBper100
                      ,stats.Profitperhand
-                     ,case when hprof2.variance = -999 then '-'
-                           else format(hprof2.variance, 2)
+                     ,case when stats.variance is null then '-'
+                           else format(stats.variance, 2)
                       end                                                          AS Variance
-                     ,case when hprof2.stddev = -999 then '-'
-                           else format(hprof2.stddev, 2)
+                     ,case when stats.variance is null then '-'
+                           else format(sqrt(abs(stats.variance)), 2)
                       end                                                          AS Stddev
                      ,stats.AvgSeats
                 FROM
-                    (select /* stats from hudcache */
+                    (select /* stats from positionscache */
                             gt.base
                            ,gt.category
                            ,upper(gt.limitType)                                             AS limitType
@@ -4304,11 +4678,10 @@ class Sql:
                            ,<hcgametypeId>                                                  AS gtId
                            ,case when hc.position = 'B' then -2
                                  when hc.position = 'S' then -1
-                                 when hc.position = 'D' then  0
-                                 when hc.position = 'C' then  1
-                                 when hc.position = 'M' then  2
-                                 when hc.position = 'E' then  5
-                                 else 9
+                                 when hc.position = '0' then  0
+                                 when hc.position = '1' then  1
+                                 when hc.position in ('2','3','4') then 2
+                                 else 5
                             end                                                             as PlPosition
                            ,sum(HDs)                                                        AS n
                            ,format(100.0*sum(street0VPI)/sum(HDs),1)                        AS vpip
@@ -4357,10 +4730,13 @@ class Sql:
                                                                                             AS BBper100
                            ,format( (sum(totalProfit)/100.0) / sum(HDs), 4)                 AS Profitperhand
                            ,format( sum(activeSeats*HDs)/(sum(HDs)+0.0), 2)                 AS AvgSeats
+                           ,(sum(totalProfitSq) - sum(totalProfit)*sum(totalProfit)/sum(HDs))
+                                 / sum(HDs) / 10000.0                                       AS variance
                      from Gametypes gt
                           inner join Sites s on s.Id = gt.siteId
-                          inner join HudCache hc on hc.gametypeId = gt.Id
+                          inner join PositionsCache hc on hc.gametypeId = gt.Id
                      where hc.playerId in <player_test>
+                     and   gt.type = 'ring'
                      <gtbigBlind_test>
                      and   hc.activeSeats <seats_test>
                      and   concat( '20', substring(hc.styleKey,2,2), '-', substring(hc.styleKey,4,2), '-'
@@ -4374,37 +4750,6 @@ class Sql:
                           <groupbyseats>
                           ,PlPosition
                     ) stats
-                inner join
-                    ( select # profit from handsplayers/handsactions
-                             hprof.gtId,
-                             case when hprof.position = 'B' then -2
-                                  when hprof.position = 'S' then -1
-                                  when hprof.position in ('3','4') then 2
-                                  when hprof.position in ('6','7') then 5
-                                  else hprof.position
-                             end                                      as PlPosition,
-                             sum(hprof.profit) as sum_profit,
-                             avg(hprof.profit/100.0) as profitperhand,
-                             case when hprof.gtId = -1 then -999
-                                  else variance(hprof.profit/100.0)
-                             end as variance
-                             ,case when hprof.gtId = -1 then -999
-                                  else sqrt(variance(hprof.profit/100.0))
-                             end as stddev
-                      from
-                          (select hp.handId, <hgametypeId> as gtId, hp.position
-                                , hp.totalProfit as profit
-                           from HandsPlayers hp
-                           inner join Hands h  ON  (h.id = hp.handId)
-                           where hp.playerId in <player_test>
-                           and   hp.tourneysPlayersId IS NULL
-                           and   date_format(h.startTime, '%Y-%m-%d') <datestest>
-                           group by hp.handId, gtId, hp.position, hp.totalProfit
-                          ) hprof
-                      group by hprof.gtId, PlPosition
-                     ) hprof2
-                    on (    hprof2.gtId = stats.gtId
-                        and hprof2.PlPosition = stats.PlPosition)
                 order by stats.category, stats.limitType, stats.bigBlindDesc desc
                          <orderbyseats>, cast(stats.PlPosition as signed)
                 """
@@ -4425,15 +4770,15 @@ class Sql:
                      ,stats.n,stats.vpip,stats.pfr,stats.pf3,stats.pf4,stats.pff3,stats.pff4
                      ,stats.steals,stats.saw_f,stats.sawsd,stats.wtsdwsf,stats.wmsd,stats.FlAFq
                      ,stats.TuAFq,stats.RvAFq,stats.PoFAFq,stats.Net,stats.BBper100,stats.Profitperhand
-                     ,case when hprof2.variance = -999 then '-'
-                           else round(hprof2.variance, 2)
+                     ,case when stats.variance is null then '-'
+                           else round(stats.variance, 2)
                       end                                                                   AS Variance
-                     ,case when hprof2.variance = -999 then '-'
-                           else round(hprof2.stddev, 2)
+                     ,case when stats.variance is null then '-'
+                           else round(sqrt(abs(stats.variance)), 2)
                       end                                                                   AS Stddev
                      ,stats.AvgSeats
                 FROM
-                    (select /* stats from hudcache */
+                    (select /* stats from positionscache */
                             gt.base
                            ,gt.category,maxSeats,gt.bigBlind,gt.currency
                            ,upper(gt.limitType)                                             AS limitType
@@ -4442,11 +4787,10 @@ class Sql:
                            ,<hcgametypeId>                                                  AS gtId
                            ,case when hc.position = 'B' then -2
                                  when hc.position = 'S' then -1
-                                 when hc.position = 'D' then  0
-                                 when hc.position = 'C' then  1
-                                 when hc.position = 'M' then  2
-                                 when hc.position = 'E' then  5
-                                 else 9
+                                 when hc.position = '0' then  0
+                                 when hc.position = '1' then  1
+                                 when hc.position in ('2','3','4') then 2
+                                 else 5
                             end                                                             AS PlPosition
                            ,sum(HDs)                                                        AS n
                            ,round(100.0*sum(street0VPI)/sum(HDs),1)                         AS vpip
@@ -4495,10 +4839,13 @@ class Sql:
                                                                                             AS BBper100
                            ,round( (sum(totalProfit)/100.0) / sum(HDs), 4)                  AS Profitperhand
                            ,round( sum(activeSeats*HDs)/(sum(HDs)+0.0), 2)                  AS AvgSeats
+                           ,(sum(totalProfitSq) - sum(totalProfit)*sum(totalProfit)/(sum(HDs)+0.0))
+                                 / sum(HDs) / 10000.0                                       AS variance
                      from Gametypes gt
                           inner join Sites s on s.Id = gt.siteId
-                          inner join HudCache hc on hc.gametypeId = gt.Id
+                          inner join PositionsCache hc on hc.gametypeId = gt.Id
                      where hc.playerId in <player_test>
+                     and   gt.type = 'ring'
                      <gtbigBlind_test>
                      and   hc.activeSeats <seats_test>
                      and   '20' || substr(hc.styleKey,2,2) || '-' || substr(hc.styleKey,4,2) || '-' ||
@@ -4506,43 +4853,12 @@ class Sql:
                      group by gt.base,gt.category,upper(gt.limitType),s.name
                               <groupbygt.bigBlind>,gtId<groupbyseats>,PlPosition
                     ) stats
-                inner join
-                    ( select /* profit from handsplayers/handsactions */
-                             hprof.gtId,
-                             cast(case when hprof.position = 'B' then -2
-                                  when hprof.position = 'S' then -1
-                                  when hprof.position in ('3','4') then 2
-                                  when hprof.position in ('6','7') then 5
-                                  else hprof.position
-                             end as signed)                           as PlPosition,
-                             sum(hprof.profit) as sum_profit,
-                             avg(hprof.profit/100.0) as profitperhand,
-                             case when hprof.gtId = -1 then -999
-                                  else variance(hprof.profit/100.0)
-                             end as variance
-                             ,case when hprof.gtId = -1 then -999
-                                  else sqrt(variance(hprof.profit/100.0))
-                             end as stddev
-                      from
-                          (select hp.handId, <hgametypeId> as gtId, hp.position
-                                , hp.totalProfit as profit
-                           from HandsPlayers hp
-                           inner join Hands h  ON  (h.id = hp.handId)
-                           where hp.playerId in <player_test>
-                           and   hp.tourneysPlayersId IS NULL
-                           and   datetime(h.startTime) <datestest>
-                           group by hp.handId, gtId, hp.position, hp.totalProfit
-                          ) hprof
-                      group by hprof.gtId, PlPosition
-                     ) hprof2
-                    on (    hprof2.gtId = stats.gtId
-                        and hprof2.PlPosition = stats.PlPosition)
                 order by stats.category, stats.bigBlind, stats.limitType, stats.currency, stats.maxSeats <orderbyseats>
                         ,cast(stats.PlPosition as signed)
                 """
         else:  # assume postgresql
             self.query['playerStatsByPosition'] = """
-                select /* stats from hudcache */
+                select /* stats from positionscache */
                        upper(stats.limitType) || ' '
                        || upper(substr(stats.category,1,1)) || substr(stats.category,2) || ' '
                        || stats.name || ' '
@@ -4574,15 +4890,15 @@ class Sql:
                       ,stats.Net
                       ,stats.BBper100
                       ,stats.Profitperhand
-                      ,case when hprof2.variance = -999 then '-'
-                            else to_char(hprof2.variance, '0D00')
+                      ,case when stats.variance is null then '-'
+                            else to_char(stats.variance, '0D00')
                        end                                                          AS Variance
-                      ,case when hprof2.stddev = -999 then '-'
-                            else to_char(hprof2.stddev, '0D00')
+                      ,case when stats.variance is null then '-'
+                            else to_char(sqrt(abs(stats.variance)), '0D00')
                        end                                                          AS Stddev
                       ,stats.AvgSeats
                 FROM
-                    (select /* stats from hudcache */
+                    (select /* stats from positionscache */
                             gt.base
                            ,gt.category
                            ,upper(gt.limitType)                                             AS limitType
@@ -4591,11 +4907,10 @@ class Sql:
                            ,<hcgametypeId>                                                  AS gtId
                            ,case when hc.position = 'B' then -2
                                  when hc.position = 'S' then -1
-                                 when hc.position = 'D' then  0
-                                 when hc.position = 'C' then  1
-                                 when hc.position = 'M' then  2
-                                 when hc.position = 'E' then  5
-                                 else 9
+                                 when hc.position = '0' then  0
+                                 when hc.position = '1' then  1
+                                 when hc.position in ('2','3','4') then 2
+                                 else 5
                             end                                                             AS PlPosition
                            ,sum(HDs)                                                        AS n
                            ,to_char(round(100.0*sum(street0VPI)/sum(HDs)),'990D0')          AS vpip
@@ -4647,10 +4962,15 @@ class Sql:
                                  else to_char( (sum(totalProfit)/100.0) / sum(HDs), '90D0000')
                             end                                                             AS Profitperhand
                            ,to_char(sum(activeSeats*HDs)/(sum(HDs)+0.0),'90D00')            AS AvgSeats
+                           ,case when sum(HDs) > 1
+                                 then (sum(totalProfitSq) - sum(totalProfit)*sum(totalProfit)/(sum(HDs)+0.0))
+                                      / (sum(HDs)-1) / 10000.0
+                            end                                                             AS variance
                      from Gametypes gt
                           inner join Sites s     on (s.Id = gt.siteId)
-                          inner join HudCache hc on (hc.gametypeId = gt.Id)
+                          inner join PositionsCache hc on (hc.gametypeId = gt.Id)
                      where hc.playerId in <player_test>
+                     and   gt.type = 'ring'
                      <gtbigBlind_test>
                      and   hc.activeSeats <seats_test>
                      and   '20' || SUBSTR(hc.styleKey,2,2) || '-' || SUBSTR(hc.styleKey,4,2) || '-'
@@ -4664,37 +4984,6 @@ class Sql:
                           <groupbyseats>
                           ,PlPosition
                     ) stats
-                inner join
-                    ( select /* profit from handsplayers/handsactions */
-                             hprof.gtId,
-                             case when hprof.position = 'B' then -2
-                                  when hprof.position = 'S' then -1
-                                  when hprof.position in ('3','4') then 2
-                                  when hprof.position in ('6','7') then 5
-                                  else cast(hprof.position as smallint)
-                             end                                      as PlPosition,
-                             sum(hprof.profit) as sum_profit,
-                             avg(hprof.profit/100.0) as profitperhand,
-                             case when hprof.gtId = -1 then -999
-                                  else variance(hprof.profit/100.0)
-                             end as variance
-                             ,case when hprof.gtId = -1 then -999
-                                  else sqrt(variance(hprof.profit/100.0))
-                             end as stddev
-                      from
-                          (select hp.handId, <hgametypeId> as gtId, hp.position
-                                , hp.totalProfit as profit
-                           from HandsPlayers hp
-                           inner join Hands h  ON  (h.id = hp.handId)
-                           where hp.playerId in <player_test>
-                           and   hp.tourneysPlayersId IS NULL
-                           and   to_char(h.startTime, 'YYYY-MM-DD') <datestest>
-                           group by hp.handId, gametypeId, hp.position, hp.totalProfit
-                          ) hprof
-                      group by hprof.gtId, PlPosition
-                    ) hprof2
-                    on (    hprof2.gtId = stats.gtId
-                        and hprof2.PlPosition = stats.PlPosition)
                 order by stats.category, stats.limitType, stats.bigBlindDesc desc
                          <orderbyseats>, cast(stats.PlPosition as smallint)
                 """
@@ -4841,7 +5130,8 @@ class Sql:
                 and hp.playerId in <player_test>
                 <game_test>
                 <limit_test>
-                <position_test>"""
+                <position_test>
+                <cards_test>"""
 
         ####################################
         # Query to get a single hand for the replayer
@@ -4900,12 +5190,67 @@ class Sql:
                       ha.id ASC
                 """
 
+        ####################################
+        # Queries to get a page of hands for the hand viewer, see
+        # Hand.hand_pages. Same columns as singleHand, playerHand and
+        # handActions, plus the hand id
+        ####################################
+        self.query['multipleHands'] = """
+                 SELECT h.*
+                    FROM Hands h
+                    WHERE id in <hand_ids>"""
+
+        self.query['playerHands'] = """
+            SELECT
+                        hp.handId,
+                        hp.seatno,
+                        round(hp.winnings / 100.0,2) as winnings,
+                        p.name,
+                        round(hp.startCash / 100.0,2) as chips,
+                        hp.card1,hp.card2,hp.card3,hp.card4,hp.card5,
+                        hp.card6,hp.card7,hp.card8,hp.card9,hp.card10,
+                        hp.card11,hp.card12,hp.card13,hp.card14,hp.card15,
+                        hp.card16,hp.card17,hp.card18,hp.card19,hp.card20,
+                        hp.position
+                    FROM
+                        HandsPlayers as hp,
+                        Players as p
+                    WHERE
+                        hp.handId in <hand_ids>
+                        and p.id = hp.playerId
+                    ORDER BY
+                        hp.handId, hp.seatno
+                """
+
+        self.query['handsActions'] = """
+            SELECT
+                      ha.handId,
+                      ha.actionNo,
+                      p.name,
+                      ha.street,
+                      ha.actionId,
+                      ha.allIn,
+                      round(ha.amount / 100.0,2) as bet,
+                      ha.numDiscarded,
+                      ha.cardsDiscarded
+                FROM
+                      HandsActions as ha,
+                      Players as p
+                WHERE
+                          ha.handId in <hand_ids>
+                      AND ha.playerId = p.id
+                ORDER BY
+                      ha.id ASC
+                """
+
         ####################################
         # Queries to rebuild/modify hudcache
         ####################################
       
         self.query['clearHudCache'] = """DELETE FROM HudCache"""
         self.query['clearHudCacheTourneyType'] = """DELETE FROM HudCache WHERE tourneyTypeId = %s"""
+        self.query['clearCardsCache'] = """DELETE FROM CardsCache"""
+        self.query['clearPositionsCache'] = """DELETE FROM PositionsCache"""
         
        
         if db_server == 'mysql':
@@ -5768,11 +6113,12 @@ class Sql:
                                                    
         self.query['insert_cardscache'] = """
             insert into CardsCache (
-                type,
-                category,
-                currency,
+                gametypeId,
                 playerId,
+                activeSeats,
+                position,
                 startCards,
+                styleKey,
                 HDs,
                 street0VPI,
                 street0Aggr,
@@ -5863,7 +6209,8 @@ class Sql:
                 street1Raises,
                 street2Raises,
                 street3Raises,
-                street4Raises)
+                street4Raises,
+                totalProfitSq)
             values (%s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
@@ -5883,7 +6230,7 @@ class Sql:
                     %s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
-                    %s
+                    %s, %s, %s
                     )"""
 
         self.query['update_cardscache'] = """
@@ -5978,12 +6325,14 @@ class Sql:
             street1Raises=street1Raises+%s,
             street2Raises=street2Raises+%s,
             street3Raises=street3Raises+%s,
-            street4Raises=street4Raises+%s
-        WHERE type=%s
-            AND   category=%s
-            AND   currency=%s
+            street4Raises=street4Raises+%s,
+            totalProfitSq=totalProfitSq+%s
+        WHERE gametypeId=%s
             AND   playerId=%s
-            AND   startCards=%s"""
+            AND   activeSeats=%s
+            AND   position=%s
+            AND   startCards=%s
+            AND   styleKey=%s"""
                    
         ####################################
         # Queries to insert/update positionscache
@@ -5991,14 +6340,11 @@ class Sql:
                    
         self.query['insert_positionscache'] = """
             insert into PositionsCache (
-                type,
-                base,
-                category,
-                currency,
-                maxSeats,
+                gametypeId,
                 playerId,
                 activeSeats,
                 position,
+                styleKey,
                 HDs,
                 street0VPI,
                 street0Aggr,
@@ -6089,7 +6435,8 @@ class Sql:
                 street1Raises,
                 street2Raises,
                 street3Raises,
-                street4Raises)
+                street4Raises,
+                totalProfitSq)
             values (%s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
@@ -6109,7 +6456,7 @@ class Sql:
                     %s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
                     %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s
+                    %s, %s
                     )"""
 
         self.query['update_positionscache'] = """
@@ -6204,15 +6551,13 @@ class Sql:
             street1Raises=street1Raises+%s,
             street2Raises=street2Raises+%s,
             street3Raises=street3Raises+%s,
-            street4Raises=street4Raises+%s
-        WHERE type=%s
-            AND   base=%s
-            AND   category=%s
-            AND   currency=%s
-            AND   maxSeats=%s
+            street4Raises=street4Raises+%s,
+            totalProfitSq=totalProfitSq+%s
+        WHERE gametypeId=%s
             AND   playerId=%s
             AND   activeSeats=%s
-            AND   position=%s"""
+            AND   position=%s
+            AND   styleKey=%s"""
             
         ####################################
         # Queries to rebuild/modify sessionscache
@@ -6280,6 +6625,24 @@ class Sql:
                     AND date=%s
                     AND gametypeId=%s
                     AND playerId=%s"""
+
+        self.query['select_GC_range'] = """
+                    SELECT id,
+                    gameStart,
+                    gameEnd,
+                    date,
+                    gametypeId,
+                    playerId,
+                    played,
+                    hands,
+                    totalProfit,
+                    rake,
+                    showdownWinnings,
+                    nonShowdownWinnings,
+                    allInEV
+                    FROM GamesCache
+                    WHERE gameEnd>=%s
+                    AND gameStart<=%s"""
                     
         ####################################
         # insert
@@ -6287,12 +6650,14 @@ class Sql:
                             
         self.query['insert_SC'] = """
                     insert into SessionsCache (
+                    id,
                     sessionStart,
                     sessionEnd)
-                    values (%s, %s)"""
+                    values (%s, %s, %s)"""
                             
         self.query['insert_GC'] = """
                     insert into GamesCache (
+                    id,
                     sessionId,
                     gameStart,
                     gameEnd,
@@ -6307,7 +6672,7 @@ class Sql:
                     nonShowdownWinnings,
                     allInEV)
                     values (%s, %s, %s, %s, %s, %s, %s,
-                            %s, %s, %s, %s, %s, %s)"""
+                            %s, %s, %s, %s, %s, %s, %s)"""
                     
         ####################################
         # update
@@ -6420,7 +6785,7 @@ class Sql:
         if db_server == 'mysql':
             self.query['analyze'] = """
             analyze table Actions, Autorates, Backings, Boards, Files, Gametypes, Hands, HandsActions, HandsPlayers, 
-                          HandsStove, HudCache, Players, RawHands, RawTourneys, SessionsCache, Settings, Sites,
+                          HandsStove, HudCache, Players, RawHands, RawHandBlocks, RawDictionaries, RawTourneys, SessionsCache, Settings, Sites,
                           Tourneys, TourneysPlayers, TourneyTypes
             """
         elif db_server == 'postgresql':
@@ -6432,7 +6797,7 @@ class Sql:
         if db_server == 'mysql':
             self.query['vacuum'] = """
             optimize table Actions, Autorates, Backings, Boards, Files, Gametypes, Hands, HandsActions, HandsPlayers, 
-                           HandsStove, HudCache, Players, RawHands, RawTourneys, SessionsCache, Settings, Sites,
+                           HandsStove, HudCache, Players, RawHands, RawHandBlocks, RawDictionaries, RawTourneys, SessionsCache, Settings, Sites,
                            Tourneys, TourneysPlayers, TourneyTypes
             """
         elif db_server == 'postgresql':
@@ -6499,6 +6864,10 @@ class Sql:
         self.query['isAlreadyInDB'] = """SELECT id FROM Hands 
                                          WHERE gametypeId=%s AND siteHandNo=%s
         """
+
+        self.query['getSiteHandNosInRange'] = """SELECT siteHandNo FROM Hands
+                                         WHERE gametypeId=%s AND siteHandNo BETWEEN %s AND %s
+        """
         
         self.query['getTourneyTypeIdByTourneyNo'] = """SELECT tt.id,
                                                               tt.siteId,
@@ -6957,6 +7326,76 @@ class Sql:
                     finished=%s
                     WHERE id=%s"""
         
+        ################################
+        # queries for IdentifyCache Table
+        ################################
+
+        self.query['get_identify_cache'] = """
+                    SELECT file, size, mtime, site, type, kodec, archive, gametype
+                    FROM IdentifyCache"""
+
+        self.query['delete_identify_cache'] = """
+                    DELETE FROM IdentifyCache WHERE file=%s"""
+
+        self.query['insert_identify_cache'] = """
+                    INSERT INTO IdentifyCache (file, size, mtime, site, type, kodec, archive, gametype)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"""
+
+        ################################
+        # Raw hand archive
+        ################################
+        self.query['get_raw_dictionaries'] = "SELECT id, siteId, dictionary FROM RawDictionaries"
+
+        self.query['insert_raw_dictionary'] = "INSERT INTO RawDictionaries (siteId, dictionary) VALUES (%s, %s)"
+
+        self.query['insert_raw_block'] = """INSERT INTO RawHandBlocks (siteId, dictionaryId, compression, file, hands, rawHands)
+                                             VALUES (%s, %s, %s, %s, %s, %s)"""
+
+        self.query['insert_raw_hands'] = "INSERT INTO RawHands (handId, blockId, blockIndex) VALUES (%s, %s, %s)"
+
+        self.query['get_raw_blocks'] = """SELECT id, siteId, dictionaryId, compression, file, rawHands
+                                           FROM RawHandBlocks
+                                           WHERE id > %s
+                                           ORDER BY id
+                                           LIMIT %s"""
+
+        self.query['get_raw_block_hands'] = """SELECT blockIndex, handId
+                                                FROM RawHands
+                                                WHERE blockId = %s
+                                                ORDER BY blockIndex"""
+
+        self.query['get_stove_equities'] = """SELECT hs.handId, p.name, hs.street, hs.boardId, hs.ev
+                                               FROM HandsStove hs
+                                               INNER JOIN Players p ON (p.id = hs.playerId)
+                                               WHERE hs.handId BETWEEN %s AND %s"""
+
+        self.query['get_raw_hand'] = """SELECT b.siteId, b.dictionaryId, b.compression, b.rawHands, r.blockIndex
+                                         FROM RawHands r
+                                         INNER JOIN RawHandBlocks b ON (b.id = r.blockId)
+                                         WHERE r.handId = %s"""
+
+        # <table> is HandsPlayers, HandsActions or HandsStove
+        self.query['delete_hand_rows'] = "DELETE FROM <table> WHERE handId = %s"
+
+        self.query['update_hand_stats'] = """UPDATE Hands SET
+                                               playersVpi=%s,
+                                               playersAtStreet1=%s,
+                                               playersAtStreet2=%s,
+                                               playersAtStreet3=%s,
+                                               playersAtStreet4=%s,
+                                               playersAtShowdown=%s,
+                                               street0Raises=%s,
+                                               street1Raises=%s,
+                                               street2Raises=%s,
+                                               street3Raises=%s,
+                                               street4Raises=%s,
+                                               street1Pot=%s,
+                                               street2Pot=%s,
+                                               street3Pot=%s,
+                                               street4Pot=%s,
+                                               showdownPot=%s
+                                           WHERE id=%s"""
+
         ################################
         # Counts for DB stats window
         ################################
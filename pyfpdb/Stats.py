@@ -40,7 +40,8 @@
 #           the vpip() function for example.  This function has to be protected from
 #           exceptions, using something like the try:/except: paragraphs in vpip.
 #        4  The name of the function has to be the same as the of the stat used
-#           in the config file.
+#           in the config file. Decorate it with @register_stat(description), that
+#           is how do_stat() finds it.
 #        5  The stat functions have a peculiar return value, which is outlined in
 #           the do_stat function.  This format is useful for tool tips and maybe
 #           other stuff.
@@ -64,6 +65,7 @@ import Database
 import Charset
 import Card
 import Hand
+import HudStatCache
 
 import logging
 if __name__ == "__main__":
@@ -74,12 +76,40 @@ log = logging.getLogger("db")
 
 re_Places = re.compile("_[0-9]$")
 
+# starting hands of the hand history files shown, see starthands()
+starthands_cache = HudStatCache.StartHandsCache()
+
 # String manipulation
 import codecs
 encoder = codecs.lookup(Configuration.LOCALE_ENCODING)
 
 stat_descriptions = {}
 
+# All the stats, by name. Filled in once at import by register_stat(), so
+# do_stat() looks the function up instead of building and eval()ing a call
+# for every stat of every player on every hand.
+STATS = {}
+
+class StatFunc:
+    """A registered stat function.
+       needs_hand is True for stats like m_ratio that are calculated from the
+       last hand as well (their function takes a hand_instance argument)."""
+    def __init__(self, name, func, description):
+        self.name = name
+        self.func = func
+        self.description = description
+        self.needs_hand = func.func_code.co_argcount == 3
+
+def register_stat(description = None):
+    """Decorator adding the stat function to STATS and its description to
+       stat_descriptions."""
+    def register(func):
+        STATS[func.__name__] = StatFunc(func.__name__, func, description)
+        if description is not None:
+            stat_descriptions[func.__name__] = description
+        return func
+    return register
+
 # Since tuples are immutable, we have to create a new one when
 # overriding any decimal placements. Copy old ones and recreate the
 # second value in tuple to specified format-
@@ -95,21 +125,32 @@ def do_tip(widget, tip):
     widget.set_tooltip_text(_tip)
 
 
-def do_stat(stat_dict, player = 24, stat = 'vpip', hand_instance = None):
+# stat name as used in the config, e.g. "vpip_0" -> (StatFunc, decimal places or None)
+stat_lookups = {}
+
+def lookup_stat(stat):
+    try:
+        return stat_lookups[stat]
+    except KeyError:
+        pass
+    places = None
     statname = stat
-    match = re_Places.search(stat)
-    if match:   # override if necessary
+    if re_Places.search(stat):   # override if necessary
         statname = stat[0:-2]
-    
-    if stat in ['starthands','m_ratio','bbstack', 'game_abbr']:
+        places = int(stat[-1:])
+    stat_lookups[stat] = (STATS[statname], places)
+    return stat_lookups[stat]
+
+def do_stat(stat_dict, player = 24, stat = 'vpip', hand_instance = None):
+    (entry, places) = lookup_stat(stat)
+
+    if entry.needs_hand:
         if hand_instance:
-            result = eval("%(stat)s(stat_dict, %(player)d, hand_instance)" %
-                {'stat': statname, 'player': player})
+            result = entry.func(stat_dict, player, hand_instance)
         else:
             return ((''),(''),(''),(''),(''),(''))
     else:
-        result = eval("%(stat)s(stat_dict, %(player)d)" %
-            {'stat': statname, 'player': player})
+        result = entry.func(stat_dict, player)
 
     # If decimal places have been defined, override result[1]
     # NOTE: decimal place override ALWAYS assumes the raw result is a
@@ -117,11 +158,28 @@ def do_stat(stat_dict, player = 24, stat = 'vpip', hand_instance = None):
     # percentage values. Also, profit/100 hands (bb/BB) already default
     # to three decimal places anyhow, so they are unlikely override
     # candidates.
-    if match:
-        places = int(stat[-1:])
+    if places is not None:
         result = __stat_override(places, result)
     return result
 
+def do_stat_all(stat_dict, stat = 'vpip', hand_instance = None):
+    """Calculates one stat for all the players in stat_dict, returns a dict
+       of the do_stat() results by player."""
+    (entry, places) = lookup_stat(stat)
+    if entry.needs_hand and not hand_instance:
+        return dict((player, ((''),(''),(''),(''),(''),(''))) for player in stat_dict)
+    func = entry.func
+    results = {}
+    for player in stat_dict:
+        if entry.needs_hand:
+            result = func(stat_dict, player, hand_instance)
+        else:
+            result = func(stat_dict, player)
+        if places is not None:
+            result = __stat_override(places, result)
+        results[player] = result
+    return results
+
 #    OK, for reference the tuple returned by the stat is:
 #    0 - The stat, raw, no formating, eg 0.33333333
 #    1 - formatted stat with appropriate precision, eg. 33; shown in HUD
@@ -134,15 +192,15 @@ def do_stat(stat_dict, player = 24, stat = 'vpip', hand_instance = None):
 #    functions that return individual stats
 
 
+@register_stat(_("Total Profit") + " (totalprofit)")
 def totalprofit(stat_dict, player):
-    stat_descriptions["totalprofit"] = _("Total Profit") + " (totalprofit)"
     if stat_dict[player]['net'] != 0:
         stat = float(stat_dict[player]['net']) / 100
         return (stat, '$%.2f' % stat, 'tp=$%.2f' % stat, 'totalprofit=$%.2f' % stat, str(stat), _('Total Profit'))
     return ('0', '$0.00', 'tp=0', 'totalprofit=0', '0', _('Total Profit'))
 
+@register_stat(_("Player Name") + " (playername)")
 def playername(stat_dict, player):
-    stat_descriptions["playername"] = _("Player Name") + " (playername)"
     return (stat_dict[player]['screen_name'],
             stat_dict[player]['screen_name'],
             stat_dict[player]['screen_name'],
@@ -182,13 +240,12 @@ def calculate_end_stack(stat_dict, player, hand_instance):
             stack += float(hand_instance.collectees[item])
     return stack
 
+@register_stat(_("M") + " (M)")
 def m_ratio(stat_dict, player, hand_instance):
     
     #Tournament M-ratio calculation
     # Using the end-of-hand stack count vs. that hand's antes/blinds
          
-    stat_descriptions["M ratio (last hand)"] = _("M") + " (M)"
-    
     # sum all blinds/antes
     compulsory_bets = 0.0
     for p in hand_instance.bets['BLINDSANTES']:
@@ -211,10 +268,10 @@ def m_ratio(stat_dict, player, hand_instance):
                 '(%d)'      % (int(stat)),
                 _('M ratio') )
 
+@register_stat(_("bb") + " (bb)")
 def bbstack(stat_dict, player, hand_instance):
     #Tournament Stack calculation in Big Blinds
     #Result is end of hand stack count / Current Big Blind limit
-    stat_descriptions["Stack in bb"] = _("bb") + " (bb)"
     # current big blind limit
     current_bigblindlimit = 0
     current_bigblindlimit += float(hand_instance.gametype['bb'])
@@ -233,8 +290,8 @@ def bbstack(stat_dict, player, hand_instance):
                 '(%d)'      % (int(stat)),
                 _('bb stack') )
 
+@register_stat((_("Player Name")+" 1-5") + " (playershort)")
 def playershort(stat_dict, player):
-    stat_descriptions["playershort"] = (_("Player Name")+" 1-5") + " (playershort)"
     r = stat_dict[player]['screen_name']
     if (len(r) > 6):
         r = r[:5] + "."
@@ -246,8 +303,8 @@ def playershort(stat_dict, player):
             (_("Player Name")+" 1-5")
             )
             
+@register_stat(_("Voluntarily put in preflop/3rd street %") + " (vpip)")
 def vpip(stat_dict, player):
-    stat_descriptions["vpip"] = _("Voluntarily put in preflop/3rd street %") + " (vpip)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['vpip'])/float(stat_dict[player]['n'])
@@ -266,8 +323,8 @@ def vpip(stat_dict, player):
                     _('Voluntarily put in preflop/3rd street %')
                     )
 
+@register_stat(_("Preflop/3rd street raise %") + " (pfr)")
 def pfr(stat_dict, player):
-    stat_descriptions["pfr"] = _("Preflop/3rd street raise %") + " (pfr)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['pfr'])/float(stat_dict[player]['n'])
@@ -287,8 +344,8 @@ def pfr(stat_dict, player):
                 _('Preflop/3rd street raise %')
                 )
 
+@register_stat(_("% went to showdown when seen flop/4th street") + " (wtsd)")
 def wtsd(stat_dict, player):
-    stat_descriptions["wtsd"] = _("% went to showdown when seen flop/4th street") + " (wtsd)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['sd'])/float(stat_dict[player]['saw_f'])
@@ -308,8 +365,8 @@ def wtsd(stat_dict, player):
                 _('% went to showdown when seen flop/4th street')
                 )
 
+@register_stat(_("% won some money at showdown") + " (wmsd)")
 def wmsd(stat_dict, player):
-    stat_descriptions["wmsd"] = _("% won some money at showdown") + " (wmsd)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['wmsd'])/float(stat_dict[player]['sd'])
@@ -331,8 +388,8 @@ def wmsd(stat_dict, player):
 
 # Money is stored as pennies, so there is an implicit 100-multiplier
 # already in place
+@register_stat(_("Profit per 100 hands") + " (profit100)")
 def profit100(stat_dict, player):
-    stat_descriptions["profit100"] = _("Profit per 100 hands") + " (profit100)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['net'])/float(stat_dict[player]['n'])
@@ -353,8 +410,8 @@ def profit100(stat_dict, player):
                     _('Profit per 100 hands')
                     )
 
+@register_stat(_("Big blinds won per 100 hands") + " (bbper100)")
 def bbper100(stat_dict, player):
-    stat_descriptions["bbper100"] = _("Big blinds won per 100 hands") + " (bbper100)"
     stat = 0.0
     #['bigblind'] is already containing number of hands * table's bigblind (e.g. 401 hands @ 5c BB = 2005)
     try:
@@ -376,8 +433,8 @@ def bbper100(stat_dict, player):
                 _('Big blinds won per 100 hands')
                 )
 
+@register_stat(_("Big bets won per 100 hands") + " (BBper100)")
 def BBper100(stat_dict, player):
-    stat_descriptions["BBper100"] = _("Big bets won per 100 hands") + " (BBper100)"
     stat = 0.0
     #['bigblind'] is already containing number of hands * table's bigblind (e.g. 401 hands @ 5c BB = 2005)
     try:
@@ -399,8 +456,8 @@ def BBper100(stat_dict, player):
                 _('Big bets won per 100 hands')
                 )
 
+@register_stat(_("Flop/4th street seen %") + " (saw_f)")
 def saw_f(stat_dict, player):
-    stat_descriptions["saw_f"] = _("Flop/4th street seen %") + " (saw_f)"
     try:
         num = float(stat_dict[player]['saw_f'])
         den = float(stat_dict[player]['n'])
@@ -422,8 +479,8 @@ def saw_f(stat_dict, player):
             _('Flop/4th street seen %')
             )
 
+@register_stat(_("Number of hands seen") + " (n)")
 def n(stat_dict, player):
-    stat_descriptions["n"] = _("Number of hands seen") + " (n)"
     try:
         # If sample is large enough, use X.Yk notation instead
         _n = stat_dict[player]['n']
@@ -454,6 +511,7 @@ def n(stat_dict, player):
                 _('Number of hands seen')
                 )
     
+@register_stat()
 def fold_f(stat_dict, player):
     #TODO: remove
     stat = 0.0
@@ -475,8 +533,8 @@ def fold_f(stat_dict, player):
                 ('folded flop/4th')
                 )
            
+@register_stat(_("% steal attempted") + " (steal)")
 def steal(stat_dict, player):
-    stat_descriptions["steal"] = _("% steal attempted") + " (steal)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['steal'])/float(stat_dict[player]['steal_opp'])
@@ -490,8 +548,8 @@ def steal(stat_dict, player):
     except:
         return (stat, 'NA', 'st=NA', 'steal=NA', '(0/0)', '% steal attempted')
 
+@register_stat(_("% steal success") + " (s_steal)")
 def s_steal(stat_dict, player):
-    stat_descriptions["s_steal"] = _("% steal success") + " (s_steal)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['suc_st'])/float(stat_dict[player]['steal'])
@@ -505,8 +563,8 @@ def s_steal(stat_dict, player):
     except:
         return (stat, 'NA', 'st=NA', 's_steal=NA', '(0/0)', '% steal success')
 
+@register_stat(_("% folded SB to steal") + " (f_SB_steal)")
 def f_SB_steal(stat_dict, player):
-    stat_descriptions["f_SB_steal"] = _("% folded SB to steal") + " (f_SB_steal)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['sbnotdef'])/float(stat_dict[player]['sbstolen'])
@@ -524,8 +582,8 @@ def f_SB_steal(stat_dict, player):
                 '(0/0)',
                 _('% folded SB to steal'))
 
+@register_stat(_("% folded BB to steal") + " (f_BB_steal)")
 def f_BB_steal(stat_dict, player):
-    stat_descriptions["f_BB_steal"] = _("% folded BB to steal") + " (f_BB_steal)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['bbnotdef'])/float(stat_dict[player]['bbstolen'])
@@ -543,8 +601,8 @@ def f_BB_steal(stat_dict, player):
                 '(0/0)',
                 _('% folded BB to steal'))
                 
+@register_stat(_("% folded blind to steal") + " (f_steal)")
 def f_steal(stat_dict, player):
-    stat_descriptions["f_steal"] = _("% folded blind to steal") + " (f_steal)"
     stat = 0.0
     try:
         folded_blind = stat_dict[player]['sbnotdef'] + stat_dict[player]['bbnotdef']
@@ -565,8 +623,8 @@ def f_steal(stat_dict, player):
                 '(0/0)',
                 _('% folded blind to steal'))
 
+@register_stat(_("% 3 bet preflop/3rd street") + " (three_B)")
 def three_B(stat_dict, player):
-    stat_descriptions["three_B"] = _("% 3 bet preflop/3rd street") + " (three_B)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['tb_0'])/float(stat_dict[player]['tb_opp_0'])
@@ -584,8 +642,8 @@ def three_B(stat_dict, player):
                 '(0/0)',
                 _('% 3 bet preflop/3rd street'))
 
+@register_stat(_("% 4 bet preflop/3rd street") + " (four_B)")
 def four_B(stat_dict, player):
-    stat_descriptions["four_B"] = _("% 4 bet preflop/3rd street") + " (four_B)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['fb_0'])/float(stat_dict[player]['fb_opp_0'])
@@ -603,8 +661,8 @@ def four_B(stat_dict, player):
                 '(0/0)',
                 _('% 4 bet preflop/3rd street'))
 
+@register_stat(_("% cold 4 bet preflop/3rd street") + " (cfour_B)")
 def cfour_B(stat_dict, player):
-    stat_descriptions["cfour_B"] = _("% cold 4 bet preflop/3rd street") + " (cfour_B)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['cfb_0'])/float(stat_dict[player]['cfb_opp_0'])
@@ -622,8 +680,8 @@ def cfour_B(stat_dict, player):
                 '(0/0)',
                 _('% cold 4 bet preflop/3rd street'))
 
+@register_stat(_("% squeeze preflop") + " (squeeze)")
 def squeeze(stat_dict, player):
-    stat_descriptions["squeeze"] = _("% squeeze preflop") + " (squeeze)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['sqz_0'])/float(stat_dict[player]['sqz_opp_0'])
@@ -642,8 +700,8 @@ def squeeze(stat_dict, player):
                 _('% squeeze preflop'))
 
 
+@register_stat(_("% raise to steal") + " (raiseToSteal)")
 def raiseToSteal(stat_dict, player):
-    stat_descriptions["raiseToSteal"] = _("% raise to steal") + " (raiseToSteal)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['rts'])/float(stat_dict[player]['rts_opp'])
@@ -661,8 +719,8 @@ def raiseToSteal(stat_dict, player):
                 '(0/0)',
                 _('% raise to steal'))
 
+@register_stat(_("% called a raise preflop") + " (car_0)")
 def car0(stat_dict, player):
-    stat_descriptions["car_0"] = _("% called a raise preflop") + " (car_0)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['car_0'])/float(stat_dict[player]['car_opp_0'])
@@ -680,8 +738,8 @@ def car0(stat_dict, player):
                 '(0/0)',
                 _('% called a raise preflop'))
 
+@register_stat(_("% fold to 3 bet preflop/3rd street") + " (f_3bet)")
 def f_3bet(stat_dict, player):
-    stat_descriptions["f_3bet"] = _("% fold to 3 bet preflop/3rd street") + " (f_3bet)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['f3b_0'])/float(stat_dict[player]['f3b_opp_0'])
@@ -699,8 +757,8 @@ def f_3bet(stat_dict, player):
                 '(0/0)',
                 _('% fold to 3 bet preflop/3rd street'))
 
+@register_stat(_("% fold to 4 bet preflop/3rd street") + " (f_4bet)")
 def f_4bet(stat_dict, player):
-    stat_descriptions["f_4bet"] = _("% fold to 4 bet preflop/3rd street") + " (f_4bet)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['f4b_0'])/float(stat_dict[player]['f4b_opp_0'])
@@ -718,8 +776,8 @@ def f_4bet(stat_dict, player):
                 '(0/0)',
                 _('% fold to 4 bet preflop/3rd street'))
 
+@register_stat(_("% won money when seen flop/4th street") + " (WMsF)")
 def WMsF(stat_dict, player):
-    stat_descriptions["WMsF"] = _("% won money when seen flop/4th street") + " (WMsF)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['w_w_s_1'])/float(stat_dict[player]['saw_1'])
@@ -737,8 +795,8 @@ def WMsF(stat_dict, player):
                 '(0/0)',
                 _('% won money when seen flop/4th street'))
 
+@register_stat(_("Aggression frequency flop/4th street") + " (a_freq1)")
 def a_freq1(stat_dict, player):
-    stat_descriptions["a_freq1"] = _("Aggression frequency flop/4th street") + " (a_freq1)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['aggr_1'])/float(stat_dict[player]['saw_f'])
@@ -756,8 +814,8 @@ def a_freq1(stat_dict, player):
                 '(0/0)',
                 _('Aggression frequency flop/4th street'))
     
+@register_stat(_("Aggression frequency turn/5th street") + " (a_freq2)")
 def a_freq2(stat_dict, player):
-    stat_descriptions["a_freq2"] = _("Aggression frequency turn/5th street") + " (a_freq2)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['aggr_2'])/float(stat_dict[player]['saw_2'])
@@ -775,8 +833,8 @@ def a_freq2(stat_dict, player):
                 '(0/0)',
                 _('Aggression frequency turn/5th street'))
     
+@register_stat(_("Aggression frequency river/6th street") + " (a_freq3)")
 def a_freq3(stat_dict, player):
-    stat_descriptions["a_freq3"] = _("Aggression frequency river/6th street") + " (a_freq3)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['aggr_3'])/float(stat_dict[player]['saw_3'])
@@ -794,8 +852,8 @@ def a_freq3(stat_dict, player):
                 '(0/0)',
                 _('Aggression frequency river/6th street'))
     
+@register_stat(_("Aggression frequency 7th street") + " (a_freq4)")
 def a_freq4(stat_dict, player):
-    stat_descriptions["a_freq4"] = _("Aggression frequency 7th street") + " (a_freq4)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['aggr_4'])/float(stat_dict[player]['saw_4'])
@@ -813,8 +871,8 @@ def a_freq4(stat_dict, player):
                 '(0/0)',
                 _('Aggression frequency 7th street'))
 
+@register_stat(_("Post-flop aggression frequency") + " (a_freq_123)")
 def a_freq_123(stat_dict, player):
-    stat_descriptions["a_freq_123"] = _("Post-flop aggression frequency") + " (a_freq_123)"
     stat = 0.0
     try:
         stat = float(  stat_dict[player]['aggr_1'] + stat_dict[player]['aggr_2'] + stat_dict[player]['aggr_3']
@@ -839,6 +897,7 @@ def a_freq_123(stat_dict, player):
                 '(0/0)',
                 _('Post-flop aggression frequency'))
 
+@register_stat()
 def agg_freq(stat_dict, player):
     #TODO: remove, dupe of a_freq_123
     stat = 0.0
@@ -866,8 +925,8 @@ def agg_freq(stat_dict, player):
                 '(0/0)',
                 ('Aggression Freq'))
 
+@register_stat(_("Aggression factor") + " (agg_fact)")
 def agg_fact(stat_dict, player):
-    stat_descriptions["agg_fact"] = _("Aggression factor") + " (agg_fact)"
     stat = 0.0
     try:
         bet_raise =   stat_dict[player]['aggr_1'] + stat_dict[player]['aggr_2'] + stat_dict[player]['aggr_3'] + stat_dict[player]['aggr_4']
@@ -891,8 +950,8 @@ def agg_fact(stat_dict, player):
                 '(0/0)',
                 _('Aggression factor'))
         
+@register_stat(_("Aggression factor pct") + " (agg_fact_pct)")
 def agg_fact_pct(stat_dict, player):
-    stat_descriptions["agg_fact_pct"] = _("Aggression factor pct") + " (agg_fact_pct)"
     stat = 0.0
     try:
         bet_raise =   stat_dict[player]['aggr_1'] + stat_dict[player]['aggr_2'] + stat_dict[player]['aggr_3'] + stat_dict[player]['aggr_4']
@@ -913,8 +972,8 @@ def agg_fact_pct(stat_dict, player):
                 '(0/0)',
                 _('Aggression factor pct'))
 
+@register_stat(_("% continuation bet") + " (cbet)")
 def cbet(stat_dict, player):
-    stat_descriptions["cbet"] = _("% continuation bet") + " (cbet)"
     stat = 0.0
     try:
         cbets = stat_dict[player]['cb_1']+stat_dict[player]['cb_2']+stat_dict[player]['cb_3']+stat_dict[player]['cb_4']
@@ -934,8 +993,8 @@ def cbet(stat_dict, player):
                 '(0/0)',
                 _('% continuation bet'))
     
+@register_stat(_("% continuation bet flop/4th street") + " (cb1)")
 def cb1(stat_dict, player):
-    stat_descriptions["cb1"] = _("% continuation bet flop/4th street") + " (cb1)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['cb_1'])/float(stat_dict[player]['cb_opp_1'])
@@ -953,8 +1012,8 @@ def cb1(stat_dict, player):
                 '(0/0)',
                 _('% continuation bet flop/4th street'))
     
+@register_stat(_("% continuation bet turn/5th street") + " (cb2)")
 def cb2(stat_dict, player):
-    stat_descriptions["cb2"] = _("% continuation bet turn/5th street") + " (cb2)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['cb_2'])/float(stat_dict[player]['cb_opp_2'])
@@ -972,8 +1031,8 @@ def cb2(stat_dict, player):
                 '(0/0)',
                 _('% continuation bet turn/5th street'))
     
+@register_stat(_("% continuation bet river/6th street") + " (cb3)")
 def cb3(stat_dict, player):
-    stat_descriptions["cb3"] = _("% continuation bet river/6th street") + " (cb3)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['cb_3'])/float(stat_dict[player]['cb_opp_3'])
@@ -991,8 +1050,8 @@ def cb3(stat_dict, player):
                 '(0/0)',
                 _('% continuation bet river/6th street'))
     
+@register_stat(_("% continuation bet 7th street") + " (cb4)")
 def cb4(stat_dict, player):
-    stat_descriptions["cb4"] = _("% continuation bet 7th street") + " (cb4)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['cb_4'])/float(stat_dict[player]['cb_opp_4'])
@@ -1010,8 +1069,8 @@ def cb4(stat_dict, player):
                 '(0/0)',
                 _('% continuation bet 7th street'))
     
+@register_stat(_("% fold frequency flop/4th street") + " (ffreq1)")
 def ffreq1(stat_dict, player):
-    stat_descriptions["ffreq1"] = _("% fold frequency flop/4th street") + " (ffreq1)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['f_freq_1'])/float(stat_dict[player]['was_raised_1'])
@@ -1029,8 +1088,8 @@ def ffreq1(stat_dict, player):
                 '(0/0)',
                 _('% fold frequency flop/4th street'))
     
+@register_stat(_("% fold frequency turn/5th street") + " (ffreq2)")
 def ffreq2(stat_dict, player):
-    stat_descriptions["ffreq2"] = _("% fold frequency turn/5th street") + " (ffreq2)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['f_freq_2'])/float(stat_dict[player]['was_raised_2'])
@@ -1048,8 +1107,8 @@ def ffreq2(stat_dict, player):
                 '(0/0)',
                 _('% fold frequency turn/5th street'))
     
+@register_stat(_("% fold frequency river/6th street") + " (ffreq3)")
 def ffreq3(stat_dict, player):
-    stat_descriptions["ffreq3"] = _("% fold frequency river/6th street") + " (ffreq3)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['f_freq_3'])/float(stat_dict[player]['was_raised_3'])
@@ -1067,8 +1126,8 @@ def ffreq3(stat_dict, player):
                 '(0/0)',
                 _('% fold frequency river/6th street'))
     
+@register_stat(_("% fold frequency 7th street") + " (ffreq4)")
 def ffreq4(stat_dict, player):
-    stat_descriptions["ffreq4"] = _("% fold frequency 7th street") + " (ffreq4)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['f_freq_4'])/float(stat_dict[player]['was_raised_4'])
@@ -1086,8 +1145,8 @@ def ffreq4(stat_dict, player):
                 '(0/0)',
                 _('% fold frequency 7th street'))
         
+@register_stat(_("% fold to continuation bet flop/4th street") + " (f_cb1)")
 def f_cb1(stat_dict, player):
-    stat_descriptions["f_cb1"] = _("% fold to continuation bet flop/4th street") + " (f_cb1)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['f_cb_1'])/float(stat_dict[player]['f_cb_opp_1'])
@@ -1105,8 +1164,8 @@ def f_cb1(stat_dict, player):
                 '(0/0)',
                 _('% fold to continuation bet flop/4th street'))
     
+@register_stat(_("% fold to continuation bet turn/5th street") + " (f_cb2)")
 def f_cb2(stat_dict, player):
-    stat_descriptions["f_cb2"] = _("% fold to continuation bet turn/5th street") + " (f_cb2)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['f_cb_2'])/float(stat_dict[player]['f_cb_opp_2'])
@@ -1124,8 +1183,8 @@ def f_cb2(stat_dict, player):
                 '(0/0)',
                 _('% fold to continuation bet turn/5th street'))
     
+@register_stat(_("% fold to continuation bet river/6th street") + " (f_cb3)")
 def f_cb3(stat_dict, player):
-    stat_descriptions["f_cb3"] = _("% fold to continuation bet river/6th street") + " (f_cb3)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['f_cb_3'])/float(stat_dict[player]['f_cb_opp_3'])
@@ -1143,8 +1202,8 @@ def f_cb3(stat_dict, player):
                 '(0/0)',
                 _('% fold to continuation bet river/6th street'))
     
+@register_stat(_("% fold to continuation bet 7th street") + " (f_cb4)")
 def f_cb4(stat_dict, player):
-    stat_descriptions["f_cb4"] = _("% fold to continuation bet 7th street") + " (f_cb4)"
     stat = 0.0
     try:
         stat = float(stat_dict[player]['f_cb_4'])/float(stat_dict[player]['f_cb_opp_4'])
@@ -1163,8 +1222,8 @@ def f_cb4(stat_dict, player):
                 _('% fold to continuation bet 7th street'))
 
 
+@register_stat(_("Game abbreviation") + " (game_abbr)")
 def game_abbr(stat_dict, player, hand_instance):
-    stat_descriptions["game_abbr"] = _("Game abbreviation") + " (game_abbr)"
     stat = ''
     uniq = hand_instance.gametype['category'] + '.' + hand_instance.gametype['limitType']
     try:
@@ -1203,12 +1262,13 @@ def game_abbr(stat_dict, player, hand_instance):
             '(%s)' % stat,
             _('Game abbreviation'))
 
+@register_stat("Blank")
 def blank(stat_dict, player):
     # blank space on the grid
-    stat_descriptions["blank"] = "Blank"
     stat = " "
     return (" ", " ", " ", " ", " ", "<blank>")
                 
+@register_stat(_("starting hands at this table") + " (starting hands)")
 def starthands(stat_dict, player, hand_instance):
     
     
@@ -1231,51 +1291,17 @@ def starthands(stat_dict, player, hand_instance):
     # be used in the popup section i.e.
     # <pu_stat pu_stat_name="starthands"> </pu_stat>
     handid = int(hand_instance.handid_selected)
-    stat_descriptions["starthands"] = _("starting hands at this table") + " (starting hands)"
     PFlimp=" PFlimp:"
     PFaggr=" PFaggr:"
     PFcar=" PFCaRa:"
     PFdefend=" PFdefBB:"
     count_pfl = count_pfa = count_pfc = count_pfd = 2
     
-    c = Configuration.Config()
-    db_connection = Database.Database(c)
-    sc = db_connection.get_cursor()
-
-    sc.execute(("SELECT distinct startCards, street0Aggr, street0CalledRaiseDone, " +
-    			"case when HandsPlayers.position = 'B' then 'b' " +
-                            "when HandsPlayers.position = 'S' then 'b' " +
-                            "when HandsPlayers.position = '0' then 'l' " +
-                            "when HandsPlayers.position = '1' then 'l' " +
-                            "when HandsPlayers.position = '2' then 'm' " +
-                            "when HandsPlayers.position = '3' then 'm' " +
-                            "when HandsPlayers.position = '4' then 'm' " +
-                            "when HandsPlayers.position = '5' then 'e' " +
-                            "when HandsPlayers.position = '6' then 'e' " +
-                            "when HandsPlayers.position = '7' then 'e' " +
-                            "when HandsPlayers.position = '8' then 'e' " +
-                            "when HandsPlayers.position = '9' then 'e' " +
-                            "else 'X' end " +
-                        "FROM Hands, HandsPlayers, Gametypes " +
-                        "WHERE HandsPlayers.handId = Hands.id " +
-                        " AND Gametypes.id = Hands.gametypeid "+
-                        " AND Gametypes.type = " +
-                        "   (SELECT Gametypes.type FROM Gametypes, Hands   " +
-                        "  WHERE Hands.gametypeid = Gametypes.id and Hands.id = %d) " +
-                        " AND Gametypes.Limittype =  " +
-                        "   (SELECT Gametypes.limitType FROM Gametypes, Hands  " +
-                        " WHERE Hands.gametypeid = Gametypes.id and Hands.id = %d) " +
-                        "AND Gametypes.category = 'holdem' " +
-                        "AND fileId = (SELECT fileId FROM Hands " +
-                        " WHERE Hands.id = %d) " +
-                        "AND HandsPlayers.playerId = %d " +
-                        "AND street0VPI " +
-                        "AND startCards > 0 " +
-                        "ORDER BY startCards DESC " +
-                        ";")
-                         % (int(handid), int(handid), int(handid), int(player)))
-
-    for (qstartcards, qstreet0Aggr, qstreet0CalledRaiseDone, qposition) in sc.fetchall():
+    # read through the connection the hand was loaded with, see Hand.hand_factory()
+    rows = starthands_cache.get_starthands(hand_instance.db_connection, handid,
+                                           hand_instance.gametype['type'], hand_instance.gametype['limitType'], int(player))
+
+    for (qstartcards, qstreet0Aggr, qstreet0CalledRaiseDone, qposition) in rows:
         humancards = Card.decodeStartHandValue("holdem", qstartcards)
                 
         if qposition == "B" and qstreet0Aggr == False:
@@ -1298,7 +1324,6 @@ def starthands(stat_dict, player, hand_instance):
             count_pfl += 1
             if (count_pfl / 8.0 == int(count_pfl / 8.0)):
                 PFlimp=PFlimp+"\n"
-    sc.close()
     
     returnstring = PFlimp + "\n" + PFaggr + "\n" + PFcar + "\n" + PFdefend  #+ "\n" + str(handid)
 
@@ -1311,33 +1336,10 @@ def starthands(stat_dict, player, hand_instance):
 
                 
 def build_stat_descriptions(stats_file):
-    for method in dir(stats_file):
-        if method in ("Charset", "Configuration", "Database", "GInitiallyUnowned", "gtk", "pygtk",
-                        "player", "c", "db_connection", "do_stat", "do_tip", "stat_dict", "h", "re",
-                        "re_Percent", "re_Places", "L10n", "sys", "_", "log", "encoder", "codecs",
-                        "logging"):
-            continue
-        if method.startswith('__'):
-            continue
-        try:
-            eval(method+"(None, None)")
-        except:
-            pass
-    
-    return stat_descriptions
+    return dict(stat_descriptions)
 
 if __name__== "__main__":
-    statlist = dir()
-    misslist = [ "Configuration", "Database", "Charset", "codecs", "encoder"
-                 , "do_stat", "do_tip", "GInitiallyUnowned", "gtk", "pygtk", "Card"
-                 , "L10n", "_", "__stat_override", "build_stat_descriptions", "log"
-                 , "logging", "stat_descriptions", 'Decimal', 'GFileDescriptorBased'
-                 , 'GPollableInputStream', 'GPollableOutputStream', 'calculate_end_stack'
-                 , "re", "re_Places", 'Hand'
-               ]
-    statlist = [ x for x in statlist if x not in dir(sys) ]
-    statlist = [ x for x in statlist if x not in dir(codecs) ]
-    statlist = [ x for x in statlist if x not in misslist ]
+    statlist = sorted(STATS.keys())
     #print "statlist is", statlist
 
     c = Configuration.Config()
@@ -1355,7 +1357,7 @@ if __name__== "__main__":
     print _("Legal stats:")
     print _("(add _0 to name to display with 0 decimal places, _1 to display with 1, etc)")
     for attr in statlist:
-        print "%-14s %s" % (attr, eval("%s.__doc__" % (attr)))
+        print "%-14s %s" % (attr, STATS[attr].func.__doc__)
 #        print "            <pu_stat pu_stat_name = \"%s\"> </pu_stat>" % (attr)
     print
 
@@ -16,7 +16,7 @@ _ = L10n.get_translation()
 
 import sys, random
 import re
-import pokereval
+import HandEval
 
 SUITS = ['h', 'd', 's', 'c']
 
@@ -26,7 +26,7 @@ ANY = 0
 SUITED = 1
 OFFSUIT = 2
 
-ev = pokereval.PokerEval()
+ev = HandEval.PokerEval()
 
 
 class Stove:
@@ -291,14 +291,14 @@ def odds_for_range(holder):
         iters = random.randint(25000, 125000)
     else:
         iters = -1
-    for h in holder.h_range.get():
-        e = odds_for_hand(
-            [holder.hand.c1, holder.hand.c2],
-            [h.c1, h.c2],
-            b,
-            iterations=iters
-            )
-        sev.add(e)
+    # every hand of the range is played out on the same boards
+    h_range = holder.h_range.get()
+    odds = ev.holdem_range_odds([holder.hand.c1, holder.hand.c2],
+                                [[h.c1, h.c2] for h in h_range],
+                                b,
+                                iterations=iters)
+    for (plays, win, tie, lose) in odds:
+        sev.add(EV(plays, win, tie, lose))
 
     sev.show(holder.hand, holder.h_range.get())
     return sev
@@ -230,6 +230,15 @@ class Table_Window(object):
                 return True
         return True
 
+#    watch() asks for check_table() to be called when the window manager
+#    reports the client moved, resized, renamed or closed. It returns False
+#    if it can't, then the hud has to call check_table() periodically.
+    def watch(self, hud):
+        return False
+
+    def unwatch(self):
+        pass
+
 ####################################################################
 #    "check" methods. They use the corresponding get method, update the
 #    table object and return the name of the signal to be emitted or 
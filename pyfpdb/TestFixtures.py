@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+"""What the tests and the Benchmark scripts share: the test configuration,
+   a PokerStars file and an importer writing to the test database."""
+
+import Configuration
+import Database
+
+TEST_CONFIG = "HUD_config.test.xml"
+STARS_FILE = "regression-test-files/cash/Stars/Flop/NLHE-FR-USD-0.01-0.02-201005.microgrind.txt"
+
+def get_config():
+    return Configuration.Config(file = TEST_CONFIG)
+
+def get_importer(config):
+    """An Importer for the database of config that doesn't call the HUD and
+       parses in process"""
+    # imported here, fpdb_import needs pygtk and the tests reading files don't
+    import fpdb_import
+    settings = {}
+    settings.update(config.get_db_parameters())
+    settings.update(config.get_import_parameters())
+    importer = fpdb_import.Importer(False, settings, config, None)
+    importer.setCallHud(False)
+    importer.setThreads(-1)
+    return importer
+
+def import_files(config, files, site = "PokerStars", filter = "PokerStarsToFpdb"):
+    """Recreates the tables of the database of config and imports files into it.
+       Returns the Database."""
+    db = Database.Database(config)
+    db.recreate_tables()
+    importer = get_importer(config)
+    for file in files:
+        importer.addImportFile(file, site = site, filter = filter)
+    importer.runImport()
+    return db
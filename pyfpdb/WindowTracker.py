@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""WindowTracker.py
+
+Keeps the titles and geometry of the top level windows up to date from the
+window manager's events, for XTables.
+"""
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as published by
+#    the Free Software Foundation, version 3 of the License.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#    In the "official" distribution you can find the license in agpl-3.0.txt.
+
+#    Standard Library modules
+import re
+import logging
+import threading
+from collections import OrderedDict
+
+# logging has been set up in fpdb.py or HUD_main.py, use their settings:
+log = logging.getLogger("hud")
+
+
+class WindowTracker:
+    """Index of the windows of screen, a wnck.Screen or anything with the same
+       signals: 'window-opened' and 'window-closed' on the screen,
+       'name-changed' and 'geometry-changed' on the windows.
+
+       The titles and the client geometry of the windows are updated when the
+       window manager reports a change, so looking up a table or its geometry
+       doesn't query the X server, and the HUDs don't have to poll their
+       tables: watch(xid, callback) calls callback(event) with "client_moved",
+       "client_resized", "client_destroyed" or "name_changed" as they happen.
+
+       The signal handlers run in the gtk thread and the queries are made
+       from the HUD's reader thread, so both hold self.lock while they use
+       the dicts."""
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.lock = threading.Lock()
+        self.windows = {}       # xid -> window
+        self.titles = OrderedDict() # xid -> title, in the order of screen.get_windows()
+        self.geometry = {}      # xid -> (x, y, width, height)
+        self.watchers = {}      # xid -> [callback]
+        self.patterns = {}      # search string -> compiled regexp
+        screen.connect('window-opened', self.window_opened)
+        screen.connect('window-closed', self.window_closed)
+        for window in screen.get_windows():
+            self.add(window)
+
+    def add(self, window):
+        xid = int(window.get_xid())
+        with self.lock:
+            if xid in self.windows:
+                return
+            self.windows[xid] = window
+            self.titles[xid] = window.get_name()
+            self.geometry[xid] = self.client_geometry(window)
+        window.connect('name-changed', self.name_changed)
+        window.connect('geometry-changed', self.geometry_changed)
+
+    def client_geometry(self, window):
+        return tuple([int(v) for v in window.get_client_window_geometry()])
+
+    def notify(self, xid, event):
+        for callback in list(self.watchers.get(xid, ())):
+            try:
+                callback(event)
+            except Exception:
+                log.exception("WindowTracker: %s callback failed for window %s" % (event, xid))
+
+    #    signal handlers
+    def window_opened(self, screen, window, *args):
+        self.add(window)
+
+    def window_closed(self, screen, window, *args):
+        xid = int(window.get_xid())
+        with self.lock:
+            if xid not in self.windows:
+                return
+            del self.windows[xid]
+            del self.geometry[xid]
+            del self.titles[xid]
+        self.notify(xid, "client_destroyed")
+        self.watchers.pop(xid, None)
+
+    def name_changed(self, window, *args):
+        xid = int(window.get_xid())
+        with self.lock:
+            if xid not in self.windows:
+                return
+            # an existing key keeps its place in the OrderedDict
+            self.titles[xid] = window.get_name()
+        self.notify(xid, "name_changed")
+
+    def geometry_changed(self, window, *args):
+        xid = int(window.get_xid())
+        with self.lock:
+            if xid not in self.windows:
+                return
+            old = self.geometry[xid]
+            new = self.geometry[xid] = self.client_geometry(window)
+        if new[2:] != old[2:]:
+            self.notify(xid, "client_resized")
+        if new[:2] != old[:2]:
+            self.notify(xid, "client_moved")
+
+    #    queries
+    def find(self, search_string, skip = None):
+        """Returns the xid of the first window, in the order of
+           screen.get_windows(), whose title matches search_string (case
+           insensitive) and for which skip(title) isn't True, or None"""
+        pattern = self.patterns.get(search_string)
+        if pattern is None:
+            pattern = self.patterns[search_string] = re.compile(search_string, re.I)
+        with self.lock:
+            titles = self.titles.items()
+        for (xid, title) in titles:
+            if pattern.search(title):
+                if skip is not None and skip(title.replace('"', '')):
+                    continue
+                log.info('"%s" matches: "%s"' % (title, search_string))
+                return xid
+        return None
+
+    def get_window(self, xid):
+        """Returns the window of xid, None if it is closed"""
+        with self.lock:
+            return self.windows.get(xid)
+
+    def get_geometry(self, xid):
+        """Returns the client geometry of xid as a dict, None if it is closed"""
+        with self.lock:
+            geo = self.geometry.get(xid)
+        if geo is None:
+            return None
+        return {'x': geo[0], 'y': geo[1], 'width': geo[2], 'height': geo[3]}
+
+    def get_title(self, xid):
+        with self.lock:
+            return self.titles.get(xid)
+
+    def watch(self, xid, callback):
+        self.watchers.setdefault(xid, []).append(callback)
+
+    def unwatch(self, xid, callback = None):
+        if callback is None:
+            self.watchers.pop(xid, None)
+        elif callback in self.watchers.get(xid, ()):
+            self.watchers[xid].remove(callback)
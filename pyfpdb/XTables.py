@@ -37,25 +37,18 @@ import wnck
 #    FPDB modules
 from TableWindow import Table_Window
 import Configuration
+import WindowTracker
 
 # Wnck caches the results of queries. A window once retrieved remains in
 # the list of Wnck internal objects even after the window no longer
-# exists. To make things worse, event callbacks for signal
-# "window-closed" can only be set for the WnckScreen, not for individual
-# WnckWindow objects. For this reason, we need to track the known table
-# windows.
-WNCK_XTABLES = set()
-
-# Prototype for callback is 'func(WnckScreen, WnckWindow, user_data)';
-# We're only interested in the XID of tables we're tracking.
-def remove_wnck_win(scr, w, *args):
-    _xid = w.get_xid()
-    if _xid in WNCK_XTABLES:
-        WNCK_XTABLES.remove(_xid)
-
-# Connect the signal handler to the single global root (screen)
+# exists, and event callbacks for signal "window-closed" can only be set
+# for the WnckScreen, not for individual WnckWindow objects. The tracker
+# follows the screen's and the windows' signals, so it knows the windows
+# that are still open, their titles and where they are without asking
+# X, and it tells the HUDs when their table moves or is closed.
 root = wnck.screen_get_default()
-root.connect('window-closed', remove_wnck_win)
+root.force_update()
+tracker = WindowTracker.WindowTracker(root)
 
 
 c = Configuration.Config()
@@ -76,21 +69,14 @@ class Table(Table_Window):
         while gtk.events_pending():
             gtk.main_iteration(False)
 
-        for win in root.get_windows():
-            w_title = win.get_name()
-            if re.search(self.search_string, w_title, re.I):
-                log.info('"%s" matches: "%s"' % (w_title, self.search_string))
-                title = w_title.replace('"', '')
-                if self.check_bad_words(title): continue
-                # XXX: If we could connect to 'window-closed' here, it
-                # would make things SOOO much easier... Alas, the signal
-                # is not available for individual windows.
-                self.wnck_table_w = win
-                self.number = int(win.get_xid())
-                self.title = title
-                # XID is a consistent key
-                WNCK_XTABLES.add(self.number)
-                break
+        xid = tracker.find(self.search_string, self.check_bad_words)
+        window = tracker.get_window(xid)
+        title = tracker.get_title(xid)
+        # the table may have closed since find() returned
+        if window is not None and title is not None:
+            self.wnck_table_w = window
+            self.number = xid
+            self.title = title.replace('"', '')
 
         if self.number is None:
             log.warning(_("No match in XTables for table '%s'.") % self.search_string)
@@ -128,23 +114,27 @@ class Table(Table_Window):
         #except:
             #return None
 
-    # This function serves a double purpose. It fetches the X geometry
-    # information from the WnckWindow, which is the normal behaviour -
-    # but it also is used to track for window lifecycle. When
-    # get_geometry() returns False [None is deal as False], the table is
-    # assumed dead and thus the HUD instance may be killed off.
+    # This function serves a double purpose. It returns the geometry of
+    # the table the tracker has from the window manager's events, which is
+    # the normal behaviour - but it also is used to track for window
+    # lifecycle. When get_geometry() returns False [None is deal as False],
+    # the table is assumed dead and thus the HUD instance may be killed off.
     def get_geometry(self):
-        if self.number not in WNCK_XTABLES:
-            return None
-        (_x, _y, _w, _h) = self.wnck_table_w.get_client_window_geometry()
-        return {'x'        : int(_x),
-                'y'        : int(_y),
-                'width'    : int(_w),
-                'height'   : int(_h)
-               }
+        return tracker.get_geometry(self.number)
 
     def get_window_title(self):
-        return self.wnck_table_w.get_name()
+        return tracker.get_title(self.number)
+
+    def watch(self, hud):
+        self.unwatch()
+        self.watcher = lambda event: self.check_table(hud)
+        tracker.watch(self.number, self.watcher)
+        return True
+
+    def unwatch(self):
+        if getattr(self, 'watcher', None) is not None:
+            tracker.unwatch(self.number, self.watcher)
+            self.watcher = None
 
 
     def topify(self, window):
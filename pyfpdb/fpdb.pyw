@@ -35,49 +35,53 @@ import string
 cl_options = string.join(sys.argv[1:])
 (options, argv) = Options.fpdb_options()
 
+import LazyImport
+if options.profileStartup:
+    import_timer = LazyImport.ImportTimer()
+    import_timer.install()
+else:
+    import_timer = None
+
 import logging
 
 import pygtk
 pygtk.require('2.0')
 import gtk
+import gobject
 import pango
 
 import interlocks
 
-# these imports not required in this module, imported here to report version in About dialog
-import matplotlib
-matplotlib_version = matplotlib.__version__
-import numpy
-numpy_version = numpy.__version__
+# imported here to report version in About dialog, matplotlib and numpy are
+# only looked up, see LazyImport.installed_version()
 import sqlite3
 sqlite3_version = sqlite3.version
 sqlite_version = sqlite3.sqlite_version
 
-import DetectInstalledSites
-import GuiPrefs
-import GuiLogView
-import GuiDatabase
-import GuiBulkImport
-import GuiTourneyImport
-import GuiImapFetcher
-import GuiRingPlayerStats
-import GuiTourneyPlayerStats
-import GuiTourneyViewer
-import GuiPositionalStats
-import GuiAutoImport
-import GuiGraphViewer
-import GuiTourneyGraphViewer
-import GuiSessionViewer
-import GuiHandViewer
-try:
-    import GuiStove
-except:
-    print _("GuiStove not found. If you want to use it please install pypoker-eval.")
+# The tabs and dialogs are imported when they are first opened, importing all
+# of them (and matplotlib with the graphs) made up most of the startup time.
+DetectInstalledSites = LazyImport.LazyModule('DetectInstalledSites')
+GuiPrefs = LazyImport.LazyModule('GuiPrefs')
+GuiLogView = LazyImport.LazyModule('GuiLogView')
+GuiDatabase = LazyImport.LazyModule('GuiDatabase')
+GuiBulkImport = LazyImport.LazyModule('GuiBulkImport')
+GuiTourneyImport = LazyImport.LazyModule('GuiTourneyImport')
+GuiImapFetcher = LazyImport.LazyModule('GuiImapFetcher')
+GuiRingPlayerStats = LazyImport.LazyModule('GuiRingPlayerStats')
+GuiTourneyPlayerStats = LazyImport.LazyModule('GuiTourneyPlayerStats')
+GuiTourneyViewer = LazyImport.LazyModule('GuiTourneyViewer')
+GuiPositionalStats = LazyImport.LazyModule('GuiPositionalStats')
+GuiAutoImport = LazyImport.LazyModule('GuiAutoImport')
+GuiGraphViewer = LazyImport.LazyModule('GuiGraphViewer')
+GuiTourneyGraphViewer = LazyImport.LazyModule('GuiTourneyGraphViewer')
+GuiSessionViewer = LazyImport.LazyModule('GuiSessionViewer')
+GuiHandViewer = LazyImport.LazyModule('GuiHandViewer')
+GuiStove = LazyImport.LazyModule('GuiStove')
+Stats = LazyImport.LazyModule('Stats')
 import SQL
 import Database
 import Configuration
 import Exceptions
-import Stats
 
 Configuration.set_logfile("fpdb-log.txt")
 log = logging.getLogger("fpdb")
@@ -246,8 +250,8 @@ class fpdb:
                 ('Python',           sys.version[0:3]),
                 ('GTK+',             '.'.join([str(x) for x in gtk.gtk_version])),
                 ('PyGTK',            '.'.join([str(x) for x in gtk.pygtk_version])),
-                ('matplotlib',       matplotlib_version),
-                ('numpy',            numpy_version),
+                ('matplotlib',       LazyImport.installed_version('matplotlib') or _('not installed')),
+                ('numpy',            LazyImport.installed_version('numpy') or _('not installed')),
                 ('sqlite',           sqlite_version),
                 (_('fpdb version'),  VERSION),
                 (_('database used'), self.settings['db-server']),
@@ -526,7 +530,8 @@ class fpdb:
                 self.db.recreate_tables()
                 # find any guibulkimport/guiautoimport windows and clear player cache:
                 for t in self.threads:
-                    if isinstance(t, GuiBulkImport.GuiBulkImport) or isinstance(t, GuiAutoImport.GuiAutoImport):
+                    if (GuiBulkImport.loaded() and isinstance(t, GuiBulkImport.GuiBulkImport)) or \
+                       (GuiAutoImport.loaded() and isinstance(t, GuiAutoImport.GuiAutoImport)):
                         t.importer.database.resetPlayerIDs()
                 self.release_global_lock()
             elif response == gtk.RESPONSE_NO:
@@ -586,6 +591,33 @@ class fpdb:
 
         self.release_global_lock()
 
+    def dia_rebuild_cardscache(self, widget, data=None):
+        if self.obtain_global_lock("dia_rebuild_cardscache"):
+            self.dia_confirm = gtk.MessageDialog(parent=self.window,
+                                                 flags=gtk.DIALOG_DESTROY_WITH_PARENT,
+                                                 type=gtk.MESSAGE_WARNING,
+                                                 buttons=(gtk.BUTTONS_YES_NO),
+                                                 message_format=_("Confirm rebuilding cards and positions caches"))
+            diastring = _("Please confirm that you want to re-create the hole cards and positions caches.")
+            self.dia_confirm.format_secondary_text(diastring)
+            # disable windowclose, do not want the the underlying processing interrupted mid-process
+            self.dia_confirm.set_deletable(False)
+
+            response = self.dia_confirm.run()
+            if response == gtk.RESPONSE_YES:
+                lbl = gtk.Label(_(" Rebuilding Cards and Positions Caches ... "))
+                self.dia_confirm.vbox.add(lbl)
+                lbl.show()
+                while gtk.events_pending():
+                    gtk.main_iteration_do(False)
+                self.db.rebuild_cardscache()
+            elif response == gtk.RESPONSE_NO:
+                print _('User cancelled rebuilding cards and positions caches')
+
+            self.dia_confirm.destroy()
+
+        self.release_global_lock()
+
     def dia_rebuild_indexes(self, widget, data=None):
         if self.obtain_global_lock("dia_rebuild_indexes"):
             self.dia_confirm = gtk.MessageDialog(parent=self.window,
@@ -837,6 +869,7 @@ class fpdb:
                   <menuitem action="maintaindbs"/>
                   <menuitem action="createtabs"/>
                   <menuitem action="rebuildhudcache"/>
+                  <menuitem action="rebuildcardscache"/>
                   <menuitem action="rebuildindexes"/>
                   <menuitem action="databasestats"/>
                   <menuitem action="dumptofile"/>
@@ -879,6 +912,7 @@ class fpdb:
                                  ('maintaindbs', None, _('_Maintain Databases'), None, 'Maintain Databases', self.dia_maintain_dbs),
                                  ('createtabs', None, _('Create or Recreate _Tables'), None, 'Create or Recreate Tables ', self.dia_recreate_tables),
                                  ('rebuildhudcache', None, _('Rebuild HUD Cache'), None, 'Rebuild HUD Cache', self.dia_recreate_hudcache),
+                                 ('rebuildcardscache', None, _('Rebuild Cards and Positions Caches'), None, 'Rebuild Cards and Positions Caches', self.dia_rebuild_cardscache),
                                  ('rebuildindexes', None, _('Rebuild DB Indexes'), None, 'Rebuild DB Indexes', self.dia_rebuild_indexes),
                                  ('databasestats', None, _('_Statistics'), None, 'View Database Statistics', self.dia_database_stats),
                                  ('dumptofile', None, _('Dump Database to Textfile (takes ALOT of time)'), None, 'Dump Database to Textfile (takes ALOT of time)', self.dia_dump_db),
@@ -1173,6 +1207,11 @@ You can find the full license texts in agpl-3.0.txt, gpl-2.0.txt, gpl-3.0.txt an
 
     def tabStove(self, widget, data=None):
         """opens a tab for poker stove"""
+        try:
+            GuiStove.load()
+        except:
+            print _("GuiStove not found. If you want to use it please install pypoker-eval.")
+            return
         thread = GuiStove.GuiStove(self.config, self.window)
         self.threads.append(thread)
         tab = thread.get_vbox()
@@ -1252,6 +1291,10 @@ You can find the full license texts in agpl-3.0.txt, gpl-2.0.txt, gpl-3.0.txt an
         if not options.hidden:
             self.window.show()
             self.visible = True     # Flip on
+
+        if import_timer is not None:
+            # report once the window has been drawn
+            gobject.idle_add(self.report_startup)
             
         self.load_profile(create_db=True)
         
@@ -1395,6 +1438,12 @@ You can find the full license texts in agpl-3.0.txt, gpl-2.0.txt, gpl-3.0.txt an
                 dia.run()
                 dia.destroy()
 
+    def report_startup(self):
+        import_timer.uninstall()
+        print _("Startup imports:")
+        print import_timer.report()
+        return False
+
     def main(self):
         gtk.main()
         return 0
@@ -27,10 +27,10 @@ import traceback
 import math
 import datetime
 import re
-import Queue
-from collections import deque # using Queue for now
-import threading
+from collections import deque
+import multiprocessing
 import shutil
+import socket
 
 import logging
 
@@ -41,12 +41,65 @@ import gtk
 import Database
 import Configuration
 import Exceptions
+import FileWatcher
+import RawHandArchive
 
 if __name__ == "__main__":
     Configuration.set_logfile("fpdb-log.txt")
 # logging has been set up in fpdb.py or HUD_main.py, use their settings:
 log = logging.getLogger("importer")
 
+# Configuration used by the converters in a parse process, and the queues
+# the processes put the hands on, see initParsePool()
+parseConfig = None
+parseQueues = None
+# batches of hands a parse process can put on its queue ahead of the database
+PARSE_QUEUE_SIZE = 2
+
+def initParsePool(config, queues):
+    """Initializer for the processes of the bulk import parse pool"""
+    global parseConfig, parseQueues
+    parseConfig = config
+    parseQueues = queues
+
+def parseFile(file, site, filter, idx, starsArchive, ftpArchive, batchSize, slot):
+    """Runs in a parse pool process: converts file and assembles the stats of
+       its hands. The Database connection is owned by the Importer, so only the
+       work that needs no ids from the database is done here.
+       The hands are put on parseQueues[slot] as they are converted, as
+       ('hands', list of up to batchSize hands), then ('done', (numHands,
+       numPartial, numErrors, lastCharacterRead)), or ('done', None) for an
+       unknown filter or a file that couldn't be converted. The queue is bounded,
+       so the process waits for the Importer instead of holding the whole file."""
+    queue = parseQueues[slot]
+    try:
+        log.info(_("Converting %s") % file)
+        filter_name = filter.replace("ToFpdb", "")
+        mod = __import__(filter)
+        obj = getattr(mod, filter_name, None)
+        if not callable(obj):
+            log.warning(_("Unknown filter name %s in filter %s.") %(filter_name, filter))
+            queue.put(('done', None))
+            return
+        hhc = obj( parseConfig, in_path = file, index = idx
+                  ,starsArchive = starsArchive
+                  ,ftpArchive   = ftpArchive
+                  ,sitename     = site, autostart = False)
+        if not hhc.getStatus():
+            # conversion didn't work, the file counts as one error
+            log.warning(_("Error converting %s") % file)
+            queue.put(('done', None))
+            return
+        for handlist in hhc.handBatches(batchSize):
+            for hand in handlist:
+                hand.assembleHand()
+            queue.put(('hands', handlist))
+        queue.put(('done', (hhc.numHands, hhc.numPartial, hhc.numErrors, hhc.getLastCharacterRead())))
+    except Exception:
+        # the Importer gets the exception from the AsyncResult
+        queue.put(('error', None))
+        raise
+
 class Importer:
     def __init__(self, caller, settings, config, sql = None, parent = None):
         """Constructor"""
@@ -67,6 +120,9 @@ class Importer:
         self.lines      = None
         self.faobs      = None       # File as one big string
         self.pos_in_file = {}        # dict to remember how far we have read in the file
+        self.watcher    = None       # FileWatcher for the monitored directories, None to poll them
+        self.followed   = {}         # converters that keep the monitored files open, by file
+        self.unseen     = {}         # files added by the last addImportDirectory, see runWatched()
         #Set defaults
         self.callHud    = self.config.get_import_parameters().get("callFpdbHud")
 
@@ -74,21 +130,20 @@ class Importer:
         self.settings.setdefault("handCount", 0)
         #self.settings.setdefault("allowHudcacheRebuild", True) # NOT USED NOW
         #self.settings.setdefault("forceThreads", 2)            # NOT USED NOW
-        self.settings.setdefault("writeQSize", 1000)           # no need to change
-        self.settings.setdefault("writeQMaxWait", 10)          # not used
         self.settings.setdefault("dropIndexes", "don't drop")
         self.settings.setdefault("dropHudCache", "don't drop")
         self.settings.setdefault("starsArchive", False)
         self.settings.setdefault("ftpArchive", False)
         self.settings.setdefault("testData", False)
         self.settings.setdefault("cacheHHC", False)
+        self.settings.setdefault("batchSize", 1000)         # hands stored per transaction
+        self.settings.setdefault("watchDirectories", True)  # False polls the monitored directories
 
-        self.writeq = None
         self.database = Database.Database(self.config, sql = self.sql)
-        self.writerdbs = []
-        self.settings.setdefault("threads", 1) # value set by GuiBulkImport
-        for i in xrange(self.settings['threads']):
-            self.writerdbs.append( Database.Database(self.config, sql = self.sql) )
+        self.archive = None          # RawHandArchive the text of the stored hands goes to
+        if self.config.raw_hands.save == 'all':
+            self.archive = RawHandArchive.RawHandArchive(self.database, self.config)
+        self.settings.setdefault("threads", 0) # parse processes for runImport, value set by GuiBulkImport
 
         clock() # init clock in windows
 
@@ -112,10 +167,8 @@ class Importer:
         self.settings['handsInDB'] = value
 
     def setThreads(self, value):
+        """Number of processes parsing files in runImport, <= 0 parses in this process"""
         self.settings['threads'] = value
-        if self.settings["threads"] > len(self.writerdbs):
-            for i in xrange(self.settings['threads'] - len(self.writerdbs)):
-                self.writerdbs.append( Database.Database(self.config, sql = self.sql) )
 
     def setDropIndexes(self, value):
         self.settings['dropIndexes'] = value
@@ -146,6 +199,28 @@ class Importer:
         self.updatetime = {}
         self.pos_in_file = {}
         self.filelist = {}
+        self.unfollowFiles()
+
+    def getWatchFd(self):
+        """File descriptor that is readable when a monitored directory changed,
+           None if the directories are polled by runUpdated()"""
+        if self.watcher:
+            return self.watcher.fileno()
+        return None
+
+    def closeWatcher(self):
+        """Stops monitoring the import directories, called when auto import stops"""
+        self.unwatch()
+        self.dirlist = {}
+
+    def unwatch(self):
+        """Closes the watcher and the followed files, the monitored directories
+           are polled from now on"""
+        self.unfollowFiles()
+        if self.watcher:
+            self.watcher.close()
+            self.watcher = None
+        self.unseen = {}
 
     def logImport(self, type, file, stored, dups, partial, errs, ttime, id):
         hands = stored + dups + partial + errs
@@ -218,11 +293,19 @@ class Importer:
             if monitor == True:
                 self.monitor = True
                 self.dirlist[site] = [dir] + [filter]
+                if self.watcher is None and len(self.dirlist) == 1 and self.settings['watchDirectories']:
+                    self.watcher = FileWatcher.get_watcher()
+                if self.watcher and not self.watcher.add_directory(dir, (site, filter)):
+                    # the other directories have to be polled too
+                    self.unwatch()
 
             #print "addImportDirectory: checking files in", dir
             for file in os.listdir(dir):
                 #print "                    adding file ", file
-                self.addImportFile(os.path.join(dir, file), site, filter)
+                file = os.path.join(dir, file)
+                if monitor and file not in self.filelist:
+                    self.unseen[file] = True
+                self.addImportFile(file, site, filter)
         else:
             log.warning(_("Attempted to add non-directory '%s' as an import directory") % str(dir))
 
@@ -238,45 +321,16 @@ class Importer:
         if 'dropHudCache' in self.settings and self.settings['dropHudCache'] == 'auto':
             self.settings['dropHudCache'] = self.calculate_auto2(self.database, 25.0, 500.0)    # returns "drop"/"don't drop"
 
-        if self.settings['threads'] <= 0:
-            (totstored, totdups, totpartial, toterrors) = self.importFiles(None)
-        else:
-            # create queue (will probably change to deque at some point):
-            self.writeq = Queue.Queue( self.settings['writeQSize'] )
-            # start separate thread(s) to read hands from queue and write to db:
-            for i in xrange(self.settings['threads']):
-                t = threading.Thread( target=self.writerdbs[i].insert_queue_hands
-                                    , args=(self.writeq, self.settings["writeQMaxWait"])
-                                    , name="dbwriter-"+str(i) )
-                t.setDaemon(True)
-                t.start()
-            # read hands and write to q:
-            (totstored, totdups, totpartial, toterrors) = self.importFiles(self.writeq)
-
-            if self.writeq.empty():
-                print _("writers finished already")
-                pass
-            else:
-                print _("waiting for writers to finish ...")
-                #for t in threading.enumerate():
-                #    print "    "+str(t)
-                #self.writeq.join()
-                #using empty() might be more reliable:
-                while not self.writeq.empty() and len(threading.enumerate()) > 1:
-                    # TODO: Do we need to actually tell the progress indicator to move, or is it already moving, and we just need to process events...
-                    while gtk.events_pending(): # see http://faq.pygtk.org/index.py?req=index for more hints (3.7)
-                        gtk.main_iteration(False)
-                    sleep(0.5)
-                print _("... writers finished")
+        (totstored, totdups, totpartial, toterrors) = self.importFiles()
 
         endtime = time()
         return (totstored, totdups, totpartial, toterrors, endtime-starttime)
     # end def runImport
 
-    def importFiles(self, q):
+    def importFiles(self):
         """"Read filenames in self.filelist and pass to import_file_dict().
-            Uses a separate database connection if created as a thread (caller
-            passes None or no param as db)."""
+            If settings['threads'] > 0 the files are parsed by that many processes
+            (see parseFiles()) and only stored here."""
 
         totstored = 0
         totdups = 0
@@ -291,14 +345,25 @@ class Importer:
         #prepare progress popup window
         ProgressDialog = ProgressBar(len(self.filelist), self.parent)
         
-        for file in self.filelist:
+        files = self.filelist.keys()
+        parsed = None
+        if self.settings['threads'] > 0:
+            parsed = self.parseFiles([f for f in files if not os.path.isdir(f)])
+
+        for file in files:
             
             filecount = filecount + 1
             ProgressDialog.progress_update(file, str(self.database.getHandCount()))
         
-            if not moveimportedfiles and not movefailedfiles:    
+            if parsed is not None and not os.path.isdir(file):
+                (stored, duplicates, partial, errors, ttime) = self.import_parsed_file(file, self.filelist[file][2], parsed)
+                totstored += stored
+                totdups += duplicates
+                totpartial += partial
+                toterrors += errors
+            elif not moveimportedfiles and not movefailedfiles:    
                 (stored, duplicates, partial, errors, ttime) = self.import_file_dict(file, self.filelist[file][0]
-                                                               ,self.filelist[file][1], self.filelist[file][2], q)
+                                                               ,self.filelist[file][1], self.filelist[file][2])
                 totstored += stored
                 totdups += duplicates
                 totpartial += partial
@@ -306,7 +371,7 @@ class Importer:
             else:
                 try:
                     (stored, duplicates, partial, errors, ttime) = self.import_file_dict(file, self.filelist[file][0]
-                                                                   ,self.filelist[file][1], self.filelist[file][2], q)
+                                                                   ,self.filelist[file][1], self.filelist[file][2])
                     totstored += stored
                     totdups += duplicates
                     totpartial += partial
@@ -332,14 +397,50 @@ class Importer:
 
         del ProgressDialog
         
-        for i in xrange( self.settings['threads'] ):
-            #print ("sending finish message queue length ="), q.qsize()
-            db.send_finish_msg(q)
-
-        
         return (totstored, totdups, totpartial, toterrors)
     # end def importFiles
 
+    def parseFiles(self, files):
+        """Generator: parses files in a pool of settings['threads'] processes and
+           yields for each of them, in order, a generator of the messages of
+           parseFile() for it. Each one must be read to the end before the next
+           one is asked for: its queue is then given to another file.
+           A file is handed out to the pool when the one threads files before it
+           has been read, and each process only gets PARSE_QUEUE_SIZE batches
+           ahead, so parsed hands don't pile up when the database is the
+           bottleneck."""
+        slots = self.settings['threads'] + 1
+        queues = [multiprocessing.Queue(PARSE_QUEUE_SIZE) for i in xrange(slots)]
+        pool = multiprocessing.Pool(self.settings['threads'], initParsePool, (self.config, queues))
+
+        def messages(slot, result):
+            while True:
+                (kind, data) = queues[slot].get()
+                if kind == 'error':
+                    result.get()    # raises the exception of the parse process
+                yield (kind, data)
+                if kind == 'done':
+                    break
+
+        try:
+            pending = deque()
+            for (n, file) in enumerate(files):
+                if file in self.pos_in_file:  idx = self.pos_in_file[file]
+                else: self.pos_in_file[file], idx = 0, 0
+                slot = n % slots
+                pending.append((slot, pool.apply_async(parseFile, (file, self.filelist[file][0], self.filelist[file][1], idx
+                                                                  ,self.settings['starsArchive'], self.settings['ftpArchive']
+                                                                  ,self.settings['batchSize'], slot))))
+                if len(pending) == slots:
+                    yield messages(*pending.popleft())
+            while pending:
+                yield messages(*pending.popleft())
+        except:
+            pool.terminate()
+            raise
+        pool.close()
+        pool.join()
+
     # not used currently
     def calculate_auto(self, db):
         """An heuristic to determine a reasonable value of drop/don't drop"""
@@ -393,6 +494,137 @@ class Importer:
 
     #Run import on updated files, then store latest update time. Called from GuiAutoImport.py
     def runUpdated(self):
+        """Imports the hands added to the monitored directories. Uses the events
+           of self.watcher if there is one, else the files are polled."""
+        if self.watcher:
+            self.runWatched()
+        else:
+            self.runPolled()
+
+    def runWatched(self):
+        """Imports the files changed according to the watcher. Monitored files
+           are kept open and only the bytes appended to them are read."""
+        (changed, removed, overflow) = self.watcher.read_events()
+        if overflow:
+            # events were lost: go back to comparing sizes and times once
+            log.warning(_("Too many file events, checking all the files"))
+            self.unfollowFiles()
+            self.runPolled()
+            return
+
+        # files found when the directory was added are imported like the
+        # poller does: recent ones at once, the others when they change
+        for file in self.unseen:
+            if file in self.filelist and file not in changed and os.path.exists(file):
+                stat_info = os.stat(file)
+                if os.path.isdir(file) or (time() - stat_info.st_mtime) < 60:
+                    changed[file] = self.filelist[file][:2]
+                else:
+                    self.updatedsize[file] = stat_info.st_size
+                    self.updatedtime[file] = time()
+        self.unseen = {}
+
+        for file, (site, filter) in removed.iteritems():
+            self.unfollowFile(file)
+            if file in self.filelist:
+                del self.filelist[file]
+
+        for file, (site, filter) in changed.iteritems():
+            if os.path.isdir(file):
+                # a sub directory is watched like the directory, its files
+                # are looked at by the next call
+                if not self.watcher.add_directory(file, (site, filter)):
+                    # (the watch limit was reached) nothing would tell us about
+                    # its files, poll all the directories from now on
+                    log.warning(_("Can't watch %s, polling the import directories") % file)
+                    self.unwatch()
+                    self.runPolled()
+                    return
+                for name in os.listdir(file):
+                    if os.path.join(file, name) not in self.filelist:
+                        self.unseen[os.path.join(file, name)] = True
+                        self.addImportFile(os.path.join(file, name), site, filter)
+                continue
+            if file not in self.filelist:
+                self.addImportFile(file, site, filter)
+                if file not in self.filelist:
+                    continue
+            self.importFollowed(file)
+        self.database.rollback()
+
+    def importFollowed(self, file):
+        """Imports the hands appended to file since the last call"""
+        (site, filter, fileId) = self.filelist[file]
+        if file not in self.followed:
+            self.followed[file] = self.followFile(file, site, filter)
+        hhc = self.followed[file]
+        if hhc is None:
+            # whole file converters (copyGameHeader) and summaries are read again
+            (stored, duplicates, partial, errors, ttime) = self.import_file_dict(file, site, filter, fileId)
+            self.logUpdated(file, stored, duplicates, partial, errors, ttime)
+            return
+
+        ttime = time()
+        hhc.processedHands, hhc.numHands, hhc.numErrors, hhc.numPartial = [], 0, 0, 0
+        handsList = hhc.readAppendedHands()
+        if handsList and hhc.isSummary(handsList[0]):
+            self.unfollowFile(file)
+            self.followed[file] = None
+            self.importFollowed(file)
+            return
+        self.pos_in_file[file] = hhc.getLastCharacterRead()
+        if not handsList:
+            return
+        hhc.processHandTexts(handsList)
+        duplicates = self.storeHands(hhc.getProcessedHands(), fileId)
+        (stored, partial, errors) = (hhc.numHands, hhc.numPartial, hhc.numErrors)
+        stored -= duplicates + errors + partial
+        self.logUpdated(file, stored, duplicates, partial, errors, time() - ttime)
+
+    def followFile(self, file, site, filter):
+        """Returns a converter following file, or None if file has to be imported
+           with import_file_dict()"""
+        filter_name = filter.replace("ToFpdb", "")
+        mod = __import__(filter)
+        obj = getattr(mod, filter_name, None)
+        if not callable(obj) or obj.copyGameHeader or obj.filetype != "text":
+            return None
+        hhc = obj( self.config, in_path = file, index = self.pos_in_file.get(file, 0)
+                  ,starsArchive = self.settings['starsArchive']
+                  ,ftpArchive   = self.settings['ftpArchive']
+                  ,sitename     = site, autostart = False)
+        if not hhc.followFile():
+            return None
+        return hhc
+
+    def unfollowFile(self, file):
+        if file in self.followed:
+            if self.followed[file]:
+                self.followed[file].unfollowFile()
+            del self.followed[file]
+
+    def unfollowFiles(self):
+        for file in self.followed.keys():
+            self.unfollowFile(file)
+
+    def logUpdated(self, file, stored, duplicates, partial, errors, ttime):
+        """Logs the import of a monitored file and shows it in the auto import tab"""
+        try:
+            self.caller.addText("\n"+os.path.basename(file))
+        except KeyError: # TODO: What error happens here?
+            pass
+        self.logImport('auto', file, stored, duplicates, partial, errors, ttime, self.filelist[file][2])
+        self.database.commit()
+        try: # Note: This assumes that whatever calls us has an "addText" func
+            self.caller.addText(" %d stored, %d duplicates, %d partial, %d errors (time = %f)" % (stored, duplicates, partial, errors, ttime))
+        except KeyError: # TODO: Again, what error happens here? fix when we find out ..
+            pass
+        if os.path.exists(file):
+            self.updatedsize[file] = os.stat(file).st_size
+            self.updatedtime[file] = time()
+
+    def runPolled(self):
+        """Imports the files whose size or time changed since the last call"""
         #Check for new files in monitored directories
         #todo: make efficient - always checks for new file, should be able to use mtime of directory
         # ^^ May not work on windows
@@ -415,7 +647,7 @@ class Importer:
                         except KeyError: # TODO: What error happens here?
                             pass
                         (stored, duplicates, partial, errors, ttime) = self.import_file_dict(file, self.filelist[file][0]
-                                                                      ,self.filelist[file][1], self.filelist[file][2], None)
+                                                                      ,self.filelist[file][1], self.filelist[file][2])
                         self.logImport('auto', file, stored, duplicates, partial, errors, ttime, self.filelist[file][2])
                         self.database.commit()
                         try:
@@ -448,7 +680,7 @@ class Importer:
         #rulog.close()
 
     # This is now an internal function that should not be called directly.
-    def import_file_dict(self, file, site, filter, fileId, q=None):
+    def import_file_dict(self, file, site, filter, fileId):
 
         if os.path.isdir(file):
             self.addToDirList[file] = [site] + [filter]
@@ -457,9 +689,7 @@ class Importer:
         (stored, duplicates, partial, errors, ttime) = (0, 0, 0, 0, time())
 
         # Load filter, process file, pass returned filename to import_fpdb_file
-        if self.settings['threads'] > 0 and self.writeq is not None:
-              log.info((_("Converting %s") % file) + " (" + str(q.qsize()) + ")")
-        else: log.info(_("Converting %s") % file)
+        log.info(_("Converting %s") % file)
             
         filter_name = filter.replace("ToFpdb", "")
         mod = __import__(filter)
@@ -472,77 +702,17 @@ class Importer:
             hhc = obj( self.config, in_path = file, index = idx
                       ,starsArchive = self.settings['starsArchive']
                       ,ftpArchive   = self.settings['ftpArchive']
-                      ,sitename     = site)
+                      ,sitename     = site, autostart = False)
             
             if hhc.getStatus():
                 if self.caller: hhc.progressNotify()
-                handlist = hhc.getProcessedHands()
+                # the hands are stored as they are converted, batchSize at a time,
+                # so the whole file is never held in memory
+                for handlist in hhc.handBatches(self.settings['batchSize']):
+                    duplicates += self.storeHands(handlist, fileId)
+                    if self.settings['cacheHHC']:
+                        hhc.processedHands.extend(handlist)
                 self.pos_in_file[file] = hhc.getLastCharacterRead()
-                (phands, ihands, to_hud) = ([], [], [])
-                self.database.resetBulkCache()
-                
-                ####Lock Placeholder####
-                for hand in handlist:
-                    hand.prepInsert(self.database, printtest = self.settings['testData'])
-                    self.database.commit()
-                    phands.append(hand)
-                ####Lock Placeholder####
-                
-                for hand in phands:
-                    hand.assembleHand()
-                
-                ####Lock Placeholder####
-                id = self.database.nextHandId()
-                sctimer, ihtimer, hctimer = 0,0,0
-                for i in range(len(phands)):
-                    doinsert = len(phands)==i+1
-                    hand = phands[i]
-                    try:
-                        id = hand.getHandId(self.database, id)
-                        stime = time()
-                        hand.updateSessionsCache(self.database, None, doinsert)
-                        sctimer += time() - stime
-                        stime = time()
-                        hand.insertHands(self.database, fileId, doinsert, self.settings['testData'])
-                        ihtimer = time() - stime
-                        stime = time()
-                        hand.updateHudCache(self.database, doinsert)
-                        hctimer = time() - stime
-                        ihands.append(hand)
-                        to_hud.append(hand.dbid_hands)
-                    except Exceptions.FpdbHandDuplicate:
-                        duplicates += 1
-                        #If last hand in the file is a duplicate this will backtrack and insert the new hand records
-                        if (doinsert and ihands):
-                            hand = ihands[-1]
-                            hp = hand.handsplayers
-                            hand.hero, self.database.hbulk, hand.handsplayers  = 0, self.database.hbulk[:-1], [] #making sure we don't insert data from this hand
-                            hand.updateSessionsCache(self.database, None, doinsert)
-                            hand.insertHands(self.database, fileId, doinsert, self.settings['testData'])
-                            hand.updateHudCache(self.database, doinsert)
-                            hand.handsplayers = hp
-                #log.debug("DEBUG: hand.updateSessionsCache: %s" % (t5tot))
-                #log.debug("DEBUG: hand.insertHands: %s" % (t6tot))
-                #log.debug("DEBUG: hand.updateHudCache: %s" % (t7tot))
-                self.database.commit()
-                ####Lock Placeholder####
-                
-                for i in range(len(ihands)):
-                    doinsert = len(ihands)==i+1
-                    hand = ihands[i]
-                    hand.insertHandsPlayers(self.database, doinsert, self.settings['testData'])
-                    hand.insertHandsActions(self.database, doinsert, self.settings['testData'])
-                    hand.insertHandsStove(self.database, doinsert)
-                self.database.commit()
-
-                #pipe the Hands.id out to the HUD
-                if self.callHud:
-                    for hid in to_hud:
-                        try:
-                            print _("fpdb_import: sending hand to hud"), hid, "pipe =", self.caller.pipe_to_hud
-                            self.caller.pipe_to_hud.stdin.write("%s" % (hid) + os.linesep)
-                        except IOError, e:
-                            log.error(_("Failed to send hand to HUD: %s") % e)
 
                 partial = getattr(hhc, 'numPartial')
                 errors  = getattr(hhc, 'numErrors')
@@ -566,6 +736,89 @@ class Importer:
 
         #This will barf if conv.getStatus != True
         return (stored, duplicates, partial, errors, ttime)
+
+    def import_parsed_file(self, file, fileId, parsed):
+        """Stores the hands of the next file of the parseFiles() generator parsed,
+           which is file, a batch at a time. The time returned includes waiting
+           for the parse pool."""
+        ttime = time()
+        duplicates, result = 0, None
+        for (kind, data) in parsed.next():
+            if kind == 'hands':
+                for hand in data:
+                    hand.config = self.config
+                duplicates += self.storeHands(data, fileId)
+            else:
+                result = data
+        if result is None:
+            return (0, 0, 0, 1, time() - ttime)
+        (stored, partial, errors, lastchar) = result
+        self.pos_in_file[file] = lastchar
+        stored -= duplicates + errors + partial
+        return (stored, duplicates, partial, errors, time() - ttime)
+
+    def storeHands(self, handlist, fileId):
+        """Writes a batch of hands of one file to the database in one transaction
+           and pipes their ids to the HUD. Hands that have already been assembled
+           (parse pool) are not assembled again. Returns the number of duplicates."""
+        (phands, ihands) = ([], [])
+        self.database.resetBulkCache()
+        
+        ####Lock Placeholder####
+        for hand in handlist:
+            hand.prepInsert(self.database, printtest = self.settings['testData'])
+            phands.append(hand)
+        ####Lock Placeholder####
+        
+        # one query per gametype instead of one per hand in isDuplicate()
+        self.database.preloadSiteHandNos([(hand.dbid_gt, hand.handid) for hand in phands])
+        
+        for hand in phands:
+            if not hand.stats.handsplayers:
+                hand.assembleHand()
+        
+        ####Lock Placeholder####
+        # the duplicates are left out before anything is queued, the last hand
+        # queued writes the rows of the batch
+        id = self.database.nextHandId()
+        for hand in phands:
+            try:
+                id = hand.getHandId(self.database, id)
+                ihands.append(hand)
+            except Exceptions.FpdbHandDuplicate:
+                pass
+        duplicates = len(phands) - len(ihands)
+        
+        for i in range(len(ihands)):
+            doinsert = len(ihands)==i+1
+            hand = ihands[i]
+            hand.updateSessionsCache(self.database, None, doinsert)
+            hand.insertHands(self.database, fileId, doinsert, self.settings['testData'])
+            hand.updateHudCache(self.database, doinsert)
+            hand.updateCardsCache(self.database, doinsert)
+            hand.updatePositionsCache(self.database, doinsert)
+        
+        for i in range(len(ihands)):
+            doinsert = len(ihands)==i+1
+            hand = ihands[i]
+            hand.insertHandsPlayers(self.database, doinsert, self.settings['testData'])
+            hand.insertHandsActions(self.database, doinsert, self.settings['testData'])
+            hand.insertHandsStove(self.database, doinsert)
+        if self.archive:
+            self.archive.storeHands([(hand.dbid_hands, hand.siteId, hand.in_path, hand.handText) for hand in ihands])
+        self.database.commit()
+        ####Lock Placeholder####
+
+        #send the Hands.id out to the HUD, the batch in as few messages as possible
+        if self.callHud:
+            hids = [hand.dbid_hands for hand in ihands]
+            log.debug(_("fpdb_import: sending hands to hud") + " %s" % hids)
+            try:
+                self.caller.hud_client.send_hands(hids)
+            except (socket.error, IOError), e:
+                log.error(_("Failed to send hand to HUD: %s") % e)
+
+        return duplicates
         
 class ProgressBar:
 
@@ -81,3 +81,11 @@ def testSQLiteModFunction():
         idx = idx+1
 
     cur.execute("DROP TABLE test")
+
+def testClusterIntervals():
+    # sessions: hands more than 30 minutes apart start a new one, a cached session
+    # between two new ones joins them
+    intervals = [(0, 0, 'a'), (25, 25, 'b'), (70, 70, 'c'), (40, 100, 'cached'), (200, 200, 'd')]
+    clusters = Database.clusterIntervals(intervals, 30)
+    assert clusters == [[0, 100, ['a', 'b', 'cached', 'c']], [200, 200, ['d']]]
+    assert Database.clusterIntervals([], 30) == []
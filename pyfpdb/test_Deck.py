@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+"""Deck's atlas, with pixbufs whose pixels are the names of the SVGs they
+   were loaded from, so the tests don't need an X display or pygtk"""
+
+import os
+import sys
+import time
+import json
+import types
+import shutil
+import tempfile
+
+class GError(Exception):
+    pass
+
+class Pixbuf(object):
+    """A gtk.gdk.Pixbuf holding a name per pixel"""
+    def __init__(self, colorspace = None, has_alpha = True, bits = 8, width = 0, height = 0,
+                 pixels = None, options = None):
+        self.width = width
+        self.height = height
+        self.pixels = pixels or [[None] * width for y in range(height)]
+        self.options = options or {}
+
+    def get_width(self):
+        return self.width
+
+    def get_height(self):
+        return self.height
+
+    def get_option(self, key):
+        return self.options.get(key)
+
+    def fill(self, pixel):
+        self.pixels = [[pixel] * self.width for y in range(self.height)]
+
+    def scale_simple(self, width, height, interp):
+        return Pixbuf(width = width, height = height,
+                      pixels = [[self.pixels[0][0]] * width for y in range(height)])
+
+    def copy_area(self, x, y, width, height, dest, dest_x, dest_y):
+        for row in range(height):
+            dest.pixels[dest_y + row][dest_x:dest_x + width] = self.pixels[y + row][x:x + width]
+
+    def subpixbuf(self, x, y, width, height):
+        return Pixbuf(width = width, height = height,
+                      pixels = [line[x:x + width] for line in self.pixels[y:y + height]])
+
+    def save(self, path, type, options):
+        f = open(path, 'w')
+        json.dump({'width': self.width, 'height': self.height,
+                   'pixels': self.pixels, 'options': options}, f)
+        f.close()
+
+    def names(self):
+        """The names of the pixels"""
+        return set([pixel for line in self.pixels for pixel in line])
+
+loaded = []     # the files pixbuf_new_from_file read
+
+def pixbuf_new_from_file(path):
+    loaded.append(path)
+    if path.endswith('.svg'):
+        name = os.path.basename(path)
+        return Pixbuf(width = 100, height = 140, pixels = [[name] * 100 for y in range(140)])
+    try:
+        data = json.load(open(path))
+    except ValueError:
+        raise GError("not an image")
+    return Pixbuf(width = data['width'], height = data['height'],
+                  pixels = data['pixels'], options = data['options'])
+
+gdk = types.ModuleType('gtk.gdk')
+gdk.Pixbuf = Pixbuf
+gdk.pixbuf_new_from_file = pixbuf_new_from_file
+gdk.COLORSPACE_RGB = 0
+gdk.INTERP_HYPER = 3
+fake_gtk = types.ModuleType('gtk')
+fake_gtk.gdk = gdk
+fake_gobject = types.ModuleType('gobject')
+fake_gobject.GError = GError
+
+try:
+    import Deck
+except ImportError:
+    # no pygtk, the fakes are only seen by Deck
+    sys.modules['gtk'] = fake_gtk
+    sys.modules['gobject'] = fake_gobject
+    try:
+        import Deck
+    finally:
+        del sys.modules['gtk'], sys.modules['gobject']
+
+class Config(object):
+    def __init__(self, dir):
+        self.graphics_path = os.path.join(dir, 'gfx')
+        self.dir_cards = os.path.join(dir, 'cards')
+
+def make_svgs(dir, deck_type = 'colour'):
+    os.makedirs(os.path.join(dir, 'gfx', 'cards', deck_type))
+    for suit in Deck.SUITS:
+        for rank in Deck.RANKS:
+            open(os.path.join(dir, 'gfx', 'cards', deck_type,
+                              '%s_%s.svg' % (suit, Deck.RANK_FILES.get(rank, str(rank)))), 'w').close()
+    if not os.path.isdir(os.path.join(dir, 'gfx', 'cards', 'backs')):
+        os.makedirs(os.path.join(dir, 'gfx', 'cards', 'backs'))
+        open(os.path.join(dir, 'gfx', 'cards', 'backs', 'back04.svg'), 'w').close()
+
+def new_deck(config, **args):
+    """A Deck built from the files, not from the decks of the earlier tests"""
+    Deck._decks.clear()
+    del loaded[:]
+    return Deck.Deck(config, **args)
+
+def run(test):
+    """Runs test(dir, config) with the fake gtk and a directory of SVGs"""
+    dir = tempfile.mkdtemp()
+    (gtk, gobject) = (Deck.gtk, Deck.gobject)
+    (Deck.gtk, Deck.gobject) = (fake_gtk, fake_gobject)
+    try:
+        make_svgs(dir)
+        test(dir, Config(dir))
+    finally:
+        (Deck.gtk, Deck.gobject) = (gtk, gobject)
+        Deck._decks.clear()
+        shutil.rmtree(dir)
+
+def svgs():
+    return [path for path in loaded if path.endswith('.svg')]
+
+def testAtlasLayout():
+    def test(dir, config):
+        deck = new_deck(config, width = 3, height = 4)
+        assert len(svgs()) == 53
+        atlas = os.path.join(config.dir_cards, 'colour-back04-3x4.png')
+        assert os.path.exists(atlas)
+        data = json.load(open(atlas))
+        assert (data['width'], data['height']) == (14 * 3, 4 * 4)
+        # a row per suit, the back after the spades' ace
+        assert data['pixels'][0][12 * 3] == 's_a.svg'
+        assert data['pixels'][0][13 * 3] == 'back04.svg'
+        assert data['pixels'][3 * 4][0] == 'c_2.svg'
+        assert data['pixels'][1 * 4 + 3][8 * 3 + 2] == 'h_10.svg'
+        for suit in Deck.SUITS:
+            for rank in Deck.RANKS:
+                card = deck.card(suit, rank)
+                assert (card.get_width(), card.get_height()) == (3, 4)
+                assert card.names() == set(['%s_%s.svg' % (suit, Deck.RANK_FILES.get(rank, str(rank)))])
+        assert deck.back().names() == set(['back04.svg'])
+        assert deck.get_all_card_images()['d'][11].names() == set(['d_j.svg'])
+    run(test)
+
+def testAtlasRoundTrip():
+    def test(dir, config):
+        first = new_deck(config)
+        cards = [first.card(suit, rank).pixels for suit in Deck.SUITS for rank in Deck.RANKS]
+        second = new_deck(config)
+        assert svgs() == []
+        assert loaded == [os.path.join(config.dir_cards, 'colour-back04-30x42.png')]
+        assert [second.card(suit, rank).pixels for suit in Deck.SUITS for rank in Deck.RANKS] == cards
+        assert second.back().pixels == first.back().pixels
+        # the decks of a process share their pixbufs
+        del loaded[:]
+        third = Deck.Deck(config)
+        assert loaded == []
+        assert third.card('s', 14) is second.card('s', 14)
+    run(test)
+
+def testAtlasInvalidation():
+    def test(dir, config):
+        new_deck(config)
+        # an SVG changes
+        path = os.path.join(config.graphics_path, 'cards', 'colour', 'h_q.svg')
+        future = time.time() + 10
+        os.utime(path, (future, future))
+        new_deck(config)
+        assert len(svgs()) == 53
+        new_deck(config)
+        assert svgs() == []
+        # an other size, an other deck
+        new_deck(config, width = 20, height = 28)
+        assert len(svgs()) == 53
+        assert os.path.exists(os.path.join(config.dir_cards, 'colour-back04-20x28.png'))
+        make_svgs(dir, 'fourcolour')
+        deck = new_deck(config, deck_type = 'fourcolour')
+        assert len(svgs()) == 53
+        assert os.path.join(config.graphics_path, 'cards', 'fourcolour', 's_2.svg') in svgs()
+        # an atlas that can't be read is rendered again
+        open(os.path.join(config.dir_cards, 'colour-back04-30x42.png'), 'w').write('garbage')
+        deck = new_deck(config)
+        assert len(svgs()) == 53
+        assert deck.card('c', 9).names() == set(['c_9.svg'])
+    run(test)
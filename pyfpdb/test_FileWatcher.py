@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+import os
+import shutil
+import tempfile
+import FileWatcher
+import PokerStarsToFpdb
+from TestFixtures import STARS_FILE, get_config
+
+def testWatcherEvents():
+    watcher = FileWatcher.get_watcher()
+    if watcher is None:
+        return
+    dir = tempfile.mkdtemp()
+    try:
+        assert watcher.add_directory(dir, 'data')
+        assert watcher.read_events() == ({}, {}, False)
+        path = os.path.join(dir, 'hh.txt')
+        open(path, 'w').write('hand')
+        assert watcher.read_events() == ({path: 'data'}, {}, False)
+        os.remove(path)
+        assert watcher.read_events() == ({}, {path: 'data'}, False)
+    finally:
+        watcher.close()
+        shutil.rmtree(dir)
+
+def testAppendedHandsMatchWholeFile():
+    config = get_config()
+    text = open(STARS_FILE, 'rb').read()
+    whole = PokerStarsToFpdb.PokerStars(config, in_path = STARS_FILE, autostart = False)
+    expected = list(whole.allHandsAsGenerator())
+
+    dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(dir, 'hh.txt')
+        fh = open(path, 'wb')
+        hhc = PokerStarsToFpdb.PokerStars(config, in_path = path, autostart = False)
+        assert hhc.followFile()
+        hands = []
+        # the site appends one hand at a time
+        chunks = text.split('\n\n\n\n')
+        for i, chunk in enumerate(chunks):
+            fh.write(chunk if i == len(chunks) - 1 else chunk + '\n\n\n\n')
+            fh.flush()
+            hands += hhc.readAppendedHands()
+        hhc.unfollowFile()
+        fh.close()
+        assert hands == expected
+        assert hhc.getLastCharacterRead() == whole.index
+    finally:
+        shutil.rmtree(dir)
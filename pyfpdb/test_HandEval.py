@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+import random
+from itertools import combinations
+import HandEval
+
+pe = HandEval.PokerEval()
+
+def evs(game, pockets, board, iterations = 0):
+    return [e['ev'] for e in pe.poker_eval(game = game, pockets = pockets, dead = [],
+                                           board = board, iterations = iterations)['eval']]
+
+def testSevenCardValues():
+    r = random.Random(1)
+    for i in xrange(2000):
+        seven = r.sample(range(52), 7)
+        best = max([HandEval.hi_value(five) for five in combinations(seven, 5)])
+        assert HandEval.hi_value(seven) == best
+
+def testBestHand():
+    best = pe.best_hand('hi', ['Ah', '2s', '3c', '4d', '5h', 'Kc', '9d'])
+    assert best[0] == 'Straight'
+    assert [pe.card2string(c) for c in best[1:]] == ['5h', '4d', '3c', '2s', 'Ah']
+    best = pe.best_hand('hi', ['Ah', 'Ks', 'Kd', 'Tc'], ['Kc', 'Th', 'Td'])
+    assert best[0] == 'FlHouse'
+    assert [pe.card2string(c) for c in best[1:]] == ['Ks', 'Kd', 'Kc', 'Th', 'Td']
+    best = pe.best_hand('low', ['Ah', '2s', '3c', '4d', '7h', 'Kc', '9d'])
+    assert [pe.card2string(c) for c in best[1:]] == ['7h', '4d', '3c', '2s', 'Ah']
+    assert pe.best_hand('low', ['Ah', 'Ks', 'Kd', 'Tc'], ['Kc', 'Th', '2s', '3d', '4d']) == ['Nothing']
+
+def testBestHandValue():
+    assert pe.best_hand_value('hi', ['As', 'Ad', 'Kc', 'Kd', '2h']) > pe.best_hand_value('hi', ['As', 'Ad', 'Qc', 'Qd', 'Kh'])
+    assert pe.best_hand_value('lo', ['As', '2d', '3c', '4d', '6h']) < pe.best_hand_value('lo', ['As', '2d', '3c', '4d', '7h'])
+
+def testHoldemEquity():
+    assert evs('holdem', [['Ah', 'Ks'], ['Qd', 'Qc']], ['2c', '9c', 'Qh', 'Kh', '__']) == [0, 1000]
+    assert evs('holdem', [['Ah', '2s'], ['Ad', '2c']], ['3c', '4c', 'Qh', '__', '__']) == [477, 522]
+    assert evs('holdem', [['Ah', 'Ks'], ['Qd', 'Qc'], ['7c', '8c']], ['2c', '9c', 'Qh', '__', '__']) == [9, 743, 246]
+
+def testOmahaEquity():
+    assert evs('omaha', [['Ah', 'Ks', 'Kd', 'Tc'], ['Qd', 'Qc', 'Js', '9s']], ['2c', '9c', 'Qh', '__', '__']) == [196, 803]
+    assert evs('omaha8', [['Ah', '2s', 'Kd', 'Tc'], ['Qd', '3c', '4s', '9s']], ['2c', '7c', 'Qh', '__', '__']) == [332, 667]
+
+def testNumpyAndPythonAgree():
+    if not HandEval.use_numpy:
+        return
+    pockets = [['Ah', '2s', 'Kd', 'Tc'], ['Qd', '3c', '4s', '9s'], ['5d', '6d', 'Jh', 'Jc']]
+    board = ['2c', '7c', '__', '__', '__']
+    with_numpy = evs('omaha8', pockets, board)
+    HandEval.use_numpy = False
+    try:
+        assert evs('omaha8', pockets, board) == with_numpy
+    finally:
+        HandEval.use_numpy = True
+
+def testMonteCarloIsRepeatable():
+    pockets = [['Ah', 'As'], ['Kd', 'Kc']]
+    assert evs('holdem', pockets, ['__'] * 5, 20000) == evs('holdem', pockets, ['__'] * 5, 20000)
+
+def testRangeOdds():
+    board = ['2c', '9c', 'Qh', '__', '__']
+    odds = pe.holdem_range_odds(['Ah', 'Ks'], [['Qd', 'Qc'], ['7c', '8c']], board)
+    for villain, (plays, win, tie, lose) in zip([['Qd', 'Qc'], ['7c', '8c']], odds):
+        res = pe.poker_eval(game = 'holdem', pockets = [['Ah', 'Ks'], villain], dead = [], board = board)
+        assert (plays, win, tie, lose) == (res['info'][0], res['eval'][0]['winhi'],
+                                           res['eval'][0]['tiehi'], res['eval'][0]['losehi'])
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+import pickle
+import HandRecords
+
+def testRecordReadsLikeADict():
+    row = HandRecords.HandsPlayersRow({'seatNo': 3, 'position': 'B'})
+    assert row['seatNo'] == 3 and row.get('startCash') is None
+    assert 'position' in row and 'startCash' not in row
+    assert row == {'seatNo': 3, 'position': 'B'} and len(row) == 2
+    assert sorted(row) == ['position', 'seatNo']
+    row['startCash'] = 500
+    copy = row.copy()
+    copy['startCash'] = 0
+    assert row['startCash'] == 500
+    try:
+        row['noSuchColumn'] = 1
+        assert False
+    except KeyError:
+        pass
+    try:
+        row['winnings']
+        assert False
+    except KeyError:
+        pass
+
+def testRecordPickles():
+    row = HandRecords.HandsActionsRow({'player': u'Hero', 'street': 0, 'allIn': False})
+    for protocol in (0, 2):
+        assert pickle.loads(pickle.dumps(row, protocol)) == row
+
+def testBatchRows():
+    batch = HandRecords.Batch()
+    row = HandRecords.HandsActionsRow(dict((column, i) for (i, column) in enumerate(HandRecords.HANDS_ACTIONS)))
+    row['player'] = u'Hero'
+    batch.append(7, 42, row)
+    assert len(batch) == 1
+    assert list(batch.rows()) == [(7, 42) + tuple(range(len(HandRecords.HANDS_ACTIONS)))]
+    del row['amount']
+    try:
+        list(batch.rows())
+        assert False
+    except KeyError:
+        pass
+
+def testBatchLargeIds():
+    batch = HandRecords.Batch()
+    row = HandRecords.HandsActionsRow(dict((column, 0) for column in HandRecords.HANDS_ACTIONS))
+    batch.append(2**40, 2**33, row)
+    assert list(batch.rows())[0][:2] == (2**40, 2**33)
+
+def testPick():
+    row = HandRecords.HandsPlayersRow(dict((column, 0) for column in HandRecords.HUD_STATS))
+    row['street0VPI'] = True
+    values = row.pick(HandRecords.HUD_STATS)
+    assert len(values) == len(HandRecords.HUD_STATS) and values[0] is True
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+import socket
+import threading
+import HudProtocol
+
+def serveThread(client, batches, hold = None):
+    def process(hand_ids):
+        if hold is not None:
+            hold.wait()
+        batches.append(hand_ids)
+    def run():
+        sock = HudProtocol.connect(client.port(), client.token)
+        HudProtocol.serve(sock, process)
+        sock.close()
+    thread = threading.Thread(target = run)
+    thread.start()
+    return thread
+
+def testHandsQueuedUntilConnected():
+    client = HudProtocol.HudClient(HudProtocol.listen(), batch = 3)
+    client.send_hands([1, 2, 3, 4])
+    assert list(client.queue) == [1, 2, 3, 4]
+    batches = []
+    thread = serveThread(client, batches)
+    assert client.connected(timeout = 10)
+    client.send_hands([5])
+    client.drain()
+    client.close()
+    thread.join()
+    assert batches == [['1', '2', '3'], ['4', '5']]
+    assert [hands for (latency, hands) in client.latencies] == [3, 2]
+
+def testWindowWaitsForTheHud():
+    client = HudProtocol.HudClient(HudProtocol.listen(), batch = 1, window = 2, timeout = None)
+    batches = []
+    hold = threading.Event()
+    thread = serveThread(client, batches, hold)
+    assert client.connected(timeout = 10)
+    client.send_hands([1])
+    client.send_hands([2])
+    assert len(client.sent) == 2
+    # the third message has to wait for an answer
+    sender = threading.Thread(target = client.send_hands, args = ([3],))
+    sender.start()
+    sender.join(0.2)
+    assert sender.isAlive()
+    hold.set()
+    sender.join()
+    client.drain()
+    client.close()
+    thread.join()
+    assert batches == [['1'], ['2'], ['3']]
+
+def testSlowHudDoesntBlock():
+    client = HudProtocol.HudClient(HudProtocol.listen(), batch = 1, window = 1)
+    batches = []
+    hold = threading.Event()
+    thread = serveThread(client, batches, hold)
+    assert client.connected(timeout = 10)
+    client.send_hands([1])
+    # the answer to the first message hasn't come, the others stay queued
+    client.send_hands([2, 3])
+    assert len(client.sent) == 1 and list(client.queue) == [2, 3]
+    hold.set()
+    client.drain()
+    client.close()
+    thread.join()
+    assert batches == [['1'], ['2'], ['3']]
+
+def testTokenRequired():
+    client = HudProtocol.HudClient(HudProtocol.listen())
+    sock = HudProtocol.connect(client.port(), 'not the token')
+    assert not client.connected(timeout = 10)
+    assert HudProtocol.recv_message(sock) is None   # closed
+    sock.close()
+    batches = []
+    thread = serveThread(client, batches)
+    assert client.connected(timeout = 10)
+    client.send_hands([1])
+    client.drain()
+    client.close()
+    thread.join()
+    assert batches == [['1']]
+
+def testReconnectAfterError():
+    client = HudProtocol.HudClient(HudProtocol.listen())
+    sock = HudProtocol.connect(client.port(), client.token)
+    assert client.connected(timeout = 10)
+    sock.close()
+    try:
+        client.send_hands([1])
+        client.drain()
+        assert False
+    except (socket.error, IOError):
+        pass
+    assert client.sock is None
+    batches = []
+    thread = serveThread(client, batches)
+    assert client.connected(timeout = 10)
+    client.send_hands([2])
+    client.drain()
+    client.close()
+    thread.join()
+    assert batches[-1] == ['2']
+
+def testMessages():
+    listener = HudProtocol.listen()
+    sock = HudProtocol.connect(listener.getsockname()[1], 'token')
+    (peer, address) = listener.accept()
+    assert HudProtocol.recv_message(peer) == 'token'
+    HudProtocol.send_message(sock, '12 13')
+    HudProtocol.send_message(sock, '')
+    assert HudProtocol.recv_message(peer) == '12 13'
+    assert HudProtocol.recv_message(peer) == ''
+    sock.close()
+    assert HudProtocol.recv_message(peer) is None
+    peer.close()
+    listener.close()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+import random
+from itertools import permutations
+import ICM
+
+def orderEquities(stacks, payouts):
+    """Equities from all the finishing orders"""
+    total = float(sum(stacks))
+    result = [0.0] * len(stacks)
+    for order in permutations(range(len(stacks)), min(len(stacks), len(payouts))):
+        p, left = 1.0, total
+        for i in order:
+            p *= stacks[i] / left
+            left -= stacks[i]
+        for place, i in enumerate(order):
+            result[i] += p * payouts[place]
+    return result
+
+def close(a, b, eps = 1e-9):
+    return all(abs(x - y) < eps for x, y in zip(a, b))
+
+def testAgainstFinishingOrders():
+    r = random.Random(1)
+    for n in xrange(1, 7):
+        for places in xrange(1, n + 2):
+            stacks = [r.randint(1, 5000) for i in xrange(n)]
+            payouts = sorted([r.randint(1, 100) for i in xrange(places)], reverse = True)
+            assert close(ICM.equities(stacks, payouts), orderEquities(stacks, payouts[:n]))
+
+def testKnownValues():
+    assert close(ICM.equities([5000, 3000, 2000], [50, 30, 20]), [38.392857142857146, 32.75, 28.857142857142858])
+    assert close(ICM.equities([100, 100, 100, 100], [60, 40]), [25.0] * 4)
+    # an empty stack gets nothing, the places behind it are not paid
+    assert close(ICM.equities([300, 0, 100], [70, 30, 10]), [60.0, 0.0, 40.0])
+
+def testTenPlayers():
+    stacks = [1200, 3400, 800, 5600, 2300, 900, 4100, 1500, 2700, 3000]
+    payouts = [30, 20, 15, 10, 8, 6, 5, 3, 2, 1]
+    eq = ICM.equities(stacks, payouts)
+    assert abs(sum(eq) - sum(payouts)) < 1e-9
+    assert [i for (e, i) in sorted(zip(eq, range(10)))] == [i for (s, i) in sorted(zip(stacks, range(10)))]
+
+def testSampledIsClose():
+    stacks = [1200, 3400, 800, 5600, 2300, 900, 4100, 1500, 2700, 3000]
+    payouts = [30, 20, 15, 10, 8, 6, 5, 3, 2, 1]
+    exact = ICM.harville(map(float, stacks), map(float, payouts))
+    assert close(ICM.sampled(map(float, stacks), payouts, 40000, 1), exact, 0.15)
+    use_numpy = ICM.use_numpy
+    ICM.use_numpy = False
+    try:
+        assert close(ICM.sampled(map(float, stacks), payouts, 20000, 1), exact, 0.2)
+    finally:
+        ICM.use_numpy = use_numpy
+
+def testLargeField():
+    stacks = [1000 + 37 * i for i in xrange(180)]
+    payouts = [100 - i for i in xrange(27)]
+    eq = ICM.equities(stacks, payouts)
+    assert abs(sum(eq) - sum(payouts)) < 1e-6
+    assert eq[-1] > eq[0]
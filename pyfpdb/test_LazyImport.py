@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+import sys
+import LazyImport
+
+def testLazyModule():
+    sys.modules.pop('colorsys', None)
+    colorsys = LazyImport.LazyModule('colorsys')
+    assert not colorsys.loaded()
+    assert 'colorsys' not in sys.modules
+    assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    assert colorsys.loaded()
+    assert colorsys.load() is sys.modules['colorsys']
+
+def testInstalledVersion():
+    assert LazyImport.installed_version('no_such_module_xyz') is None
+
+def testImportTimer():
+    for name in ('wave', 'chunk'):
+        sys.modules.pop(name, None)
+    timer = LazyImport.ImportTimer()
+    timer.install()
+    try:
+        import wave
+    finally:
+        timer.uninstall()
+    # wave imports chunk, which counts in its total but not its own time
+    assert 'wave' in timer.times and 'chunk' in timer.times
+    (total, own) = timer.times['wave']
+    assert total >= timer.times['chunk'][0] and own <= total
+    assert timer.report().splitlines()[1].split()[0] == 'wave'
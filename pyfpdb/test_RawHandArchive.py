@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+import RawHandArchive
+from TestFixtures import STARS_FILE, get_config
+
+def testBlocksRoundTrip():
+    config = get_config()
+    hands = open(STARS_FILE, 'rb').read().decode('utf8').split(u'\n\n\n\n')
+    data = RawHandArchive.SEPARATOR.join([text.encode('utf8') for text in hands[1:]])
+    for compression in ('none', 'bzip2', 'zlib', 'zstd'):
+        archive = RawHandArchive.RawHandArchive(None, config, compression)
+        # the first hand is the dictionary of the site
+        archive.dictionaries = {1: (2, hands[0].encode('utf8'))}
+        dictionaryId = 1 if archive.compression in ('zlib', 'zstd') else None
+        compressed = archive.compress(archive.compression, dictionaryId, data)
+        if compression != 'none':
+            assert len(compressed) < len(data) / 3
+        # a new archive primes its decompressor from the stored dictionary only
+        reader = RawHandArchive.RawHandArchive(None, config, compression)
+        reader.dictionaries = archive.dictionaries
+        assert reader.decompress(archive.compression, dictionaryId, compressed) == hands[1:]
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#This program is free software: you can redistribute it and/or modify
+#it under the terms of the GNU Affero General Public License as published by
+#the Free Software Foundation, version 3 of the License.
+#
+#This program is distributed in the hope that it will be useful,
+#but WITHOUT ANY WARRANTY; without even the implied warranty of
+#MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#GNU General Public License for more details.
+#
+#You should have received a copy of the GNU Affero General Public License
+#along with this program. If not, see <http://www.gnu.org/licenses/>.
+#In the "official" distribution you can find the license in agpl-3.0.txt.
+
+import threading
+import WindowTracker
+
+class FakeObject:
+    """Signals like a gobject"""
+    def __init__(self):
+        self.handlers = {}
+
+    def connect(self, signal, handler):
+        self.handlers.setdefault(signal, []).append(handler)
+
+    def emit(self, signal, *args):
+        for handler in self.handlers.get(signal, []):
+            handler(self, *args)
+
+class FakeWindow(FakeObject):
+    """A wnck.Window"""
+    def __init__(self, xid, name, geometry = (0, 0, 800, 600)):
+        FakeObject.__init__(self)
+        self.xid = xid
+        self.name = name
+        self.geometry = geometry
+
+    def get_xid(self):
+        return self.xid
+
+    def get_name(self):
+        return self.name
+
+    def get_client_window_geometry(self):
+        return self.geometry
+
+    def rename(self, name):
+        self.name = name
+        self.emit('name-changed')
+
+    def configure(self, *geometry):
+        self.geometry = geometry
+        self.emit('geometry-changed')
+
+class FakeScreen(FakeObject):
+    """A wnck.Screen, the window manager"""
+    def __init__(self, windows = []):
+        FakeObject.__init__(self)
+        self.windows = list(windows)
+
+    def get_windows(self):
+        return self.windows
+
+    def open(self, window):
+        self.windows.append(window)
+        self.emit('window-opened', window)
+
+    def close(self, window):
+        self.windows.remove(window)
+        self.emit('window-closed', window)
+
+def badWords(title):
+    return 'Lobby' in title
+
+def testFind():
+    screen = FakeScreen([FakeWindow(1, "PokerStars Lobby - Table 'Alcor' 6-max"),
+                         FakeWindow(2, "Table 'Alcor' 6-max - $0.01/$0.02")])
+    tracker = WindowTracker.WindowTracker(screen)
+    assert tracker.find("Table 'Alcor'", badWords) == 2
+    # the first window of screen.get_windows() that matches
+    assert tracker.find("table 'alcor'") == 1
+    assert tracker.find("Alcor.*\$0\.01") == 2
+    assert tracker.find("Table 'Mizar'") is None
+    screen.open(FakeWindow(3, "Table 'Mizar' - $0.05/$0.10"))
+    assert tracker.find("Table 'Mizar'", badWords) == 3
+    assert tracker.get_geometry(3) == {'x': 0, 'y': 0, 'width': 800, 'height': 600}
+
+def testClose():
+    window = FakeWindow(7, "Table 'Alcor'")
+    screen = FakeScreen([window])
+    tracker = WindowTracker.WindowTracker(screen)
+    events = []
+    tracker.watch(7, events.append)
+    screen.close(window)
+    assert events == ["client_destroyed"]
+    assert tracker.find("Alcor") is None
+    assert tracker.get_geometry(7) is None
+    assert tracker.get_title(7) is None
+    assert tracker.titles == {} and tracker.watchers == {}
+    # wnck keeps the window object around, its signals must be ignored
+    window.configure(10, 10, 800, 600)
+    assert events == ["client_destroyed"]
+
+def testFindOrder():
+    screen = FakeScreen([FakeWindow(9, "Table 'Alcor' 1"), FakeWindow(4, "Table 'Alcor' 2")])
+    tracker = WindowTracker.WindowTracker(screen)
+    screen.open(FakeWindow(2, "Table 'Alcor' 3"))
+    assert tracker.find("Alcor") == 9
+    screen.windows[0].rename("Table 'Alcor' 1 (renamed)")
+    assert tracker.find("Alcor") == 9
+    assert tracker.find("Alcor", lambda title: '1' in title) == 4
+
+def testFindWhileWindowsChange():
+    screen = FakeScreen([FakeWindow(xid, "Table %d" % xid) for xid in range(100)])
+    tracker = WindowTracker.WindowTracker(screen)
+    errors = []
+    def search():
+        try:
+            for i in range(200):
+                tracker.find("Table 99$")
+        except Exception, e:
+            errors.append(e)
+    thread = threading.Thread(target = search)
+    thread.start()
+    for xid in range(100, 2000):
+        window = FakeWindow(xid, "Table %d" % xid)
+        screen.open(window)
+        screen.close(window)
+    thread.join()
+    assert errors == []
+
+def testMoveAndResize():
+    window = FakeWindow(5, "Table 'Alcor'", (0, 0, 800, 600))
+    tracker = WindowTracker.WindowTracker(FakeScreen([window]))
+    events = []
+    tracker.watch(5, events.append)
+    window.configure(20, 30, 800, 600)
+    assert events == ["client_moved"]
+    window.configure(20, 30, 1024, 768)
+    assert events == ["client_moved", "client_resized"]
+    window.configure(20, 30, 1024, 768)
+    assert len(events) == 2
+    assert tracker.get_geometry(5) == {'x': 20, 'y': 30, 'width': 1024, 'height': 768}
+    tracker.unwatch(5, events.append)
+    window.configure(0, 0, 800, 600)
+    assert len(events) == 2
+
+def testRename():
+    window = FakeWindow(9, "Table 'Alcor' - $0.01/$0.02")
+    tracker = WindowTracker.WindowTracker(FakeScreen([window]))
+    events = []
+    tracker.watch(9, events.append)
+    window.rename("Table 'Alcor' - $0.02/$0.05")
+    assert events == ["name_changed"]
+    assert tracker.find("0.01/") is None
+    assert tracker.find("0.02/") == 9
+    assert tracker.get_title(9) == "Table 'Alcor' - $0.02/$0.05"